@@ -0,0 +1,88 @@
+import logging
+import statistics
+import time
+from contextlib import contextmanager
+from functools import partial
+import psycopg2
+import psycopg2.extensions
+from const import db_config
+from utils.data_access.booking_dao import BookingDAO
+
+_round_trips = 0
+_recorded_queries = None
+
+
+class CountingCursor(psycopg2.extensions.cursor):
+  def execute(self, query, vars=None):
+    global _round_trips
+    _round_trips += 1
+    if _recorded_queries is not None:
+      _recorded_queries.append(self.mogrify(query, vars).decode())
+    return super().execute(query, vars)
+
+
+class CountingConnection(psycopg2.extensions.connection):
+  def cursor(self, *args, **kwargs):
+    kwargs.setdefault('cursor_factory', CountingCursor)
+    return super().cursor(*args, **kwargs)
+
+  def commit(self):
+    global _round_trips
+    if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+      _round_trips += 1
+    return super().commit()
+
+  def rollback(self):
+    global _round_trips
+    if self.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+      _round_trips += 1
+    return super().rollback()
+
+
+def create_booking_dao():
+  """Creates a BookingDAO against the database in DB_* env vars whose statements are counted."""
+  logging.basicConfig(level=logging.WARNING)
+  psycopg2.connect = partial(psycopg2.connect, connection_factory=CountingConnection)
+  return BookingDAO(db_config, logging.getLogger('benchmark'), enable_notification=False)
+
+
+def get_round_trips():
+  return _round_trips
+
+
+@contextmanager
+def record_queries():
+  """Collects the SQL, with parameters bound, of every statement executed inside the block."""
+  global _recorded_queries
+  _recorded_queries = []
+  try:
+    yield _recorded_queries
+  finally:
+    _recorded_queries = None
+
+
+def measure(fn, args_list):
+  """Calls fn once per args tuple and returns latency percentiles and round trips per call."""
+  latencies = []
+  round_trips_before = get_round_trips()
+  for args in args_list:
+    started_at = time.perf_counter()
+    fn(*args)
+    latencies.append((time.perf_counter() - started_at) * 1000)
+  calls = len(latencies)
+  return {
+    'calls': calls,
+    'round_trips_per_call': round((get_round_trips() - round_trips_before) / calls, 2) if calls else 0,
+    'mean_ms': round(statistics.mean(latencies), 3) if calls else 0,
+    'p50_ms': round(statistics.median(latencies), 3) if calls else 0,
+    'p95_ms': round(sorted(latencies)[int(calls * 0.95) - 1], 3) if calls else 0,
+  }
+
+
+def print_results(title, results: dict):
+  print(f"\n{title}")
+  for name, result in results.items():
+    print(
+      f"  {name:<32} calls={result['calls']:<6} round_trips/call={result['round_trips_per_call']:<6} "
+      f"mean={result['mean_ms']}ms p50={result['p50_ms']}ms p95={result['p95_ms']}ms"
+    )
@@ -0,0 +1,33 @@
+import argparse
+from benchmarks.bench_utils import create_booking_dao, measure, print_results
+
+
+def get_recent_booking_ids(booking_dao, count):
+  with booking_dao.cursor() as cursor:
+    cursor.execute("SELECT booking_id FROM Bookings ORDER BY booking_id DESC LIMIT %s;", (count,))
+    return [row[0] for row in cursor.fetchall()]
+
+
+def run():
+  parser = argparse.ArgumentParser(description="N single-booking DAO calls vs one bulk call")
+  parser.add_argument('--bookings', type=int, default=50, help="bookings fetched per run")
+  parser.add_argument('--repeat', type=int, default=20, help="runs per variant")
+  args = parser.parse_args()
+
+  booking_dao = create_booking_dao()
+  booking_ids = get_recent_booking_ids(booking_dao, args.bookings)
+  if not booking_ids:
+    raise SystemExit("No bookings found, seed some first, e.g. python -m benchmarks.query_plan_benchmark --seed")
+  runs = [(booking_ids,)] * args.repeat
+
+  results = {
+    'get_booking_info x N': measure(lambda ids: [booking_dao.get_booking_info(booking_id) for booking_id in ids], runs),
+    'get_bookings_by_ids': measure(booking_dao.get_bookings_by_ids, runs),
+    'get_booking_room_type_summary x N': measure(lambda ids: [booking_dao.get_booking_room_type_summary(booking_id) for booking_id in ids], runs),
+    'get_room_type_summaries': measure(booking_dao.get_room_type_summaries, runs),
+  }
+  print_results(f"Fetching {len(booking_ids)} bookings: one call per booking vs one bulk call (per run)", results)
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,135 @@
+import argparse
+from datetime import date
+from benchmarks.bench_utils import create_booking_dao, measure, print_results
+
+SEED_MARKER = 'benchmark-keyword-seed'
+SEED_BOOKING_COUNT = 100000
+SEED_CUSTOMER_COUNT = 20000
+# Far enough in the past not to overlap the bookings seeded by query_plan_benchmark
+SEED_START_DATE = date(1960, 1, 1)
+SURNAMES = '陳林黃張李王吳劉蔡楊許鄭謝洪郭邱曾廖賴徐'
+GIVEN_NAME_CHARACTERS = '志明美玲家豪淑芬建宏雅婷俊傑怡君宗翰佩珊冠宇惠如承恩詩涵'
+
+# The OR-ed search_booking_by_keyword query before db/sql/0012_add_keyword_search_indexes.sql
+LEGACY_KEYWORD_QUERY = """
+SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
+  b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
+  STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
+  JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
+  b.created, b.modified
+FROM Bookings b
+JOIN Customers c ON b.customer_id = c.customer_id
+JOIN RoomBookings rb ON b.booking_id = rb.booking_id
+JOIN Rooms r ON rb.room_id = r.room_id
+WHERE b.booking_id::text LIKE %s
+  OR c.phone_number LIKE %s
+  OR c.name LIKE %s
+GROUP BY b.booking_id, c.customer_id
+ORDER BY
+  CASE
+    WHEN b.status = 'canceled'::booking_statuses THEN 1
+    ELSE 0
+  END,
+  b.booking_id DESC
+LIMIT %s;
+"""
+
+
+# Seeds SEED_BOOKING_COUNT one-night bookings, one room each, spread over the rooms two days
+# apart so they satisfy room_bookings_no_overlap; customers get three-character names
+def seed(booking_dao):
+  with booking_dao.transaction() as cursor:
+    cursor.execute("""
+    INSERT INTO Customers (name, phone_number, notes)
+    SELECT
+      SUBSTR(%s, i %% 20 + 1, 1) || SUBSTR(%s, i / 20 %% 28 + 1, 1) || SUBSTR(%s, i / 560 %% 28 + 1, 1),
+      '+8867' || LPAD(i::text, 8, '0'),
+      %s
+    FROM GENERATE_SERIES(0, %s - 1) AS i;
+    """, (SURNAMES, GIVEN_NAME_CHARACTERS, GIVEN_NAME_CHARACTERS, SEED_MARKER, SEED_CUSTOMER_COUNT))
+    cursor.execute("""
+    WITH rooms AS (
+      SELECT room_id, ROW_NUMBER() OVER (ORDER BY room_id) - 1 AS room_index, COUNT(*) OVER () AS room_count
+      FROM Rooms
+    )
+    INSERT INTO Bookings (status, customer_id, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes)
+    SELECT
+      (CASE WHEN k %% 10 = 0 THEN 'canceled' ELSE 'prepaid' END)::booking_statuses,
+      c.customer_id,
+      %s::date + (k / r.room_count)::int * 2,
+      %s::date + (k / r.room_count)::int * 2,
+      3000,
+      900,
+      'paid'::prepayment_statuses,
+      '自洽'::booking_sources,
+      %s || ':' || r.room_id
+    FROM GENERATE_SERIES(0, %s - 1) AS k
+    JOIN rooms r ON r.room_index = k %% r.room_count
+    JOIN Customers c ON c.phone_number = '+8867' || LPAD((k %% %s)::text, 8, '0');
+    """, (SEED_START_DATE, SEED_START_DATE, SEED_MARKER, SEED_BOOKING_COUNT, SEED_CUSTOMER_COUNT))
+    cursor.execute("""
+    INSERT INTO RoomBookings (booking_id, room_id)
+    SELECT booking_id, SPLIT_PART(notes, ':', 2)
+    FROM Bookings
+    WHERE notes LIKE %s;
+    """, (f'{SEED_MARKER}:%',))
+  analyze(booking_dao)
+  print(f"Seeded {SEED_BOOKING_COUNT} bookings for {SEED_CUSTOMER_COUNT} customers")
+
+
+def cleanup(booking_dao):
+  with booking_dao.transaction() as cursor:
+    cursor.execute("DELETE FROM Bookings WHERE notes LIKE %s;", (f'{SEED_MARKER}:%',))
+    cursor.execute("DELETE FROM Customers WHERE notes = %s;", (SEED_MARKER,))
+  analyze(booking_dao)
+  print("Removed seeded rows")
+
+
+def analyze(booking_dao):
+  with booking_dao.cursor() as cursor:
+    cursor.execute("ANALYZE Bookings; ANALYZE RoomBookings; ANALYZE Customers;")
+
+
+def legacy_search(booking_dao, keyword, limit=10):
+  with booking_dao.cursor() as cursor:
+    cursor.execute(LEGACY_KEYWORD_QUERY, (keyword, f"%{keyword}", f"%{keyword}%", limit))
+    return cursor.fetchall()
+
+
+def get_sample_keywords(booking_dao):
+  with booking_dao.cursor() as cursor:
+    cursor.execute("SELECT MAX(booking_id) FROM Bookings;")
+    max_booking_id = cursor.fetchone()[0] or 1
+  return {
+    'booking ID': str(max_booking_id // 2),
+    'phone last 3 digits': '042',
+    'full name': SURNAMES[3] + GIVEN_NAME_CHARACTERS[5] + GIVEN_NAME_CHARACTERS[7],
+    'name fragment': GIVEN_NAME_CHARACTERS[5] + GIVEN_NAME_CHARACTERS[7],
+  }
+
+
+def run():
+  parser = argparse.ArgumentParser(description="OR-ed LIKE keyword search vs the indexed UNION search")
+  parser.add_argument('--seed', action='store_true', help=f"seed {SEED_BOOKING_COUNT} synthetic bookings first")
+  parser.add_argument('--cleanup', action='store_true', help="remove the seeded rows afterwards")
+  parser.add_argument('--repeat', type=int, default=50, help="searches per keyword and variant")
+  args = parser.parse_args()
+
+  booking_dao = create_booking_dao()
+  if args.seed:
+    seed(booking_dao)
+
+  for label, keyword in get_sample_keywords(booking_dao).items():
+    runs = [(keyword,)] * args.repeat
+    results = {
+      'legacy OR query': measure(lambda kw: legacy_search(booking_dao, kw), runs),
+      'search_booking_by_keyword': measure(booking_dao.search_booking_by_keyword, runs),
+    }
+    print_results(f"Keyword search by {label} ({keyword})", results)
+
+  if args.cleanup:
+    cleanup(booking_dao)
+
+
+if __name__ == '__main__':
+  run()
@@ -0,0 +1,102 @@
+import argparse
+import json
+import random
+import statistics
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+PUBLIC_API_PREFIX = '/api/public'
+ENDPOINTS = ['rooms', 'holiday-rate-dates', 'availability', 'availability-calendar', 'quote']
+
+
+def send(url, body=None):
+  headers = { 'Content-Type': 'application/json' } if body is not None else {}
+  data = json.dumps(body).encode('utf-8') if body is not None else None
+  request = urllib.request.Request(url, data=data, method='POST' if body is not None else 'GET', headers=headers)
+  start = time.perf_counter()
+  try:
+    with urllib.request.urlopen(request, timeout=30) as response:
+      response.read()
+      status = response.status
+  except urllib.error.HTTPError as e:
+    e.read()
+    status = e.code
+  return (time.perf_counter() - start) * 1000, status
+
+
+def get_room_ids(server_url):
+  with urllib.request.urlopen(f'{server_url}{PUBLIC_API_PREFIX}/rooms', timeout=10) as response:
+    return [room['roomId'] for room in json.loads(response.read())['rooms']]
+
+
+def build_requests(server_url, room_ids, count, rng):
+  """The site's calls for random stays in the next 90 days, so few of them hit the response cache."""
+  base_url = f'{server_url}{PUBLIC_API_PREFIX}'
+  today = date.today()
+  requests = []
+  for i in range(count):
+    endpoint = ENDPOINTS[i % len(ENDPOINTS)]
+    check_in = today + timedelta(days=rng.randint(1, 90))
+    check_out = check_in + timedelta(days=rng.randint(1, 3))
+    if endpoint == 'rooms':
+      requests.append((endpoint, f'{base_url}/rooms', None))
+    elif endpoint == 'holiday-rate-dates':
+      requests.append((endpoint, f'{base_url}/holiday-rate-dates?start={check_in}&end={check_in + timedelta(days=60)}', None))
+    elif endpoint == 'availability':
+      requests.append((endpoint, f'{base_url}/availability?checkIn={check_in}&checkOut={check_out}', None))
+    elif endpoint == 'availability-calendar':
+      requests.append((endpoint, f'{base_url}/availability-calendar?start={check_in}&end={check_in + timedelta(days=30)}', None))
+    else:
+      requests.append((endpoint, f'{base_url}/quote', {
+        'checkIn': check_in.isoformat(),
+        'checkOut': check_out.isoformat(),
+        'roomIds': [rng.choice(room_ids)],
+      }))
+  return requests
+
+
+def run_load(server_url, requests, concurrency):
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=concurrency) as executor:
+    results = list(executor.map(lambda request: (request[0], *send(request[1], request[2])), requests))
+  return time.perf_counter() - start, results
+
+
+def print_results(server_url, elapsed_seconds, results):
+  statuses = Counter(status for _, _, status in results)
+  print(f"{server_url}: {len(results)} requests in {elapsed_seconds:.2f}s ({len(results) / elapsed_seconds:.1f}/s), "
+        f"statuses {dict(sorted(statuses.items()))}")
+  latencies_by_endpoint = defaultdict(list)
+  for endpoint, ms, _ in results:
+    latencies_by_endpoint[endpoint].append(ms)
+  latencies_by_endpoint['all'] = [ms for _, ms, _ in results]
+  for endpoint in ENDPOINTS + ['all']:
+    latencies = sorted(latencies_by_endpoint[endpoint])
+    if not latencies:
+      continue
+    print(f"  {endpoint:<22} mean {statistics.mean(latencies):8.2f}ms  p50 {latencies[len(latencies) // 2]:8.2f}ms  "
+          f"p95 {latencies[int(len(latencies) * 0.95)]:8.2f}ms  p99 {latencies[int(len(latencies) * 0.99)]:8.2f}ms  "
+          f"max {latencies[-1]:8.2f}ms")
+
+
+def run():
+  parser = argparse.ArgumentParser(description="Load test the public booking API of one or more line-bot-server deployments")
+  parser.add_argument('--url', action='append', help="line-bot-server base URL; repeat to compare deployments")
+  parser.add_argument('--requests', type=int, default=1000, help="number of requests per deployment")
+  parser.add_argument('--concurrency', type=int, default=32, help="concurrent clients")
+  parser.add_argument('--seed', type=int, default=0, help="random seed of the stay dates, shared by all deployments")
+  args = parser.parse_args()
+
+  for server_url in args.url or ['http://localhost:5001']:
+    # The same request sequence for every deployment
+    requests = build_requests(server_url, get_room_ids(server_url), args.requests, random.Random(args.seed))
+    elapsed_seconds, results = run_load(server_url, requests, args.concurrency)
+    print_results(server_url, elapsed_seconds, results)
+
+
+if __name__ == '__main__':
+  run()
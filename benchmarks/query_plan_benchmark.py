@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import re
+import statistics
+from datetime import date, datetime, timedelta
+from benchmarks.bench_utils import create_booking_dao, record_queries
+
+SEED_MARKER = 'benchmark-seed'
+SEED_YEARS = 10
+SEED_CUSTOMER_COUNT = 5000
+INDEX_MIGRATION_PATH = os.path.join(os.path.dirname(__file__), '..', 'db', 'sql', '0006_add_query_indexes.sql')
+
+
+# Seeds one single-room booking of one or two nights per room every two days over SEED_YEARS,
+# ending about one year from today, so the rows never overlap and satisfy room_bookings_no_overlap
+def seed(booking_dao):
+  start_date = date.today() - timedelta(days=365 * (SEED_YEARS - 1))
+  slot_count = 365 * SEED_YEARS // 2
+  with booking_dao.transaction() as cursor:
+    cursor.execute("""
+    INSERT INTO Customers (name, phone_number, notes)
+    SELECT '壓測' || i, '+8869' || LPAD(i::text, 8, '0'), %s
+    FROM GENERATE_SERIES(0, %s - 1) AS i;
+    """, (SEED_MARKER, SEED_CUSTOMER_COUNT))
+    cursor.execute("""
+    INSERT INTO Bookings (status, customer_id, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes, created, modified)
+    SELECT
+      (CASE WHEN k %% 10 = 0 THEN 'canceled' WHEN k %% 3 = 0 THEN 'new' ELSE 'prepaid' END)::booking_statuses,
+      c.customer_id,
+      %s::date + k * 2,
+      %s::date + k * 2 + (k %% 2),
+      3000 * (1 + k %% 2),
+      CASE WHEN k %% 4 = 0 THEN 0 ELSE 900 END,
+      (CASE WHEN k %% 3 = 0 THEN 'unpaid' ELSE 'paid' END)::prepayment_statuses,
+      '自洽'::booking_sources,
+      %s || ':' || r.room_id,
+      %s::date + k * 2 - 30,
+      %s::date + k * 2 - 30
+    FROM Rooms r
+    CROSS JOIN GENERATE_SERIES(0, %s - 1) AS k
+    JOIN Customers c ON c.phone_number = '+8869' || LPAD((k %% %s)::text, 8, '0');
+    """, (start_date, start_date, SEED_MARKER, start_date, start_date, slot_count, SEED_CUSTOMER_COUNT))
+    cursor.execute("""
+    INSERT INTO RoomBookings (booking_id, room_id)
+    SELECT booking_id, SPLIT_PART(notes, ':', 2)
+    FROM Bookings
+    WHERE notes LIKE %s;
+    """, (f'{SEED_MARKER}:%',))
+    cursor.execute("""
+    INSERT INTO SyncRecords (sync_type, synced_booking_ids, success, error_message, synced_time)
+    SELECT 'sql_to_google_calendar', '', i %% 20 <> 0, %s, NOW() - i * INTERVAL '10 minutes'
+    FROM GENERATE_SERIES(0, %s - 1) AS i;
+    """, (SEED_MARKER, SEED_YEARS * 365 * 24 * 6))
+  analyze(booking_dao)
+  print(f"Seeded {slot_count} stays per room from {start_date}")
+
+
+def cleanup(booking_dao):
+  with booking_dao.transaction() as cursor:
+    cursor.execute("DELETE FROM Bookings WHERE notes LIKE %s;", (f'{SEED_MARKER}:%',))
+    cursor.execute("DELETE FROM Customers WHERE notes = %s;", (SEED_MARKER,))
+    cursor.execute("DELETE FROM SyncRecords WHERE error_message = %s;", (SEED_MARKER,))
+  analyze(booking_dao)
+  print("Removed seeded rows")
+
+
+def analyze(booking_dao):
+  with booking_dao.cursor() as cursor:
+    cursor.execute("ANALYZE;")
+
+
+def get_index_names():
+  with open(INDEX_MIGRATION_PATH, 'r', encoding='utf-8') as f:
+    return re.findall(r'CREATE INDEX IF NOT EXISTS (\w+)', f.read())
+
+
+# The read methods of BookingDAO with representative arguments
+def get_dao_calls(booking_dao):
+  today = date.today()
+  return {
+    'get_booking_info': lambda: booking_dao.get_booking_info(1),
+    'search_booking_by_keyword': lambda: booking_dao.search_booking_by_keyword('壓測42'),
+    'search_booking_by_date': lambda: booking_dao.search_booking_by_date(today),
+    'search_booking_by_date check_in_date': lambda: booking_dao.search_booking_by_date(today, 'check_in_date'),
+    'search_booking_by_date last_date': lambda: booking_dao.search_booking_by_date(today, 'last_date'),
+    'get_overlapping_bookings_by_phone': lambda: booking_dao.get_overlapping_bookings_by_phone('+886900000042', today, today + timedelta(days=30)),
+    'search_booking_not_prepaid': lambda: booking_dao.search_booking_not_prepaid(),
+    'get_bookings_by_month': lambda: booking_dao.get_bookings_by_month(today.strftime('%Y-%m')),
+    'get_latest_bookings': lambda: booking_dao.get_latest_bookings(datetime.now() - timedelta(days=1)),
+    'search_closure_by_date': lambda: booking_dao.search_closure_by_date(today),
+    'get_latest_closures': lambda: booking_dao.get_latest_closures(datetime.now() - timedelta(days=1)),
+    'get_available_room_ids (SQL)': lambda: booking_dao._query_available_room_ids(today, today + timedelta(days=1)),
+    'get_occupied_room_nights': lambda: booking_dao.get_occupied_room_nights(today, today + timedelta(days=90)),
+    'get_latest_sync_time': lambda: booking_dao.get_latest_sync_time(),
+    'get_customer_by_phone_number': lambda: booking_dao.get_customer_by_phone_number('+886900000042'),
+    'get_customer_by_name': lambda: booking_dao.get_customer_by_name('壓測42'),
+  }
+
+
+def capture_queries(booking_dao):
+  # EXECUTE of a prepared statement cannot be explained on another connection, so capture the plain SQL
+  booking_dao.db_config.DB_PREPARED_STATEMENTS_ENABLED = False
+  captured = {}
+  for name, call in get_dao_calls(booking_dao).items():
+    with record_queries() as queries:
+      call()
+    captured[name] = [query for query in queries if query.lstrip().upper().startswith(('SELECT', 'WITH'))]
+  return captured
+
+
+def get_seq_scanned_relations(plan):
+  relations = set()
+  if plan['Node Type'] == 'Seq Scan':
+    relations.add(plan['Relation Name'])
+  for child_plan in plan.get('Plans', []):
+    relations |= get_seq_scanned_relations(child_plan)
+  return relations
+
+
+def explain(cursor, query, repeat):
+  execution_times = []
+  plan = None
+  for _ in range(repeat):
+    cursor.execute(f"EXPLAIN (ANALYZE, FORMAT JSON) {query}")
+    result = cursor.fetchone()[0]
+    result = result if isinstance(result, list) else json.loads(result)
+    plan = result[0]['Plan']
+    execution_times.append(result[0]['Execution Time'])
+  return statistics.median(execution_times), get_seq_scanned_relations(plan)
+
+
+# Runs EXPLAIN ANALYZE for each captured query; without_indexes drops the 0006 indexes
+# inside the transaction, which is rolled back afterwards
+def explain_all(booking_dao, captured, repeat, without_indexes):
+  timings = {}
+  connection = booking_dao.get_connection()
+  try:
+    connection.autocommit = False
+    with connection.cursor() as cursor:
+      if without_indexes:
+        for index_name in get_index_names():
+          cursor.execute(f"DROP INDEX IF EXISTS {index_name};")
+      for name, queries in captured.items():
+        results = [explain(cursor, query, repeat) for query in queries]
+        seq_scanned_relations = set().union(*(relations for _, relations in results))
+        timings[name] = (sum(ms for ms, _ in results), ', '.join(sorted(seq_scanned_relations)) or '-')
+  finally:
+    connection.rollback()
+    booking_dao.release_connection(connection)
+  return timings
+
+
+def run():
+  parser = argparse.ArgumentParser(description="EXPLAIN ANALYZE BookingDAO queries with and without the 0006 indexes")
+  parser.add_argument('--seed', action='store_true', help=f"seed {SEED_YEARS} years of synthetic bookings first")
+  parser.add_argument('--cleanup', action='store_true', help="remove the seeded rows afterwards")
+  parser.add_argument('--repeat', type=int, default=5, help="EXPLAIN ANALYZE runs per query, the median is reported")
+  args = parser.parse_args()
+
+  booking_dao = create_booking_dao()
+  if args.seed:
+    seed(booking_dao)
+
+  captured = capture_queries(booking_dao)
+  before = explain_all(booking_dao, captured, args.repeat, without_indexes=True)
+  after = explain_all(booking_dao, captured, args.repeat, without_indexes=False)
+
+  print(f"\n{'DAO method':<40} {'before ms':>10} {'after ms':>10}  seq scans (before -> after)")
+  for name in captured:
+    print(f"{name:<40} {before[name][0]:>10.3f} {after[name][0]:>10.3f}  {before[name][1]} -> {after[name][1]}")
+
+  if args.cleanup:
+    cleanup(booking_dao)
+
+
+if __name__ == '__main__':
+  run()
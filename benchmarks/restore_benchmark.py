@@ -0,0 +1,69 @@
+import argparse
+import logging
+import os
+import tempfile
+from psycopg2 import sql
+from benchmarks.bench_utils import measure, print_results
+from scheduler.jobs import backup_sql
+from utils.backup_utils import ContentStore, save_manifest
+
+SCRATCH_DATABASE_PREFIX = 'restore_benchmark'
+
+
+def create_scratch_database(name):
+  connection = backup_sql.connect()
+  connection.autocommit = True
+  try:
+    with connection.cursor() as cursor:
+      cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {};").format(sql.Identifier(name)))
+      cursor.execute(sql.SQL("CREATE DATABASE {};").format(sql.Identifier(name)))
+  finally:
+    connection.close()
+
+
+def drop_scratch_database(name):
+  connection = backup_sql.connect()
+  connection.autocommit = True
+  try:
+    with connection.cursor() as cursor:
+      cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {};").format(sql.Identifier(name)))
+  finally:
+    connection.close()
+
+
+def restore_into_scratch_database(jobs):
+  name = f"{SCRATCH_DATABASE_PREFIX}_j{jobs}"
+  create_scratch_database(name)
+  try:
+    backup_sql.restore_backup(dbname=name, jobs=jobs)
+  finally:
+    drop_scratch_database(name)
+
+
+def main():
+  parser = argparse.ArgumentParser()
+  parser.add_argument('--jobs', type=int, default=os.cpu_count() or 4, help='pg_restore jobs of the parallel run')
+  parser.add_argument('--incremental', action='store_true', help='Also replay an incremental change set on top of the full dump')
+  parser.add_argument('--repeat', type=int, default=3)
+  args = parser.parse_args()
+  logging.basicConfig(level=logging.WARNING)
+
+  with tempfile.TemporaryDirectory() as backup_dir:
+    # Back up the DB_* database into a throwaway store, so ./backup is left alone
+    backup_sql.BACKUP_DIR = backup_dir
+    store = ContentStore(backup_dir)
+    full_backup = backup_sql.take_full_backup(store, 'benchmark-full')
+    save_manifest(backup_dir, full_backup)
+    if args.incremental:
+      save_manifest(backup_dir, backup_sql.take_incremental_backup(store, 'benchmark-incremental', full_backup, full_backup))
+    dump_bytes = sum(os.path.getsize(store.object_path(digest)) for digest in full_backup.files.values())
+    print(f"Full dump: {len(full_backup.files)} files, {dump_bytes / 1024 / 1024:.1f} MiB")
+
+    results = {}
+    for jobs in sorted({1, args.jobs}):
+      results[f"restore -j {jobs}"] = measure(restore_into_scratch_database, [(jobs,)] * args.repeat)
+    print_results('Restore into a scratch database', results)
+
+
+if __name__ == '__main__':
+  main()
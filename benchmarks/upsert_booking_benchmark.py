@@ -0,0 +1,127 @@
+import random
+from datetime import date, timedelta
+from benchmarks.bench_utils import create_booking_dao, measure, print_results
+from utils.booking_utils import is_generic_name, is_generic_phone_number
+from utils.data_access.data_class.booking_info import BookingInfo
+
+ITERATIONS = 200
+BASE_CHECK_IN_DATE = date(2040, 1, 1)
+
+
+# The write path before the transactional rewrite, kept here as the comparison baseline
+def legacy_upsert_booking(booking_dao, booking_info: BookingInfo):
+  existing_booking_info = booking_dao.get_booking_info(booking_info.booking_id)
+  customer_id = legacy_upsert_customer(booking_dao, booking_info.customer_name, booking_info.phone_number)
+  with booking_dao.cursor() as cursor:
+    if existing_booking_info:
+      booking_id = existing_booking_info.booking_id
+      cursor.execute("""
+      UPDATE Bookings
+      SET customer_id = %s, status = %s, check_in_date = %s, last_date = %s,
+          total_price = %s, prepayment = %s, prepayment_status = %s, source = %s, notes = %s
+      WHERE booking_id = %s
+      """, (customer_id, booking_info.status, booking_info.check_in_date, booking_info.last_date,
+            int(booking_info.total_price), int(booking_info.prepayment), booking_info.prepayment_status,
+            booking_info.source, booking_info.notes, booking_id))
+      cursor.execute("DELETE FROM RoomBookings WHERE booking_id = %s", (booking_id,))
+    else:
+      cursor.execute("""
+      INSERT INTO Bookings (customer_id, status, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes)
+      VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+      RETURNING booking_id;
+      """, (customer_id, booking_info.status, booking_info.check_in_date, booking_info.last_date,
+            int(booking_info.total_price), int(booking_info.prepayment), booking_info.prepayment_status,
+            booking_info.source, booking_info.notes))
+      booking_id = cursor.fetchone()[0]
+    for room_id in booking_info.room_ids:
+      cursor.execute(
+        "INSERT INTO RoomBookings (booking_id, room_id, extra_bed_count) VALUES (%s, %s, %s);",
+        (booking_id, room_id, booking_info.extra_bed_counts.get(room_id, 0))
+      )
+  return booking_id
+
+
+def legacy_upsert_customer(booking_dao, name, phone_number):
+  with booking_dao.cursor() as cursor:
+    existing_customer = None
+    if not is_generic_phone_number(phone_number):
+      cursor.execute("SELECT customer_id, name, phone_number FROM Customers WHERE phone_number=%s", (phone_number,))
+      existing_customer = cursor.fetchone()
+    elif not is_generic_name(name):
+      cursor.execute("SELECT customer_id, name, phone_number FROM Customers WHERE name=%s", (name,))
+      existing_customer = cursor.fetchone()
+    if existing_customer:
+      customer_id, existing_name, _ = existing_customer
+      if not is_generic_name(name) and name != existing_name:
+        cursor.execute("UPDATE Customers SET name=%s WHERE customer_id=%s", (name, customer_id))
+      return customer_id
+    cursor.execute("INSERT INTO Customers (name, phone_number) VALUES (%s, %s) RETURNING customer_id;", (name, phone_number))
+    return cursor.fetchone()[0]
+
+
+def build_booking_infos(room_ids, offset):
+  booking_infos = []
+  for i in range(ITERATIONS):
+    check_in_date = BASE_CHECK_IN_DATE + timedelta(days=(offset + i) * 3)
+    booked_room_ids = ''.join(random.sample(room_ids, 3))
+    booking_infos.append(BookingInfo(
+      booking_id=-1,
+      status='new',
+      customer_name=f'壓測{offset + i}',
+      phone_number=f'+8869{offset + i:08d}',
+      check_in_date=check_in_date,
+      last_date=check_in_date + timedelta(days=1),
+      total_price=6000,
+      notes='benchmark',
+      source='自洽',
+      prepayment=1800,
+      prepayment_note='',
+      prepayment_status='unpaid',
+      room_ids=booked_room_ids,
+      extra_bed_counts={ booked_room_ids[0]: 1 },
+    ))
+  return booking_infos
+
+
+def edit_booking_infos(booking_dao, booking_ids, room_ids):
+  edited_booking_infos = []
+  for booking_id in booking_ids:
+    booking_info = booking_dao.get_booking_info(booking_id)
+    booking_info.room_ids = ''.join(random.sample(room_ids, 2))
+    booking_info.extra_bed_counts = {}
+    booking_info.notes = 'benchmark edited'
+    edited_booking_infos.append(booking_info)
+  return edited_booking_infos
+
+
+def cleanup(booking_dao, booking_ids):
+  with booking_dao.cursor() as cursor:
+    cursor.execute("DELETE FROM Bookings WHERE booking_id = ANY(%s)", (booking_ids,))
+    cursor.execute("DELETE FROM Customers WHERE notes IS NULL AND name LIKE '壓測%%'")
+
+
+def run():
+  booking_dao = create_booking_dao()
+  room_ids = booking_dao.get_all_room_ids()
+  results = {}
+  created_booking_ids = []
+
+  for label, upsert, offset in (
+    ('legacy', lambda booking_info: legacy_upsert_booking(booking_dao, booking_info), 0),
+    ('transactional', booking_dao.upsert_booking, ITERATIONS),
+  ):
+    booking_ids = []
+    results[f'{label} create'] = measure(
+      lambda booking_info: booking_ids.append(upsert(booking_info)),
+      [(booking_info,) for booking_info in build_booking_infos(room_ids, offset)]
+    )
+    edited_booking_infos = edit_booking_infos(booking_dao, booking_ids, room_ids)
+    results[f'{label} edit'] = measure(upsert, [(booking_info,) for booking_info in edited_booking_infos])
+    created_booking_ids += booking_ids
+
+  cleanup(booking_dao, created_booking_ids)
+  print_results("upsert_booking: legacy per-statement path vs single transaction", results)
+
+
+if __name__ == '__main__':
+  run()
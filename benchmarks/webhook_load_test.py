@@ -0,0 +1,87 @@
+import argparse
+import base64
+import glob
+import hashlib
+import hmac
+import json
+import os
+import statistics
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+DEFAULT_PAYLOAD_DIR = os.path.join(os.path.dirname(__file__), 'line_webhook_payloads')
+
+
+def load_payloads(payload_dir):
+  payloads = []
+  for path in sorted(glob.glob(os.path.join(payload_dir, '*.json'))):
+    with open(path, 'r', encoding='utf-8') as f:
+      payloads.append(f.read().encode('utf-8'))
+  return payloads
+
+
+def sign(body, channel_secret):
+  digest = hmac.new(channel_secret.encode('utf-8'), body, hashlib.sha256).digest()
+  return base64.b64encode(digest).decode('utf-8')
+
+
+def post_webhook(url, body, channel_secret):
+  request = urllib.request.Request(url, data=body, method='POST', headers={
+    'Content-Type': 'application/json',
+    'X-Line-Signature': sign(body, channel_secret),
+  })
+  start = time.perf_counter()
+  with urllib.request.urlopen(request, timeout=30) as response:
+    response.read()
+    status = response.status
+  return (time.perf_counter() - start) * 1000, status
+
+
+def get_queue_stats(server_url):
+  with urllib.request.urlopen(f'{server_url}/health/webhook-queue', timeout=10) as response:
+    return json.loads(response.read())
+
+
+def wait_for_drain(server_url, timeout_seconds):
+  deadline = time.monotonic() + timeout_seconds
+  stats = get_queue_stats(server_url)
+  while stats.get('depth') and time.monotonic() < deadline:
+    time.sleep(0.2)
+    stats = get_queue_stats(server_url)
+  return stats
+
+
+def run():
+  parser = argparse.ArgumentParser(description="Replay recorded LINE webhook bodies against the line-bot-server")
+  parser.add_argument('--url', default='http://localhost:5000', help="line-bot-server base URL")
+  parser.add_argument('--payload-dir', default=DEFAULT_PAYLOAD_DIR, help="directory of recorded webhook JSON bodies")
+  parser.add_argument('--requests', type=int, default=500, help="number of webhook requests to send")
+  parser.add_argument('--concurrency', type=int, default=20, help="concurrent senders")
+  parser.add_argument('--drain-timeout', type=int, default=120, help="seconds to wait for the queue to drain")
+  args = parser.parse_args()
+
+  channel_secret = os.environ['LINE_CHANNEL_SECRET']
+  payloads = load_payloads(args.payload_dir)
+  if not payloads:
+    raise SystemExit(f"No webhook payloads found in {args.payload_dir}")
+
+  bodies = [payloads[i % len(payloads)] for i in range(args.requests)]
+  start = time.perf_counter()
+  with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+    results = list(executor.map(lambda body: post_webhook(f'{args.url}/callback', body, channel_secret), bodies))
+  elapsed_seconds = time.perf_counter() - start
+
+  latencies = sorted(ms for ms, _ in results)
+  failures = sum(1 for _, status in results if status != 200)
+  print(f"Sent {len(results)} webhooks in {elapsed_seconds:.2f}s ({len(results) / elapsed_seconds:.1f}/s), {failures} non-200")
+  print(f"Acknowledgement latency ms: mean {statistics.mean(latencies):.2f}, "
+        f"p50 {latencies[len(latencies) // 2]:.2f}, p95 {latencies[int(len(latencies) * 0.95)]:.2f}, "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:.2f}, max {latencies[-1]:.2f}")
+
+  stats = wait_for_drain(args.url, args.drain_timeout)
+  print(f"Webhook queue after drain: {json.dumps(stats)}")
+
+
+if __name__ == '__main__':
+  run()
@@ -7,6 +7,7 @@ PREPAYMENT_STATUS_MAP = {
 }
 GENERIC_NAMES = ['先生', '小姐', '無名氏']
 PUBLIC_BOOKING_SOURCE = '官網'
+PUBLIC_BOOKING_CLOSED_WEEKDAYS = {0, 1, 2}
 VALID_BOOKING_SOURCES = ['自洽', PUBLIC_BOOKING_SOURCE, 'Booking_com', 'FB', 'Agoda', '台灣旅宿', 'Airbnb']
 GENERIC_PHONE_NUMBER_POSTFIX = '000000'
 EXTRA_BED_PRICE_PER_NIGHT = 500
@@ -9,3 +9,24 @@ DB_PASSWORD = os.getenv('DB_PASSWORD')
 DB_NAME = os.getenv('DB_NAME')
 DB_SSLMODE = os.getenv('DB_SSLMODE')
 DB_SSLROOTCERT = os.getenv('DB_SSLROOTCERT')
+
+# Connection pool
+DB_POOL_MIN_CONN = os.getenv('DB_POOL_MIN_CONN', '1')
+DB_POOL_MAX_CONN = os.getenv('DB_POOL_MAX_CONN', '20')
+DB_POOL_TIMEOUT = os.getenv('DB_POOL_TIMEOUT', '10')
+DB_POOL_MAX_IDLE_SECONDS = os.getenv('DB_POOL_MAX_IDLE_SECONDS', '30')
+DB_POOL_MAX_LIFETIME_SECONDS = os.getenv('DB_POOL_MAX_LIFETIME_SECONDS', '1800')
+
+# In-memory room occupancy index
+OCCUPANCY_INDEX_ENABLED = os.getenv('OCCUPANCY_INDEX_ENABLED', '').lower() in ('1', 'true', 'yes', 'on')
+OCCUPANCY_INDEX_REFRESH_SECONDS = int(os.getenv('OCCUPANCY_INDEX_REFRESH_SECONDS', '300'))
+OCCUPANCY_INDEX_CONSISTENCY_CHECK = os.getenv('OCCUPANCY_INDEX_CONSISTENCY_CHECK', '').lower() in ('1', 'true', 'yes', 'on')
+# Drop the index whenever any process commits a booking or closure change (booking_changes channel)
+OCCUPANCY_INDEX_LISTEN_ENABLED = os.getenv('OCCUPANCY_INDEX_LISTEN_ENABLED', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Process-wide room catalogue cache; 0 disables it
+ROOM_CATALOGUE_CACHE_SECONDS = int(os.getenv('ROOM_CATALOGUE_CACHE_SECONDS', '3600'))
+ROOM_CATALOGUE_LISTEN_ENABLED = os.getenv('ROOM_CATALOGUE_LISTEN_ENABLED', '').lower() in ('1', 'true', 'yes', 'on')
+
+# Run the booking projection queries as server-side prepared statements, prepared once per connection
+DB_PREPARED_STATEMENTS_ENABLED = os.getenv('DB_PREPARED_STATEMENTS_ENABLED', 'true').lower() in ('1', 'true', 'yes', 'on')
@@ -9,6 +9,22 @@ LINE_ADMIN_USER_IDS = [
   if user_id.strip()
 ]
 
+# Conversation session store: 'memory' (single worker only) or 'postgres'
+LINE_SESSION_STORE = os.getenv('LINE_SESSION_STORE', 'memory')
+LINE_SESSION_TTL_SECONDS = int(os.getenv('LINE_SESSION_TTL_SECONDS', '21600'))
+
+# Webhook events are queued and handled by a worker pool instead of inside the request
+LINE_WEBHOOK_ASYNC_ENABLED = os.getenv('LINE_WEBHOOK_ASYNC', '').lower() in ('1', 'true', 'yes', 'on')
+LINE_WEBHOOK_WORKERS = int(os.getenv('LINE_WEBHOOK_WORKERS', '4'))
+LINE_WEBHOOK_QUEUE_SIZE = int(os.getenv('LINE_WEBHOOK_QUEUE_SIZE', '50'))
+LINE_WEBHOOK_SHUTDOWN_TIMEOUT_SECONDS = int(os.getenv('LINE_WEBHOOK_SHUTDOWN_TIMEOUT_SECONDS', '10'))
+
+# Booking notifications queued in the LineNotificationOutbox table are pushed by a dispatcher thread
+LINE_NOTIFICATION_DISPATCH_ENABLED = os.getenv('LINE_NOTIFICATION_DISPATCH', 'true').lower() in ('1', 'true', 'yes', 'on')
+LINE_NOTIFICATION_BATCH_SIZE = int(os.getenv('LINE_NOTIFICATION_BATCH_SIZE', '50'))
+LINE_NOTIFICATION_POLL_SECONDS = int(os.getenv('LINE_NOTIFICATION_POLL_SECONDS', '5'))
+LINE_NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('LINE_NOTIFICATION_MAX_ATTEMPTS', '8'))
+
 # User flows and steps
 USER_FLOW_CREATE_BOOKING = 'USER_FLOW.CREATE_BOOKING'
 USER_FLOW_STEP_CREATE_BOOKING__GET_CUSTOMER_NAME = 'USER_FLOW_STEP.CREATE_BOOKING.GET_CUSTOMER_NAME'
@@ -78,6 +94,7 @@ USER_COMMAND_CONFIRM = '確認'
 USER_COMMAND_CANCEL_CURRENT_FLOW = '取消'
 USER_COMMAND_GO_TO_PREVIOUS_STEP_OF_CURRENT_FLOW = '上一步'
 USER_COMMAND_CREATE_BOOKING = '建立訂單'
+USER_COMMAND_SHOW_JOB_RUNS = '排程狀態'
 USER_COMMAND_EDIT_BOOKING = '更改訂單 {booking_id}'
 
 # for both create and edit booking
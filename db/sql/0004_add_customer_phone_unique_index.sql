@@ -0,0 +1,25 @@
+-- Merge customers that share a real (non-generic) phone number before enforcing uniqueness.
+-- Generic phone numbers end with '000000' (GENERIC_PHONE_NUMBER_POSTFIX) and may be shared.
+WITH duplicates AS (
+    SELECT customer_id, MIN(customer_id) OVER (PARTITION BY phone_number) AS kept_customer_id
+    FROM Customers
+    WHERE RIGHT(phone_number, 6) <> '000000'
+)
+UPDATE Bookings b
+SET customer_id = d.kept_customer_id
+FROM duplicates d
+WHERE b.customer_id = d.customer_id AND d.customer_id <> d.kept_customer_id;
+
+WITH duplicates AS (
+    SELECT customer_id, MIN(customer_id) OVER (PARTITION BY phone_number) AS kept_customer_id
+    FROM Customers
+    WHERE RIGHT(phone_number, 6) <> '000000'
+)
+DELETE FROM Customers c
+USING duplicates d
+WHERE c.customer_id = d.customer_id AND d.customer_id <> d.kept_customer_id;
+
+-- Used by INSERT ... ON CONFLICT in BookingDAO._upsert_customer
+CREATE UNIQUE INDEX IF NOT EXISTS customers_phone_number_key
+ON Customers (phone_number)
+WHERE RIGHT(phone_number, 6) <> '000000';
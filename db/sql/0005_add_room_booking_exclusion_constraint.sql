@@ -0,0 +1,79 @@
+-- Let the database reject double bookings: every RoomBookings row carries the stay range and
+-- canceled flag of its booking, and no two non-canceled rows of the same room may overlap.
+CREATE EXTENSION IF NOT EXISTS btree_gist;
+
+-- Existing double bookings must be resolved by an admin (cancel or move one of each pair) before the
+-- constraint can be added. Checked before anything changes, so the migration can simply be rerun after.
+DO $$
+DECLARE
+   conflicts TEXT;
+BEGIN
+   SELECT STRING_AGG(FORMAT('booking %s and booking %s in room %s', a.booking_id, b.booking_id, a.room_id), E'\n'
+                     ORDER BY a.booking_id, b.booking_id, a.room_id)
+   INTO conflicts
+   FROM RoomBookings a
+   JOIN Bookings ba ON ba.booking_id = a.booking_id
+   JOIN RoomBookings b ON b.room_id = a.room_id AND b.booking_id > a.booking_id
+   JOIN Bookings bb ON bb.booking_id = b.booking_id
+   WHERE ba.status IS DISTINCT FROM 'canceled' AND bb.status IS DISTINCT FROM 'canceled'
+     AND DATERANGE(ba.check_in_date, ba.last_date, '[]') && DATERANGE(bb.check_in_date, bb.last_date, '[]');
+
+   IF conflicts IS NOT NULL THEN
+      RAISE EXCEPTION 'Resolve the overlapping bookings before adding room_bookings_no_overlap:%', E'\n' || conflicts;
+   END IF;
+END;
+$$;
+
+ALTER TABLE RoomBookings
+    ADD COLUMN IF NOT EXISTS stay_range DATERANGE,
+    ADD COLUMN IF NOT EXISTS is_canceled BOOLEAN NOT NULL DEFAULT FALSE;
+
+UPDATE RoomBookings rb
+SET stay_range = DATERANGE(b.check_in_date, b.last_date, '[]'),
+    is_canceled = b.status IS NOT DISTINCT FROM 'canceled'
+FROM Bookings b
+WHERE b.booking_id = rb.booking_id;
+
+ALTER TABLE RoomBookings ALTER COLUMN stay_range SET NOT NULL;
+
+-- Copy the stay range of the booking onto new room-booking rows
+CREATE OR REPLACE FUNCTION set_room_booking_stay_range()
+RETURNS TRIGGER AS $$
+BEGIN
+   SELECT DATERANGE(check_in_date, last_date, '[]'), status IS NOT DISTINCT FROM 'canceled'
+   INTO NEW.stay_range, NEW.is_canceled
+   FROM Bookings
+   WHERE booking_id = NEW.booking_id;
+   RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_set_room_booking_stay_range
+BEFORE INSERT OR UPDATE OF booking_id ON RoomBookings
+FOR EACH ROW
+EXECUTE FUNCTION set_room_booking_stay_range();
+
+-- Keep the copies in sync when a booking moves, is canceled or is restored
+CREATE OR REPLACE FUNCTION sync_room_booking_stay_ranges()
+RETURNS TRIGGER AS $$
+BEGIN
+   UPDATE RoomBookings
+   SET stay_range = DATERANGE(NEW.check_in_date, NEW.last_date, '[]'),
+       is_canceled = NEW.status IS NOT DISTINCT FROM 'canceled'
+   WHERE booking_id = NEW.booking_id;
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_sync_room_booking_stay_ranges
+AFTER UPDATE OF check_in_date, last_date, status ON Bookings
+FOR EACH ROW
+WHEN ((OLD.check_in_date, OLD.last_date, OLD.status) IS DISTINCT FROM (NEW.check_in_date, NEW.last_date, NEW.status))
+EXECUTE FUNCTION sync_room_booking_stay_ranges();
+
+-- Deferred so a booking can move dates and swap rooms within one transaction; the check runs at commit.
+ALTER TABLE RoomBookings
+    ADD CONSTRAINT room_bookings_no_overlap
+    EXCLUDE USING GIST (room_id WITH =, stay_range WITH &&)
+    WHERE (NOT is_canceled)
+    DEFERRABLE INITIALLY DEFERRED;
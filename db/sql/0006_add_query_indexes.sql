@@ -0,0 +1,41 @@
+-- Indexes for the filters used by BookingDAO; 0000_init.sql only defined primary keys.
+
+-- Stay-overlap and stay-contains lookups (availability, occupancy calendar, search by date)
+-- are written as DATERANGE(...) && / @> so they can use these GiST expression indexes.
+CREATE INDEX IF NOT EXISTS bookings_stay_range_idx
+ON Bookings USING GIST (DATERANGE(check_in_date, last_date, '[]'));
+
+CREATE INDEX IF NOT EXISTS closures_stay_range_idx
+ON Closures USING GIST (DATERANGE(start_date, last_date, '[]'));
+
+-- Check-in / check-out day lookups and monthly reports
+CREATE INDEX IF NOT EXISTS bookings_check_in_date_last_date_idx ON Bookings (check_in_date, last_date);
+CREATE INDEX IF NOT EXISTS bookings_last_date_idx ON Bookings (last_date);
+
+-- Upcoming bookings still waiting for a prepayment
+CREATE INDEX IF NOT EXISTS bookings_not_prepaid_check_in_date_idx
+ON Bookings (check_in_date)
+WHERE prepayment_status = 'unpaid' AND status <> 'canceled' AND prepayment > 0;
+
+-- Incremental sync reads rows created or modified since the last successful sync
+CREATE INDEX IF NOT EXISTS bookings_created_idx ON Bookings (created);
+CREATE INDEX IF NOT EXISTS bookings_modified_idx ON Bookings (modified);
+CREATE INDEX IF NOT EXISTS closures_created_idx ON Closures (created);
+CREATE INDEX IF NOT EXISTS closures_modified_idx ON Closures (modified);
+CREATE INDEX IF NOT EXISTS sync_records_type_success_time_idx ON SyncRecords (sync_type, success, synced_time DESC);
+
+-- Foreign keys that are joined or filtered on from the referencing side
+CREATE INDEX IF NOT EXISTS bookings_customer_id_idx ON Bookings (customer_id);
+CREATE INDEX IF NOT EXISTS room_bookings_room_id_idx ON RoomBookings (room_id);
+CREATE INDEX IF NOT EXISTS room_closures_room_id_idx ON RoomClosures (room_id);
+
+-- Customer lookups; generic phone numbers are not covered by customers_phone_number_key
+CREATE INDEX IF NOT EXISTS customers_phone_number_idx ON Customers (phone_number);
+CREATE INDEX IF NOT EXISTS customers_name_idx ON Customers (name);
+
+ANALYZE Bookings;
+ANALYZE Closures;
+ANALYZE RoomBookings;
+ANALYZE RoomClosures;
+ANALYZE Customers;
+ANALYZE SyncRecords;
@@ -0,0 +1,13 @@
+-- Tell BookingDAO room catalogue caches to reload whenever the Rooms table changes
+CREATE OR REPLACE FUNCTION notify_rooms_changed()
+RETURNS TRIGGER AS $$
+BEGIN
+   PERFORM pg_notify('rooms_changed', TG_OP);
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_notify_rooms_changed
+AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON Rooms
+FOR EACH STATEMENT
+EXECUTE FUNCTION notify_rooms_changed();
@@ -0,0 +1,8 @@
+-- LINE conversation sessions shared by all line-bot-server workers
+CREATE TABLE IF NOT EXISTS LineSessions (
+    user_id VARCHAR(64) PRIMARY KEY,
+    data TEXT NOT NULL,
+    expires_at TIMESTAMP NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS line_sessions_expires_at_idx ON LineSessions (expires_at);
@@ -0,0 +1,17 @@
+-- LINE push notifications written in the same transaction as the booking change and sent by
+-- LineNotificationDispatcher, so a crash between commit and push cannot lose a notification
+CREATE TABLE IF NOT EXISTS LineNotificationOutbox (
+    outbox_id BIGSERIAL PRIMARY KEY,
+    recipient_id VARCHAR(64) NOT NULL,
+    messages JSONB NOT NULL,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    attempts INT NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    sent_at TIMESTAMP,
+    created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS line_notification_outbox_pending_idx
+ON LineNotificationOutbox (next_attempt_at, outbox_id)
+WHERE sent_at IS NULL;
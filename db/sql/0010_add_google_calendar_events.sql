@@ -0,0 +1,11 @@
+-- Google Calendar event of each synced booking or closure, so updates can patch the event
+-- directly instead of searching the calendar for it
+CREATE TABLE IF NOT EXISTS GoogleCalendarEvents (
+    entity_type VARCHAR(16) NOT NULL CHECK (entity_type IN ('booking', 'closure')),
+    entity_id INT NOT NULL,
+    calendar_id VARCHAR(255) NOT NULL,
+    event_id VARCHAR(1024) NOT NULL,
+    etag VARCHAR(255),
+    synced_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (calendar_id, entity_type, entity_id)
+);
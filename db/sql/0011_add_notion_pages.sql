@@ -0,0 +1,10 @@
+-- Notion page of each synced booking or closure, so the sync can update the page directly
+-- instead of querying the Notion database for it
+CREATE TABLE IF NOT EXISTS NotionPages (
+    entity_type VARCHAR(16) NOT NULL CHECK (entity_type IN ('booking', 'closure')),
+    entity_id INT NOT NULL,
+    database_id VARCHAR(64) NOT NULL,
+    page_id VARCHAR(64) NOT NULL,
+    synced_time TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (database_id, entity_type, entity_id)
+);
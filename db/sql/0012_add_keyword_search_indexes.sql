@@ -0,0 +1,12 @@
+-- Indexes for search_booking_by_keyword, which looks bookings up by exact booking ID, by the
+-- last digits of the phone number and by any part of the customer name.
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- LIKE '%keyword%' on names, and SIMILARITY() for ranking the matches
+CREATE INDEX IF NOT EXISTS customers_name_trgm_idx ON Customers USING GIN (name gin_trgm_ops);
+
+-- "Ends with" phone lookups become a prefix match on the reversed number
+CREATE INDEX IF NOT EXISTS customers_phone_number_reversed_idx
+ON Customers (REVERSE(phone_number) text_pattern_ops);
+
+ANALYZE Customers;
@@ -0,0 +1,133 @@
+-- Pre-aggregated figures for the monthly report. Booking changes only mark the months they touch
+-- as stale; refresh_booking_stats() recomputes one month, either when the report reads a stale
+-- month or from the refresh_booking_stats scheduler job.
+
+-- Report totals of the non-canceled bookings checking in during the month, with the same
+-- truncation as booking_utils.generate_report
+CREATE TABLE IF NOT EXISTS MonthlyBookingStats (
+    month DATE PRIMARY KEY,  -- First day of the month
+    booking_count INT NOT NULL,
+    total_revenue BIGINT NOT NULL,
+    booking_com_commission BIGINT NOT NULL,
+    staff_share BIGINT NOT NULL,
+    balance BIGINT NOT NULL,
+    refreshed TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Room nights sold per night and room type; each night of a booking gets an equal share of its
+-- total price, split equally between its rooms
+CREATE TABLE IF NOT EXISTS RoomTypeNightStats (
+    stay_date DATE NOT NULL,
+    room_type room_types NOT NULL,
+    rooms_sold INT NOT NULL,
+    room_revenue DECIMAL(12, 2) NOT NULL,
+    PRIMARY KEY (stay_date, room_type)
+);
+
+CREATE TABLE IF NOT EXISTS BookingStatsStaleMonths (
+    month DATE PRIMARY KEY,
+    marked TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE OR REPLACE FUNCTION mark_booking_stats_stale(start_date DATE, last_date DATE)
+RETURNS VOID AS $$
+BEGIN
+   INSERT INTO BookingStatsStaleMonths (month)
+   SELECT GENERATE_SERIES(DATE_TRUNC('month', start_date), DATE_TRUNC('month', last_date), INTERVAL '1 month')::date
+   ON CONFLICT (month) DO NOTHING;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION mark_booking_stats_stale_for_booking()
+RETURNS TRIGGER AS $$
+BEGIN
+   IF TG_OP IN ('UPDATE', 'DELETE') THEN
+      PERFORM mark_booking_stats_stale(OLD.check_in_date, OLD.last_date);
+   END IF;
+   IF TG_OP IN ('INSERT', 'UPDATE') THEN
+      PERFORM mark_booking_stats_stale(NEW.check_in_date, NEW.last_date);
+   END IF;
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_mark_booking_stats_stale
+AFTER INSERT OR DELETE OR UPDATE OF check_in_date, last_date, status, total_price, source ON Bookings
+FOR EACH ROW
+EXECUTE FUNCTION mark_booking_stats_stale_for_booking();
+
+-- Adding or removing a room changes the room type figures of the booking's nights; rows deleted
+-- together with their booking were already handled by the Bookings trigger
+CREATE OR REPLACE FUNCTION mark_booking_stats_stale_for_room_booking()
+RETURNS TRIGGER AS $$
+BEGIN
+   PERFORM mark_booking_stats_stale(b.check_in_date, b.last_date)
+   FROM Bookings b
+   WHERE b.booking_id = COALESCE(NEW.booking_id, OLD.booking_id);
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_mark_booking_stats_stale_for_room_booking
+AFTER INSERT OR DELETE OR UPDATE OF room_id ON RoomBookings
+FOR EACH ROW
+EXECUTE FUNCTION mark_booking_stats_stale_for_room_booking();
+
+CREATE OR REPLACE FUNCTION refresh_booking_stats(target_month DATE)
+RETURNS VOID AS $$
+DECLARE
+   month_last_date DATE := (target_month + INTERVAL '1 month')::date - 1;
+BEGIN
+   -- Serializes refreshes of the same month
+   PERFORM pg_advisory_xact_lock(hashtext('refresh_booking_stats'), target_month - DATE '2000-01-01');
+   DELETE FROM BookingStatsStaleMonths WHERE month = target_month;
+
+   DELETE FROM MonthlyBookingStats WHERE month = target_month;
+   INSERT INTO MonthlyBookingStats (month, booking_count, total_revenue, booking_com_commission, staff_share, balance)
+   SELECT
+      target_month,
+      COUNT(*),
+      COALESCE(SUM(price), 0),
+      COALESCE(SUM(commission), 0),
+      COALESCE(SUM(staff_share), 0),
+      COALESCE(SUM(price - commission - staff_share), 0)
+   FROM (
+      SELECT price, commission, TRUNC((price - commission) * 0.2) AS staff_share
+      FROM (
+         SELECT
+            TRUNC(COALESCE(total_price, 0)) AS price,
+            CASE WHEN source = 'Booking_com' THEN TRUNC(TRUNC(COALESCE(total_price, 0)) * 0.12) ELSE 0 END AS commission
+         FROM Bookings
+         WHERE check_in_date >= target_month AND check_in_date <= month_last_date
+            AND status != 'canceled'::booking_statuses
+      ) priced
+   ) shared;
+
+   DELETE FROM RoomTypeNightStats WHERE stay_date BETWEEN target_month AND month_last_date;
+   INSERT INTO RoomTypeNightStats (stay_date, room_type, rooms_sold, room_revenue)
+   SELECT
+      night::date,
+      r.room_type,
+      COUNT(*),
+      SUM(COALESCE(b.total_price, 0) / ((b.last_date - b.check_in_date + 1) * booking_rooms.room_count))
+   FROM Bookings b
+   JOIN RoomBookings rb ON rb.booking_id = b.booking_id
+   JOIN Rooms r ON r.room_id = rb.room_id
+   JOIN LATERAL (
+      SELECT COUNT(*) AS room_count FROM RoomBookings WHERE booking_id = b.booking_id
+   ) booking_rooms ON TRUE
+   CROSS JOIN LATERAL GENERATE_SERIES(
+      GREATEST(b.check_in_date, target_month), LEAST(b.last_date, month_last_date), INTERVAL '1 day'
+   ) AS night
+   WHERE DATERANGE(b.check_in_date, b.last_date, '[]') && DATERANGE(target_month, month_last_date, '[]')
+      AND b.status != 'canceled'::booking_statuses
+      AND r.room_type IS NOT NULL
+   GROUP BY night::date, r.room_type;
+END;
+$$ LANGUAGE plpgsql;
+
+-- Every month with bookings starts stale and is filled in on first read or by the job
+INSERT INTO BookingStatsStaleMonths (month)
+SELECT DISTINCT GENERATE_SERIES(DATE_TRUNC('month', check_in_date), DATE_TRUNC('month', last_date), INTERVAL '1 month')::date
+FROM Bookings
+ON CONFLICT (month) DO NOTHING;
@@ -0,0 +1,16 @@
+-- One row per finished scheduler job run, written by scheduler/job_runner.py and shown by the LINE bot
+CREATE TABLE IF NOT EXISTS SchedulerJobRuns (
+    run_id BIGSERIAL PRIMARY KEY,
+    job_name VARCHAR(64) NOT NULL,
+    executor VARCHAR(16) NOT NULL,
+    status VARCHAR(16) NOT NULL CHECK (status IN ('succeeded', 'failed')),
+    started TIMESTAMP NOT NULL,
+    finished TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    duration_ms INT NOT NULL,
+    item_count INT,
+    error_count INT NOT NULL DEFAULT 0,
+    error TEXT
+);
+
+CREATE INDEX IF NOT EXISTS scheduler_job_runs_job_name_started_idx
+ON SchedulerJobRuns (job_name, started DESC);
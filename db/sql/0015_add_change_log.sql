@@ -0,0 +1,79 @@
+-- Change feed for the sync jobs: triggers log the ID of every booking and closure a transaction
+-- writes, and consumers read the log from the txid snapshot saved as their cursor. Reading by
+-- snapshot, rather than by change_id or timestamp, cannot skip the changes of a transaction that
+-- commits after a later one, so no update is lost to commit order or clock skew.
+CREATE TABLE IF NOT EXISTS ChangeLog (
+    change_id BIGSERIAL PRIMARY KEY,
+    entity_type VARCHAR(16) NOT NULL CHECK (entity_type IN ('booking', 'closure')),
+    entity_id INT NOT NULL,
+    txid BIGINT NOT NULL DEFAULT txid_current(),
+    created TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- One row per entity and transaction, however many of its rows the transaction writes
+CREATE UNIQUE INDEX IF NOT EXISTS change_log_txid_entity_idx
+ON ChangeLog (txid, entity_type, entity_id);
+
+CREATE TABLE IF NOT EXISTS ChangeFeedCursors (
+    consumer VARCHAR(64) PRIMARY KEY,
+    snapshot txid_snapshot NOT NULL,
+    modified TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+-- TG_ARGV[0] is the entity type and TG_ARGV[1] the column holding its ID
+CREATE OR REPLACE FUNCTION log_change()
+RETURNS TRIGGER AS $$
+DECLARE
+   changed_row JSONB;
+BEGIN
+   IF TG_OP = 'DELETE' THEN
+      changed_row := TO_JSONB(OLD);
+   ELSE
+      changed_row := TO_JSONB(NEW);
+   END IF;
+   INSERT INTO ChangeLog (entity_type, entity_id)
+   VALUES (TG_ARGV[0], (changed_row ->> TG_ARGV[1])::INT)
+   ON CONFLICT (txid, entity_type, entity_id) DO NOTHING;
+   -- Delivered on commit, once per transaction
+   PERFORM pg_notify('booking_changes', TG_ARGV[0]);
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_log_booking_change
+AFTER INSERT OR UPDATE OR DELETE ON Bookings
+FOR EACH ROW
+EXECUTE FUNCTION log_change('booking', 'booking_id');
+
+CREATE TRIGGER trigger_log_room_booking_change
+AFTER INSERT OR UPDATE OR DELETE ON RoomBookings
+FOR EACH ROW
+EXECUTE FUNCTION log_change('booking', 'booking_id');
+
+CREATE TRIGGER trigger_log_closure_change
+AFTER INSERT OR UPDATE OR DELETE ON Closures
+FOR EACH ROW
+EXECUTE FUNCTION log_change('closure', 'closure_id');
+
+CREATE TRIGGER trigger_log_room_closure_change
+AFTER INSERT OR UPDATE OR DELETE ON RoomClosures
+FOR EACH ROW
+EXECUTE FUNCTION log_change('closure', 'closure_id');
+
+-- The customer name and phone number are part of every synced booking
+CREATE OR REPLACE FUNCTION log_customer_bookings_change()
+RETURNS TRIGGER AS $$
+BEGIN
+   INSERT INTO ChangeLog (entity_type, entity_id)
+   SELECT 'booking', booking_id FROM Bookings WHERE customer_id = NEW.customer_id
+   ON CONFLICT (txid, entity_type, entity_id) DO NOTHING;
+   PERFORM pg_notify('booking_changes', 'booking');
+   RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trigger_log_customer_bookings_change
+AFTER UPDATE OF name, phone_number ON Customers
+FOR EACH ROW
+WHEN (OLD.name IS DISTINCT FROM NEW.name OR OLD.phone_number IS DISTINCT FROM NEW.phone_number)
+EXECUTE FUNCTION log_customer_bookings_change();
@@ -0,0 +1,5 @@
+-- LineNotificationDispatcher claims due rows by setting claimed_until in a short transaction and
+-- pushes them after it commits, so no row lock or pooled connection is held across LINE API
+-- calls. Rows of a dispatcher that died mid-batch become due again once their lease expires.
+ALTER TABLE LineNotificationOutbox
+    ADD COLUMN IF NOT EXISTS claimed_until TIMESTAMP;
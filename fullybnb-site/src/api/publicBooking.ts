@@ -19,6 +19,15 @@ export type NightlyRoomPrice = {
   rateType: "weekday" | "holiday";
 };
 
+export type AvailabilityCalendar = {
+  start: string;
+  end: string;
+  dates: string[];
+  rateTypes: Array<"weekday" | "holiday">;
+  bookable: boolean[];
+  rooms: Record<string, { available: boolean[]; prices: number[] }>;
+};
+
 export type PublicReservation = {
   bookingId: number;
   status: string;
@@ -51,6 +60,17 @@ export type PublicQuote = {
   websiteDiscountAmount: number;
   totalPrice: number;
   suggestedPrepayment: number;
+  priceBreakdown?: PriceBreakdown;
+};
+
+export type PriceBreakdown = {
+  rateTypes: Array<"weekday" | "holiday">;
+  rooms: Record<string, {
+    nightlyPrices: number[];
+    extraBedCount: number;
+    extraBedPrice: number;
+    totalPrice: number;
+  }>;
 };
 
 export type ReservationPayload = {
@@ -102,6 +122,11 @@ export async function getAvailability(checkIn: string, checkOut: string) {
   }>(`/availability?${params.toString()}`);
 }
 
+export async function getAvailabilityCalendar(start: string, end: string) {
+  const params = new URLSearchParams({ start, end });
+  return requestJson<AvailabilityCalendar>(`/availability-calendar?${params.toString()}`);
+}
+
 export async function getHolidayRateDates(start: string, end: string) {
   const params = new URLSearchParams({ start, end });
   return requestJson<{
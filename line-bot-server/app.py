@@ -1,20 +1,24 @@
 import os
 import json
+import atexit
 import logging
-from datetime import timedelta
 from flask import Flask, request, abort, jsonify
 from linebot import LineBotApi, WebhookHandler
 from linebot.exceptions import InvalidSignatureError
 from linebot.models import MessageEvent, PostbackEvent, TextMessage, TextSendMessage, QuickReply, QuickReplyButton, MessageAction, DatetimePickerAction
 from const import db_config, line_config
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
+from utils.data_access.line_session_store import create_session_store
+from utils.keyed_work_queue import KeyedWorkQueue
+from utils.response_cache import CachedResponse, ResponseCache
 from utils.booking_utils import format_booking_info
 from utils.booking_utils import get_prepayment_estimation
 from utils.closure_utils import format_closure_info
 from utils.input_utils import is_valid_date
 from utils.datetime_utils import get_latest_months
 from utils.line_messaging_utils import generate_booking_carousel_message, generate_closure_carousel_message
-from utils.taiwan_holiday_utils import is_booking_holiday_night
+from utils.taiwan_holiday_utils import get_booking_holiday_night_dates
+from utils.pricing_utils import get_nightly_room_prices
 from utils.public_booking_api_utils import (
   api_error,
   can_cancel_public_booking,
@@ -22,17 +26,28 @@ from utils.public_booking_api_utils import (
   get_owned_booking_or_error,
   get_rooms_by_id,
   normalize_api_phone_number,
+  parse_calendar_date_range,
   parse_extra_bed_counts,
   parse_api_json,
   parse_date_value,
   parse_date_range,
   is_public_bookable_date_range,
   serialize_booking,
+  serialize_price_quote,
   serialize_room,
   validate_public_room_ids,
   apply_public_booking_discount,
+  build_availability_calendar,
+  AVAILABILITY_CALENDAR_MAX_AGE_SECONDS,
+  AVAILABILITY_MAX_AGE_SECONDS,
+  HOLIDAY_RATE_DATES_MAX_AGE_SECONDS,
+  PUBLIC_API_CACHE_LISTEN_ENABLED,
+  PUBLIC_API_CACHE_MAX_ENTRIES,
+  PUBLIC_API_CACHE_TTL_SECONDS,
+  ROOMS_MAX_AGE_SECONDS,
+  ROOMS_UNAVAILABLE_ERROR_MESSAGE,
 )
-from utils.line_notification_service import LineNotificationService
+from utils.line_notification_dispatcher import LineNotificationDispatcher
 from const.booking_const import PUBLIC_BOOKING_SOURCE
 from utils.data_access.data_class.booking_info import BookingInfo
 from message_handlers.handle_default_messages import handle_default_messages
@@ -51,7 +66,25 @@ line_bot_api = LineBotApi(line_config.LINE_CHANNEL_ACCESS_TOKEN)
 handler = WebhookHandler(line_config.LINE_CHANNEL_SECRET)
 booking_dao = BookingDAO.get_instance(db_config, app.logger)
 
+# Pushes the notifications that booking changes write to the LineNotificationOutbox table
+if line_config.LINE_NOTIFICATION_DISPATCH_ENABLED:
+  notification_dispatcher = LineNotificationDispatcher(
+    booking_dao,
+    line_config.LINE_CHANNEL_ACCESS_TOKEN,
+    app.logger,
+    batch_size=line_config.LINE_NOTIFICATION_BATCH_SIZE,
+    poll_seconds=line_config.LINE_NOTIFICATION_POLL_SECONDS,
+    max_attempts=line_config.LINE_NOTIFICATION_MAX_ATTEMPTS
+  )
+  booking_dao.set_notification_dispatcher(notification_dispatcher)
+  notification_dispatcher.start()
+
 PUBLIC_API_PREFIX = '/api/public'
+public_response_cache = ResponseCache(PUBLIC_API_CACHE_MAX_ENTRIES, PUBLIC_API_CACHE_TTL_SECONDS)
+if public_response_cache.enabled and PUBLIC_API_CACHE_LISTEN_ENABLED and not booking_dao.is_listening_for_changes():
+  # Notified by the change log triggers of db/sql/0015_add_change_log.sql. The occupancy index is
+  # dropped before the version moves, so the next response is not rebuilt from stale availability
+  booking_dao.start_change_listener(booking_dao.invalidate_caches)
 LINE_EVENT_LOGGING_ENABLED = os.getenv('LINE_EVENT_LOGGING', '').lower() in ('1', 'true', 'yes', 'on')
 
 if LINE_EVENT_LOGGING_ENABLED:
@@ -76,10 +109,47 @@ def log_line_source(event, event_type):
 def health():
   return 'OK'
 
+@app.route('/health/db-pool')
+def health_db_pool():
+  return jsonify(booking_dao.get_connection_pool_stats() or {})
+
+@app.route('/health/webhook-queue')
+def health_webhook_queue():
+  return jsonify(webhook_queue.get_stats() if webhook_queue else {})
+
+@app.route('/health/response-cache')
+def health_response_cache():
+  return jsonify(public_response_cache.get_stats())
+
+def cached_json_response(cache_key, build_payload, max_age_seconds, versioned=True):
+  """
+  Serves a public read from public_response_cache, rendering build_payload() on a miss. Versioned
+  responses are keyed on the DAO data version as well, so a booking, closure or room write is seen
+  at once. build_payload returns None when the data failed to load, which is answered uncached.
+  """
+  key = (request.endpoint, cache_key, booking_dao.data_version if versioned else None)
+  cached_response = public_response_cache.get(key)
+  if cached_response is None:
+    payload = build_payload()
+    if payload is None:
+      return api_error("系統暫時無法查詢，請稍後再試。", 500)
+    cached_response = CachedResponse.from_body(jsonify(payload).get_data())
+    public_response_cache.put(key, cached_response)
+
+  response = app.response_class(cached_response.body, mimetype='application/json')
+  response.set_etag(cached_response.etag)
+  response.cache_control.public = True
+  response.cache_control.max_age = max_age_seconds
+  return response.make_conditional(request)
+
 @app.route(f'{PUBLIC_API_PREFIX}/rooms')
 def api_public_rooms():
-  rooms = [serialize_room(room) for room in booking_dao.get_rooms_by_ids()]
-  return jsonify({ 'rooms': rooms })
+  def build_payload():
+    rooms = [serialize_room(room) for room in booking_dao.get_rooms_by_ids()]
+    # No rooms means they failed to load
+    return { 'rooms': rooms } if rooms else None
+
+  return cached_json_response(None, build_payload, ROOMS_MAX_AGE_SECONDS)
 
 @app.route(f'{PUBLIC_API_PREFIX}/holiday-rate-dates')
 def api_public_holiday_rate_dates():
@@ -93,18 +163,12 @@ def api_public_holiday_rate_dates():
   except ValueError as e:
     return api_error(str(e))
 
-  dates = []
-  current_date = start_date
-  while current_date <= end_date:
-    if is_booking_holiday_night(current_date):
-      dates.append(current_date.isoformat())
-    current_date = current_date + timedelta(days=1)
-
-  return jsonify({
+  # Holidays come from the bundled calendar rather than the database, so no data version
+  return cached_json_response((start_date, end_date), lambda: {
     'start': start_date.isoformat(),
     'end': end_date.isoformat(),
-    'dates': dates,
-  })
+    'dates': [holiday_date.isoformat() for holiday_date in get_booking_holiday_night_dates(start_date, end_date)],
+  }, HOLIDAY_RATE_DATES_MAX_AGE_SECONDS, versioned=False)
 
 @app.route(f'{PUBLIC_API_PREFIX}/availability')
 def api_public_availability():
@@ -113,35 +177,50 @@ def api_public_availability():
   except ValueError as e:
     return api_error(str(e))
 
-  rooms_by_id = get_rooms_by_id(booking_dao)
-  available_room_ids = (
-    set(booking_dao.get_available_room_ids(check_in_date, last_date) or [])
-    if is_public_bookable_date_range(check_in_date, last_date)
-    else set()
-  )
-  rooms = [
-    serialize_room(room, room['room_id'] in available_room_ids)
-    for room in rooms_by_id.values()
-  ]
-  nightly_room_prices = {}
-  current_date = check_in_date
-  while current_date <= last_date:
-    is_holiday = is_booking_holiday_night(current_date)
-    for room in rooms_by_id.values():
-      nightly_room_prices.setdefault(room['room_id'], []).append({
-        'date': current_date.isoformat(),
-        'price': int(room['holiday_price_per_night'] if is_holiday else room['weekday_price_per_night']),
-        'rateType': 'holiday' if is_holiday else 'weekday',
-      })
-    current_date = current_date + timedelta(days=1)
-  return jsonify({
-    'checkIn': check_in_date.isoformat(),
-    'checkOut': check_out_date.isoformat(),
-    'nights': nights,
-    'rooms': rooms,
-    'availableRoomIds': [room['roomId'] for room in rooms if room['available']],
-    'nightlyRoomPrices': nightly_room_prices,
-  })
+  def build_payload():
+    rooms_by_id = get_rooms_by_id(booking_dao)
+    if is_public_bookable_date_range(check_in_date, last_date):
+      available_room_ids = booking_dao.get_available_room_ids(check_in_date, last_date)
+      if available_room_ids is None:
+        return None
+      available_room_ids = set(available_room_ids)
+    else:
+      available_room_ids = set()
+    rooms = [
+      serialize_room(room, room['room_id'] in available_room_ids)
+      for room in rooms_by_id.values()
+    ]
+    return {
+      'checkIn': check_in_date.isoformat(),
+      'checkOut': check_out_date.isoformat(),
+      'nights': nights,
+      'rooms': rooms,
+      'availableRoomIds': [room['roomId'] for room in rooms if room['available']],
+      'nightlyRoomPrices': get_nightly_room_prices(rooms_by_id, check_in_date, last_date),
+    }
+
+  # Keyed on the parsed dates, so equivalent query strings share an entry
+  return cached_json_response((check_in_date, last_date), build_payload, AVAILABILITY_MAX_AGE_SECONDS)
+
+@app.route(f'{PUBLIC_API_PREFIX}/availability-calendar')
+def api_public_availability_calendar():
+  try:
+    start_date, end_date = parse_calendar_date_range(request.args)
+  except ValueError as e:
+    return api_error(str(e))
+
+  occupancy = booking_dao.get_occupied_room_nights(start_date, end_date)
+  if occupancy is None:
+    return api_error("系統暫時無法查詢空房，請稍後再試。", 500)
+  occupied_room_nights, last_modified = occupancy
+
+  response = jsonify(build_availability_calendar(get_rooms_by_id(booking_dao), start_date, end_date, occupied_room_nights))
+  response.cache_control.public = True
+  response.cache_control.max_age = AVAILABILITY_CALENDAR_MAX_AGE_SECONDS
+  if last_modified:
+    response.last_modified = last_modified
+  response.add_etag()
+  return response.make_conditional(request)
 
 @app.route(f'{PUBLIC_API_PREFIX}/quote', methods=['POST'])
 def api_public_quote():
@@ -154,9 +233,10 @@ def api_public_quote():
   except ValueError as e:
     return api_error(str(e))
 
-  original_total_price = booking_dao.get_total_price_estimation(room_ids, check_in_date, last_date, sum(extra_bed_counts.values()))
-  if original_total_price is None:
+  price_quote = booking_dao.get_price_quote(room_ids, check_in_date, last_date, extra_bed_counts)
+  if price_quote is None:
     return api_error("系統暫時無法計算金額，請稍後再試。", 500)
+  original_total_price = price_quote.total_price
   total_price, website_discount_amount = apply_public_booking_discount(original_total_price, room_ids, nights)
   return jsonify({
     'checkIn': check_in_date.isoformat(),
@@ -169,6 +249,7 @@ def api_public_quote():
     'websiteDiscountAmount': website_discount_amount,
     'totalPrice': int(total_price),
     'suggestedPrepayment': get_prepayment_estimation(total_price),
+    'priceBreakdown': serialize_price_quote(price_quote),
   })
 
 @app.route(f'{PUBLIC_API_PREFIX}/reservations', methods=['POST'])
@@ -186,9 +267,10 @@ def api_public_create_reservation():
   except ValueError as e:
     return api_error(str(e))
 
-  original_total_price = booking_dao.get_total_price_estimation(room_ids, check_in_date, last_date, sum(extra_bed_counts.values()))
-  if original_total_price is None:
+  price_quote = booking_dao.get_price_quote(room_ids, check_in_date, last_date, extra_bed_counts)
+  if price_quote is None:
     return api_error("系統暫時無法計算金額，請稍後再試。", 500)
+  original_total_price = price_quote.total_price
   total_price, website_discount_amount = apply_public_booking_discount(original_total_price, room_ids, nights)
 
   booking_info = BookingInfo(
@@ -207,13 +289,14 @@ def api_public_create_reservation():
     room_ids=''.join(room_ids),
     extra_bed_counts=extra_bed_counts
   )
-  booking_id = booking_dao.upsert_booking(booking_info)
+  try:
+    booking_id = booking_dao.upsert_booking(booking_info, notify_admins=True)
+  except RoomsUnavailableError:
+    return api_error(ROOMS_UNAVAILABLE_ERROR_MESSAGE, 409)
   if not booking_id:
     return api_error("系統暫時無法建立訂單，請稍後再試。", 500)
 
   created_booking_info = booking_dao.get_booking_info(booking_id)
-  room_type_summary = booking_dao.get_booking_room_type_summary(booking_id)
-  LineNotificationService(app.logger).notify_public_booking_created_admins(created_booking_info, room_type_summary)
   return jsonify({ 'reservation': serialize_booking(created_booking_info, website_discount_amount, booking_dao) }), 201
 
 @app.route(f'{PUBLIC_API_PREFIX}/reservations/overlap')
@@ -225,11 +308,12 @@ def api_public_overlapping_reservations():
     return api_error(str(e))
 
   matches = booking_dao.get_overlapping_bookings_by_phone(phone_number, check_in_date, last_date) or []
+  rooms_by_id = booking_dao.get_rooms_by_id()
   return jsonify({
     'checkIn': check_in_date.isoformat(),
     'checkOut': check_out_date.isoformat(),
     'nights': nights,
-    'reservations': [serialize_booking(booking_info, booking_dao=booking_dao) for booking_info in matches],
+    'reservations': [serialize_booking(booking_info, rooms_by_id=rooms_by_id) for booking_info in matches],
   })
 
 @app.route(f'{PUBLIC_API_PREFIX}/reservations/<int:booking_id>')
@@ -286,9 +370,10 @@ def api_public_update_reservation(booking_id):
   except ValueError as e:
     return api_error(str(e))
 
-  original_total_price = booking_dao.get_total_price_estimation(room_ids, booking_info.check_in_date, booking_info.last_date, booking_info.extra_bed_count)
-  if original_total_price is None:
+  price_quote = booking_dao.get_price_quote(room_ids, booking_info.check_in_date, booking_info.last_date, booking_info.extra_bed_counts)
+  if price_quote is None:
     return api_error("系統暫時無法計算金額，請稍後再試。", 500)
+  original_total_price = price_quote.total_price
   nights = (booking_info.last_date - booking_info.check_in_date).days + 1
   total_price, website_discount_amount = apply_public_booking_discount(original_total_price, room_ids, nights)
   booking_info.total_price = total_price
@@ -296,7 +381,10 @@ def api_public_update_reservation(booking_id):
     booking_info.prepayment = get_prepayment_estimation(total_price)
     booking_info.prepayment_status = 'unpaid'
 
-  updated_booking_id = booking_dao.upsert_booking(booking_info)
+  try:
+    updated_booking_id = booking_dao.upsert_booking(booking_info)
+  except RoomsUnavailableError:
+    return api_error(ROOMS_UNAVAILABLE_ERROR_MESSAGE, 409)
   if not updated_booking_id:
     return api_error("系統暫時無法更新訂單，請稍後再試。", 500)
 
@@ -359,8 +447,30 @@ def search_closures(date):
     reply_message = '\n\n'.join([format_closure_info(match) for match in matches])
   return reply_message
 
-# In-memory session store for LINE messaging API
-user_sessions = {}
+# Conversation state of each LINE user, shared across gunicorn workers with the postgres backend
+session_store = create_session_store(line_config.LINE_SESSION_STORE, line_config.LINE_SESSION_TTL_SECONDS, booking_dao)
+
+# Webhook events are processed by a worker pool so the callback can acknowledge LINE right away;
+# events of the same user or group share a worker and are handled in order
+webhook_queue = None
+if line_config.LINE_WEBHOOK_ASYNC_ENABLED:
+  webhook_queue = KeyedWorkQueue(
+    line_config.LINE_WEBHOOK_WORKERS,
+    line_config.LINE_WEBHOOK_QUEUE_SIZE,
+    logger=app.logger,
+    name='line-webhook'
+  )
+  atexit.register(webhook_queue.shutdown, line_config.LINE_WEBHOOK_SHUTDOWN_TIMEOUT_SECONDS)
+
+def get_event_source_key(event):
+  source = event.source
+  return getattr(source, 'group_id', None) or getattr(source, 'room_id', None) or getattr(source, 'user_id', None)
+
+def dispatch_line_event(event):
+  if isinstance(event, MessageEvent) and isinstance(event.message, TextMessage):
+    handle_message(event)
+  elif isinstance(event, PostbackEvent):
+    handle_message_postback(event)
 
 # LINE messaging API handlers
 @app.route("/callback", methods=['POST'])
@@ -368,9 +478,18 @@ def callback():
   signature = request.headers['X-Line-Signature']
   body = request.get_data(as_text=True)
   try:
-    handler.handle(body, signature)
+    if not webhook_queue:
+      handler.handle(body, signature)
+      return 'OK'
+    events = handler.parser.parse(body, signature)
   except InvalidSignatureError:
     abort(400)
+
+  # All or nothing: LINE redelivers the whole webhook after a 503 (when redelivery is enabled for
+  # the channel), so queueing part of it would handle those events twice
+  if not webhook_queue.submit_all([(get_event_source_key(event), dispatch_line_event, (event,)) for event in events]):
+    app.logger.warning(f"LINE webhook queue is full, rejected a webhook of {len(events)} events")
+    abort(503)
   return 'OK'
 
 @handler.add(MessageEvent, message=TextMessage)
@@ -386,11 +505,16 @@ def handle_message(event):
   user_message = event.message.text
   app.logger.debug(f"User Id: {user_id}, message: {user_message}")
 
-  # Initialize session if user is new
-  if user_id not in user_sessions:
-    user_sessions[user_id] = { 'flow': None, 'step': None, 'data': {} }
+  with session_store.session(user_id) as session:
+    reply_messages = dispatch_user_message(user_message, session)
+
+  if (len(reply_messages) > 0):
+    line_bot_api.reply_message(
+      event.reply_token,
+      reply_messages
+    )
 
-  session = user_sessions[user_id]
+def dispatch_user_message(user_message, session):
   reply_messages = []
   if not session['flow']:
     reply_messages = handle_default_messages(user_message, session, booking_dao)
@@ -419,11 +543,7 @@ def handle_message(event):
   elif session['flow'] == line_config.USER_FLOW_SHOW_MONTHLY_REPORT:
     reply_messages = handle_show_monthly_report_messages(user_message, session, booking_dao)
 
-  if (len(reply_messages) > 0):
-    line_bot_api.reply_message(
-      event.reply_token,
-      reply_messages
-    )
+  return reply_messages
 
 @handler.add(PostbackEvent)
 def handle_message_postback(event):
@@ -443,11 +563,16 @@ def handle_message_postback(event):
     app.logger.debug(f"Ignoring postback command from group #{event.source.group_id}")
     return
 
-  # Initialize session if user is new
-  if user_id not in user_sessions:
-    user_sessions[user_id] = { 'flow': None, 'step': None, 'data': {} }
+  with session_store.session(user_id) as session:
+    reply_messages = dispatch_postback_command(event, command_obj, session)
+
+  if (len(reply_messages) > 0):
+    line_bot_api.reply_message(
+        event.reply_token,
+        reply_messages
+      )
 
-  session = user_sessions[user_id]
+def dispatch_postback_command(event, command_obj, session):
   reply_messages = []
   if command_obj['command'] == line_config.POSTBACK_COMMAND_LOOKUP_BOOKING:
     quick_reply_buttons = [
@@ -648,10 +773,6 @@ def handle_message_postback(event):
   else:
     app.logger.warning(f"Unrecognized postback command: {command_obj['command']}")
 
-  if (len(reply_messages) > 0):
-    line_bot_api.reply_message(
-        event.reply_token,
-        reply_messages
-      )
+  return reply_messages
 if __name__ == "__main__":
   app.run(debug=True)
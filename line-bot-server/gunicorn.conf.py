@@ -0,0 +1,13 @@
+import os
+
+bind = '0.0.0.0:5000'
+
+# Public API and webhook requests spend most of their time waiting on PostgreSQL and the LINE API,
+# which releases the GIL, so each worker serves GUNICORN_THREADS requests at once. Every thread may
+# hold a pooled connection, so keep GUNICORN_THREADS at or below DB_POOL_MAX_CONN.
+workers = int(os.getenv('GUNICORN_WORKERS', '1'))
+threads = int(os.getenv('GUNICORN_THREADS', '8'))
+worker_class = 'gthread' if threads > 1 else 'sync'
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '30'))
+# Lets the site reuse its connection across the availability, quote and reservation calls
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE_SECONDS', '5'))
@@ -6,7 +6,7 @@ from const.booking_const import VALID_BOOKING_SOURCES
 from const import line_config, property_config
 from const.notification_templates import ASK_FOR_PREPAYMENT
 from utils.data_access.data_class.booking_info import BookingInfo
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
 from utils.booking_utils import format_booking_info, get_prepayment_estimation, get_booking_room_brief, is_generic_name
 from utils.input_utils import is_valid_date, is_valid_phone_number, is_valid_num_nights, is_valid_price, is_valid_extra_bed_count, format_phone_number, format_phone_number_for_display
 from utils.line_messaging_utils import append_total_price_quick_reply_buttons, generate_go_to_previous_step_button
@@ -84,14 +84,18 @@ def append_extra_bed_room_quick_reply_buttons(quick_reply_buttons, session, book
 def get_current_extra_bed_room_id(session):
   return session['data']['extra_bed_room_id']
 
-def append_total_price_question(reply_messages, quick_reply_buttons, session, booking_dao):
-  estimated_total_price = booking_dao.get_total_price_estimation(
+def get_estimated_total_price(session, booking_dao):
+  price_quote = booking_dao.get_price_quote(
     session['data']['room_ids'],
     session['data']['check_in_date'],
     session['data']['last_date'],
-    sum(session['data'].get('extra_bed_counts', {}).values())
+    session['data'].get('extra_bed_counts', {})
   )
-  append_total_price_quick_reply_buttons(quick_reply_buttons, estimated_total_price)
+  # None when the quote failed, so no made-up 0 is offered as the price
+  return price_quote.total_price if price_quote else None
+
+def append_total_price_question(reply_messages, quick_reply_buttons, session, booking_dao):
+  append_total_price_quick_reply_buttons(quick_reply_buttons, get_estimated_total_price(session, booking_dao))
   reply_messages.append(TextSendMessage(text="請輸入總金額:", quick_reply=QuickReply(items=quick_reply_buttons)))
   session['step'] = line_config.USER_FLOW_STEP_CREATE_BOOKING__GET_TOTAL_PRICE
 
@@ -288,13 +292,7 @@ def handle_create_booking_messages(user_message: str, session: dict, booking_dao
 
   elif session['step'] == line_config.USER_FLOW_STEP_CREATE_BOOKING__GET_TOTAL_PRICE:
     if is_previous_step or not is_valid_price(user_message):
-      estimated_total_price = booking_dao.get_total_price_estimation(
-        session['data']['room_ids'],
-        session['data']['check_in_date'],
-        session['data']['last_date'],
-        sum(session['data'].get('extra_bed_counts', {}).values())
-      )
-      append_total_price_quick_reply_buttons(quick_reply_buttons, estimated_total_price)
+      append_total_price_quick_reply_buttons(quick_reply_buttons, get_estimated_total_price(session, booking_dao))
       reply_messages.append(TextSendMessage(text=f"{'' if is_previous_step else '輸入格式有誤，'}請重新輸入總金額(0~100000):", quick_reply=QuickReply(items=quick_reply_buttons)))
     else:
       session['data']['total_price'] = int(user_message)
@@ -413,7 +411,12 @@ def handle_create_booking_messages(user_message: str, session: dict, booking_dao
         room_ids=''.join(session['data']['room_ids']),
         extra_bed_counts=session['data'].get('extra_bed_counts', {})
       )
-      booking_id = booking_dao.upsert_booking(booking_info)
+      try:
+        booking_id = booking_dao.upsert_booking(booking_info)
+      except RoomsUnavailableError:
+        session['flow'], session['step'], session['data'] = None, None, {}
+        reply_messages.append(TextSendMessage(text="選擇的房間已被其他訂單預訂，訂單未新增，請重新建立"))
+        return reply_messages
       reply_messages.append(TextSendMessage(text=f"訂單已新增完成, ID:{booking_id}"))
       if booking_info.prepayment > 0 and booking_info.prepayment_status == 'unpaid':
         room_type_summary = booking_dao.get_booking_room_type_summary(booking_info.booking_id)
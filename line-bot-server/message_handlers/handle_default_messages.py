@@ -3,6 +3,7 @@ import datetime
 from linebot.models import TextSendMessage,  QuickReply, QuickReplyButton, MessageAction, DatetimePickerAction
 from const import line_config
 from utils.input_utils import extract_booking_id
+from utils.job_run_utils import format_job_runs
 from utils.data_access.booking_dao import BookingDAO
 from utils.line_messaging_utils import generate_booking_carousel_message, generate_closure_carousel_message, generate_edit_booking_select_attribute_quick_reply_buttons
 
@@ -127,6 +128,13 @@ def handle_default_messages(user_message: str, session: dict, booking_dao: Booki
     session['step'] = line_config.USER_FLOW_STEP_CREATE_BOOKING__GET_CUSTOMER_NAME
     session['data'] = {}
 
+  elif user_message == line_config.USER_COMMAND_SHOW_JOB_RUNS:
+    job_runs = booking_dao.get_latest_job_runs()
+    if job_runs is None:
+      reply_messages.append(TextSendMessage(text="無法取得排程狀態"))
+    else:
+      reply_messages.append(TextSendMessage(text=format_job_runs(job_runs)))
+
   elif booking_id := extract_booking_id(user_message, line_config.USER_COMMAND_EDIT_BOOKING):
     quick_reply_buttons = [
       QuickReplyButton(action=MessageAction(
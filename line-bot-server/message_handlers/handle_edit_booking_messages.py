@@ -3,7 +3,7 @@ from datetime import datetime, timedelta
 from linebot.models import TextSendMessage,  QuickReply, QuickReplyButton, MessageAction, DatetimePickerAction
 from const.booking_const import VALID_BOOKING_SOURCES
 from const import line_config
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
 from utils.booking_utils import format_booking_changes, trim_booking_changes, get_prepayment_estimation
 from utils.input_utils import is_valid_date, is_valid_phone_number, is_valid_num_nights, is_valid_price, is_valid_extra_bed_count, format_phone_number
 from utils.line_messaging_utils import append_total_price_quick_reply_buttons, generate_edit_booking_select_attribute_quick_reply_buttons, generate_go_to_previous_step_button
@@ -17,6 +17,16 @@ def append_extra_bed_count_quick_reply_buttons(quick_reply_buttons, max_extra_be
       )
     )
 
+def get_estimated_total_price(session, booking_info, booking_dao):
+  price_quote = booking_dao.get_price_quote(
+    session['data']['room_ids'] if 'room_ids' in session['data'] else list(booking_info.room_ids),
+    session['data']['check_in_date'] if 'check_in_date' in session['data'] else booking_info.check_in_date,
+    session['data']['last_date'] if 'last_date' in session['data'] else booking_info.last_date,
+    session['data']['extra_bed_counts'] if 'extra_bed_counts' in session['data'] else booking_info.extra_bed_counts,
+  )
+  # None when the quote failed, so no made-up 0 is offered as the price
+  return price_quote.total_price if price_quote else None
+
 def get_extra_bed_room_options(session, booking_dao):
   room_ids = session['data']['extra_bed_room_ids']
   selected_extra_bed_room_ids = session['data'].get('extra_bed_counts', {}).keys()
@@ -148,13 +158,7 @@ def handle_edit_booking_messages(user_message: str, session: dict, booking_dao:
       reply_messages.append(TextSendMessage(text="請選擇要加床的房間", quick_reply=QuickReply(items=quick_reply_buttons)))
       session['step'] = line_config.USER_FLOW_STEP_EDIT_BOOKING__SELECT_EXTRA_BED_ROOM
     elif user_message == line_config.USER_COMMAND_EDIT_BOOKING__EDIT_TOTAL_PRICE:
-      estimated_total_price = booking_dao.get_total_price_estimation(
-        session['data']['room_ids'] if 'room_ids' in session['data'] else list(booking_info.room_ids),
-        session['data']['check_in_date'] if 'check_in_date' in session['data'] else booking_info.check_in_date,
-        session['data']['last_date'] if 'last_date' in session['data'] else booking_info.last_date,
-        sum(session['data']['extra_bed_counts'].values()) if 'extra_bed_counts' in session['data'] else booking_info.extra_bed_count,
-      )
-      append_total_price_quick_reply_buttons(quick_reply_buttons, estimated_total_price)
+      append_total_price_quick_reply_buttons(quick_reply_buttons, get_estimated_total_price(session, booking_info, booking_dao))
       reply_messages.append(TextSendMessage(text="請輸入總金額:", quick_reply=QuickReply(items=quick_reply_buttons)))
       session['step'] = line_config.USER_FLOW_STEP_EDIT_BOOKING__EDIT_TOTAL_PRICE
     elif user_message == line_config.USER_COMMAND_EDIT_BOOKING__EDIT_PREPAYMENT:
@@ -322,13 +326,7 @@ def handle_edit_booking_messages(user_message: str, session: dict, booking_dao:
     if not is_valid_price(user_message):
       quick_reply_buttons = [generate_go_to_previous_step_button()]
       booking_info = booking_dao.get_booking_info(session['data']['booking_id'])
-      estimated_total_price = booking_dao.get_total_price_estimation(
-        session['data']['room_ids'] if 'room_ids' in session['data'] else list(booking_info.room_ids),
-        session['data']['check_in_date'] if 'check_in_date' in session['data'] else booking_info.check_in_date,
-        session['data']['last_date'] if 'last_date' in session['data'] else booking_info.last_date,
-        sum(session['data']['extra_bed_counts'].values()) if 'extra_bed_counts' in session['data'] else booking_info.extra_bed_count,
-      )
-      append_total_price_quick_reply_buttons(quick_reply_buttons, estimated_total_price)
+      append_total_price_quick_reply_buttons(quick_reply_buttons, get_estimated_total_price(session, booking_info, booking_dao))
       reply_messages.append(TextSendMessage(text="輸入格式有誤，請重新輸入總金額(0~100000):", quick_reply=QuickReply(items=quick_reply_buttons)))
     else:
       session['data']['total_price'] = int(user_message)
@@ -468,8 +466,11 @@ def handle_edit_booking_messages(user_message: str, session: dict, booking_dao:
         booking_info.room_ids = ''.join(session['data']['room_ids'])
       if ('extra_bed_counts' in session['data']):
         booking_info.extra_bed_counts = session['data']['extra_bed_counts']
-      booking_id = booking_dao.upsert_booking(booking_info)
-      reply_messages.append(TextSendMessage(text=f"訂單ID{booking_id}已更改完成"))
+      try:
+        booking_id = booking_dao.upsert_booking(booking_info)
+        reply_messages.append(TextSendMessage(text=f"訂單ID{booking_id}已更改完成"))
+      except RoomsUnavailableError:
+        reply_messages.append(TextSendMessage(text=f"訂單ID{booking_info.booking_id}的房間與其他訂單重疊，未更改"))
 
       # clear session data
       session['flow'], session['step'], session['data'] = None, None, {}
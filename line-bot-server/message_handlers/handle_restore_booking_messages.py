@@ -1,6 +1,6 @@
 from linebot.models import TextSendMessage,  QuickReply, QuickReplyButton, MessageAction
 from const import line_config
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
 
 def handle_restore_booking_messages(user_message: str, session: dict, booking_dao: BookingDAO):
   reply_messages = []
@@ -10,8 +10,11 @@ def handle_restore_booking_messages(user_message: str, session: dict, booking_da
     reply_messages.append(TextSendMessage(text="好的，沒有復原"))
 
   elif user_message == line_config.USER_COMMAND_RESTORE_BOOKING__CONFIRM:
-    success = booking_dao.restore_booking(session['data']['booking_id'])
-    reply_messages.append(TextSendMessage(text=("已復原訂單，請注意該日房間是否重複" if success else "復原訂單時遇到錯誤")))
+    try:
+      success = booking_dao.restore_booking(session['data']['booking_id'])
+      reply_messages.append(TextSendMessage(text=("已復原訂單" if success else "復原訂單時遇到錯誤")))
+    except RoomsUnavailableError:
+      reply_messages.append(TextSendMessage(text="該日房間已被其他訂單預訂，無法復原訂單"))
     session['flow'], session['step'], session['data'] = None, None, {}
 
   else:
@@ -34,7 +34,8 @@ def handle_show_monthly_report_messages(user_message: str, session: dict, bookin
     else:
       session['data']['year_month'] = user_message
       bookings = booking_dao.get_bookings_by_month(session['data']['year_month'])
-      report_text = generate_report(session['data']['year_month'], bookings)
+      monthly_stats = booking_dao.get_monthly_booking_stats(session['data']['year_month'])
+      report_text = generate_report(session['data']['year_month'], bookings, monthly_stats)
       reply_messages.append(TextSendMessage(text=report_text))
 
       # clear session data
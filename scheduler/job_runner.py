@@ -0,0 +1,72 @@
+import logging
+import threading
+import time
+from const import db_config
+from jobs.import_historical_bookings import import_historical_bookings
+from jobs.sync_bookings_to_google_calendar import sync_bookings_to_google_calendar
+from jobs.sync_bookings_with_notion import sync_bookings_with_notion
+from jobs.export_historical_bookings import export_historical_bookings
+from jobs.notify_daily_bookings import notify_daily_bookings
+from jobs.notify_not_prepaid_bookings import notify_not_prepaid_bookings
+from jobs.backup_sql import backup_sql
+from jobs.refresh_booking_stats import refresh_booking_stats
+from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.data_class.job_run import JOB_RUN_STATUS_FAILED, JOB_RUN_STATUS_SUCCEEDED
+
+JOB_FUNCTIONS = {
+  'import_historical_bookings': import_historical_bookings,
+  'sync_bookings_to_google_calendar': sync_bookings_to_google_calendar,
+  'sync_bookings_with_notion': sync_bookings_with_notion,
+  'export_historical_bookings': export_historical_bookings,
+  'notify_daily_bookings': notify_daily_bookings,
+  'notify_not_prepaid_bookings': notify_not_prepaid_bookings,
+  'backup_sql': backup_sql,
+  'refresh_booking_stats': refresh_booking_stats,
+}
+
+
+class ThreadErrorCounter(logging.Handler):
+  """Counts the errors logged by the thread that created it, i.e. by one job run."""
+
+  def __init__(self):
+    super().__init__(level=logging.ERROR)
+    self.thread_id = threading.get_ident()
+    self.count = 0
+    self.last_message = None
+
+  def emit(self, record):
+    if record.thread == self.thread_id:
+      self.count += 1
+      self.last_message = record.getMessage()
+
+
+def run_job(job_name, job_function_name, executor):
+  """
+  Runs one job and records its duration, item count and outcome in SchedulerJobRuns. Called by
+  the scheduler's executors, so it has to stay a module-level function for the process pool.
+
+  Jobs may return the number of items they handled. A run fails when the job raises or logs an
+  error, since most jobs log their failures instead of raising them.
+  """
+  # Process pool workers are spawned without the scheduler's logging setup
+  logging.basicConfig(level=logging.INFO)
+  error_counter = ThreadErrorCounter()
+  logging.getLogger().addHandler(error_counter)
+  started_at = time.monotonic()
+  item_count = None
+  try:
+    result = JOB_FUNCTIONS[job_function_name]()
+    if isinstance(result, int) and not isinstance(result, bool):
+      item_count = result
+  except Exception as e:
+    logging.exception(f"Job {job_name} failed: {e}")
+  finally:
+    logging.getLogger().removeHandler(error_counter)
+
+  duration_ms = round((time.monotonic() - started_at) * 1000)
+  status = JOB_RUN_STATUS_FAILED if error_counter.count else JOB_RUN_STATUS_SUCCEEDED
+  logging.info(f"Job {job_name} {status} in {duration_ms}ms on {executor} (items: {item_count}, errors: {error_counter.count})")
+
+  # Jobs create the DAO themselves first, so their own options (e.g. enable_notification) apply
+  booking_dao = BookingDAO.get_instance(db_config, logging)
+  booking_dao.log_job_run(job_name, executor, status, duration_ms, item_count, error_counter.count, error_counter.last_message)
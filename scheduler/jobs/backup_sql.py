@@ -1,48 +1,132 @@
 import os
 import logging
 import subprocess
+import tempfile
+import time
+from datetime import timedelta
+from functools import partial
+import psycopg2
 from const import db_config
+from utils.backup_utils import (
+  BACKUP_TYPE_FULL, BACKUP_TYPE_INCREMENTAL, BackupManifest, ContentStore, delete_manifest,
+  get_expired_manifests, get_restore_chain, load_manifests, save_manifest
+)
 from utils.datetime_utils import get_local_now
+from utils.incremental_backup import apply_changes, capture_changes, reset_sequences
 
 BACKUP_DIR = './backup/sql_backups'
+# Full dumps from before the content store, one custom-format file each
 MAX_BACKUPS = 15
+# Full backups, each with its incrementals, kept in the store
+MAX_FULL_BACKUPS = int(os.getenv('BACKUP_MAX_FULL_BACKUPS', '4'))
+FULL_BACKUP_INTERVAL_DAYS = int(os.getenv('BACKUP_FULL_INTERVAL_DAYS', '7'))
+BACKUP_JOBS = int(os.getenv('BACKUP_JOBS', '4'))
+# Incrementals re-read rows written shortly before the previous snapshot, so a transaction that
+# started before it but committed after it is not missed
+INCREMENTAL_OVERLAP = timedelta(minutes=int(os.getenv('BACKUP_INCREMENTAL_OVERLAP_MINUTES', '60')))
 
-def backup_sql():
-  """
-  Perform a MySQL backup and manage file rotation.
-  """
-  try:
-    # Create the backup directory if it doesn't exist
-    os.makedirs(BACKUP_DIR, exist_ok=True)
 
-    # Generate timestamped filename
-    timestamp = get_local_now().strftime("%Y%m%d_%H%M%S")
-    backup_file = os.path.join(BACKUP_DIR, f"{db_config.DB_NAME}-{timestamp}.sql")
+def get_pg_env():
+  env = os.environ.copy()
+  env["PGPASSWORD"] = db_config.DB_PASSWORD
+  if db_config.DB_SSLMODE:
+    env["PGSSLMODE"] = db_config.DB_SSLMODE
+  if db_config.DB_SSLROOTCERT:
+    env["PGSSLROOTCERT"] = db_config.DB_SSLROOTCERT
+  return env
+
+def connect(dbname=None):
+  options = {
+    "user": db_config.DB_USER,
+    "password": db_config.DB_PASSWORD,
+    "host": db_config.DB_HOST,
+    "port": db_config.DB_PORT,
+    "database": dbname or db_config.DB_NAME,
+    "connect_timeout": db_config.DB_CONNECT_TIMEOUT,
+  }
+  if db_config.DB_SSLMODE:
+    options["sslmode"] = db_config.DB_SSLMODE
+  if db_config.DB_SSLROOTCERT:
+    options["sslrootcert"] = db_config.DB_SSLROOTCERT
+  return psycopg2.connect(**options)
 
-    # Perform the database backup using mysqldump
+def take_full_backup(store: ContentStore, name) -> BackupManifest:
+  """Dumps the database in directory format with BACKUP_JOBS parallel jobs and stores its files."""
+  with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+    dump_dir = os.path.join(work_dir, 'dump')
+    snapshot_time = get_database_time()
     command = [
       "pg_dump",
       "-h", db_config.DB_HOST,
       "-p", db_config.DB_PORT,
       "-U", db_config.DB_USER,
-      "-F", "c",  # Custom format for compressed backup
-      "-f", backup_file,
+      "-F", "d",  # Directory format: one compressed file per table, dumped and restored in parallel
+      "-j", str(BACKUP_JOBS),
+      "-f", dump_dir,
       db_config.DB_NAME,
     ]
+    subprocess.run(command, env=get_pg_env(), check=True)
+    return BackupManifest(
+      name=name,
+      backup_type=BACKUP_TYPE_FULL,
+      snapshot_time=snapshot_time,
+      files=store.put_directory(dump_dir)
+    )
 
-    # Set the password environment variable for pg_dump
-    env = os.environ.copy()
-    env["PGPASSWORD"] = db_config.DB_PASSWORD
-    if db_config.DB_SSLMODE:
-      env["PGSSLMODE"] = db_config.DB_SSLMODE
-    if db_config.DB_SSLROOTCERT:
-      env["PGSSLROOTCERT"] = db_config.DB_SSLROOTCERT
+def take_incremental_backup(store: ContentStore, name, base: BackupManifest, previous: BackupManifest) -> BackupManifest:
+  """Stores the rows written since the previous backup of the chain, and the keys of all rows."""
+  since = previous.snapshot_time - INCREMENTAL_OVERLAP
+  with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+    connection = connect()
+    try:
+      snapshot_time, tables = capture_changes(connection, since, work_dir)
+    finally:
+      connection.close()
+    return BackupManifest(
+      name=name,
+      backup_type=BACKUP_TYPE_INCREMENTAL,
+      snapshot_time=snapshot_time,
+      files=store.put_directory(work_dir),
+      base=base.name,
+      since=since,
+      tables=tables
+    )
 
-    subprocess.run(command, env=env, check=True)
-    logging.info(f"Backup successful: {backup_file}")
+def get_database_time():
+  # pg_dump takes its snapshot right after this, so the full backup is at least this recent
+  connection = connect()
+  try:
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT LOCALTIMESTAMP;")
+      return cursor.fetchone()[0]
+  finally:
+    connection.close()
+
+def backup_sql():
+  """
+  Take a full backup every FULL_BACKUP_INTERVAL_DAYS and an incremental change set on the
+  other runs, store them deduplicated under BACKUP_DIR and drop expired backups.
+  """
+  try:
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+    store = ContentStore(BACKUP_DIR)
+    chain = get_restore_chain(load_manifests(BACKUP_DIR))
+    timestamp = get_local_now().strftime("%Y%m%d_%H%M%S")
+
+    is_full_backup_due = (
+      not chain or
+      get_local_now().replace(tzinfo=None) - chain[0].snapshot_time >= timedelta(days=FULL_BACKUP_INTERVAL_DAYS)
+    )
+    if is_full_backup_due:
+      manifest = take_full_backup(store, f"{db_config.DB_NAME}-{timestamp}-{BACKUP_TYPE_FULL}")
+    else:
+      manifest = take_incremental_backup(store, f"{db_config.DB_NAME}-{timestamp}-{BACKUP_TYPE_INCREMENTAL}", chain[0], chain[-1])
+    save_manifest(BACKUP_DIR, manifest)
+    logging.info(f"Backup successful: {manifest.name} ({len(manifest.files)} files)")
 
     # Handle file rotation
     rotate_backups()
+    return len(manifest.files)
 
   except subprocess.CalledProcessError as e:
     logging.error(f"Backup failed: {e}")
@@ -51,12 +135,27 @@ def backup_sql():
 
 def rotate_backups():
   """
-  Delete the oldest backup files if the total number exceeds MAX_BACKUPS.
+  Delete backups beyond the newest MAX_FULL_BACKUPS full backups and the stored files no
+  backup refers to any more, and the oldest legacy dump files beyond MAX_BACKUPS.
   """
   try:
-    # List backup files sorted by creation time
+    manifests = load_manifests(BACKUP_DIR)
+    expired = get_expired_manifests(manifests, MAX_FULL_BACKUPS)
+    for manifest in expired:
+      delete_manifest(BACKUP_DIR, manifest)
+      logging.info(f"Deleted expired backup: {manifest.name}")
+    live_digests = {
+      digest
+      for manifest in manifests if manifest not in expired
+      for digest in manifest.files.values()
+    }
+    removed_count = ContentStore(BACKUP_DIR).remove_unreferenced(live_digests)
+    if removed_count:
+      logging.info(f"Deleted {removed_count} unreferenced backup files")
+
+    # List legacy backup files sorted by creation time
     backups = sorted(
-      [os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR)],
+      [os.path.join(BACKUP_DIR, f) for f in os.listdir(BACKUP_DIR) if f.endswith('.sql')],
       key=os.path.getctime,
     )
 
@@ -68,3 +167,53 @@ def rotate_backups():
 
   except Exception as e:
     logging.error(f"Error during file rotation: {e}")
+
+def restore_backup(target_time=None, dbname=None, jobs=BACKUP_JOBS) -> dict[str, float]:
+  """
+  Rebuild the state of the latest backup taken at or before target_time into dbname: pg_restore
+  the full dump with `jobs` parallel jobs, then replay its incrementals table by table with
+  `jobs` workers and move the sequences past the restored IDs. The database must exist.
+
+  Returns:
+      dict[str, float]: Seconds spent per step, keyed by the restored backup name.
+  """
+  dbname = dbname or db_config.DB_NAME
+  store = ContentStore(BACKUP_DIR)
+  chain = get_restore_chain(load_manifests(BACKUP_DIR), target_time)
+  if not chain:
+    raise ValueError(f"No full backup taken by {target_time or 'now'} in {BACKUP_DIR}")
+
+  timings = {}
+  with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as work_dir:
+    full_backup, incrementals = chain[0], chain[1:]
+    dump_dir = os.path.join(work_dir, full_backup.name)
+    store.materialize(full_backup.files, dump_dir)
+    command = [
+      "pg_restore",
+      "-h", db_config.DB_HOST,
+      "-p", db_config.DB_PORT,
+      "-U", db_config.DB_USER,
+      "-d", dbname,
+      "-j", str(jobs),
+      "--clean", "--if-exists", "--no-owner",
+      dump_dir,
+    ]
+    start = time.perf_counter()
+    subprocess.run(command, env=get_pg_env(), check=True)
+    timings[full_backup.name] = time.perf_counter() - start
+    logging.info(f"Restored {full_backup.name} in {timings[full_backup.name]:.1f}s")
+
+    for manifest in incrementals:
+      changes_dir = os.path.join(work_dir, manifest.name)
+      store.materialize(manifest.files, changes_dir)
+      start = time.perf_counter()
+      apply_changes(partial(connect, dbname), manifest.tables, changes_dir, jobs=jobs)
+      timings[manifest.name] = time.perf_counter() - start
+      logging.info(f"Applied {manifest.name} in {timings[manifest.name]:.1f}s")
+
+  connection = connect(dbname)
+  try:
+    reset_sequences(connection)
+  finally:
+    connection.close()
+  return timings
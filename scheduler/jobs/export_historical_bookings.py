@@ -1,39 +1,37 @@
 import os
 import logging
-from datetime import date
 from const import db_config
 from utils.data_access.booking_dao import BookingDAO
-from utils.booking_utils import format_booking_info
-
-# DB Connection details
-DB_HOST = os.getenv('DB_HOST')
-DB_USER = os.getenv('DB_USER')
-DB_PASSWORD = os.getenv('DB_PASSWORD')
-DB_NAME = os.getenv('DB_NAME')
+from utils.booking_export_utils import EXPORT_FORMAT_CSV, EXPORT_FORMAT_JSONL, EXPORT_FORMAT_TEXT, export_bookings
 
 SORTED_BOOKINGS_FILE_PATH = './backup/sorted_bookings_exported.txt'
+EXPORT_FILE_PATHS = {
+  EXPORT_FORMAT_TEXT: SORTED_BOOKINGS_FILE_PATH,
+  EXPORT_FORMAT_JSONL: './backup/bookings_exported.jsonl.gz',
+  EXPORT_FORMAT_CSV: './backup/bookings_exported.csv.gz',
+}
+
+# Comma-separated formats to write: text (the original export), jsonl and csv
+BOOKING_EXPORT_FORMATS = [
+  export_format.strip()
+  for export_format in os.getenv('BOOKING_EXPORT_FORMATS', EXPORT_FORMAT_TEXT).split(',')
+  if export_format.strip()
+]
+BOOKING_EXPORT_ITERSIZE = int(os.getenv('BOOKING_EXPORT_ITERSIZE', '1000'))
 
 
 def export_historical_bookings():
   """
-  Fetch all booking information from the database, sort it by booking ID, and write to a file.
+  Stream every booking from the database, ordered by creation time, into the export files.
+  Each file is written to a temporary file first and renamed into place when complete.
   """
   try:
     booking_dao = BookingDAO.get_instance(db_config, logging, enable_notification=False)
+    paths = { export_format: EXPORT_FILE_PATHS[export_format] for export_format in BOOKING_EXPORT_FORMATS }
 
-    # Fetch all bookings
-    all_booking_infos = booking_dao.get_latest_bookings(date(1970, 1, 1))
-
-    # Prepare content for writing to the file
-    lines = []
-    for booking_info in all_booking_infos:
-      lines.append(format_booking_info(booking_info))
-      lines.append('\n')
-
-    # Write to the file
-    with open(SORTED_BOOKINGS_FILE_PATH, 'w', encoding='utf-8') as f:
-      f.writelines('\n'.join(lines))
-    logging.info(f"Exported {len(all_booking_infos)} bookings to {SORTED_BOOKINGS_FILE_PATH}")
+    exported_count = export_bookings(booking_dao.iter_all_bookings(BOOKING_EXPORT_ITERSIZE), paths)
+    logging.info(f"Exported {exported_count} bookings to {', '.join(paths.values())}")
+    return exported_count
 
   except Exception as e:
     logging.error(f"Error exporting historical bookings: {e}")
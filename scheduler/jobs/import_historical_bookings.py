@@ -1,16 +1,22 @@
 import os
 import re
+import time
 import logging
 from datetime import datetime, timedelta
 from const import db_config
 from const.booking_const import VALID_BOOKING_SOURCES
 from utils.data_access.data_class.booking_info import BookingInfo
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
 from utils.input_utils import format_phone_number
 
 # Example booking text block
 SORTED_BOOKINGS_FILE_PATH = './data/sorted_bookings.txt'
 
+# 'bulk' loads the whole file with COPY in one transaction; 'per_record' calls upsert_booking for each booking
+IMPORT_MODE_BULK = 'bulk'
+IMPORT_MODE_PER_RECORD = 'per_record'
+IMPORT_HISTORICAL_BOOKINGS_MODE = os.getenv('IMPORT_HISTORICAL_BOOKINGS_MODE', IMPORT_MODE_BULK)
+
 # Function to parse the booking text block
 def parse_booking(text):
   try:
@@ -87,6 +93,55 @@ def extract_room_ids(available_room_ids, room_name_string):
       room_ids.append(char)
   return room_ids
 
+# Function to read the booking text blocks one at a time; blocks are separated by blank lines
+def iter_booking_texts(file_path):
+  block = []
+  with open(file_path, 'r', encoding='utf-8') as f:
+    for line in f:
+      line = line.rstrip('\n')
+      if line:
+        block.append(line)
+      elif block:
+        yield '\n'.join(block)
+        block = []
+  if block:
+    yield '\n'.join(block)
+
+# Function to parse and validate the booking file into BookingInfo objects, lazily
+def iter_booking_infos(file_path, all_room_ids):
+  for booking_text in iter_booking_texts(file_path):
+    booking_data = parse_booking(booking_text)
+    if (not booking_data):
+      continue
+    validate_booking(booking_data)
+    yield BookingInfo(
+      booking_id=booking_data['booking_id'],
+      status=booking_data['status'],
+      customer_name=booking_data['customer_name'],
+      phone_number=booking_data['phone_number'],
+      check_in_date=datetime.strptime(booking_data['check_in_date'], '%Y/%m/%d').date(),
+      last_date=datetime.strptime(booking_data['last_date'], '%Y/%m/%d').date(),
+      total_price=booking_data['total_price'],
+      notes=booking_data['notes'],
+      source=booking_data['source'],
+      prepayment=booking_data['prepayment'],
+      prepayment_note='',
+      prepayment_status=booking_data['prepayment_status'],
+      room_ids=''.join(extract_room_ids(all_room_ids, booking_data['room_name_string']))
+    )
+
+def import_bookings_per_record(booking_dao, booking_infos):
+  imported_count = 0
+  for booking_info in booking_infos:
+    try:
+      booking_id = booking_dao.upsert_booking(booking_info)
+    except RoomsUnavailableError as e:
+      logging.warning(f"Skipped importing booking #{booking_info.booking_id}: {e}")
+      continue
+    logging.info(f"Booking #{booking_id} imported successfully")
+    imported_count += 1
+  return imported_count
+
 def import_historical_bookings():
   booking_dao = BookingDAO.get_instance(db_config, logging, enable_notification=False)
   all_room_ids = booking_dao.get_all_room_ids()
@@ -95,30 +150,27 @@ def import_historical_bookings():
     logging.warning(f"Failed to load available Room IDs. Aborted")
     return
 
-  with open(SORTED_BOOKINGS_FILE_PATH, 'r', encoding='utf-8') as f:
-    content = f.read()
-    booking_text_list = content.split("\n\n")
-    for booking_text in booking_text_list:
-      if (not booking_text):
-        continue
-      booking_data = parse_booking(booking_text)
-      if (not booking_data):
-        continue
-      validate_booking(booking_data)
-      booking_info = BookingInfo(
-        booking_id=booking_data['booking_id'],
-        status=booking_data['status'],
-        customer_name=booking_data['customer_name'],
-        phone_number=booking_data['phone_number'],
-        check_in_date=booking_data['check_in_date'],
-        last_date=booking_data['last_date'],
-        total_price=booking_data['total_price'],
-        notes=booking_data['notes'],
-        source=booking_data['source'],
-        prepayment=booking_data['prepayment'],
-        prepayment_note='',
-        prepayment_status=booking_data['prepayment_status'],
-        room_ids=extract_room_ids(all_room_ids, booking_data['room_name_string'])
+  started_at = time.monotonic()
+  if IMPORT_HISTORICAL_BOOKINGS_MODE == IMPORT_MODE_BULK:
+    result = booking_dao.bulk_import_bookings(iter_booking_infos(SORTED_BOOKINGS_FILE_PATH, all_room_ids))
+    if result is not None:
+      for booking_id in result['skipped']:
+        logging.warning(f"Skipped importing booking #{booking_id}: rooms already booked for the same nights")
+      imported_count = result['inserted'] + result['updated'] + result['unchanged']
+      elapsed_seconds = time.monotonic() - started_at
+      logging.info(
+        f"Bulk imported {imported_count} bookings ({result['inserted']} new, {result['updated']} updated, "
+        f"{result['unchanged']} unchanged, {len(result['skipped'])} skipped) in {elapsed_seconds:.1f}s "
+        f"({imported_count / max(elapsed_seconds, 1e-6):.0f} bookings/s)"
       )
-      booking_id = booking_dao.upsert_booking(booking_info)
-      logging.info(f"Booking #{booking_id} imported successfully")
+      return imported_count
+    logging.warning("Bulk import failed, importing one booking at a time instead")
+    started_at = time.monotonic()
+
+  imported_count = import_bookings_per_record(booking_dao, iter_booking_infos(SORTED_BOOKINGS_FILE_PATH, all_room_ids))
+  elapsed_seconds = time.monotonic() - started_at
+  logging.info(
+    f"Imported {imported_count} bookings one at a time in {elapsed_seconds:.1f}s "
+    f"({imported_count / max(elapsed_seconds, 1e-6):.0f} bookings/s)"
+  )
+  return imported_count
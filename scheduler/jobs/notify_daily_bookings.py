@@ -48,3 +48,4 @@ def notify_daily_bookings():
       recipient_id,
       message
     )
+  return len(messages)
@@ -30,3 +30,4 @@ def notify_not_prepaid_bookings():
       recipient_id,
       message
     )
+  return len(messages)
@@ -0,0 +1,13 @@
+import logging
+from const import db_config
+from utils.data_access.booking_dao import BookingDAO
+
+# Task to recompute the monthly report aggregates of months changed since the last run
+def refresh_booking_stats():
+  booking_dao = BookingDAO.get_instance(db_config, logging)
+  refreshed_count = booking_dao.refresh_stale_booking_stats()
+  if refreshed_count is None:
+    logging.error("Failed to refresh booking stats.")
+  elif refreshed_count:
+    logging.info(f"Refreshed booking stats of {refreshed_count} months.")
+  return refreshed_count
@@ -1,20 +1,24 @@
 import os
 import logging
 from typing import List
-from datetime import datetime, timedelta
+from datetime import datetime
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
 from const import db_config
-from utils.booking_utils import format_booking_info
-from utils.closure_utils import format_closure_info
+from utils.change_feed_utils import load_changed_bookings_and_closures
 from utils.data_access.booking_dao import BookingDAO
 from utils.data_access.data_class.booking_info import BookingInfo
 from utils.data_access.data_class.closure_info import ClosureInfo
+from utils.google_calendar_utils import (
+  ENTITY_TYPE_BOOKING, ENTITY_TYPE_CLOSURE, backfill_calendar_event_ids, get_booking_event_changes,
+  get_closure_event_changes, sync_calendar_events
+)
 
 SCOPES = ["https://www.googleapis.com/auth/calendar"]
 GOOGLE_SERVICE_ACCOUNT_CRED_FILE=os.getenv('GOOGLE_SERVICE_ACCOUNT_CRED_FILE')
 GOOGLE_CALENDAR_ID = os.getenv('GOOGLE_CALENDAR_ID')
 GOOGLE_CALENDAR_SYNC_MIN_TIME = datetime.strptime(os.getenv('GOOGLE_CALENDAR_SYNC_MIN_TIME'), '%Y-%m-%dT%H:%M:%S')
+CHANGE_FEED_CONSUMER = 'google_calendar'
 
 # Task to load latest bookings and sync to Google Calendar
 def sync_bookings_to_google_calendar():
@@ -24,14 +28,25 @@ def sync_bookings_to_google_calendar():
   if latest_sync_time < GOOGLE_CALENDAR_SYNC_MIN_TIME:
     latest_sync_time = GOOGLE_CALENDAR_SYNC_MIN_TIME
 
+  # First run after the GoogleCalendarEvents table was added: map the events created before it
+  if booking_dao.has_google_calendar_events(GOOGLE_CALENDAR_ID) is False:
+    logging.info("Mapping existing Google Calendar events to bookings and closures...")
+    mapped_counts = backfill_calendar_event_ids(service, booking_dao, GOOGLE_CALENDAR_ID)
+    logging.info(f"Mapped existing Google Calendar events: {mapped_counts}")
+
+  changes = load_changed_bookings_and_closures(booking_dao, CHANGE_FEED_CONSUMER, latest_sync_time)
+  if changes is None:
+    logging.error("Failed to load changed bookings and closures.")
+    return
+  change_batch, latest_bookings, latest_closures = changes
+
   success = True
-  logging.info(f"Syncing bookings to google calendar after {latest_sync_time}...")
-  latest_bookings = booking_dao.get_latest_bookings(latest_sync_time)
+  logging.info(f"Syncing {len(latest_bookings)} changed bookings to google calendar...")
   if not latest_bookings:
     logging.info("No new bookings to sync.")
   else:
     try:
-      write_bookings_to_google_calendar(service, latest_bookings)
+      write_bookings_to_google_calendar(service, booking_dao, latest_bookings)
     except Exception as e:
       success = False
       logging.error(f"Sync to Google Calendar failed: {e}")
@@ -39,171 +54,37 @@ def sync_bookings_to_google_calendar():
   synced_booking_ids = [booking_info.booking_id for booking_info in latest_bookings]
   booking_dao.log_sync_record("sql_to_google_calendar", synced_booking_ids, success)
 
-  logging.info(f"Syncing closures to google calendar after {latest_sync_time}...")
-  latest_closures = booking_dao.get_latest_closures(latest_sync_time)
+  logging.info(f"Syncing {len(latest_closures)} changed closures to google calendar...")
   if not latest_closures:
     logging.info("No new closures to sync.")
   else:
     try:
-      write_closures_to_google_calendar(service, latest_closures)
+      write_closures_to_google_calendar(service, booking_dao, latest_closures)
     except Exception as e:
+      success = False
       logging.error(f"Sync to Google Calendar failed: {e}")
 
   logging.info(f"Google Calendar closures syncing completed.")
+  # Left in place after a failure, so the same changes are synced again on the next run
+  if success:
+    booking_dao.save_change_cursor(CHANGE_FEED_CONSUMER, change_batch.snapshot)
+  return len(latest_bookings) + len(latest_closures)
 
 # Util function to write bookings to Google Calendar
-def write_bookings_to_google_calendar(calendar_service, bookings: List[BookingInfo]):
-  for booking_info in bookings:
-    try:
-      # Event details for either creating or updating the event
-      event_body = {
-        'summary': f'{booking_info.customer_name}，{booking_info.room_ids}，{int(booking_info.total_price)}',
-        'description': format_booking_info(booking_info, 'calendar'),
-        'start': {
-          'date': booking_info.check_in_date.strftime('%Y-%m-%d'),
-          'timeZone': 'Asia/Taipei',
-        },
-        'end': {
-          'date': (booking_info.last_date + timedelta(days=1)).strftime('%Y-%m-%d'),
-          'timeZone': 'Asia/Taipei',
-        },
-        'reminders': {
-          'useDefault': False,
-          'overrides': [
-            {'method': 'popup', 'minutes': 1440},  # Reminder 1 day before
-          ],
-        },
-      }
-
-      # Check if the event with the same booking_id already exists
-      existing_events = []
-      events_result = calendar_service.events().list(
-        calendarId=GOOGLE_CALENDAR_ID,
-        q=f"ＩＤ：{booking_info.booking_id}",
-        singleEvents=True
-      ).execute()
-
-      for event in events_result.get('items', []):
-        if f"ＩＤ：{booking_info.booking_id}" in event.get('description', ''):
-          existing_events.append(event)
-
-      if booking_info.status == 'canceled':
-        if not existing_events:
-          logging.info(f"No existing event found to delete for canceled booking ID {booking_info.booking_id}")
-        else:
-          for existing_event in existing_events:
-            # Delete the event if booking is canceled and event exists
-            calendar_service.events().delete(
-                calendarId=GOOGLE_CALENDAR_ID,
-                eventId=existing_event['id']
-            ).execute()
-            logging.info(f"Deleted Google Calendar event for canceled booking ID {booking_info.booking_id}")
-      else:
-        # If booking is not canceled, create or update the event
-        if len(existing_events) > 1:
-          # Somehow there are duplicated events. Reduce them to only 1
-          for existing_event in existing_events[:-1]:
-            calendar_service.events().delete(
-                calendarId=GOOGLE_CALENDAR_ID,
-                eventId=existing_event['id']
-            ).execute()
-            logging.info(f"Deleted duplicated Google Calendar event for booking ID {booking_info.booking_id}")
-        if existing_events:
-          # Update the existing event
-          calendar_service.events().update(
-            calendarId=GOOGLE_CALENDAR_ID,
-            eventId=existing_events[-1]['id'],
-            body=event_body
-          ).execute()
-          logging.info(f"Updated Google Calendar event for booking ID {booking_info.booking_id}")
-        else:
-          # Insert new event
-          calendar_service.events().insert(
-            calendarId=GOOGLE_CALENDAR_ID,
-            body=event_body
-          ).execute()
-          logging.info(f"Created new Google Calendar event for booking ID {booking_info.booking_id}")
-
-    except Exception as e:
-      logging.error(f"Error syncing booking {booking_info.booking_id} to Google Calendar: {e}")
-      raise e
+def write_bookings_to_google_calendar(calendar_service, booking_dao, bookings: List[BookingInfo]):
+  failed_booking_ids = sync_calendar_events(
+    calendar_service, booking_dao, GOOGLE_CALENDAR_ID, ENTITY_TYPE_BOOKING, get_booking_event_changes(bookings)
+  )
+  if failed_booking_ids:
+    raise RuntimeError(f"Failed to sync bookings {failed_booking_ids}")
 
 # Util function to write closures to Google Calendar
-def write_closures_to_google_calendar(calendar_service, closures: List[ClosureInfo]):
-  for closure_info in closures:
-    try:
-      # Event details for either creating or updating the event
-      event_body = {
-        'summary': f'關{closure_info.room_ids}',
-        'description': format_closure_info(closure_info, 'calendar'),
-        'start': {
-          'date': closure_info.start_date.strftime('%Y-%m-%d'),
-          'timeZone': 'Asia/Taipei',
-        },
-        'end': {
-          'date': (closure_info.last_date + timedelta(days=1)).strftime('%Y-%m-%d'),
-          'timeZone': 'Asia/Taipei',
-        },
-        'reminders': {
-          'useDefault': False,
-          'overrides': [
-            {'method': 'popup', 'minutes': 1440},  # Reminder 1 day before
-          ],
-        },
-      }
-
-      # Check if the event with the same closure already exists
-      existing_events = []
-      events_result = calendar_service.events().list(
-        calendarId=GOOGLE_CALENDAR_ID,
-        q=f"ＣＬＩＤ：{closure_info.closure_id}",
-        singleEvents=True
-      ).execute()
-
-      for event in events_result.get('items', []):
-        if f"ＣＬＩＤ：{closure_info.closure_id}" in event.get('description', ''):
-          existing_events.append(event)
-
-      if closure_info.status == 'deleted':
-        if not existing_events:
-          logging.info(f"No existing event found to delete for deleted closure ID {closure_info.closure_id}")
-        else:
-          for existing_event in existing_events:
-            # Delete the event if booking is canceled and event exists
-            calendar_service.events().delete(
-                calendarId=GOOGLE_CALENDAR_ID,
-                eventId=existing_event['id']
-            ).execute()
-            logging.info(f"Deleted Google Calendar event for deleted closure ID {closure_info.closure_id}")
-      else:
-        # If closure is not deleted, create or update the event
-        if len(existing_events) > 1:
-          # Somehow there are duplicated events. Reduce them to only 1
-          for existing_event in existing_events[:-1]:
-            calendar_service.events().delete(
-                calendarId=GOOGLE_CALENDAR_ID,
-                eventId=existing_event['id']
-            ).execute()
-            logging.info(f"Deleted duplicated Google Calendar event for closure ID {closure_info.closure_id}")
-        if existing_events:
-          # Update the existing event
-          calendar_service.events().update(
-            calendarId=GOOGLE_CALENDAR_ID,
-            eventId=existing_events[-1]['id'],
-            body=event_body
-          ).execute()
-          logging.info(f"Updated Google Calendar event for closure ID {closure_info.closure_id}")
-        else:
-          # Insert new event
-          calendar_service.events().insert(
-            calendarId=GOOGLE_CALENDAR_ID,
-            body=event_body
-          ).execute()
-          logging.info(f"Created new Google Calendar event for closure ID {closure_info.closure_id}")
-
-    except Exception as e:
-      logging.error(f"Error syncing closure {closure_info.closure_id} to Google Calendar: {e}")
-      raise e
+def write_closures_to_google_calendar(calendar_service, booking_dao, closures: List[ClosureInfo]):
+  failed_closure_ids = sync_calendar_events(
+    calendar_service, booking_dao, GOOGLE_CALENDAR_ID, ENTITY_TYPE_CLOSURE, get_closure_event_changes(closures)
+  )
+  if failed_closure_ids:
+    raise RuntimeError(f"Failed to sync closures {failed_closure_ids}")
 
 # Util function to build a connection to google calendar API
 def build_google_calendar_service():
@@ -1,20 +1,30 @@
 import os
+import time
 import logging
 import pytz
-from typing import List, Optional
+from typing import List
 from datetime import datetime, timedelta
 from const import db_config
 from notion_client import Client
+from utils.change_feed_utils import load_changed_bookings_and_closures
 from utils.input_utils import format_phone_number
-from utils.data_access.booking_dao import BookingDAO
+from utils.data_access.booking_dao import BookingDAO, RoomsUnavailableError
 from utils.data_access.data_class.booking_info import BookingInfo
 from utils.data_access.data_class.closure_info import ClosureInfo
+from utils.notion_sync_utils import (
+  NOTION_OBJECT_NOT_FOUND_CODE, NOTION_REQUESTS_PER_SECOND, RateLimitedNotion, get_notion_error_code,
+  resolve_booking_conflicts
+)
+from utils.rate_limiter import TokenBucket
 
 NOTION_TOKEN=os.getenv('NOTION_TOKEN')
 NOTION_DATABASE_ID=os.getenv('NOTION_DATABASE_ID')
 NOTION_SYNC_MIN_TIME = datetime.strptime(os.getenv('NOTION_SYNC_MIN_TIME'), '%Y-%m-%dT%H:%M:%S')
 NOTION_ID_CLOSURE = '關房'
-notion = Client(auth=NOTION_TOKEN)
+NOTION_ENTITY_BOOKING = 'booking'
+NOTION_ENTITY_CLOSURE = 'closure'
+CHANGE_FEED_CONSUMER = 'notion'
+notion = RateLimitedNotion(Client(auth=NOTION_TOKEN), TokenBucket(NOTION_REQUESTS_PER_SECOND), time.sleep)
 local_tz = pytz.timezone('Asia/Taipei')
 utc_tz = pytz.timezone('UTC')
 
@@ -25,43 +35,37 @@ def sync_bookings_with_notion():
   if latest_sync_time < NOTION_SYNC_MIN_TIME:
     latest_sync_time = NOTION_SYNC_MIN_TIME
 
+  # First run after the NotionPages table was added: map the booking pages created before it
+  if booking_dao.has_notion_pages(NOTION_DATABASE_ID) is False:
+    logging.info("Mapping existing Notion pages to bookings...")
+    backfill_notion_booking_page_ids(booking_dao)
+
+  changes = load_changed_bookings_and_closures(booking_dao, CHANGE_FEED_CONSUMER, latest_sync_time)
+  if changes is None:
+    logging.error("Failed to load changed bookings and closures.")
+    return
+  change_batch, latest_bookings_in_db, latest_closures_in_db = changes
+
+  # Changes made in the database come from the change feed, those made in Notion by last edit time
   logging.info(f"Syncing bookings with notion after {latest_sync_time}...")
-  latest_bookings_in_db = booking_dao.get_latest_bookings(latest_sync_time)
-  latest_bookings_from_notion = get_latest_bookings_from_notion(latest_sync_time)
+  latest_bookings_from_notion, notion_page_ids = get_latest_bookings_from_notion(latest_sync_time)
+  booking_dao.save_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_BOOKING, notion_page_ids)
 
   logging.info(f"Latest bookings in db (before conflict detection): {latest_bookings_in_db}")
   logging.info(f"Latest bookings from notion (before conflict detection): {latest_bookings_from_notion}")
 
-  # remove bookings that are exactly equal
-  latest_bookings_in_db = [booking_info for booking_info in latest_bookings_in_db if booking_info not in latest_bookings_from_notion]
-  latest_bookings_from_notion = [booking_info for booking_info in latest_bookings_from_notion if booking_info not in latest_bookings_in_db]
-
-  # remove notion bookings that are exactly equal with the corresponding entries in DB
-  # this is required due to the trick of minus latest_sync_time by 1 min
-  latest_bookings_from_notion = list(filter(lambda bi: booking_dao.get_booking_info(bi.booking_id) != bi, latest_bookings_from_notion))
-
-  # find conflicted bookings and keep only the more recent one
-  latest_booking_ids_in_db = [booking_info.booking_id for booking_info in latest_bookings_in_db]
-  latest_booking_ids_from_notion = [booking_info.booking_id for booking_info in latest_bookings_from_notion]
-  booking_ids_in_db_to_skip = []
-  booking_ids_from_notion_to_skip = []
-  for booking_id_in_db, booking_info_in_db in zip(latest_booking_ids_in_db, latest_bookings_in_db):
-    for booking_id_from_notion, booking_info_from_notion in zip(latest_booking_ids_from_notion, latest_bookings_from_notion):
-      if booking_id_in_db == booking_id_from_notion:
-        if booking_info_in_db.modified.astimezone(local_tz) > booking_info_from_notion.modified:
-          booking_ids_from_notion_to_skip.append(booking_id_from_notion)
-        else:
-          booking_ids_in_db_to_skip.append(booking_id_in_db)
-
-  latest_bookings_in_db = [booking_info for booking_info in latest_bookings_in_db if booking_info.booking_id not in booking_ids_in_db_to_skip]
-  latest_bookings_from_notion = [booking_info for booking_info in latest_bookings_from_notion if booking_info.booking_id not in booking_ids_from_notion_to_skip]
+  # One query for the stored version of every Notion booking, instead of one per booking
+  stored_bookings = booking_dao.get_bookings_by_ids([booking_info.booking_id for booking_info in latest_bookings_from_notion]) or {}
+  latest_bookings_in_db, latest_bookings_from_notion = resolve_booking_conflicts(
+    latest_bookings_in_db, latest_bookings_from_notion, stored_bookings, local_tz
+  )
 
   logging.info(f"Latest bookings in db: {latest_bookings_in_db}")
   logging.info(f"Latest bookings from notion: {latest_bookings_from_notion}")
 
   success = True
   try:
-    write_bookings_to_notion(latest_bookings_in_db)
+    write_bookings_to_notion(booking_dao, latest_bookings_in_db)
     write_bookings_to_db(latest_bookings_from_notion)
   except Exception as e:
     success = False
@@ -71,21 +75,25 @@ def sync_bookings_with_notion():
   booking_dao.log_sync_record("sql_with_notion", synced_booking_ids, success)
 
   # Syncing closures. Currently we only support one-way sync (DB => Notion)
-  logging.info(f"Syncing closures after {latest_sync_time}...")
-  latest_closures_in_db = booking_dao.get_latest_closures(latest_sync_time)
   logging.info(f"Latest closures in db: {latest_closures_in_db}")
 
-  for closure in latest_closures_in_db:
-    write_closure_to_notion(closure)
+  write_closures_to_notion(booking_dao, latest_closures_in_db)
   logging.info("Notion closures syncing completed.")
-
-def get_latest_bookings_from_notion(latest_sync_time: datetime) -> List[BookingInfo]:
+  # Left in place after a failure, so the same changes are synced again on the next run
+  if success:
+    booking_dao.save_change_cursor(CHANGE_FEED_CONSUMER, change_batch.snapshot)
+  return len(synced_booking_ids) + len(latest_closures_in_db)
+
+def get_latest_bookings_from_notion(latest_sync_time: datetime) -> tuple[List[BookingInfo], dict[int, str]]:
+  """Returns the bookings edited in Notion since latest_sync_time, and their page IDs keyed by booking ID."""
+  latest_bookings = []
+  page_ids = {}
   try:
     # since notion timestamp only accurate to minute, minus the latest_sync_time by 1 min to prevent
     # the edge case where there is any notion update on the same minute of latest_sync_time
     latest_sync_time_utc = local_tz.localize(latest_sync_time - timedelta(minutes=1)).astimezone(utc_tz).isoformat()
-    response = notion.databases.query(
-      database_id=NOTION_DATABASE_ID,
+    entries = notion.query_database(
+      NOTION_DATABASE_ID,
       filter={
         "and": [
           {
@@ -100,25 +108,48 @@ def get_latest_bookings_from_notion(latest_sync_time: datetime) -> List[BookingI
       }
     )
 
-    latest_bookings = []
-    if not response['results']:
-      return latest_bookings
-
-    for entry in response['results']:
+    for entry in entries:
       booking_info_from_notion = load_booking_info_from_notion_entry(entry)
       if not booking_info_from_notion:
         continue
       latest_bookings.append(booking_info_from_notion)
+      page_ids[booking_info_from_notion.booking_id] = entry['id']
 
-    return latest_bookings
+    return latest_bookings, page_ids
 
   except Exception as e:
     logging.error(f"Error loading latest bookings from Notion: {e}")
-    return []
+    return [], {}
+
+def backfill_notion_booking_page_ids(booking_dao):
+  page_ids = {}
+  for entry in notion.query_database(NOTION_DATABASE_ID, filter={
+    "property": "ID",
+    "title": { "does_not_equal": NOTION_ID_CLOSURE }
+  }):
+    try:
+      booking_id = int(entry['properties']['ID']['title'][0]['text']['content'])
+    except (KeyError, IndexError, ValueError):
+      continue
+    if booking_id in page_ids:
+      logging.warning(f"Duplicated event with ID {booking_id} detected in Notion")
+      continue
+    page_ids[booking_id] = entry['id']
+  booking_dao.save_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_BOOKING, page_ids)
+  logging.info(f"Mapped {len(page_ids)} existing Notion booking pages")
+
+# Updates a Notion page, returns False when the page no longer exists
+def update_notion_page(page_id, **kwargs) -> bool:
+  try:
+    notion.call(notion.client.pages.update, page_id=page_id, **kwargs)
+    return True
+  except Exception as e:
+    if get_notion_error_code(e) == NOTION_OBJECT_NOT_FOUND_CODE:
+      return False
+    raise
 
-# Util function to write closure to Notion
-def write_closure_to_notion(closure: ClosureInfo):
-  properties = {
+def build_closure_properties(closure: ClosureInfo) -> dict:
+  return {
     "ID": {
       "title": [{ "text": {"content": NOTION_ID_CLOSURE} }]
     },
@@ -135,59 +166,82 @@ def write_closure_to_notion(closure: ClosureInfo):
       "rich_text": [{ "text": { "content": closure.reason or '' } }]
     }
   }
-  try:
-    existing_closure = get_closure_from_notion(closure)
-    if (closure.status == 'valid'):
-      if existing_closure:
-        notion.pages.update(page_id=existing_closure.notion_page_id, properties=properties)
-      else:
-        notion.pages.create(
-          parent={"database_id": NOTION_DATABASE_ID},
-          properties=properties
-        )
-      logging.info(f"Closure written to Notion: {closure}")
-    elif existing_closure:
-      notion.pages.update(
-        page_id=existing_closure.notion_page_id,
-        archived=True
-      )
-      logging.info(f"Deleted closure from Notion: {existing_closure.notion_page_id}")
-  except Exception as e:
-    logging.error(f"Error writing closure to Notion: {e}")
-
-def get_closure_from_notion(closure_from_db: ClosureInfo) -> Optional[ClosureInfo]:
-  try:
-    response = notion.databases.query(
-      database_id=NOTION_DATABASE_ID,
-      filter={
-        "and": [
-          {
-            "property": "ID",
-            "title": { "equals": NOTION_ID_CLOSURE }
-          },
-          {
-            "property": "日期(不含退房日)",
-            "date": {
-              "on_or_after": closure_from_db.start_date.strftime('%Y-%m-%d'),
-              "on_or_before": closure_from_db.last_date.strftime('%Y-%m-%d')
-            },
-          },
-          {
-            "property": "房間",
-            "multi_select": { "contains": closure_from_db.room_ids[0] }
-          },
-        ]
-      }
-    )
 
-    if not response['results']:
-      return None
+# Util function to write closures to Notion
+def write_closures_to_notion(booking_dao, closures: List[ClosureInfo]):
+  if not closures:
+    return
+  page_ids = booking_dao.get_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_CLOSURE, [closure.closure_id for closure in closures])
+  if page_ids is None:
+    logging.error("Error loading Notion page IDs of closures, skip syncing closures")
+    return
+
+  unmapped_closures = [closure for closure in closures if closure.closure_id not in page_ids]
+  if unmapped_closures:
+    page_ids.update(find_closure_page_ids(unmapped_closures))
+
+  saved_page_ids = {}
+  archived_closure_ids = []
+  for closure in closures:
+    page_id = page_ids.get(closure.closure_id)
+    try:
+      if closure.status == 'valid':
+        properties = build_closure_properties(closure)
+        if not page_id or not update_notion_page(page_id, properties=properties):
+          page_id = notion.call(
+            notion.client.pages.create,
+            parent={"database_id": NOTION_DATABASE_ID},
+            properties=properties
+          )['id']
+        saved_page_ids[closure.closure_id] = page_id
+        logging.info(f"Closure written to Notion: {closure}")
+      elif page_id:
+        update_notion_page(page_id, archived=True)
+        archived_closure_ids.append(closure.closure_id)
+        logging.info(f"Deleted closure from Notion: {page_id}")
+    except Exception as e:
+      logging.error(f"Error writing closure to Notion: {e}")
 
-    return load_closure_info_from_notion_entry(response['results'][0])
+  booking_dao.save_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_CLOSURE, saved_page_ids)
+  booking_dao.delete_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_CLOSURE, archived_closure_ids)
 
+# Closure pages only carry their dates and rooms, so closures without a stored page are matched
+# against the closure pages in their date span, fetched with one paginated query
+def find_closure_page_ids(closures: List[ClosureInfo]) -> dict[int, str]:
+  try:
+    closure_pages = [
+      closure_page for closure_page in (
+        load_closure_info_from_notion_entry(entry)
+        for entry in notion.query_database(NOTION_DATABASE_ID, filter={
+          "and": [
+            {
+              "property": "ID",
+              "title": { "equals": NOTION_ID_CLOSURE }
+            },
+            {
+              "property": "日期(不含退房日)",
+              "date": { "on_or_after": min(closure.start_date for closure in closures).strftime('%Y-%m-%d') }
+            },
+            {
+              "property": "日期(不含退房日)",
+              "date": { "on_or_before": max(closure.last_date for closure in closures).strftime('%Y-%m-%d') }
+            },
+          ]
+        })
+      )
+      if closure_page
+    ]
   except Exception as e:
-    logging.error(f"Error loading latest closures from Notion: {e}")
-    return []
+    logging.error(f"Error loading closures from Notion: {e}")
+    return {}
+
+  page_ids = {}
+  for closure in closures:
+    for closure_page in closure_pages:
+      if closure.start_date <= closure_page.start_date <= closure.last_date and closure.room_ids[0] in closure_page.room_ids:
+        page_ids[closure.closure_id] = closure_page.notion_page_id
+        break
+  return page_ids
 
 def load_booking_info_from_notion_entry(notion_entry: dict):
   try:
@@ -261,79 +315,85 @@ def load_closure_info_from_notion_entry(notion_entry: dict):
     return None
 
 # Util function to write bookings to Notion
-def write_bookings_to_notion(bookings: List[BookingInfo]):
-  for booking_info in bookings:
-    # Construct Notion page properties
-    properties = {
-      "ID": {
-        "title": [{ "text": { "content": str(booking_info.booking_id) } }]
-      },
-      "姓名": {
-        "rich_text": [{ "text": { "content": booking_info.customer_name } }]
-      },
-      "電話": {
-        "phone_number": booking_info.phone_number
-      },
-      "日期(不含退房日)": {
-        "date": {
-          "start": booking_info.check_in_date.strftime('%Y-%m-%d'),
-          "end": booking_info.last_date.strftime('%Y-%m-%d')
-        }
-      },
-      "房間": {
-        "multi_select": [({ "name": room_id }) for room_id in booking_info.room_ids]
-      },
-      "總金額": {
-        "number": int(booking_info.total_price)
-      },
-      "來源": {
-        "select": { "name": booking_info.source }
-      },
-      "訂金": {
-        "number": int(booking_info.prepayment)
-      },
-      "已付訂金": {
-        "checkbox": booking_info.prepayment_status == 'paid'
-      },
-      "匯款摘要": {
-        "rich_text": [{ "text": {"content": booking_info.prepayment_note or '' } }]
-      },
-      "備註": {
-        "rich_text": [{ "text": { "content": booking_info.notes or '' } }]
-      },
-      "取消": {
-        "checkbox": booking_info.status == 'canceled'
-      },
-    }
+def write_bookings_to_notion(booking_dao, bookings: List[BookingInfo]):
+  if not bookings:
+    return
+  page_ids = booking_dao.get_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_BOOKING, [booking_info.booking_id for booking_info in bookings])
+  if page_ids is None:
+    raise Exception("Error loading Notion page IDs of bookings")
+
+  created_page_ids = {}
+  try:
+    for booking_info in bookings:
+      # Construct Notion page properties
+      properties = {
+        "ID": {
+          "title": [{ "text": { "content": str(booking_info.booking_id) } }]
+        },
+        "姓名": {
+          "rich_text": [{ "text": { "content": booking_info.customer_name } }]
+        },
+        "電話": {
+          "phone_number": booking_info.phone_number
+        },
+        "日期(不含退房日)": {
+          "date": {
+            "start": booking_info.check_in_date.strftime('%Y-%m-%d'),
+            "end": booking_info.last_date.strftime('%Y-%m-%d')
+          }
+        },
+        "房間": {
+          "multi_select": [({ "name": room_id }) for room_id in booking_info.room_ids]
+        },
+        "總金額": {
+          "number": int(booking_info.total_price)
+        },
+        "來源": {
+          "select": { "name": booking_info.source }
+        },
+        "訂金": {
+          "number": int(booking_info.prepayment)
+        },
+        "已付訂金": {
+          "checkbox": booking_info.prepayment_status == 'paid'
+        },
+        "匯款摘要": {
+          "rich_text": [{ "text": {"content": booking_info.prepayment_note or '' } }]
+        },
+        "備註": {
+          "rich_text": [{ "text": { "content": booking_info.notes or '' } }]
+        },
+        "取消": {
+          "checkbox": booking_info.status == 'canceled'
+        },
+      }
 
-    try:
-      query = notion.databases.query(database_id=NOTION_DATABASE_ID, filter={
-        "property": "ID",
-        "title": {"equals": str(booking_info.booking_id)}
-      })
-
-      if query['results']:
-        if len(query['results']) > 1:
-          logging.warning(f"Duplicated event with ID {booking_info.booking_id} detected in Notion")
-
-        # Update existing Notion page
-        page_id = query['results'][0]['id']
-        notion.pages.update(page_id=page_id, properties=properties)
-        logging.info(f"Updated Notion entry for booking ID {booking_info.booking_id}")
-      else:
-        # Create a new Notion page
-        notion.pages.create(parent={"database_id": NOTION_DATABASE_ID}, properties=properties)
-        logging.info(f"Created new Notion entry for booking ID {booking_info.booking_id}")
-    except Exception as e:
-      logging.error(f"Error syncing booking ID {booking_info.booking_id} to Notion: {e}")
-      raise e
+      try:
+        page_id = page_ids.get(booking_info.booking_id)
+        if page_id and update_notion_page(page_id, properties=properties):
+          logging.info(f"Updated Notion entry for booking ID {booking_info.booking_id}")
+        else:
+          # Create a new Notion page, also when the stored page was deleted in Notion
+          page = notion.call(notion.client.pages.create, parent={"database_id": NOTION_DATABASE_ID}, properties=properties)
+          created_page_ids[booking_info.booking_id] = page['id']
+          logging.info(f"Created new Notion entry for booking ID {booking_info.booking_id}")
+      except Exception as e:
+        logging.error(f"Error syncing booking ID {booking_info.booking_id} to Notion: {e}")
+        raise e
+  finally:
+    booking_dao.save_notion_page_ids(NOTION_DATABASE_ID, NOTION_ENTITY_BOOKING, created_page_ids)
 
 # Util function to write bookings to DB
 def write_bookings_to_db(bookings: List[BookingInfo]):
   try:
     booking_dao = BookingDAO.get_instance(db_config, logging)
     for booking_info in bookings:
-      booking_id = booking_dao.upsert_booking(booking_info)
+      try:
+        booking_id = booking_dao.upsert_booking(booking_info)
+      except RoomsUnavailableError as e:
+        # An overlap edited in Notion is left for the admins to fix there; the other bookings still sync
+        logging.error(f"Skipped Notion booking {booking_info.booking_id}: {e}")
+        continue
       if (not booking_id):
         raise Exception(f"Error upsert booking {booking_info.booking_id}")
       logging.info(f"Created or updated SQL booking record {booking_id} from Notion")
@@ -1,21 +1,39 @@
+import os
 import yaml
 import logging
+import multiprocessing
+from datetime import timedelta
+from apscheduler.executors.pool import ProcessPoolExecutor, ThreadPoolExecutor
 from apscheduler.schedulers.blocking import BlockingScheduler
 from apscheduler.triggers.cron import CronTrigger
-from jobs.import_historical_bookings import import_historical_bookings
-from jobs.sync_bookings_to_google_calendar import sync_bookings_to_google_calendar
-from jobs.sync_bookings_with_notion import sync_bookings_with_notion
-from jobs.export_historical_bookings import export_historical_bookings
-from jobs.notify_daily_bookings import notify_daily_bookings
-from jobs.notify_not_prepaid_bookings import notify_not_prepaid_bookings
-from jobs.backup_sql import backup_sql
-from utils.datetime_utils import APP_TIMEZONE
+from const import db_config
+from job_runner import JOB_FUNCTIONS, run_job
+from utils.data_access.booking_dao import BookingDAO
+from utils.datetime_utils import APP_TIMEZONE, get_local_now
 
 JOBS_CONFIG_PATH = 'jobs_config.yaml'
 
 JOB_TYPE_STARTUP = 'startup'
 JOB_TYPE_CRON = 'cron'
 
+# Network-bound jobs (syncs, LINE pushes) run on threads sharing the BookingDAO pool, so keep
+# SCHEDULER_THREAD_POOL_SIZE below DB_POOL_MAX_CONN. Backups, exports and imports run in
+# processes, each with its own pool, so they neither hold the GIL nor starve the syncs.
+EXECUTOR_THREADS = 'threads'
+EXECUTOR_PROCESSES = 'processes'
+SCHEDULER_THREAD_POOL_SIZE = int(os.getenv('SCHEDULER_THREAD_POOL_SIZE', '4'))
+SCHEDULER_PROCESS_POOL_SIZE = int(os.getenv('SCHEDULER_PROCESS_POOL_SIZE', '2'))
+
+# Jobs with wake_on_changes run this long after a booking or closure changes, so a burst of
+# changes is synced in one run
+CHANGE_FEED_WAKE_DELAY_SECONDS = float(os.getenv('CHANGE_FEED_WAKE_DELAY_SECONDS', '5'))
+
+JOB_DEFAULTS = {
+  'max_instances': 1,
+  'coalesce': True,
+  'misfire_grace_time': 300,
+}
+
 def load_config(file_path=JOBS_CONFIG_PATH):
   logging.info("Loading job config")
   with open(file_path, 'r') as file:
@@ -23,32 +41,68 @@ def load_config(file_path=JOBS_CONFIG_PATH):
   return config
 
 
-JOB_FUNCTIONS = {
-  'import_historical_bookings': import_historical_bookings,
-  'sync_bookings_to_google_calendar': sync_bookings_to_google_calendar,
-  'sync_bookings_with_notion': sync_bookings_with_notion,
-  'export_historical_bookings': export_historical_bookings,
-  'notify_daily_bookings': notify_daily_bookings,
-  'notify_not_prepaid_bookings': notify_not_prepaid_bookings,
-  'backup_sql': backup_sql,
-}
+def create_scheduler():
+  executors = {
+    EXECUTOR_THREADS: ThreadPoolExecutor(SCHEDULER_THREAD_POOL_SIZE),
+    # Spawned rather than forked: a fork would copy the open connections of the thread jobs' pool
+    EXECUTOR_PROCESSES: ProcessPoolExecutor(
+      SCHEDULER_PROCESS_POOL_SIZE, pool_kwargs={ 'mp_context': multiprocessing.get_context('spawn') }
+    ),
+  }
+  return BlockingScheduler(executors=executors, job_defaults=JOB_DEFAULTS, timezone=APP_TIMEZONE)
+
+
+def get_job_options(job_name, job_details):
+  """Executor, overlap and misfire settings of a job, falling back to JOB_DEFAULTS."""
+  executor = job_details.get('executor', EXECUTOR_THREADS)
+  if executor not in (EXECUTOR_THREADS, EXECUTOR_PROCESSES):
+    raise ValueError(f"Unknown executor {executor} of job {job_name}")
+  return {
+    'id': job_name,
+    'executor': executor,
+    'max_instances': int(job_details.get('max_instances', JOB_DEFAULTS['max_instances'])),
+    'coalesce': str(job_details.get('coalesce', JOB_DEFAULTS['coalesce'])) == 'True',
+    'misfire_grace_time': int(job_details.get('misfire_grace_time', JOB_DEFAULTS['misfire_grace_time'])),
+  }
+
+def start_change_feed_wakeup(scheduler, job_ids):
+  """Moves the next run of the jobs forward when the change feed reports new changes."""
+  def wake_jobs():
+    wake_time = get_local_now() + timedelta(seconds=CHANGE_FEED_WAKE_DELAY_SECONDS)
+    for job_id in job_ids:
+      job = scheduler.get_job(job_id)
+      # Only ever earlier, so later changes of a burst do not keep pushing the run back
+      next_run_time = getattr(job, 'next_run_time', None)
+      if next_run_time and next_run_time > wake_time:
+        job.modify(next_run_time=wake_time)
+
+  booking_dao = BookingDAO.get_instance(db_config, logging)
+  booking_dao.start_change_listener(wake_jobs)
+  logging.info(f"Waking {', '.join(job_ids)} on booking changes")
 
 # Scheduler setup
 def schedule_jobs(config):
   logging.info("Scheduling jobs")
-  scheduler = BlockingScheduler(timezone=APP_TIMEZONE)
+  scheduler = create_scheduler()
+  wake_on_changes_job_ids = []
   for job_name, job_details in config['jobs'].items():
     enabled = job_details['enabled'] == 'True'
-    job_function = JOB_FUNCTIONS[job_details['job_function']]
+    job_function_name = job_details['job_function']
     job_type = job_details['type']
 
     if (not enabled):
       logging.info(f"Job {job_name} disabled.")
       continue
 
+    if job_function_name not in JOB_FUNCTIONS:
+      raise ValueError(f"Unknown job function {job_function_name} of job {job_name}")
+    options = get_job_options(job_name, job_details)
+    args = [job_name, job_function_name, options['executor']]
+
     if job_type == JOB_TYPE_STARTUP:
-      logging.info(f"Trigger startup job: {job_name}")
-      job_function()
+      # Without a trigger the job runs once as soon as the scheduler starts, next to the cron jobs
+      scheduler.add_job(run_job, args=args, **options)
+      logging.info(f"Scheduled startup job: {job_name} on {options['executor']}")
     elif job_type == JOB_TYPE_CRON:
       cron_expr = job_details['cron'].split()
       trigger = CronTrigger(
@@ -56,8 +110,13 @@ def schedule_jobs(config):
         month=cron_expr[3], day_of_week=cron_expr[4],
         timezone=APP_TIMEZONE
       )
-      scheduler.add_job(job_function, trigger, id=job_name)
-      logging.info(f"Scheduled job: {job_name} with cron: {job_details['cron']}")
+      scheduler.add_job(run_job, trigger, args=args, **options)
+      logging.info(f"Scheduled job: {job_name} with cron: {job_details['cron']} on {options['executor']}")
+      if job_details.get('wake_on_changes') == 'True':
+        wake_on_changes_job_ids.append(job_name)
+
+  if wake_on_changes_job_ids:
+    start_change_feed_wakeup(scheduler, wake_on_changes_job_ids)
 
   return scheduler
 
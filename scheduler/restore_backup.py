@@ -0,0 +1,33 @@
+import argparse
+import logging
+from datetime import datetime
+from jobs.backup_sql import BACKUP_DIR, BACKUP_JOBS, restore_backup
+from utils.backup_utils import load_manifests
+
+# Usage, inside the scheduler container:
+#   python restore_backup.py --list
+#   python restore_backup.py --target-time 2025-03-01T12:00 --dbname room_booking_db_restore --jobs 8
+
+def main():
+  parser = argparse.ArgumentParser(description='Restore the database from the backups under ' + BACKUP_DIR)
+  parser.add_argument('--target-time', type=datetime.fromisoformat, default=None,
+                      help='Restore the latest backup taken at or before this time (default: the latest backup)')
+  parser.add_argument('--dbname', default=None, help='Existing database to restore into (default: DB_NAME)')
+  parser.add_argument('--jobs', type=int, default=BACKUP_JOBS, help='Parallel pg_restore jobs and change set workers')
+  parser.add_argument('--list', action='store_true', help='List the backups and exit')
+  args = parser.parse_args()
+
+  logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+  if args.list:
+    for manifest in load_manifests(BACKUP_DIR):
+      print(f"{manifest.snapshot_time.isoformat()}  {manifest.backup_type:<11}  {manifest.name}")
+    return
+
+  timings = restore_backup(args.target_time, args.dbname, args.jobs)
+  for name, seconds in timings.items():
+    print(f"{name}: {seconds:.1f}s")
+  print(f"total: {sum(timings.values()):.1f}s")
+
+
+if __name__ == '__main__':
+  main()
@@ -0,0 +1,13 @@
+from datetime import date
+
+from utils.data_access.data_class.booking_info import BookingInfo
+
+
+def make_booking_info(booking_id=7, **overrides):
+  fields = dict(
+    booking_id=booking_id, status='new', customer_name='王小明', phone_number='+886912345678',
+    check_in_date=date(2026, 3, 6), last_date=date(2026, 3, 7), total_price=6000, notes='',
+    source='自洽', prepayment=1800, prepayment_note='', prepayment_status='unpaid', room_ids='太',
+  )
+  fields.update(overrides)
+  return BookingInfo(**fields)
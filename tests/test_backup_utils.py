@@ -0,0 +1,104 @@
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from utils.backup_utils import (
+  BACKUP_TYPE_FULL, BACKUP_TYPE_INCREMENTAL, BackupManifest, ContentStore, get_expired_manifests,
+  get_restore_chain, load_manifests, save_manifest
+)
+
+
+def make_manifest(name, day, base=None):
+  return BackupManifest(
+    name=name,
+    backup_type=BACKUP_TYPE_INCREMENTAL if base else BACKUP_TYPE_FULL,
+    snapshot_time=datetime(2026, 3, day, 3, 0),
+    files={ f'{name}.dat': name },
+    base=base,
+    since=datetime(2026, 3, day - 1, 2, 0) if base else None,
+  )
+
+
+class ContentStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.store = ContentStore(os.path.join(self.directory.name, 'store'))
+
+  def write(self, name, content):
+    path = os.path.join(self.directory.name, name)
+    with open(path, 'wb') as f:
+      f.write(content)
+    return path
+
+  def test_identical_files_are_stored_once(self):
+    first = self.store.put_file(self.write('a.dat', b'same rows'))
+    second = self.store.put_file(self.write('b.dat', b'same rows'))
+    other = self.store.put_file(self.write('c.dat', b'other rows'))
+
+    self.assertEqual(first, second)
+    self.assertNotEqual(first, other)
+    self.assertEqual(sum(len(files) for _, _, files in os.walk(self.store.objects_dir)), 2)
+
+  def test_materialize_lays_out_files_by_name(self):
+    dump_dir = os.path.join(self.directory.name, 'dump')
+    os.makedirs(dump_dir)
+    for name, content in (('toc.dat', b'toc'), ('3001.dat.gz', b'bookings')):
+      with open(os.path.join(dump_dir, name), 'wb') as f:
+        f.write(content)
+    files = self.store.put_directory(dump_dir)
+
+    restore_dir = os.path.join(self.directory.name, 'restore')
+    self.store.materialize(files, restore_dir)
+
+    self.assertEqual(sorted(os.listdir(restore_dir)), ['3001.dat.gz', 'toc.dat'])
+    with open(os.path.join(restore_dir, 'toc.dat'), 'rb') as f:
+      self.assertEqual(f.read(), b'toc')
+
+  def test_remove_unreferenced_keeps_live_files(self):
+    kept = self.store.put_file(self.write('a.dat', b'kept'))
+    removed = self.store.put_file(self.write('b.dat', b'removed'))
+
+    self.assertEqual(self.store.remove_unreferenced({ kept }), 1)
+    self.assertTrue(os.path.exists(self.store.object_path(kept)))
+    self.assertFalse(os.path.exists(self.store.object_path(removed)))
+
+
+class BackupManifestTest(unittest.TestCase):
+  def test_manifests_round_trip_oldest_first(self):
+    with tempfile.TemporaryDirectory() as directory:
+      incremental = make_manifest('inc-2', 2, base='full-1')
+      incremental.tables = { 'bookings': { 'mode': 'changes', 'key_columns': ['booking_id'] } }
+      save_manifest(directory, incremental)
+      save_manifest(directory, make_manifest('full-1', 1))
+
+      self.assertEqual(load_manifests(directory), [make_manifest('full-1', 1), incremental])
+
+  def test_restore_chain_uses_the_last_full_backup_before_the_target(self):
+    manifests = [
+      make_manifest('full-1', 1),
+      make_manifest('inc-2', 2, base='full-1'),
+      make_manifest('inc-3', 3, base='full-1'),
+      make_manifest('full-8', 8),
+      make_manifest('inc-9', 9, base='full-8'),
+    ]
+
+    self.assertEqual([m.name for m in get_restore_chain(manifests)], ['full-8', 'inc-9'])
+    self.assertEqual([m.name for m in get_restore_chain(manifests, datetime(2026, 3, 2, 12, 0))], ['full-1', 'inc-2'])
+    self.assertEqual(get_restore_chain(manifests, datetime(2026, 2, 28)), [])
+
+  def test_expired_manifests_include_incrementals_of_expired_full_backups(self):
+    manifests = [
+      make_manifest('full-1', 1),
+      make_manifest('inc-2', 2, base='full-1'),
+      make_manifest('full-8', 8),
+      make_manifest('inc-9', 9, base='full-8'),
+    ]
+
+    self.assertEqual([m.name for m in get_expired_manifests(manifests, 1)], ['full-1', 'inc-2'])
+    self.assertEqual(get_expired_manifests(manifests, 2), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,69 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+import unittest
+from datetime import datetime
+
+from utils.booking_export_utils import export_bookings
+from utils.booking_utils import format_booking_info
+from tests.booking_fixtures import make_booking_info
+
+
+class ExportBookingsTest(unittest.TestCase):
+  def setUp(self):
+    self.directory = tempfile.TemporaryDirectory()
+    self.addCleanup(self.directory.cleanup)
+    self.bookings = [
+      make_booking_info(1, room_ids='太月', extra_bed_counts={ '太': 1, '月': 0 }, created=datetime(2026, 1, 2, 9, 30)),
+      make_booking_info(2, notes='晚到, 約 22:00'),
+    ]
+
+  def path(self, name):
+    return os.path.join(self.directory.name, name)
+
+  def test_text_export_matches_the_previous_format(self):
+    lines = []
+    for booking_info in self.bookings:
+      lines.append(format_booking_info(booking_info))
+      lines.append('\n')
+
+    self.assertEqual(export_bookings(iter(self.bookings), { 'text': self.path('bookings.txt') }), 2)
+
+    with open(self.path('bookings.txt'), encoding='utf-8') as f:
+      self.assertEqual(f.read(), '\n'.join(lines))
+
+  def test_writes_gzip_jsonl_and_csv_in_one_pass(self):
+    export_bookings(iter(self.bookings), { 'jsonl': self.path('bookings.jsonl.gz'), 'csv': self.path('bookings.csv.gz') })
+
+    with gzip.open(self.path('bookings.jsonl.gz'), 'rt', encoding='utf-8') as f:
+      records = [json.loads(line) for line in f]
+    self.assertEqual([record['booking_id'] for record in records], [1, 2])
+    self.assertEqual(records[0]['extra_bed_counts'], { '太': 1, '月': 0 })
+    self.assertEqual(records[0]['created'], '2026-01-02T09:30:00')
+    self.assertEqual(records[0]['check_in_date'], '2026-03-06')
+
+    with gzip.open(self.path('bookings.csv.gz'), 'rt', encoding='utf-8', newline='') as f:
+      rows = list(csv.DictReader(f))
+    self.assertEqual(rows[1]['notes'], '晚到, 約 22:00')
+    self.assertEqual(json.loads(rows[0]['extra_bed_counts']), { '太': 1, '月': 0 })
+
+  def test_failed_export_keeps_the_previous_file(self):
+    with open(self.path('bookings.txt'), 'w', encoding='utf-8') as f:
+      f.write('previous export')
+
+    def failing_bookings():
+      yield self.bookings[0]
+      raise RuntimeError('connection lost')
+
+    with self.assertRaises(RuntimeError):
+      export_bookings(failing_bookings(), { 'text': self.path('bookings.txt') })
+
+    with open(self.path('bookings.txt'), encoding='utf-8') as f:
+      self.assertEqual(f.read(), 'previous export')
+    self.assertEqual(os.listdir(self.directory.name), ['bookings.txt'])
+
+
+if __name__ == '__main__':
+  unittest.main()
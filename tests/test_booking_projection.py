@@ -0,0 +1,43 @@
+import unittest
+from datetime import date, datetime
+from decimal import Decimal
+
+from utils.data_access.booking_projection import (
+  LATEST_BOOKINGS, OVERLAPPING_BOOKINGS_BY_PHONE, booking_info_from_row, build_booking_query
+)
+from tests.booking_fixtures import make_booking_info
+
+
+class BookingProjectionTest(unittest.TestCase):
+  def test_decodes_row_with_extra_bed_array_in_room_order(self):
+    created = datetime(2026, 3, 1, 12, 0)
+    row = (
+      7, 'new', '王小明', '+886912345678', date(2026, 3, 6), date(2026, 3, 7), Decimal('6000.00'),
+      None, '自洽', Decimal('1800'), None, 'unpaid', '太月', [1, 0], created, created
+    )
+
+    booking_info = booking_info_from_row(row)
+
+    self.assertEqual(booking_info, make_booking_info(room_ids='太月', extra_bed_counts={ '太': 1, '月': 0 }))
+    self.assertIsInstance(booking_info.total_price, int)
+    self.assertEqual(booking_info.notes, '')
+    self.assertEqual(booking_info.modified, created)
+
+  def test_builds_prepare_and_direct_forms_of_the_same_query(self):
+    self.assertEqual(OVERLAPPING_BOOKINGS_BY_PHONE.parameter_count, 3)
+    self.assertTrue(OVERLAPPING_BOOKINGS_BY_PHONE.prepare_sql.startswith('PREPARE overlapping_bookings_by_phone AS '))
+    self.assertEqual(OVERLAPPING_BOOKINGS_BY_PHONE.execute_sql, 'EXECUTE overlapping_bookings_by_phone (%s, %s, %s)')
+    self.assertIn("DATERANGE(%(p2)s::date, %(p3)s::date, '[]')", OVERLAPPING_BOOKINGS_BY_PHONE.direct_sql)
+
+    # A reused parameter is passed once
+    self.assertEqual(LATEST_BOOKINGS.execute_sql, 'EXECUTE latest_bookings (%s)')
+    self.assertIn('b.created >= %(p1)s OR b.modified >= %(p1)s', LATEST_BOOKINGS.direct_sql)
+    self.assertEqual(LATEST_BOOKINGS.direct_params(('2026-03-01',)), { 'p1': '2026-03-01' })
+
+  def test_query_without_parameters(self):
+    booking_query = build_booking_query('all_bookings', 'TRUE')
+    self.assertEqual(booking_query.execute_sql, 'EXECUTE all_bookings')
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,64 @@
+import re
+import sqlite3
+import unittest
+
+from utils.data_access.booking_search import (
+  BOOKINGS_BY_KEYWORD, KEYWORD_MATCHES_QUERY, KEYWORD_RANK_BOOKING_ID, get_keyword_booking_id,
+  get_keyword_search_params
+)
+
+
+class KeywordSearchParamsTest(unittest.TestCase):
+  def test_numeric_keyword_is_looked_up_as_booking_id_and_phone_suffix(self):
+    self.assertEqual(get_keyword_search_params('678', 10), (678, '876%', '678', '%678%', 10))
+
+  def test_text_keyword_skips_the_booking_id_branch(self):
+    self.assertEqual(get_keyword_search_params('王小明', 5), (None, '明小王%', '王小明', '%王小明%', 5))
+
+  def test_like_wildcards_in_keyword_are_escaped(self):
+    _, phone_suffix, _, name_like, _ = get_keyword_search_params('5_%', 10)
+    self.assertEqual(phone_suffix, '\\%\\_5%')
+    self.assertEqual(name_like, '%5\\_\\%%')
+
+  def test_booking_id_must_fit_the_integer_column(self):
+    self.assertIsNone(get_keyword_booking_id('99999999999'))
+    self.assertIsNone(get_keyword_booking_id('１２'))
+    self.assertEqual(get_keyword_booking_id(' 12 '), 12)
+
+  def test_query_unions_the_indexed_branches(self):
+    self.assertFalse(BOOKINGS_BY_KEYWORD.prepared)
+    self.assertEqual(BOOKINGS_BY_KEYWORD.parameter_count, 5)
+    self.assertEqual(BOOKINGS_BY_KEYWORD.sql.count('UNION ALL'), 2)
+    self.assertNotIn(' OR ', BOOKINGS_BY_KEYWORD.sql)
+
+
+class KeywordMatchesTest(unittest.TestCase):
+  """Runs the keyword_matches CTE on SQLite, with the Postgres casts and $n parameters rewritten."""
+
+  def setUp(self):
+    self.connection = sqlite3.connect(':memory:')
+    self.connection.create_function('REVERSE', 1, lambda value: value[::-1])
+    self.connection.create_function('SIMILARITY', 2, lambda value, keyword: 0.5 if keyword in value else 0.0)
+    self.connection.executescript("""
+    CREATE TABLE Customers (customer_id INTEGER PRIMARY KEY, name TEXT, phone_number TEXT);
+    CREATE TABLE Bookings (booking_id INTEGER PRIMARY KEY, customer_id INTEGER);
+    INSERT INTO Customers VALUES (1, '王小明', '0912345675'), (2, '陳大文', '0987654321');
+    INSERT INTO Bookings VALUES (5, 1), (6, 2);
+    """)
+
+  def tearDown(self):
+    self.connection.close()
+
+  def get_matches(self, keyword):
+    sql = re.sub(r'::\w+', '', KEYWORD_MATCHES_QUERY)
+    sql = re.sub(r'\$(\d+)', r'?\1', sql)
+    params = get_keyword_search_params(keyword, 10)[:4]
+    return self.connection.execute(f"WITH {sql} SELECT booking_id, rank FROM keyword_matches ORDER BY booking_id", params).fetchall()
+
+  def test_booking_matching_two_branches_is_one_row_with_its_best_rank(self):
+    # Booking 5 by ID and by its phone suffix
+    self.assertEqual(self.get_matches('5'), [(5, KEYWORD_RANK_BOOKING_ID)])
+
+
+if __name__ == '__main__':
+  unittest.main()
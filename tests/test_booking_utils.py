@@ -5,7 +5,9 @@ from types import SimpleNamespace
 
 sys.modules.setdefault("utils.datetime_utils", SimpleNamespace(get_local_today=lambda: date.today()))
 
-from utils.booking_utils import get_booking_room_brief
+from utils.booking_utils import generate_report, get_booking_room_brief
+from utils.data_access.data_class.monthly_booking_stats import MonthlyBookingStats, RoomTypeStats
+from tests.booking_fixtures import make_booking_info
 
 
 class BookingUtilsTest(unittest.TestCase):
@@ -21,6 +23,28 @@ class BookingUtilsTest(unittest.TestCase):
       "雙人套房1間、共加2床",
     )
 
+  def test_generate_report_reads_totals_and_room_types_from_monthly_stats(self):
+    monthly_stats = MonthlyBookingStats(
+      year_month="2026-03", booking_count=40, total_revenue=250000, booking_com_commission=6000,
+      staff_share=48800, balance=195200,
+      room_types=[RoomTypeStats("standard_double_room", available_room_nights=155, rooms_sold=62, room_revenue=161200)],
+    )
+
+    report = generate_report("2026-03", [make_booking_info(source="Booking_com")], monthly_stats)
+
+    self.assertIn("Booking_com佣金：720\n給雅雯：1056\n結餘：4224\n", report)
+    self.assertIn("營業額：250000\nBooking_com佣金：6000\n給雅雯：48800\n結餘：195200", report)
+    self.assertTrue(report.endswith("[房型]\n雙人套房：住房率40%，ADR 2600，RevPAR 1040"))
+
+  def test_generate_report_sums_bookings_without_monthly_stats(self):
+    report = generate_report("2026-03", [make_booking_info(1), make_booking_info(2, source="Booking_com")])
+
+    self.assertTrue(report.endswith("營業額：12000\nBooking_com佣金：720\n給雅雯：2256\n結餘：9024"))
+
+  def test_room_type_stats_without_sold_or_available_nights(self):
+    stats = RoomTypeStats("washitsu", available_room_nights=0, rooms_sold=0, room_revenue=0)
+    self.assertEqual((stats.occupancy_rate, stats.adr, stats.revpar), (0.0, 0, 0))
+
 
 if __name__ == "__main__":
   unittest.main()
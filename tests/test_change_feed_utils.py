@@ -0,0 +1,74 @@
+import unittest
+from datetime import date, datetime
+
+from utils.change_feed_utils import load_changed_bookings_and_closures
+from utils.data_access.data_class.change_batch import ChangeBatch
+from utils.data_access.data_class.closure_info import ClosureInfo
+from tests.booking_fixtures import make_booking_info
+
+
+class FakeBookingDAO:
+  def __init__(self, batch, bookings=None, closures=None):
+    self.batch = batch
+    self.bookings = bookings or []
+    self.closures = closures or []
+    self.calls = []
+
+  def read_changes(self, consumer):
+    self.calls.append(('read_changes', consumer))
+    return self.batch
+
+  def get_latest_bookings(self, last_sync_time):
+    self.calls.append(('get_latest_bookings', last_sync_time))
+    return self.bookings
+
+  def get_latest_closures(self, last_sync_time):
+    self.calls.append(('get_latest_closures', last_sync_time))
+    return self.closures
+
+  def get_bookings_by_ids(self, booking_ids):
+    self.calls.append(('get_bookings_by_ids', booking_ids))
+    return { b.booking_id: b for b in self.bookings if b.booking_id in booking_ids }
+
+  def get_closures_by_ids(self, closure_ids):
+    self.calls.append(('get_closures_by_ids', closure_ids))
+    return [c for c in self.closures if c.closure_id in closure_ids]
+
+
+class LoadChangedBookingsAndClosuresTest(unittest.TestCase):
+  def setUp(self):
+    self.latest_sync_time = datetime(2026, 3, 1, 12, 0)
+    self.closure = ClosureInfo(closure_id=3, status='valid', start_date=date(2026, 3, 5), last_date=date(2026, 3, 5), reason='', room_ids='太')
+
+  def test_reads_changed_ids_in_id_order(self):
+    batch = ChangeBatch('notion', '100:105:', booking_ids=[9, 7], closure_ids=[3], change_count=3)
+    booking_dao = FakeBookingDAO(batch, [make_booking_info(7), make_booking_info(9)], [self.closure])
+
+    loaded_batch, bookings, closures = load_changed_bookings_and_closures(booking_dao, 'notion', self.latest_sync_time)
+
+    self.assertIs(loaded_batch, batch)
+    self.assertEqual([b.booking_id for b in bookings], [7, 9])
+    self.assertEqual(closures, [self.closure])
+    self.assertNotIn(('get_latest_bookings', self.latest_sync_time), booking_dao.calls)
+
+  def test_consumer_without_cursor_polls_by_sync_time(self):
+    batch = ChangeBatch('notion', '100:100:', is_initial=True)
+    booking_dao = FakeBookingDAO(batch, [make_booking_info(7)], [self.closure])
+
+    loaded_batch, bookings, closures = load_changed_bookings_and_closures(booking_dao, 'notion', self.latest_sync_time)
+
+    self.assertEqual([b.booking_id for b in bookings], [7])
+    self.assertEqual(closures, [self.closure])
+    self.assertEqual(booking_dao.calls[0], ('read_changes', 'notion'))
+    self.assertIn(('get_latest_bookings', self.latest_sync_time), booking_dao.calls)
+
+  def test_returns_none_when_loading_fails(self):
+    self.assertIsNone(load_changed_bookings_and_closures(FakeBookingDAO(None), 'notion', self.latest_sync_time))
+
+    booking_dao = FakeBookingDAO(ChangeBatch('notion', '100:105:', booking_ids=[7]))
+    booking_dao.get_bookings_by_ids = lambda booking_ids: None
+    self.assertIsNone(load_changed_bookings_and_closures(booking_dao, 'notion', self.latest_sync_time))
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,96 @@
+import threading
+import unittest
+from unittest.mock import patch
+
+from utils.data_access.connection_pool import HealthCheckedConnectionPool, PoolTimeoutError
+
+
+class FakeCursor:
+  def __init__(self, connection):
+    self.connection = connection
+
+  def __enter__(self):
+    return self
+
+  def __exit__(self, *args):
+    return False
+
+  def execute(self, query):
+    if self.connection.broken:
+      raise Exception("server closed the connection unexpectedly")
+
+
+class FakeConnection:
+  def __init__(self):
+    self.closed = 0
+    self.autocommit = True
+    self.broken = False
+
+  def cursor(self):
+    return FakeCursor(self)
+
+  def rollback(self):
+    pass
+
+  def close(self):
+    self.closed = 1
+
+
+class HealthCheckedConnectionPoolTest(unittest.TestCase):
+  def test_reuses_released_connection(self):
+    pool = HealthCheckedConnectionPool(1, 2, FakeConnection)
+    connection = pool.getconn()
+    pool.putconn(connection)
+
+    self.assertIs(pool.getconn(), connection)
+    self.assertEqual(pool.get_stats()["size"], 1)
+
+  def test_times_out_when_pool_is_exhausted(self):
+    pool = HealthCheckedConnectionPool(0, 1, FakeConnection, timeout=0.01)
+    pool.getconn()
+
+    with self.assertRaises(PoolTimeoutError):
+      pool.getconn()
+    self.assertEqual(pool.get_stats()["in_use"], 1)
+
+  def test_waiting_caller_gets_connection_released_by_another_thread(self):
+    pool = HealthCheckedConnectionPool(0, 1, FakeConnection, timeout=1)
+    connection = pool.getconn()
+    threading.Timer(0.05, pool.putconn, args=(connection,)).start()
+
+    self.assertIs(pool.getconn(), connection)
+    self.assertEqual(pool.get_stats()["waits"], 1)
+
+  def test_replaces_idle_connection_that_fails_ping(self):
+    pool = HealthCheckedConnectionPool(1, 1, FakeConnection, max_idle_seconds=0)
+    connection = pool.getconn()
+    pool.putconn(connection)
+    connection.broken = True
+
+    replacement = pool.getconn()
+
+    self.assertIsNot(replacement, connection)
+    self.assertTrue(connection.closed)
+
+  def test_recycles_connection_past_max_lifetime(self):
+    pool = HealthCheckedConnectionPool(1, 1, FakeConnection, max_lifetime_seconds=60)
+    connection = pool.getconn()
+    pool.putconn(connection)
+
+    with patch("utils.data_access.connection_pool.time.monotonic", return_value=10 ** 9):
+      replacement = pool.getconn()
+
+    self.assertIsNot(replacement, connection)
+    self.assertEqual(pool.get_stats()["discarded"], 1)
+
+  def test_closed_connection_is_not_returned_to_pool(self):
+    pool = HealthCheckedConnectionPool(0, 1, FakeConnection)
+    connection = pool.getconn()
+    connection.close()
+    pool.putconn(connection)
+
+    self.assertEqual(pool.get_stats()["size"], 0)
+
+
+if __name__ == "__main__":
+  unittest.main()
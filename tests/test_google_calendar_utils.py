@@ -0,0 +1,193 @@
+import unittest
+from collections import Counter
+from types import SimpleNamespace
+
+from utils.google_calendar_utils import (
+  ENTITY_TYPE_BOOKING, backfill_calendar_event_ids, get_booking_event_changes, sync_calendar_events
+)
+from tests.booking_fixtures import make_booking_info
+
+CALENDAR_ID = 'calendar@example.com'
+
+
+class FakeHttpError(Exception):
+  def __init__(self, status):
+    super().__init__(f"HTTP {status}")
+    self.resp = SimpleNamespace(status=status)
+
+
+class FakeRequest:
+  def __init__(self, service, method, fn):
+    self.service = service
+    self.method = method
+    self.fn = fn
+
+  def execute(self):
+    self.service.http_requests += 1
+    return self.run()
+
+  def run(self):
+    self.service.calls[self.method] += 1
+    return self.fn()
+
+
+class FakeBatch:
+  def __init__(self, service, callback):
+    self.service = service
+    self.callback = callback
+    self.requests = []
+
+  def add(self, request, request_id):
+    self.requests.append((request_id, request))
+
+  def execute(self):
+    assert len(self.requests) <= 50
+    self.service.http_requests += 1
+    for request_id, request in self.requests:
+      try:
+        self.callback(request_id, request.run(), None)
+      except FakeHttpError as e:
+        self.callback(request_id, None, e)
+
+
+class FakeCalendarService:
+  """In-memory Google Calendar that counts API calls and HTTP requests."""
+
+  def __init__(self):
+    self.events_by_id = {}
+    self.revisions = {}
+    self.calls = Counter()
+    self.http_requests = 0
+    self._next_id = 1
+
+  def events(self):
+    return self
+
+  def new_batch_http_request(self, callback):
+    return FakeBatch(self, callback)
+
+  def _insert(self, body):
+    event_id = f'event{self._next_id}'
+    self._next_id += 1
+    self.revisions[event_id] = 1
+    self.events_by_id[event_id] = dict(body, id=event_id, etag=f'"{event_id}-1"')
+    return self.events_by_id[event_id]
+
+  def _patch(self, event_id, body):
+    if event_id not in self.events_by_id:
+      raise FakeHttpError(404)
+    self.revisions[event_id] += 1
+    self.events_by_id[event_id].update(body, etag=f'"{event_id}-{self.revisions[event_id]}"')
+    return self.events_by_id[event_id]
+
+  def _delete(self, event_id):
+    if self.events_by_id.pop(event_id, None) is None:
+      raise FakeHttpError(410)
+    return ''
+
+  def insert(self, calendarId, body):
+    return FakeRequest(self, 'insert', lambda: self._insert(body))
+
+  def patch(self, calendarId, eventId, body):
+    return FakeRequest(self, 'patch', lambda: self._patch(eventId, body))
+
+  def delete(self, calendarId, eventId):
+    return FakeRequest(self, 'delete', lambda: self._delete(eventId))
+
+  def list(self, calendarId, maxResults, pageToken=None, fields=None):
+    event_ids = sorted(self.events_by_id)
+    start = int(pageToken or 0)
+    page = event_ids[start:start + maxResults]
+    next_page_token = str(start + maxResults) if start + maxResults < len(event_ids) else None
+    return FakeRequest(self, 'list', lambda: {
+      'items': [self.events_by_id[event_id] for event_id in page],
+      **({ 'nextPageToken': next_page_token } if next_page_token else {}),
+    })
+
+
+class FakeEventStore:
+  """Stands in for the GoogleCalendarEvents methods of BookingDAO."""
+
+  def __init__(self):
+    self.events = {}
+
+  def get_google_calendar_event_ids(self, calendar_id, entity_type, entity_ids=None):
+    return {
+      entity_id: event_id
+      for (mapped_calendar_id, mapped_type, entity_id), (event_id, _) in self.events.items()
+      if mapped_calendar_id == calendar_id and mapped_type == entity_type and (entity_ids is None or entity_id in entity_ids)
+    }
+
+  def save_google_calendar_events(self, calendar_id, entity_type, events):
+    for entity_id, event in events.items():
+      self.events[(calendar_id, entity_type, entity_id)] = event
+    return True
+
+  def delete_google_calendar_events(self, calendar_id, entity_type, entity_ids):
+    for entity_id in entity_ids:
+      self.events.pop((calendar_id, entity_type, entity_id), None)
+    return True
+
+
+class GoogleCalendarSyncTest(unittest.TestCase):
+  def setUp(self):
+    self.service = FakeCalendarService()
+    self.event_store = FakeEventStore()
+
+  def sync(self, bookings):
+    return sync_calendar_events(
+      self.service, self.event_store, CALENDAR_ID, ENTITY_TYPE_BOOKING, get_booking_event_changes(bookings)
+    )
+
+  def test_inserts_in_batches_and_maps_events(self):
+    self.assertEqual(self.sync([make_booking_info(booking_id) for booking_id in range(1, 121)]), [])
+
+    self.assertEqual(self.service.calls, Counter(insert=120))
+    self.assertEqual(self.service.http_requests, 3)
+    self.assertEqual(len(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, ENTITY_TYPE_BOOKING)), 120)
+
+  def test_maps_events_of_earlier_batches_when_a_batch_fails(self):
+    new_batch_http_request = self.service.new_batch_http_request
+    def new_failing_batch_http_request(callback):
+      if self.service.http_requests == 1:
+        raise ConnectionError("connection reset")
+      return new_batch_http_request(callback)
+    self.service.new_batch_http_request = new_failing_batch_http_request
+
+    with self.assertRaises(ConnectionError):
+      self.sync([make_booking_info(booking_id) for booking_id in range(1, 121)])
+
+    self.assertEqual(len(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, ENTITY_TYPE_BOOKING)), 50)
+
+  def test_updates_patch_the_mapped_event_without_searching(self):
+    self.sync([make_booking_info(1), make_booking_info(2)])
+    self.service.calls.clear()
+
+    self.sync([make_booking_info(1), make_booking_info(2, status='canceled')])
+
+    self.assertEqual(self.service.calls, Counter(patch=1, delete=1))
+    self.assertEqual(len(self.service.events_by_id), 1)
+    self.assertEqual(list(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, ENTITY_TYPE_BOOKING)), [1])
+    self.assertEqual(self.event_store.events[(CALENDAR_ID, ENTITY_TYPE_BOOKING, 1)][1], '"event1-2"')
+
+  def test_recreates_events_deleted_from_the_calendar(self):
+    self.sync([make_booking_info(1)])
+    self.service.events_by_id.clear()
+
+    self.assertEqual(self.sync([make_booking_info(1)]), [])
+
+    self.assertEqual(len(self.service.events_by_id), 1)
+    self.assertEqual(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, ENTITY_TYPE_BOOKING), { 1: 'event2' })
+
+  def test_backfill_maps_events_by_description(self):
+    self.service._insert({ 'description': 'ＩＤ：12\n' })
+    self.service._insert({ 'description': 'ＣＬＩＤ：3\n原因：整修\n' })
+    self.service._insert({ 'description': '其他行程' })
+
+    self.assertEqual(backfill_calendar_event_ids(self.service, self.event_store, CALENDAR_ID), { 'booking': 1, 'closure': 1 })
+    self.assertEqual(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, 'booking'), { 12: 'event1' })
+    self.assertEqual(self.event_store.get_google_calendar_event_ids(CALENDAR_ID, 'closure'), { 3: 'event2' })
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,48 @@
+import unittest
+from datetime import datetime
+
+from utils.data_access.data_class.job_run import JOB_RUN_STATUS_FAILED, JOB_RUN_STATUS_SUCCEEDED, JobRun
+from utils.job_run_utils import format_duration, format_job_runs
+
+
+def make_job_run(job_name, status=JOB_RUN_STATUS_SUCCEEDED, **overrides):
+  fields = {
+    'run_id': 1,
+    'job_name': job_name,
+    'executor': 'threads',
+    'status': status,
+    'started': datetime(2026, 3, 1, 2, 59, 58),
+    'finished': datetime(2026, 3, 1, 3, 0),
+    'duration_ms': 1500,
+  }
+  fields.update(overrides)
+  return JobRun(**fields)
+
+
+class FormatJobRunsTest(unittest.TestCase):
+  def test_format_duration(self):
+    self.assertEqual(format_duration(320), '320ms')
+    self.assertEqual(format_duration(1500), '1.5秒')
+    self.assertEqual(format_duration(125000), '2分5秒')
+
+  def test_formats_item_count_and_errors(self):
+    job_runs = [
+      make_job_run('backup_sql', executor='processes', item_count=12),
+      make_job_run('sync_bookings_with_notion', JOB_RUN_STATUS_FAILED, error_count=2, error='x' * 100),
+    ]
+
+    self.assertEqual(format_job_runs(job_runs), (
+      "[排程狀態]\n"
+      "✅ backup_sql\n"
+      "03/01 03:00，1.5秒，12筆\n"
+      "❌ sync_bookings_with_notion\n"
+      "03/01 03:00，1.5秒\n"
+      f"錯誤2次：{'x' * 80}…"
+    ))
+
+  def test_no_runs(self):
+    self.assertEqual(format_job_runs([]), "尚無排程紀錄")
+
+
+if __name__ == '__main__':
+  unittest.main()
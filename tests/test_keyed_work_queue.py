@@ -0,0 +1,79 @@
+import threading
+import time
+import unittest
+
+from utils.keyed_work_queue import KeyedWorkQueue
+
+
+class KeyedWorkQueueTest(unittest.TestCase):
+  def setUp(self):
+    self.work_queue = KeyedWorkQueue(num_workers=4, max_size_per_worker=100)
+
+  def tearDown(self):
+    self.work_queue.shutdown(timeout=5)
+
+  def test_tasks_of_a_key_run_in_submission_order(self):
+    results = {}
+    def record(key, value):
+      time.sleep(0.001)
+      results.setdefault(key, []).append(value)
+
+    for value in range(20):
+      for key in ('U1', 'U2', 'C3'):
+        self.assertTrue(self.work_queue.submit(key, record, key, value))
+    self.work_queue.join()
+
+    self.assertEqual(results, { key: list(range(20)) for key in ('U1', 'U2', 'C3') })
+
+  def test_rejects_when_queue_is_full(self):
+    work_queue = KeyedWorkQueue(num_workers=1, max_size_per_worker=1)
+    release = threading.Event()
+    started = threading.Event()
+    def block():
+      started.set()
+      release.wait(5)
+
+    self.assertTrue(work_queue.submit('U1', block))
+    started.wait(5)
+    self.assertTrue(work_queue.submit('U1', lambda: None))
+    self.assertFalse(work_queue.submit('U1', lambda: None))
+    release.set()
+    work_queue.shutdown(timeout=5)
+
+    stats = work_queue.get_stats()
+    self.assertEqual((stats['submitted'], stats['rejected'], stats['processed']), (2, 1, 2))
+
+  def test_submit_all_queues_nothing_when_one_task_does_not_fit(self):
+    work_queue = KeyedWorkQueue(num_workers=1, max_size_per_worker=2)
+    release = threading.Event()
+    started = threading.Event()
+    def block():
+      started.set()
+      release.wait(5)
+    ran = []
+
+    self.assertTrue(work_queue.submit('U1', block))
+    started.wait(5)
+    self.assertTrue(work_queue.submit('U1', ran.append, 'first'))
+    self.assertFalse(work_queue.submit_all([('U1', ran.append, ('second',)), ('U2', ran.append, ('third',))]))
+    release.set()
+    work_queue.shutdown(timeout=5)
+
+    self.assertEqual(ran, ['first'])
+    stats = work_queue.get_stats()
+    self.assertEqual((stats['submitted'], stats['rejected']), (2, 2))
+
+  def test_failed_tasks_are_counted_and_do_not_stop_the_worker(self):
+    def fail():
+      raise ValueError('boom')
+
+    self.work_queue.submit('U1', fail)
+    self.work_queue.submit('U1', lambda: None)
+    self.work_queue.join()
+
+    stats = self.work_queue.get_stats()
+    self.assertEqual((stats['processed'], stats['failed'], stats['depth']), (1, 1, 0))
+
+
+if __name__ == '__main__':
+  unittest.main()
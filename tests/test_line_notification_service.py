@@ -0,0 +1,64 @@
+import logging
+import unittest
+from unittest.mock import patch
+
+from utils.line_notification_service import LineNotificationService, merge_line_notifications, text_message
+from tests.booking_fixtures import make_booking_info
+
+
+class MergeLineNotificationsTest(unittest.TestCase):
+  def test_merges_messages_of_a_recipient_up_to_five(self):
+    rows = [(outbox_id, 'G1', [text_message(f'm{outbox_id}')]) for outbox_id in range(1, 8)]
+    rows.insert(2, (100, 'U1', [text_message('admin')]))
+
+    pushes = merge_line_notifications(rows)
+
+    self.assertEqual([(recipient_id, outbox_ids) for recipient_id, outbox_ids, _ in pushes], [
+      ('G1', [1, 2, 3, 4, 5]),
+      ('U1', [100]),
+      ('G1', [6, 7]),
+    ])
+    self.assertEqual([message['text'] for message in pushes[0][2]], ['m1', 'm2', 'm3', 'm4', 'm5'])
+
+  def test_keeps_multi_message_notifications_in_one_push(self):
+    rows = [
+      (1, 'U1', [text_message('a'), text_message('b'), text_message('c')]),
+      (2, 'U1', [text_message('d'), text_message('e'), text_message('f')]),
+    ]
+    self.assertEqual([outbox_ids for _, outbox_ids, _ in merge_line_notifications(rows)], [[1], [2]])
+
+  def test_repeated_messages_are_sent_once(self):
+    rows = [(1, 'G1', [text_message('same')]), (2, 'G1', [text_message('same')])]
+    self.assertEqual(merge_line_notifications(rows), [('G1', [1, 2], [text_message('same')])])
+
+
+class LineNotificationServiceTest(unittest.TestCase):
+  def setUp(self):
+    with patch.dict('os.environ', { 'LINE_BROADCAST_GROUP_ID': 'G1' }):
+      self.service = LineNotificationService(logging.getLogger(__name__))
+
+  def test_booking_changed_picks_the_notification_of_the_status_change(self):
+    existing_booking_info = make_booking_info()
+    cases = [
+      (None, 'booking_created'),
+      (make_booking_info(status='canceled'), 'booking_canceled'),
+      (make_booking_info(status='prepaid'), 'booking_prepaid'),
+      (make_booking_info(notes='改期'), 'booking_updated'),
+    ]
+    for booking_info, event in cases:
+      previous = existing_booking_info if booking_info else None
+      notifications = self.service.booking_changed(previous, booking_info or existing_booking_info)
+      self.assertEqual([notification.dedupe_key for notification in notifications], [f'{event}:7:G1'])
+
+    restored = self.service.booking_changed(make_booking_info(status='canceled'), existing_booking_info)
+    self.assertEqual(restored[0].dedupe_key, 'booking_restored:7:G1')
+    self.assertEqual(self.service.booking_changed(existing_booking_info, make_booking_info()), [])
+
+  def test_skips_group_notifications_without_recipient(self):
+    with patch.dict('os.environ', { 'LINE_BROADCAST_GROUP_ID': '' }):
+      service = LineNotificationService(logging.getLogger(__name__))
+    self.assertEqual(service.booking_created(make_booking_info()), [])
+
+
+if __name__ == '__main__':
+  unittest.main()
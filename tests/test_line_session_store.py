@@ -0,0 +1,87 @@
+import threading
+import unittest
+from datetime import date, datetime
+from unittest.mock import patch
+
+from utils.data_access.line_session_store import (
+  InMemorySessionStore,
+  create_session_store,
+  decode_session,
+  encode_session,
+)
+
+
+class LineSessionSerializationTest(unittest.TestCase):
+  def test_dates_and_nested_data_round_trip(self):
+    session = {
+      'flow': 'USER_FLOW.CREATE_BOOKING',
+      'step': 'USER_FLOW_STEP.CREATE_BOOKING.SELECT_ROOMS',
+      'data': {
+        'customer_name': '王小明',
+        'check_in_date': date(2026, 7, 10),
+        'created': datetime(2026, 7, 1, 12, 30),
+        'room_ids': ['太', '月'],
+        'extra_bed_counts': { '太': 1 },
+      },
+    }
+    self.assertEqual(decode_session(encode_session(session)), session)
+
+  def test_payload_is_compact(self):
+    self.assertEqual(encode_session({ 'flow': None, 'data': { 'd': date(2026, 1, 2) } }), '{"flow":null,"data":{"d":{"$d":"2026-01-02"}}}')
+
+  def test_unsupported_values_are_rejected(self):
+    with self.assertRaises(TypeError):
+      encode_session({ 'data': { 'rooms': {'太'} } })
+
+
+class InMemorySessionStoreTest(unittest.TestCase):
+  def setUp(self):
+    self.session_store = InMemorySessionStore(ttl_seconds=60)
+
+  def test_changes_are_kept_between_events(self):
+    with self.session_store.session('U1') as session:
+      session['flow'] = 'USER_FLOW.CREATE_BOOKING'
+    with self.session_store.session('U1') as session:
+      self.assertEqual(session['flow'], 'USER_FLOW.CREATE_BOOKING')
+    with self.session_store.session('U2') as session:
+      self.assertIsNone(session['flow'])
+
+  def test_expired_session_starts_over(self):
+    with self.session_store.session('U1') as session:
+      session['flow'] = 'USER_FLOW.CREATE_BOOKING'
+    with patch('utils.data_access.line_session_store.time.monotonic', return_value=10 ** 9):
+      with self.session_store.session('U1') as session:
+        self.assertIsNone(session['flow'])
+
+  def test_same_user_events_are_serialized(self):
+    entered = threading.Event()
+    release = threading.Event()
+    order = []
+
+    def first_event():
+      with self.session_store.session('U1'):
+        entered.set()
+        release.wait(1)
+        order.append('first')
+
+    def second_event():
+      with self.session_store.session('U1'):
+        order.append('second')
+
+    first_thread = threading.Thread(target=first_event)
+    first_thread.start()
+    entered.wait(1)
+    second_thread = threading.Thread(target=second_event)
+    second_thread.start()
+    release.set()
+    first_thread.join(1)
+    second_thread.join(1)
+    self.assertEqual(order, ['first', 'second'])
+
+  def test_unknown_backend_is_rejected(self):
+    with self.assertRaises(ValueError):
+      create_session_store('redis', 60)
+
+
+if __name__ == '__main__':
+  unittest.main()
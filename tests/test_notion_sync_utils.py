@@ -0,0 +1,90 @@
+import unittest
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+from utils.notion_sync_utils import RateLimitedNotion, resolve_booking_conflicts
+from tests.booking_fixtures import make_booking_info
+
+LOCAL_TZ = timezone(timedelta(hours=8))
+
+
+class NoopTokenBucket:
+  def __init__(self):
+    self.acquired = 0
+
+  def acquire(self):
+    self.acquired += 1
+
+
+class FakeNotionError(Exception):
+  def __init__(self, code):
+    super().__init__(code)
+    self.code = code
+
+
+class FakeDatabases:
+  def __init__(self, pages, page_size=100, rate_limited_calls=0):
+    self.pages = pages
+    self.page_size = page_size
+    self.rate_limited_calls = rate_limited_calls
+    self.queries = []
+
+  def query(self, database_id, page_size, filter=None, start_cursor=None):
+    self.queries.append(start_cursor)
+    if self.rate_limited_calls:
+      self.rate_limited_calls -= 1
+      raise FakeNotionError('rate_limited')
+    start = int(start_cursor or 0)
+    end = start + min(page_size, self.page_size)
+    return {
+      'results': self.pages[start:end],
+      'has_more': end < len(self.pages),
+      'next_cursor': str(end) if end < len(self.pages) else None,
+    }
+
+
+class RateLimitedNotionTest(unittest.TestCase):
+  def test_query_database_follows_cursors(self):
+    databases = FakeDatabases([{ 'id': str(i) } for i in range(250)])
+    token_bucket = NoopTokenBucket()
+    notion = RateLimitedNotion(SimpleNamespace(databases=databases), token_bucket, sleep=lambda seconds: None)
+
+    pages = list(notion.query_database('db'))
+
+    self.assertEqual(len(pages), 250)
+    self.assertEqual(databases.queries, [None, '100', '200'])
+    self.assertEqual(token_bucket.acquired, 3)
+
+  def test_retries_rate_limited_calls(self):
+    databases = FakeDatabases([{ 'id': '1' }], rate_limited_calls=2)
+    sleeps = []
+    notion = RateLimitedNotion(SimpleNamespace(databases=databases), NoopTokenBucket(), sleep=sleeps.append)
+
+    self.assertEqual(len(list(notion.query_database('db'))), 1)
+    self.assertEqual(sleeps, [1, 2])
+
+
+class ResolveBookingConflictsTest(unittest.TestCase):
+  def test_drops_unchanged_bookings_and_keeps_the_newer_side(self):
+    synced_at = datetime(2026, 4, 1, 12, 0)
+    unchanged = make_booking_info(1, modified=synced_at)
+    db_newer = make_booking_info(2, modified=synced_at + timedelta(minutes=30), notes='DB')
+    notion_older = make_booking_info(2, modified=(synced_at + timedelta(minutes=10)).replace(tzinfo=LOCAL_TZ), notes='Notion')
+    db_older = make_booking_info(3, modified=synced_at, notes='DB')
+    notion_newer = make_booking_info(3, modified=(synced_at + timedelta(minutes=10)).replace(tzinfo=LOCAL_TZ), notes='Notion')
+    notion_only = make_booking_info(4, modified=synced_at.replace(tzinfo=LOCAL_TZ), notes='Notion')
+    notion_echo = make_booking_info(5, modified=synced_at.replace(tzinfo=LOCAL_TZ))
+
+    to_notion, to_db = resolve_booking_conflicts(
+      [unchanged, db_newer, db_older],
+      [make_booking_info(1, modified=synced_at.replace(tzinfo=LOCAL_TZ)), notion_older, notion_newer, notion_only, notion_echo],
+      { 2: db_newer, 3: db_older, 5: make_booking_info(5, modified=synced_at) },
+      LOCAL_TZ
+    )
+
+    self.assertEqual([booking_info.booking_id for booking_info in to_notion], [2])
+    self.assertEqual([booking_info.booking_id for booking_info in to_db], [3, 4])
+
+
+if __name__ == '__main__':
+  unittest.main()
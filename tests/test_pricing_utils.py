@@ -0,0 +1,43 @@
+import unittest
+from datetime import date
+
+from utils.pricing_utils import get_nightly_room_prices, quote_stay
+
+ROOMS_BY_ID = {
+  '藍': { 'room_id': '藍', 'holiday_price_per_night': 2800, 'weekday_price_per_night': 2200 },
+  '太': { 'room_id': '太', 'holiday_price_per_night': 3600, 'weekday_price_per_night': 3000 },
+}
+
+
+class PricingUtilsTest(unittest.TestCase):
+  def test_quote_prices_each_room_per_night(self):
+    # Friday and Saturday nights; only Saturday is holiday priced
+    quote = quote_stay(ROOMS_BY_ID, ['藍', '太'], date(2026, 6, 12), date(2026, 6, 13))
+    self.assertEqual(quote.rate_types, ['weekday', 'holiday'])
+    self.assertEqual(quote.rooms['藍'].nightly_prices, [2200, 2800])
+    self.assertEqual(quote.rooms['太'].nightly_prices, [3000, 3600])
+    self.assertEqual(quote.total_price, 2200 + 2800 + 3000 + 3600)
+    self.assertEqual(quote.nights, 2)
+
+  def test_extra_beds_are_charged_to_their_room(self):
+    quote = quote_stay(ROOMS_BY_ID, ['藍', '太'], date(2026, 6, 12), date(2026, 6, 13), { '太': 1 })
+    self.assertEqual(quote.rooms['藍'].extra_bed_price, 0)
+    self.assertEqual(quote.rooms['太'].extra_bed_price, 1000)
+    self.assertEqual(quote.rooms['太'].total_price, 3000 + 3600 + 1000)
+    self.assertEqual(quote.total_price, 2200 + 2800 + 3000 + 3600 + 1000)
+
+  def test_unknown_room_raises(self):
+    with self.assertRaises(KeyError):
+      quote_stay(ROOMS_BY_ID, ['森'], date(2026, 6, 12), date(2026, 6, 12))
+
+  def test_nightly_room_prices_cover_every_room(self):
+    nightly_room_prices = get_nightly_room_prices(ROOMS_BY_ID, date(2026, 6, 13), date(2026, 6, 14))
+    self.assertEqual(nightly_room_prices['藍'], [
+      { 'date': '2026-06-13', 'price': 2800, 'rateType': 'holiday' },
+      { 'date': '2026-06-14', 'price': 2200, 'rateType': 'weekday' },
+    ])
+    self.assertEqual(set(nightly_room_prices), {'藍', '太'})
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -8,11 +8,15 @@ sys.modules.setdefault("flask", SimpleNamespace(jsonify=lambda payload: payload,
 sys.modules.setdefault("utils.datetime_utils", SimpleNamespace(get_local_today=lambda: date.today()))
 
 from utils.public_booking_api_utils import (
+  build_availability_calendar,
   ensure_public_bookable_date_range,
   ensure_rooms_available,
   is_public_bookable_date_range,
+  parse_calendar_date_range,
   parse_date_range,
+  serialize_booking,
 )
+from tests.booking_fixtures import make_booking_info
 
 
 class PublicBookingApiUtilsTest(unittest.TestCase):
@@ -57,6 +61,55 @@ class PublicBookingApiUtilsTest(unittest.TestCase):
         "checkOut": "2027-01-08",
       })
 
+  @patch("utils.public_booking_api_utils.get_local_today", return_value=date(2026, 7, 10))
+  def test_parse_calendar_date_range_clamps_to_booking_window(self, _):
+    start_date, end_date = parse_calendar_date_range({
+      "start": "2026-07-01",
+      "end": "2027-02-28",
+    })
+
+    self.assertEqual(start_date, date(2026, 7, 10))
+    self.assertEqual(end_date, date(2027, 1, 6))
+
+  def test_build_availability_calendar_marks_occupied_and_closed_weekday_nights(self):
+    rooms_by_id = {
+      "太": {"room_status": "available", "holiday_price_per_night": 3600, "weekday_price_per_night": 3000},
+      "和": {"room_status": "closed", "holiday_price_per_night": 3600, "weekday_price_per_night": 3600},
+    }
+
+    calendar = build_availability_calendar(
+      rooms_by_id,
+      date(2026, 7, 11),
+      date(2026, 7, 13),
+      {("太", date(2026, 7, 12))},
+    )
+
+    self.assertEqual(calendar["dates"], ["2026-07-11", "2026-07-12", "2026-07-13"])
+    self.assertEqual(calendar["rateTypes"], ["holiday", "weekday", "weekday"])
+    self.assertEqual(calendar["bookable"], [True, True, False])
+    self.assertEqual(calendar["rooms"]["太"], {
+      "available": [True, False, False],
+      "prices": [3600, 3000, 3000],
+    })
+    self.assertEqual(calendar["rooms"]["和"]["available"], [False, False, False])
+
+
+  def test_serialize_booking_uses_the_given_rooms_without_querying_dao(self):
+    booking_dao = Mock()
+    rooms_by_id = {
+      room_id: {
+        'room_id': room_id, 'room_name': room_id, 'room_type': 'standard_double_room', 'capacity': 2,
+        'holiday_price_per_night': 3500, 'weekday_price_per_night': 3000, 'extra_bed_number': 1,
+        'description': '', 'room_status': 'available',
+      }
+      for room_id in ('太', '月')
+    }
+
+    serialized = serialize_booking(make_booking_info(room_ids='月太'), booking_dao=booking_dao, rooms_by_id=rooms_by_id)
+
+    self.assertEqual([room['roomId'] for room in serialized['rooms']], ['月', '太'])
+    booking_dao.get_rooms_by_id.assert_not_called()
+
 
 if __name__ == "__main__":
   unittest.main()
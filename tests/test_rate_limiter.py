@@ -0,0 +1,46 @@
+import unittest
+
+from utils.rate_limiter import TokenBucket
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+    self.sleeps = []
+
+  def __call__(self):
+    return self.now
+
+  def sleep(self, seconds):
+    self.sleeps.append(seconds)
+    self.now += seconds
+
+
+class TokenBucketTest(unittest.TestCase):
+  def test_bursts_up_to_capacity_then_paces_at_rate(self):
+    clock = FakeClock()
+    token_bucket = TokenBucket(3, clock=clock, sleep=clock.sleep)
+
+    for _ in range(9):
+      token_bucket.acquire()
+
+    self.assertEqual(clock.sleeps[:1], [1 / 3])
+    self.assertAlmostEqual(clock.now, 2.0)
+
+  def test_refills_while_idle_but_not_above_capacity(self):
+    clock = FakeClock()
+    token_bucket = TokenBucket(3, capacity=3, clock=clock, sleep=clock.sleep)
+    for _ in range(3):
+      token_bucket.acquire()
+
+    clock.now += 60
+    for _ in range(3):
+      token_bucket.acquire()
+    self.assertEqual(clock.sleeps, [])
+
+    token_bucket.acquire()
+    self.assertEqual(len(clock.sleeps), 1)
+
+
+if __name__ == '__main__':
+  unittest.main()
@@ -0,0 +1,57 @@
+import unittest
+
+from utils.response_cache import CachedResponse, ResponseCache
+
+
+class FakeClock:
+  def __init__(self):
+    self.now = 0.0
+
+  def __call__(self):
+    return self.now
+
+
+class ResponseCacheTest(unittest.TestCase):
+  def setUp(self):
+    self.clock = FakeClock()
+    self.cache = ResponseCache(max_entries=2, ttl_seconds=60, clock=self.clock)
+
+  def test_returns_entry_until_ttl_expires(self):
+    response = CachedResponse.from_body(b'{"rooms":[]}')
+    self.cache.put('rooms', response)
+
+    self.clock.now = 59
+    self.assertIs(self.cache.get('rooms'), response)
+    self.clock.now = 60
+    self.assertIsNone(self.cache.get('rooms'))
+    self.assertEqual(self.cache.get_stats(), { 'entries': 0, 'hits': 1, 'misses': 1 })
+
+  def test_evicts_least_recently_used(self):
+    self.cache.put('a', CachedResponse.from_body(b'a'))
+    self.cache.put('b', CachedResponse.from_body(b'b'))
+    self.cache.get('a')
+    self.cache.put('c', CachedResponse.from_body(b'c'))
+
+    self.assertIsNotNone(self.cache.get('a'))
+    self.assertIsNone(self.cache.get('b'))
+    self.assertIsNotNone(self.cache.get('c'))
+
+  def test_data_version_in_key_separates_entries(self):
+    self.cache.put(('availability', 1), CachedResponse.from_body(b'before'))
+
+    self.assertIsNone(self.cache.get(('availability', 2)))
+
+  def test_disabled_cache_stores_nothing(self):
+    cache = ResponseCache(max_entries=10, ttl_seconds=0, clock=self.clock)
+    cache.put('rooms', CachedResponse.from_body(b'{}'))
+
+    self.assertFalse(cache.enabled)
+    self.assertIsNone(cache.get('rooms'))
+
+  def test_etag_follows_body(self):
+    self.assertEqual(CachedResponse.from_body(b'x').etag, CachedResponse.from_body(b'x').etag)
+    self.assertNotEqual(CachedResponse.from_body(b'x').etag, CachedResponse.from_body(b'y').etag)
+
+
+if __name__ == '__main__':
+  unittest.main()
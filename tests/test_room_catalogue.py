@@ -0,0 +1,37 @@
+import unittest
+from unittest.mock import patch
+
+from utils.data_access.room_catalogue import RoomCatalogue
+
+ROOMS = [
+  { 'room_id': '太', 'room_status': 'available' },
+  { 'room_id': '月', 'room_status': 'available' },
+  { 'room_id': '藍', 'room_status': 'closed' },
+]
+
+
+class RoomCatalogueTest(unittest.TestCase):
+  def setUp(self):
+    self.room_catalogue = RoomCatalogue(ttl_seconds=60)
+    self.room_catalogue.load(ROOMS)
+
+  def test_filters_rooms_in_catalogue_order(self):
+    self.assertEqual([room['room_id'] for room in self.room_catalogue.get_rooms(['藍', '太'])], ['太', '藍'])
+    self.assertEqual(len(self.room_catalogue.get_rooms()), 3)
+
+  def test_returned_rooms_are_copies(self):
+    self.room_catalogue.get_rooms(['太'])[0]['room_status'] = 'closed'
+    self.assertEqual(self.room_catalogue.get_rooms(['太'])[0]['room_status'], 'available')
+
+  def test_expires_after_ttl(self):
+    self.assertTrue(self.room_catalogue.is_fresh())
+    with patch('utils.data_access.room_catalogue.time.monotonic', return_value=self.room_catalogue.loaded_at + 61):
+      self.assertFalse(self.room_catalogue.is_fresh())
+
+  def test_invalidate_marks_catalogue_stale(self):
+    self.room_catalogue.invalidate()
+    self.assertFalse(self.room_catalogue.is_fresh())
+
+
+if __name__ == '__main__':
+  unittest.main()
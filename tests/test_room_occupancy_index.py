@@ -0,0 +1,57 @@
+import unittest
+from datetime import date
+
+from utils.data_access.room_occupancy_index import RoomOccupancyIndex
+
+
+class RoomOccupancyIndexTest(unittest.TestCase):
+  def setUp(self):
+    self.occupancy_index = RoomOccupancyIndex()
+    self.occupancy_index.load(
+      ["太", "月", "藍"],
+      [(1, "太", date(2026, 7, 10), date(2026, 7, 11))],
+      [(5, "月", date(2026, 7, 11), date(2026, 7, 11))],
+    )
+
+  def test_rooms_occupied_by_booking_or_closure_are_unavailable(self):
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 11), date(2026, 7, 12)),
+      ["藍"],
+    )
+
+  def test_nights_outside_existing_holders_are_available(self):
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 12), date(2026, 7, 13)),
+      ["太", "月", "藍"],
+    )
+
+  def test_excluded_booking_does_not_block_its_own_rooms(self):
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 10), date(2026, 7, 10), exclude_booking_id=1),
+      ["太", "月", "藍"],
+    )
+
+  def test_set_booking_replaces_previous_room_nights(self):
+    self.occupancy_index.set_booking(1, "藍", date(2026, 7, 20), date(2026, 7, 20))
+
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 10), date(2026, 7, 10)),
+      ["太", "月", "藍"],
+    )
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 20), date(2026, 7, 20)),
+      ["太", "月"],
+    )
+
+  def test_removed_booking_and_closure_free_their_rooms(self):
+    self.occupancy_index.remove_booking(1)
+    self.occupancy_index.remove_closure(5)
+
+    self.assertEqual(
+      self.occupancy_index.get_available_room_ids(date(2026, 7, 10), date(2026, 7, 11)),
+      ["太", "月", "藍"],
+    )
+
+
+if __name__ == "__main__":
+  unittest.main()
@@ -1,8 +1,16 @@
 import unittest
-from datetime import date
+from datetime import date, timedelta
 
 from utils.taiwan_holiday_utils import (
+  DAY_FLAG_BOOKING_HOLIDAY_NIGHT,
+  DAY_FLAG_HOLIDAY,
+  count_booking_holiday_nights,
+  get_booking_holiday_night_dates,
+  get_booking_holiday_nights,
+  get_day_flags,
+  get_public_bookable_nights,
   is_booking_holiday_night,
+  is_public_bookable_night,
   is_taiwan_workday,
 )
 
@@ -26,6 +34,34 @@ class TaiwanHolidayUtilsTest(unittest.TestCase):
   def test_holiday_observed_monday_is_not_a_workday(self):
     self.assertFalse(is_taiwan_workday(date(2026, 4, 6)))
 
+  def test_makeup_workday_saturday_is_a_workday(self):
+    self.assertTrue(is_taiwan_workday(date(2025, 2, 8)))
+
+  def test_day_flags_slice_spans_year_boundary(self):
+    day_flags = get_day_flags(date(2025, 12, 30), date(2026, 1, 2))
+    self.assertEqual(len(day_flags), 4)
+    self.assertTrue(day_flags[2] & DAY_FLAG_HOLIDAY)
+    self.assertFalse(day_flags[0] & DAY_FLAG_HOLIDAY)
+
+  def test_range_flags_match_single_day_lookups(self):
+    start_date, last_date = date(2025, 1, 1), date(2027, 12, 31)
+    days = [start_date + timedelta(days=offset) for offset in range((last_date - start_date).days + 1)]
+    self.assertEqual(get_booking_holiday_nights(start_date, last_date), [is_booking_holiday_night(day) for day in days])
+    self.assertEqual(get_public_bookable_nights(start_date, last_date), [is_public_bookable_night(day) for day in days])
+    self.assertEqual(
+      get_booking_holiday_night_dates(start_date, last_date),
+      [day for day in days if is_booking_holiday_night(day)]
+    )
+    self.assertEqual(count_booking_holiday_nights(start_date, last_date), sum(get_booking_holiday_nights(start_date, last_date)))
+
+  def test_year_outside_holiday_table_uses_weekend_rules(self):
+    self.assertTrue(is_booking_holiday_night(date(2030, 6, 15)))
+    self.assertFalse(is_booking_holiday_night(date(2030, 6, 16)))
+    self.assertEqual(get_day_flags(date(2030, 6, 15), date(2030, 6, 15))[0] & DAY_FLAG_BOOKING_HOLIDAY_NIGHT, DAY_FLAG_BOOKING_HOLIDAY_NIGHT)
+
+  def test_empty_range_has_no_flags(self):
+    self.assertEqual(get_day_flags(date(2026, 1, 2), date(2026, 1, 1)), b'')
+
 
 if __name__ == '__main__':
   unittest.main()
@@ -0,0 +1,170 @@
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from dataclasses import asdict, dataclass, field
+from datetime import datetime
+from typing import Optional
+
+BACKUP_TYPE_FULL = 'full'
+BACKUP_TYPE_INCREMENTAL = 'incremental'
+
+HASH_CHUNK_BYTES = 1024 * 1024
+
+
+class ContentStore:
+  """
+  Keeps backup files under objects/ named by the SHA-256 of their content, so a file that did
+  not change between backups (a table dump, a key list) is stored once.
+  """
+
+  def __init__(self, root):
+    self.root = root
+    self.objects_dir = os.path.join(root, 'objects')
+
+  def object_path(self, digest) -> str:
+    return os.path.join(self.objects_dir, digest[:2], digest[2:])
+
+  def put_file(self, path) -> str:
+    """Adds the file to the store unless an identical one is already there and returns its digest."""
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as f:
+      for chunk in iter(lambda: f.read(HASH_CHUNK_BYTES), b''):
+        sha256.update(chunk)
+    digest = sha256.hexdigest()
+
+    object_path = self.object_path(digest)
+    if not os.path.exists(object_path):
+      os.makedirs(os.path.dirname(object_path), exist_ok=True)
+      fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(object_path), suffix='.tmp')
+      os.close(fd)
+      try:
+        shutil.copyfile(path, temp_path)
+        os.replace(temp_path, object_path)
+      except BaseException:
+        if os.path.exists(temp_path):
+          os.remove(temp_path)
+        raise
+    return digest
+
+  def put_directory(self, directory) -> dict[str, str]:
+    """Adds every file of a flat directory, e.g. a pg_dump directory-format dump, keyed by file name."""
+    return {
+      name: self.put_file(os.path.join(directory, name))
+      for name in sorted(os.listdir(directory))
+      if os.path.isfile(os.path.join(directory, name))
+    }
+
+  def materialize(self, files: dict[str, str], directory):
+    """Lays the files of a manifest out under their names in directory, hard-linked when possible."""
+    os.makedirs(directory, exist_ok=True)
+    for name, digest in files.items():
+      target_path = os.path.join(directory, name)
+      try:
+        os.link(self.object_path(digest), target_path)
+      except OSError:
+        shutil.copyfile(self.object_path(digest), target_path)
+
+  def remove_unreferenced(self, live_digests: set[str]) -> int:
+    removed_count = 0
+    if not os.path.isdir(self.objects_dir):
+      return removed_count
+    for prefix in os.listdir(self.objects_dir):
+      prefix_dir = os.path.join(self.objects_dir, prefix)
+      for name in os.listdir(prefix_dir):
+        if prefix + name not in live_digests:
+          os.remove(os.path.join(prefix_dir, name))
+          removed_count += 1
+    return removed_count
+
+
+@dataclass
+class BackupManifest:
+  """
+  One backup: a full pg_dump or an incremental change set on top of the full backup named in base.
+
+  snapshot_time is the database time the backup reflects; an incremental holds the rows changed
+  since its since time, plus the key lists used to replay deletions.
+  """
+  name: str
+  backup_type: str
+  snapshot_time: datetime
+  files: dict[str, str] = field(default_factory=dict)
+  base: Optional[str] = None
+  since: Optional[datetime] = None
+  tables: dict[str, dict] = field(default_factory=dict)
+
+  def to_json(self) -> str:
+    data = asdict(self)
+    data['snapshot_time'] = self.snapshot_time.isoformat()
+    data['since'] = self.since.isoformat() if self.since else None
+    return json.dumps(data, ensure_ascii=False, indent=2, sort_keys=True)
+
+  @classmethod
+  def from_json(cls, text) -> 'BackupManifest':
+    data = json.loads(text)
+    data['snapshot_time'] = datetime.fromisoformat(data['snapshot_time'])
+    data['since'] = datetime.fromisoformat(data['since']) if data.get('since') else None
+    return cls(**data)
+
+
+def get_manifests_dir(root) -> str:
+  return os.path.join(root, 'manifests')
+
+
+def save_manifest(root, manifest: BackupManifest):
+  manifests_dir = get_manifests_dir(root)
+  os.makedirs(manifests_dir, exist_ok=True)
+  path = os.path.join(manifests_dir, f'{manifest.name}.json')
+  temp_path = f'{path}.tmp'
+  with open(temp_path, 'w', encoding='utf-8') as f:
+    f.write(manifest.to_json())
+  os.replace(temp_path, path)
+
+
+def load_manifests(root) -> list[BackupManifest]:
+  """Returns the manifests under root, oldest snapshot first."""
+  manifests_dir = get_manifests_dir(root)
+  if not os.path.isdir(manifests_dir):
+    return []
+  manifests = []
+  for name in os.listdir(manifests_dir):
+    if name.endswith('.json'):
+      with open(os.path.join(manifests_dir, name), 'r', encoding='utf-8') as f:
+        manifests.append(BackupManifest.from_json(f.read()))
+  return sorted(manifests, key=lambda manifest: manifest.snapshot_time)
+
+
+def delete_manifest(root, manifest: BackupManifest):
+  os.remove(os.path.join(get_manifests_dir(root), f'{manifest.name}.json'))
+
+
+def get_restore_chain(manifests: list[BackupManifest], target_time: Optional[datetime]=None) -> list[BackupManifest]:
+  """
+  Returns the backups to restore, in order, to rebuild the state at target_time (the latest
+  state by default): the last full backup taken by then and its incrementals up to then.
+  """
+  eligible = [
+    manifest for manifest in manifests
+    if target_time is None or manifest.snapshot_time <= target_time
+  ]
+  full_backups = [manifest for manifest in eligible if manifest.backup_type == BACKUP_TYPE_FULL]
+  if not full_backups:
+    return []
+  full_backup = full_backups[-1]
+  incrementals = [
+    manifest for manifest in eligible
+    if manifest.backup_type == BACKUP_TYPE_INCREMENTAL and manifest.base == full_backup.name
+  ]
+  return [full_backup, *incrementals]
+
+
+def get_expired_manifests(manifests: list[BackupManifest], keep_full_backups: int) -> list[BackupManifest]:
+  """Returns the full backups older than the newest keep_full_backups ones, with their incrementals."""
+  full_backup_names = [manifest.name for manifest in manifests if manifest.backup_type == BACKUP_TYPE_FULL]
+  expired_names = set(full_backup_names[:-keep_full_backups] if keep_full_backups > 0 else full_backup_names)
+  return [
+    manifest for manifest in manifests
+    if manifest.name in expired_names or manifest.base in expired_names
+  ]
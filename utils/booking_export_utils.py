@@ -0,0 +1,130 @@
+import csv
+import gzip
+import json
+import os
+import tempfile
+from contextlib import ExitStack, contextmanager
+from typing import Iterable
+from utils.booking_utils import format_booking_info
+from utils.data_access.data_class.booking_info import BookingInfo
+
+EXPORT_FORMAT_TEXT = 'text'
+EXPORT_FORMAT_JSONL = 'jsonl'
+EXPORT_FORMAT_CSV = 'csv'
+
+EXPORT_CSV_FIELDS = [
+  'booking_id', 'status', 'customer_name', 'phone_number', 'check_in_date', 'last_date', 'total_price',
+  'notes', 'source', 'prepayment', 'prepayment_note', 'prepayment_status', 'room_ids', 'extra_bed_counts',
+  'created', 'modified',
+]
+
+
+@contextmanager
+def atomic_open(path, compress=False):
+  """
+  Opens a temporary file next to path for writing text and renames it over path once the block
+  succeeds, so readers never see a partial export. The temporary file is removed on error.
+  """
+  directory = os.path.dirname(path) or '.'
+  os.makedirs(directory, exist_ok=True)
+  fd, temp_path = tempfile.mkstemp(dir=directory, prefix=f'.{os.path.basename(path)}.', suffix='.tmp')
+  try:
+    if compress:
+      os.close(fd)
+      f = gzip.open(temp_path, 'wt', encoding='utf-8', newline='')
+    else:
+      f = os.fdopen(fd, 'w', encoding='utf-8', newline='')
+    with f:
+      yield f
+    os.replace(temp_path, path)
+  except BaseException:
+    if os.path.exists(temp_path):
+      os.remove(temp_path)
+    raise
+
+
+def booking_to_export_record(booking_info: BookingInfo) -> dict:
+  return {
+    'booking_id': booking_info.booking_id,
+    'status': booking_info.status,
+    'customer_name': booking_info.customer_name,
+    'phone_number': booking_info.phone_number,
+    'check_in_date': booking_info.check_in_date.isoformat(),
+    'last_date': booking_info.last_date.isoformat(),
+    'total_price': int(booking_info.total_price),
+    'notes': booking_info.notes,
+    'source': booking_info.source,
+    'prepayment': int(booking_info.prepayment),
+    'prepayment_note': booking_info.prepayment_note,
+    'prepayment_status': booking_info.prepayment_status,
+    'room_ids': booking_info.room_ids,
+    'extra_bed_counts': booking_info.extra_bed_counts,
+    'created': booking_info.created.isoformat() if booking_info.created else None,
+    'modified': booking_info.modified.isoformat() if booking_info.modified else None,
+  }
+
+
+class TextExportWriter:
+  """The format written by the export job before JSONL and CSV: formatted bookings separated by blank lines."""
+
+  def __init__(self, f):
+    self.f = f
+    self.started = False
+
+  def write(self, booking_info: BookingInfo):
+    if self.started:
+      self.f.write('\n')
+    self.f.write(format_booking_info(booking_info))
+    self.f.write('\n\n')
+    self.started = True
+
+
+class JsonlExportWriter:
+  def __init__(self, f):
+    self.f = f
+
+  def write(self, booking_info: BookingInfo):
+    self.f.write(json.dumps(booking_to_export_record(booking_info), ensure_ascii=False))
+    self.f.write('\n')
+
+
+class CsvExportWriter:
+  def __init__(self, f):
+    self.writer = csv.DictWriter(f, fieldnames=EXPORT_CSV_FIELDS)
+    self.writer.writeheader()
+
+  def write(self, booking_info: BookingInfo):
+    record = booking_to_export_record(booking_info)
+    record['extra_bed_counts'] = json.dumps(record['extra_bed_counts'], ensure_ascii=False)
+    self.writer.writerow(record)
+
+
+EXPORT_WRITERS = {
+  EXPORT_FORMAT_TEXT: TextExportWriter,
+  EXPORT_FORMAT_JSONL: JsonlExportWriter,
+  EXPORT_FORMAT_CSV: CsvExportWriter,
+}
+
+
+def export_bookings(bookings: Iterable[BookingInfo], paths: dict[str, str]) -> int:
+  """
+  Writes bookings to every requested format in a single pass, one booking at a time.
+
+  Args:
+      bookings (Iterable[BookingInfo]): Bookings in export order, e.g. a streaming iterator.
+      paths (dict[str, str]): Output path keyed by format; paths ending in .gz are gzip-compressed.
+
+  Returns:
+      int: Number of exported bookings.
+  """
+  count = 0
+  with ExitStack() as stack:
+    writers = [
+      EXPORT_WRITERS[export_format](stack.enter_context(atomic_open(path, compress=path.endswith('.gz'))))
+      for export_format, path in paths.items()
+    ]
+    for booking_info in bookings:
+      for writer in writers:
+        writer.write(booking_info)
+      count += 1
+  return count
@@ -2,6 +2,7 @@ import datetime
 import typing
 from const.booking_const import GENERIC_NAMES, BOOKING_STATUS_MARK, PREPAYMENT_STATUS_MAP, GENERIC_PHONE_NUMBER_POSTFIX, ROOM_TYPES
 from utils.data_access.data_class.booking_info import BookingInfo
+from utils.data_access.data_class.monthly_booking_stats import MonthlyBookingStats
 from utils.input_utils import format_phone_number_for_display
 
 # Function to format the booking info as per the required format
@@ -161,7 +162,18 @@ def format_extra_bed_counts(extra_bed_counts):
 def get_prepayment_estimation(total_price):
   return int(int(total_price) * 0.3 // 100 * 100)
 
-def generate_report(year_month: str, bookings: list[BookingInfo]):
+def get_booking_financials(booking_info: BookingInfo) -> tuple[int, int, int]:
+  """Returns the Booking.com commission, staff share and balance of a booking."""
+  amount_for_booking_com = int(booking_info.total_price * .12) if booking_info.source == 'Booking_com' else 0
+  amount_for_staff = int((booking_info.total_price - amount_for_booking_com) * .2)
+  amount_left = int(booking_info.total_price - amount_for_booking_com - amount_for_staff)
+  return amount_for_booking_com, amount_for_staff, amount_left
+
+def generate_report(year_month: str, bookings: list[BookingInfo], monthly_stats: typing.Optional[MonthlyBookingStats]=None):
+  """
+  Formats the monthly report. The totals and room type figures come from monthly_stats when
+  given, otherwise the totals are summed from bookings.
+  """
   message = (
     f"##### {year_month}月報表  #####\n\n"
     f"------------------------------\n\n"
@@ -172,9 +184,7 @@ def generate_report(year_month: str, bookings: list[BookingInfo]):
   total_amount_for_staff = 0
   total_amount_left = 0
   for booking_info in bookings:
-    amount_for_booking_com = int(booking_info.total_price * .12) if booking_info.source == 'Booking_com' else 0
-    amount_for_staff = int((booking_info.total_price - amount_for_booking_com) * .2)
-    amount_left = int(booking_info.total_price - amount_for_booking_com - amount_for_staff)
+    amount_for_booking_com, amount_for_staff, amount_left = get_booking_financials(booking_info)
 
     total_revenue += int(booking_info.total_price)
     total_amount_for_booking_com += amount_for_booking_com
@@ -192,6 +202,12 @@ def generate_report(year_month: str, bookings: list[BookingInfo]):
   message += f"------------------------------\n\n"
   message += f"[總結]\n"
 
+  if monthly_stats:
+    total_revenue = monthly_stats.total_revenue
+    total_amount_for_booking_com = monthly_stats.booking_com_commission
+    total_amount_for_staff = monthly_stats.staff_share
+    total_amount_left = monthly_stats.balance
+
   message += (
     f"營業額：{total_revenue}\n"
     f"Booking_com佣金：{total_amount_for_booking_com}\n"
@@ -199,6 +215,15 @@ def generate_report(year_month: str, bookings: list[BookingInfo]):
     f"結餘：{total_amount_left}"
   )
 
+  if monthly_stats and monthly_stats.room_types:
+    room_type_names = { room_type: room_type_name for room_type, room_type_name, _ in ROOM_TYPES }
+    message += f"\n\n[房型]\n"
+    message += '\n'.join(
+      f"{room_type_names.get(stats.room_type, stats.room_type)}：住房率{stats.occupancy_rate:.0%}，"
+      f"ADR {stats.adr}，RevPAR {stats.revpar}"
+      for stats in monthly_stats.room_types
+    )
+
   return message
 
 def get_booking_room_brief(room_type_summary: dict[str, int]={}, extra_bed_count=0):
@@ -0,0 +1,32 @@
+from datetime import datetime
+from typing import Optional
+from utils.data_access.data_class.booking_info import BookingInfo
+from utils.data_access.data_class.change_batch import ChangeBatch
+from utils.data_access.data_class.closure_info import ClosureInfo
+
+
+def load_changed_bookings_and_closures(booking_dao, consumer, latest_sync_time: datetime) -> Optional[tuple[ChangeBatch, list[BookingInfo], list[ClosureInfo]]]:
+  """
+  Loads the bookings and closures changed since the consumer's change feed cursor. A consumer
+  without a cursor yet loads those created or modified since latest_sync_time instead; the batch
+  snapshot was taken first, so nothing committed in between is missed once it is saved.
+
+  Returns:
+      Optional[tuple]: The batch, whose snapshot to save once synced, with the bookings and
+      closures in ID order, or None when any of them failed to load.
+  """
+  batch = booking_dao.read_changes(consumer)
+  if batch is None:
+    return None
+
+  if batch.is_initial:
+    bookings = booking_dao.get_latest_bookings(latest_sync_time)
+    closures = booking_dao.get_latest_closures(latest_sync_time)
+  else:
+    bookings_by_id = booking_dao.get_bookings_by_ids(batch.booking_ids)
+    bookings = [bookings_by_id[booking_id] for booking_id in sorted(bookings_by_id)] if bookings_by_id is not None else None
+    closures = booking_dao.get_closures_by_ids(batch.closure_ids)
+
+  if bookings is None or closures is None:
+    return None
+  return batch, bookings, closures
@@ -1,50 +1,105 @@
+import calendar
+import csv
+import json
+import select
+import tempfile
+import threading
+import time
+import weakref
 import psycopg2
-import psycopg2.pool
+from psycopg2.errors import ExclusionViolation, InvalidSqlStatementName
 from contextlib import contextmanager
-from typing import Optional
+from dataclasses import replace
+from typing import Iterable, Iterator, Optional
 from datetime import datetime, timedelta
 from utils.booking_utils import is_generic_name, is_generic_phone_number
 from utils.datetime_utils import get_local_today
-from utils.taiwan_holiday_utils import is_booking_holiday_night
-from utils.line_notification_service import LineNotificationService
-from const.booking_const import EXTRA_BED_PRICE_PER_NIGHT
+from utils.pricing_utils import PriceQuote, quote_stay
+from utils.line_notification_service import LineNotification, LineNotificationService
+from .booking_projection import (
+  ALL_BOOKINGS, BOOKING_BY_ID, BOOKINGS_BY_CHECK_IN_RANGE, BOOKINGS_BY_DATE, BOOKINGS_BY_IDS, BOOKINGS_NOT_PREPAID,
+  LATEST_BOOKINGS, OVERLAPPING_BOOKINGS_BY_PHONE, BookingQuery, booking_info_from_row
+)
+from .booking_search import BOOKINGS_BY_KEYWORD, get_keyword_search_params
 from .data_class.booking_info import BookingInfo
 from .data_class.closure_info import ClosureInfo
+from .data_class.change_batch import ChangeBatch
 from .data_class.customer import Customer
+from .data_class.job_run import JobRun
+from .data_class.monthly_booking_stats import MonthlyBookingStats, RoomTypeStats
+from .room_occupancy_index import RoomOccupancyIndex
+from .room_catalogue import RoomCatalogue
+from .connection_pool import HealthCheckedConnectionPool
+
+ROOMS_CHANGED_CHANNEL = 'rooms_changed'
+BOOKING_CHANGES_CHANNEL = 'booking_changes'
+ROOM_CHANGE_LISTENER_POLL_SECONDS = 60
+ROOM_CHANGE_LISTENER_RETRY_SECONDS = 30
+CHANGE_ENTITY_BOOKING = 'booking'
+CHANGE_ENTITY_CLOSURE = 'closure'
+BULK_IMPORT_SPOOL_BYTES = 8 * 1024 * 1024
+
+
+class RoomsUnavailableError(Exception):
+  """Raised when a write would make a room overlap another non-canceled booking."""
+
+  def __init__(self, booking_id, room_ids):
+    super().__init__(f"Rooms {room_ids} of booking {booking_id} are already booked for the same nights")
+    self.booking_id = booking_id
+    self.room_ids = room_ids
 
 
 class BookingDAO:
   _instance = None
+  _instance_lock = threading.Lock()
 
   def __init__(self, db_config, logger, enable_notification):
     self.db_config = db_config
     self.logger = logger
     self.enable_notification = enable_notification
+    self.line_notification_service = LineNotificationService(logger)
+    self.notification_dispatcher = None
     self.connection_pool = None
+    self.occupancy_index = None
+    # Held while the index is swapped or updated in place; the change count lets a rebuild notice
+    # updates made after it read the database, which its copy would otherwise silently drop
+    self._occupancy_index_lock = threading.Lock()
+    self._occupancy_index_load_lock = threading.Lock()
+    self._occupancy_index_changes = 0
+    self.room_catalogue = RoomCatalogue(self.db_config.ROOM_CATALOGUE_CACHE_SECONDS) if self.db_config.ROOM_CATALOGUE_CACHE_SECONDS > 0 else None
+    self._room_catalogue_lock = threading.Lock()
+    # Bumped by every booking, closure and room write seen by this process, so caches of data
+    # derived from them (e.g. public API responses) can key on it
+    self.data_version = 0
+    self._data_version_lock = threading.Lock()
+    # Names of the statements prepared on each pooled connection; entries go away with the connection
+    self._prepared_statements = weakref.WeakKeyDictionary()
+    self._prepared_statements_lock = threading.Lock()
     self.create_connection_pool()
+    if self.db_config.OCCUPANCY_INDEX_ENABLED:
+      self.load_occupancy_index()
+      # Bookings and closures written by the scheduler and the other gunicorn workers
+      if self.db_config.OCCUPANCY_INDEX_LISTEN_ENABLED:
+        self.start_change_listener(self.invalidate_caches)
+    if self.room_catalogue and self.db_config.ROOM_CATALOGUE_LISTEN_ENABLED:
+      self.start_room_change_listener()
 
   def create_connection_pool(self):
     if self.connection_pool:
       return self.connection_pool
 
     try:
-      connection_options = {
-        "user": self.db_config.DB_USER,
-        "password": self.db_config.DB_PASSWORD,
-        "host": self.db_config.DB_HOST,
-        "port": self.db_config.DB_PORT,
-        "database": self.db_config.DB_NAME,
-        "connect_timeout": self.db_config.DB_CONNECT_TIMEOUT
-      }
-      if self.db_config.DB_SSLMODE:
-        connection_options["sslmode"] = self.db_config.DB_SSLMODE
-      if self.db_config.DB_SSLROOTCERT:
-        connection_options["sslrootcert"] = self.db_config.DB_SSLROOTCERT
-
-      # Create a connection pool with min and max connections
-      self.connection_pool = psycopg2.pool.SimpleConnectionPool(
-        1, 20,  # Min 1 and Max 20 connections in the pool
-        **connection_options
+      connection_options = self.get_connection_options()
+
+      # Create a thread-safe connection pool that pings stale connections and recycles old ones
+      self.connection_pool = HealthCheckedConnectionPool(
+        int(self.db_config.DB_POOL_MIN_CONN),
+        int(self.db_config.DB_POOL_MAX_CONN),
+        lambda: psycopg2.connect(**connection_options),
+        timeout=float(self.db_config.DB_POOL_TIMEOUT),
+        max_idle_seconds=float(self.db_config.DB_POOL_MAX_IDLE_SECONDS),
+        max_lifetime_seconds=float(self.db_config.DB_POOL_MAX_LIFETIME_SECONDS),
+        logger=self.logger
       )
       if self.connection_pool:
         self.logger.info("Connection pool created successfully")
@@ -53,10 +108,26 @@ class BookingDAO:
       self.logger.error(f"Error while creating the connection pool: {error}")
     return self.connection_pool
 
+  def get_connection_options(self) -> dict:
+    connection_options = {
+      "user": self.db_config.DB_USER,
+      "password": self.db_config.DB_PASSWORD,
+      "host": self.db_config.DB_HOST,
+      "port": self.db_config.DB_PORT,
+      "database": self.db_config.DB_NAME,
+      "connect_timeout": self.db_config.DB_CONNECT_TIMEOUT
+    }
+    if self.db_config.DB_SSLMODE:
+      connection_options["sslmode"] = self.db_config.DB_SSLMODE
+    if self.db_config.DB_SSLROOTCERT:
+      connection_options["sslrootcert"] = self.db_config.DB_SSLROOTCERT
+    return connection_options
+
   @classmethod
   def get_instance(cls, db_config=None, logger=None, enable_notification=True):
-    if cls._instance is None:
-      cls._instance = BookingDAO(db_config, logger, enable_notification)
+    with cls._instance_lock:
+      if cls._instance is None:
+        cls._instance = BookingDAO(db_config, logger, enable_notification)
     return cls._instance
 
   def get_connection(self):
@@ -97,6 +168,33 @@ class BookingDAO:
         cursor.close()
       self.release_connection(connection)
 
+  @contextmanager
+  def transaction(self):
+    """Yields a cursor whose statements are committed together, or rolled back on error."""
+    connection = self.get_connection()
+    if not connection:
+      yield None
+      return
+
+    cursor = None
+    try:
+      connection.autocommit = False
+      cursor = connection.cursor()
+      yield cursor
+      connection.commit()
+    except Exception:
+      connection.rollback()
+      raise
+    finally:
+      if cursor:
+        cursor.close()
+      self.release_connection(connection)
+
+  def get_connection_pool_stats(self) -> Optional[dict]:
+    if not self.connection_pool:
+      return None
+    return self.connection_pool.get_stats()
+
   def close_all_connections(self):
     try:
       self.connection_pool.closeall()
@@ -104,29 +202,28 @@ class BookingDAO:
     except Exception as e:
       self.logger.error(f"Error closing all connections in the pool: {e}")
 
-  def _booking_info_from_row(self, row) -> BookingInfo:
-    extra_bed_counts = {
-      room_id: int(count)
-      for room_id, count in (row[13] or {}).items()
-    }
-    return BookingInfo(
-      booking_id=row[0],
-      status=row[1],
-      customer_name=row[2],
-      phone_number=row[3],
-      check_in_date=row[4],
-      last_date=row[5],
-      total_price=int(row[6] or 0),
-      notes=row[7] or '',
-      source=row[8],
-      prepayment=int(row[9] or 0),
-      prepayment_note=row[10] or '',
-      prepayment_status=row[11],
-      room_ids=row[12],
-      extra_bed_counts=extra_bed_counts,
-      created=row[14],
-      modified=row[15]
-    )
+  def _query_bookings(self, cursor, booking_query: BookingQuery, params=()) -> list[BookingInfo]:
+    """Runs a booking projection query, preparing it on the cursor's connection the first time."""
+    if not (booking_query.prepared and self.db_config.DB_PREPARED_STATEMENTS_ENABLED):
+      cursor.execute(booking_query.direct_sql, booking_query.direct_params(params))
+      return [booking_info_from_row(row) for row in cursor.fetchall()]
+
+    with self._prepared_statements_lock:
+      prepared_names = self._prepared_statements.setdefault(cursor.connection, set())
+    if booking_query.name not in prepared_names:
+      cursor.execute(booking_query.prepare_sql)
+      prepared_names.add(booking_query.name)
+    try:
+      cursor.execute(booking_query.execute_sql, tuple(params))
+    except InvalidSqlStatementName:
+      # Dropped on the server (e.g. DISCARD ALL); prepared again on the next call
+      prepared_names.discard(booking_query.name)
+      raise
+    return [booking_info_from_row(row) for row in cursor.fetchall()]
+
+  def _fetch_booking_info(self, cursor, booking_id) -> Optional[BookingInfo]:
+    bookings = self._query_bookings(cursor, BOOKING_BY_ID, (booking_id,))
+    return bookings[0] if bookings else None
 
   # Function to query the booking info by booking_id
   def get_booking_info(self, booking_id) -> Optional[BookingInfo]:
@@ -135,53 +232,64 @@ class BookingDAO:
       with self.cursor() as cursor:
         if not cursor:
           return None
-
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.booking_id = %s
-        GROUP BY b.booking_id, c.customer_id;
-        """
-        cursor.execute(query, (booking_id,))
-        row = cursor.fetchone()
-
-      if (row):
-        booking_info = self._booking_info_from_row(row)
+        booking_info = self._fetch_booking_info(cursor, booking_id)
     except Exception as e:
       self.logger.error(f"Error querying booking info: {e}")
     return booking_info
 
-  def upsert_booking(self, booking_info: BookingInfo) -> Optional[int]:
-    existing_booking_info = self.get_booking_info(booking_info.booking_id)
-    is_customer_changed = (
-      existing_booking_info and (
-        existing_booking_info.customer_name != booking_info.customer_name or
-        existing_booking_info.phone_number != booking_info.phone_number
-      )
-    )
+  def get_bookings_by_ids(self, booking_ids) -> Optional[dict[int, BookingInfo]]:
+    """Returns the bookings of booking_ids keyed by booking ID, in one query; missing IDs are left out."""
+    if not booking_ids:
+      return {}
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
 
-    # upsert customer first
-    customer_id = self.upsert_customer(Customer(
-      name=booking_info.customer_name,
-      phone_number=booking_info.phone_number
-    ))
+        bookings = self._query_bookings(cursor, BOOKINGS_BY_IDS, (list(booking_ids),))
+      return { booking_info.booking_id: booking_info for booking_info in bookings }
+    except Exception as e:
+      self.logger.error(f"Error querying bookings by IDs: {e}")
+      return None
+
+  def upsert_booking(self, booking_info: BookingInfo, notify_admins=False) -> Optional[int]:
+    """
+    Creates or updates a booking with its customer and rooms.
+
+    With notify_admins, the prepayment reminder for the LINE admins of a new website booking is
+    queued in the same transaction, so it is sent exactly when the booking is committed.
+
+    Returns:
+        The booking ID, or None on database errors.
 
+    Raises:
+        RoomsUnavailableError: A room is already booked by another booking for an overlapping night.
+    """
     booking_id = None
+    existing_booking_info = None
     try:
-      with self.cursor() as cursor:
+      # Read, customer upsert and booking writes share one connection and one transaction,
+      # so concurrent readers never observe a booking without its rooms.
+      with self.transaction() as cursor:
         if not cursor:
           return None
 
+        existing_booking_info = self._fetch_booking_info(cursor, booking_info.booking_id)
+        is_customer_changed = (
+          existing_booking_info and (
+            existing_booking_info.customer_name != booking_info.customer_name or
+            existing_booking_info.phone_number != booking_info.phone_number
+          )
+        )
+        if existing_booking_info and booking_info == existing_booking_info and not is_customer_changed:
+          return existing_booking_info.booking_id
+
+        customer_id = self._upsert_customer(cursor, Customer(
+          name=booking_info.customer_name,
+          phone_number=booking_info.phone_number
+        ))
+
         if existing_booking_info:
-          if booking_info == existing_booking_info and not is_customer_changed:
-            return existing_booking_info.booking_id
           booking_id = existing_booking_info.booking_id
           update_booking_query = """
           UPDATE Bookings
@@ -199,15 +307,8 @@ class BookingDAO:
             booking_info.prepayment_status,
             booking_info.source,
             booking_info.notes,
-            existing_booking_info.booking_id
+            booking_id
           ))
-
-          # Delete existing RoomBookings that relate to this booking_id
-          delete_room_bookings_query = """
-          DELETE FROM RoomBookings
-          WHERE booking_id = %s
-          """
-          cursor.execute(delete_room_bookings_query, (booking_id,))
         else:
           insert_query = """
           INSERT INTO Bookings (customer_id, status, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes)
@@ -227,36 +328,51 @@ class BookingDAO:
           ))
           booking_id = cursor.fetchone()[0]
 
-        # Insert room-booking relationships into RoomBookings table
-        for room_id in booking_info.room_ids:
-          insert_room_bookings_query = """
-          INSERT INTO RoomBookings (booking_id, room_id, extra_bed_count)
-          VALUES (%s, %s, %s);
-          """
-          cursor.execute(insert_room_bookings_query, (
-            booking_id,
-            room_id,
-            booking_info.extra_bed_counts.get(room_id, 0)
-          ))
-
-      if (self.enable_notification):
-        if existing_booking_info:
-          if (
-            existing_booking_info.status != booking_info.status
-          ):
-            if (booking_info.status == 'canceled'):
-              LineNotificationService(self.logger).notify_booking_canceled(booking_info)
-            elif (existing_booking_info.status == 'canceled'):
-              LineNotificationService(self.logger).notify_booking_restored(booking_info)
-            elif (booking_info.status == 'prepaid'):
-              LineNotificationService(self.logger).notify_booking_prepaid(booking_info)
-          elif (existing_booking_info != booking_info):
-            LineNotificationService(self.logger).notify_booking_updated(booking_info)
-        else:
-          LineNotificationService(self.logger).notify_booking_created(booking_info)
+        # Diff the room-booking relationships in one statement: drop rooms no longer booked,
+        # insert new ones and update changed extra bed counts
+        room_ids = list(booking_info.room_ids)
+        upsert_room_bookings_query = """
+        WITH deleted AS (
+          DELETE FROM RoomBookings
+          WHERE booking_id = %s AND NOT (room_id = ANY(%s::varchar[]))
+        )
+        INSERT INTO RoomBookings (booking_id, room_id, extra_bed_count)
+        SELECT %s, t.room_id, t.extra_bed_count
+        FROM UNNEST(%s::varchar[], %s::int[]) AS t(room_id, extra_bed_count)
+        ON CONFLICT (booking_id, room_id) DO UPDATE
+        SET extra_bed_count = EXCLUDED.extra_bed_count
+        WHERE RoomBookings.extra_bed_count IS DISTINCT FROM EXCLUDED.extra_bed_count;
+        """
+        cursor.execute(upsert_room_bookings_query, (
+          booking_id,
+          room_ids,
+          booking_id,
+          room_ids,
+          [int(booking_info.extra_bed_counts.get(room_id, 0)) for room_id in room_ids]
+        ))
 
+        if self.enable_notification:
+          self._enqueue_line_notifications(cursor, self.line_notification_service.booking_changed(
+            existing_booking_info,
+            replace(booking_info, booking_id=booking_id)
+          ))
+          if notify_admins:
+            self._enqueue_line_notifications(cursor, self.line_notification_service.public_booking_created_admins(
+              self._fetch_booking_info(cursor, booking_id),
+              self._fetch_room_type_summaries(cursor, [booking_id]).get(booking_id, {})
+            ))
+
+    except ExclusionViolation as e:
+      # Enforced by the room_bookings_no_overlap constraint, so concurrent writers cannot both win
+      self.logger.warning(f"Rejected upsert of booking {booking_info.booking_id}: {e}")
+      raise RoomsUnavailableError(booking_info.booking_id, booking_info.room_ids) from e
     except Exception as e:
-      self.logger.error(f"Error upsert booking {booking_id}: {e}")
+      self.logger.error(f"Error upsert booking {booking_info.booking_id}: {e}")
+      return None
+
+    self._update_occupancy_index_booking(booking_id, booking_info)
+    self.bump_data_version()
+    self._wake_notification_dispatcher()
     return booking_id
 
   def cancel_booking(self, booking_id):
@@ -267,7 +383,7 @@ class BookingDAO:
 
     success = False
     try:
-      with self.cursor() as cursor:
+      with self.transaction() as cursor:
         if not cursor:
           return False
 
@@ -279,11 +395,14 @@ class BookingDAO:
         """
         cursor.execute(query, (booking_id,))
         result = cursor.fetchone()
+        if result and self.enable_notification:
+          self._enqueue_line_notifications(cursor, self.line_notification_service.booking_canceled(existing_booking_info))
 
       if result:
         success = True
-        if (self.enable_notification):
-          LineNotificationService(self.logger).notify_booking_canceled(existing_booking_info)
+        self._update_occupancy_index(lambda occupancy_index: occupancy_index.remove_booking(booking_id))
+        self.bump_data_version()
+        self._wake_notification_dispatcher()
       else:
         self.logger.warning(f"Trying to cancel booking with ID {booking_id} but not found.")
 
@@ -299,7 +418,7 @@ class BookingDAO:
 
     success = False
     try:
-      with self.cursor() as cursor:
+      with self.transaction() as cursor:
         if not cursor:
           return False
 
@@ -315,15 +434,21 @@ class BookingDAO:
         """
         cursor.execute(query, (booking_id,))
         result = cursor.fetchone()
+        booking_info = self._fetch_booking_info(cursor, booking_id) if result else None
+        if booking_info and self.enable_notification:
+          self._enqueue_line_notifications(cursor, self.line_notification_service.booking_restored(booking_info))
 
       if result:
         success = True
-        booking_info = self.get_booking_info(booking_id)
-        if (self.enable_notification):
-          LineNotificationService(self.logger).notify_booking_restored(booking_info)
+        self._update_occupancy_index_booking(booking_id, booking_info or existing_booking_info)
+        self.bump_data_version()
+        self._wake_notification_dispatcher()
       else:
         self.logger.warning(f"Trying to restore booking with ID {booking_id} but not found.")
 
+    except ExclusionViolation as e:
+      self.logger.warning(f"Rejected restore of booking {booking_id}: {e}")
+      raise RoomsUnavailableError(booking_id, existing_booking_info.room_ids) from e
     except Exception as e:
       self.logger.error(f"Error restoring booking {booking_id}: {e}")
     return success
@@ -336,7 +461,7 @@ class BookingDAO:
 
     success = False
     try:
-      with self.cursor() as cursor:
+      with self.transaction() as cursor:
         if not cursor:
           return False
 
@@ -348,12 +473,13 @@ class BookingDAO:
         """
         cursor.execute(query, (int(prepayment), prepayment_note, booking_id))
         result = cursor.fetchone()
+        booking_info = self._fetch_booking_info(cursor, booking_id) if result else None
+        if booking_info and self.enable_notification:
+          self._enqueue_line_notifications(cursor, self.line_notification_service.booking_prepaid(booking_info))
 
       if result:
         success = True
-        booking_info = self.get_booking_info(booking_id)
-        if (self.enable_notification):
-          LineNotificationService(self.logger).notify_booking_prepaid(booking_info)
+        self._wake_notification_dispatcher()
       else:
         self.logger.warning(f"Trying to update the prepayment of booking with ID {booking_id} but not found.")
 
@@ -363,28 +489,34 @@ class BookingDAO:
 
   # Function to get the number of rooms group by types
   def get_booking_room_type_summary(self, booking_id) -> dict[str, int]:
-    summary = {}
+    return (self.get_room_type_summaries([booking_id]) or {}).get(booking_id, {})
+
+  def get_room_type_summaries(self, booking_ids) -> Optional[dict[int, dict[str, int]]]:
+    """Returns the number of rooms per room type of each booking, keyed by booking ID, in one query."""
+    if not booking_ids:
+      return {}
     try:
       with self.cursor() as cursor:
         if not cursor:
-          return {}
-
-        query = """
-        SELECT r.room_type, COUNT(*) as count
-        FROM Bookings b
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.booking_id = %s
-        GROUP BY r.room_type
-        """
-        cursor.execute(query, (booking_id,))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        summary[row[0]] = row[1]
+          return None
+        return self._fetch_room_type_summaries(cursor, booking_ids)
     except Exception as e:
-      self.logger.error(f"Error getting booking room type summary: {e}")
-    return summary
+      self.logger.error(f"Error getting booking room type summaries: {e}")
+      return None
+
+  def _fetch_room_type_summaries(self, cursor, booking_ids) -> dict[int, dict[str, int]]:
+    query = """
+    SELECT rb.booking_id, r.room_type, COUNT(*) as count
+    FROM RoomBookings rb
+    JOIN Rooms r ON rb.room_id = r.room_id
+    WHERE rb.booking_id = ANY(%s::int[])
+    GROUP BY rb.booking_id, r.room_type
+    """
+    cursor.execute(query, (list(booking_ids),))
+    summaries = {}
+    for booking_id, room_type, count in cursor.fetchall():
+      summaries.setdefault(booking_id, {})[room_type] = count
+    return summaries
 
   def get_next_booking_id(self):
     next_id = None
@@ -406,42 +538,8 @@ class BookingDAO:
         if not cursor:
           return None
 
-        # SQL query to search for bookings by booking_id, phone_number, or customer_name
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.booking_id::text LIKE %s
-          OR c.phone_number LIKE %s
-          OR c.name LIKE %s
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY
-          CASE
-            WHEN b.status = 'canceled'::booking_statuses THEN 1
-            ELSE 0
-          END,
-          b.booking_id DESC
-        LIMIT %s;
-        """
-
-        booking_id = f"{keyword}"
-        phone_number_like = f"%{keyword}"
-        customer_name_like = f"%{keyword}%"
-        cursor.execute(query, (booking_id, phone_number_like, customer_name_like, limit))
-        rows = cursor.fetchall()
-
-      matches = []
-      for row in rows:
-        booking_info = self._booking_info_from_row(row)
-        matches.append(booking_info)
-
-      return matches
+        # Search for bookings by exact booking_id, phone_number suffix, or customer_name substring
+        return self._query_bookings(cursor, BOOKINGS_BY_KEYWORD, get_keyword_search_params(keyword, limit))
 
     except Exception as e:
         self.logger.error(f"Error searching bookings: {e}")
@@ -450,45 +548,15 @@ class BookingDAO:
   def search_booking_by_date(self, date, mode=None, include_canceled=False) -> Optional[list[BookingInfo]]:
     matches = []
     try:
-      date_query = "%s BETWEEN b.check_in_date AND b.last_date"
-      if mode == 'check_in_date':
-        date_query = "b.check_in_date = %s"
-      elif mode == 'last_date':
-        date_query = "b.last_date = %s"
-
       with self.cursor() as cursor:
         if not cursor:
           return None
 
-        # SQL query to search for bookings by check-in date
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE {date_query}
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY
-          CASE
-            WHEN b.status = 'canceled'::booking_statuses THEN 1
-            ELSE 0
-          END,
-          b.booking_id;
-        """
-
-        cursor.execute(query.format(date_query=date_query), (date,))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        booking_info = self._booking_info_from_row(row)
-        if (not include_canceled and booking_info.status == 'canceled'):
-          continue
-        matches.append(booking_info)
+        # mode picks the check-in date, the last date or, by default, any night of the stay
+        for booking_info in self._query_bookings(cursor, BOOKINGS_BY_DATE.get(mode, BOOKINGS_BY_DATE[None]), (date,)):
+          if (not include_canceled and booking_info.status == 'canceled'):
+            continue
+          matches.append(booking_info)
 
     except Exception as e:
       self.logger.error(f"Error searching bookings by check-in date: {e}")
@@ -502,29 +570,7 @@ class BookingDAO:
       with self.cursor() as cursor:
         if not cursor:
           return None
-
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE c.phone_number = %s
-          AND b.status != 'canceled'::booking_statuses
-          AND b.check_in_date <= %s
-          AND b.last_date >= %s
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY b.check_in_date, b.booking_id;
-        """
-        cursor.execute(query, (phone_number, last_date, check_in_date))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        matches.append(self._booking_info_from_row(row))
+        matches = self._query_bookings(cursor, OVERLAPPING_BOOKINGS_BY_PHONE, (phone_number, check_in_date, last_date))
     except Exception as e:
       self.logger.error(f"Error searching overlapping bookings by phone: {e}")
       matches = None
@@ -538,31 +584,7 @@ class BookingDAO:
         if not cursor:
           return None
         min_check_in_date = min_check_in_date or get_local_today()
-
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.check_in_date >= %s
-          AND b.status != 'canceled'::booking_statuses
-          AND b.prepayment > 0 AND b.prepayment_status = 'unpaid'::prepayment_statuses
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY
-          b.check_in_date, b.booking_id;
-        """
-
-        cursor.execute(query, (min_check_in_date,))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        booking_info = self._booking_info_from_row(row)
-        matches.append(booking_info)
+        matches = self._query_bookings(cursor, BOOKINGS_NOT_PREPAID, (min_check_in_date,))
 
     except Exception as e:
       self.logger.error(f"Error searching bookings not prepaid: {e}")
@@ -589,31 +611,7 @@ class BookingDAO:
       with self.cursor() as cursor:
         if not cursor:
           return None
-
-        # SQL query to retrieve bookings within the given month
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.check_in_date >= %s AND b.check_in_date < %s
-          AND b.status != 'canceled'::booking_statuses
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY
-          b.check_in_date,
-          b.booking_id;
-        """
-        cursor.execute(query, (first_day, last_day))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        booking_info = self._booking_info_from_row(row)
-        matches.append(booking_info)
+        matches = self._query_bookings(cursor, BOOKINGS_BY_CHECK_IN_RANGE, (first_day, last_day))
 
     except Exception as e:
       self.logger.error(f"Error getting bookings by month: {e}")
@@ -628,28 +626,8 @@ class BookingDAO:
         if not cursor:
           return None
 
-        # SQL query to get bookings created or modified after the last sync time
-        query = """
-        SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
-          b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
-          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
-          JSON_OBJECT_AGG(r.room_id, rb.extra_bed_count) AS extra_bed_counts,
-          b.created, b.modified
-        FROM Bookings b
-        JOIN Customers c ON b.customer_id = c.customer_id
-        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
-        JOIN Rooms r ON rb.room_id = r.room_id
-        WHERE b.created >= %s OR b.modified >= %s
-        GROUP BY b.booking_id, c.customer_id
-        ORDER BY b.created;
-        """
-
-        cursor.execute(query, (last_sync_time, last_sync_time))
-        rows = cursor.fetchall()
-
-      for row in rows:
-        booking_info = self._booking_info_from_row(row)
-        matches.append(booking_info)
+        # Bookings created or modified after the last sync time
+        matches = self._query_bookings(cursor, LATEST_BOOKINGS, (last_sync_time,))
 
     except Exception as e:
       self.logger.error(f"Error fetching latest bookings: {e}")
@@ -657,6 +635,271 @@ class BookingDAO:
 
     return matches
 
+  def iter_all_bookings(self, itersize=1000) -> Iterator[BookingInfo]:
+    """
+    Yields every booking ordered by creation time. Rows are fetched itersize at a time through a
+    named server-side cursor on a dedicated connection, so neither the rows nor a pooled
+    connection are held for the whole iteration. Errors are raised to the caller.
+    """
+    connection = psycopg2.connect(**self.get_connection_options())
+    try:
+      with connection.cursor(name='iter_all_bookings') as cursor:
+        cursor.itersize = itersize
+        cursor.execute(ALL_BOOKINGS.direct_sql)
+        for row in cursor:
+          yield booking_info_from_row(row)
+    finally:
+      connection.close()
+
+  def bulk_import_bookings(self, bookings: Iterable[BookingInfo]) -> Optional[dict]:
+    """
+    Imports bookings with COPY into temporary staging tables and merges them with set-based
+    statements in one transaction; the set-based counterpart of calling upsert_booking per booking.
+
+    Bookings whose booking ID exists are updated, the others are inserted with new IDs in input
+    order. Customers are resolved for the whole batch with the rules of _upsert_customer.
+    Bookings whose rooms overlap another booking, or an earlier one in the input, are skipped.
+    No LINE notifications are queued.
+
+    Returns:
+        dict: 'inserted', 'updated' and 'unchanged' counts and the 'skipped' booking IDs, or
+            None on database errors, in which case nothing is imported.
+    """
+    booking_columns = (
+      'line_no', 'booking_id', 'status', 'customer_name', 'phone_number', 'is_name_generic', 'is_phone_generic',
+      'check_in_date', 'last_date', 'total_price', 'prepayment', 'prepayment_status', 'source', 'notes'
+    )
+    try:
+      # Spooled to disk past a few MB, so the input is never held in memory as a whole
+      with tempfile.SpooledTemporaryFile(max_size=BULK_IMPORT_SPOOL_BYTES, mode='w+', newline='', encoding='utf-8') as booking_file, \
+          tempfile.SpooledTemporaryFile(max_size=BULK_IMPORT_SPOOL_BYTES, mode='w+', newline='', encoding='utf-8') as room_booking_file:
+        booking_writer = csv.writer(booking_file)
+        room_booking_writer = csv.writer(room_booking_file)
+        for line_no, booking_info in enumerate(bookings):
+          booking_writer.writerow((
+            line_no, booking_info.booking_id, booking_info.status, booking_info.customer_name, booking_info.phone_number,
+            is_generic_name(booking_info.customer_name), is_generic_phone_number(booking_info.phone_number),
+            booking_info.check_in_date, booking_info.last_date, int(booking_info.total_price), int(booking_info.prepayment),
+            booking_info.prepayment_status, booking_info.source, booking_info.notes or ''
+          ))
+          for room_id in booking_info.room_ids:
+            room_booking_writer.writerow((line_no, room_id, int(booking_info.extra_bed_counts.get(room_id, 0))))
+        booking_file.seek(0)
+        room_booking_file.seek(0)
+
+        with self.transaction() as cursor:
+          if not cursor:
+            return None
+
+          cursor.execute("""
+          CREATE TEMP TABLE import_bookings (
+            line_no INT PRIMARY KEY,
+            booking_id INT,
+            status booking_statuses,
+            customer_name VARCHAR(100),
+            phone_number VARCHAR(20),
+            is_name_generic BOOLEAN,
+            is_phone_generic BOOLEAN,
+            check_in_date DATE,
+            last_date DATE,
+            total_price DECIMAL(10, 2),
+            prepayment DECIMAL(10, 2),
+            prepayment_status prepayment_statuses,
+            source booking_sources,
+            notes TEXT,
+            customer_id INT,
+            target_booking_id INT,
+            is_new BOOLEAN NOT NULL DEFAULT FALSE
+          ) ON COMMIT DROP;
+          CREATE TEMP TABLE import_room_bookings (
+            line_no INT,
+            room_id VARCHAR(100),
+            extra_bed_count INT
+          ) ON COMMIT DROP;
+          """)
+          cursor.copy_expert(
+            f"COPY import_bookings ({', '.join(booking_columns)}) FROM STDIN "
+            "WITH (FORMAT csv, FORCE_NOT_NULL (customer_name, phone_number, notes))",
+            booking_file
+          )
+          cursor.copy_expert("COPY import_room_bookings (line_no, room_id, extra_bed_count) FROM STDIN WITH (FORMAT csv)", room_booking_file)
+          cursor.execute("ANALYZE import_bookings; ANALYZE import_room_bookings;")
+
+          # A booking ID repeated in the input is imported once, from its last record
+          cursor.execute("""
+          DELETE FROM import_bookings i
+          USING import_bookings later
+          WHERE later.booking_id = i.booking_id AND later.line_no > i.line_no;
+
+          UPDATE import_bookings i
+          SET target_booking_id = b.booking_id
+          FROM Bookings b
+          WHERE b.booking_id = i.booking_id;
+          """)
+
+          # Skip bookings that would break room_bookings_no_overlap at commit, keeping the earlier
+          # record when two imported bookings overlap, like the per-booking import does
+          cursor.execute("""
+          WITH staged AS (
+            SELECT i.line_no, i.booking_id, irb.room_id, DATERANGE(i.check_in_date, i.last_date, '[]') AS stay_range
+            FROM import_bookings i
+            JOIN import_room_bookings irb ON irb.line_no = i.line_no
+            WHERE i.status IS DISTINCT FROM 'canceled'::booking_statuses
+          ), conflicting AS (
+            SELECT s.line_no, s.booking_id
+            FROM staged s
+            WHERE EXISTS (
+              SELECT 1 FROM RoomBookings rb
+              WHERE rb.room_id = s.room_id AND rb.stay_range && s.stay_range AND NOT rb.is_canceled
+                AND NOT EXISTS (SELECT 1 FROM import_bookings o WHERE o.target_booking_id = rb.booking_id)
+            ) OR EXISTS (
+              SELECT 1 FROM staged o
+              WHERE o.room_id = s.room_id AND o.stay_range && s.stay_range AND o.line_no < s.line_no
+            )
+          )
+          DELETE FROM import_bookings i
+          USING conflicting c
+          WHERE i.line_no = c.line_no
+          RETURNING i.booking_id;
+          """)
+          skipped_booking_ids = sorted({ row[0] for row in cursor.fetchall() })
+
+          # Records identical to the stored booking and customer are left alone
+          cursor.execute("""
+          WITH unchanged AS (
+            SELECT i.line_no
+            FROM import_bookings i
+            JOIN Bookings b ON b.booking_id = i.target_booking_id
+            JOIN Customers c ON c.customer_id = b.customer_id
+            WHERE (b.status, c.name, c.phone_number, b.check_in_date, b.last_date, TRUNC(b.total_price), TRUNC(b.prepayment),
+                   b.prepayment_status, b.source, COALESCE(b.notes, ''))
+                  IS NOT DISTINCT FROM
+                  (i.status, i.customer_name, i.phone_number, i.check_in_date, i.last_date, i.total_price, i.prepayment,
+                   i.prepayment_status, i.source, i.notes)
+              AND (
+                SELECT COALESCE(ARRAY_AGG((rb.room_id, rb.extra_bed_count)::text ORDER BY rb.room_id), '{}')
+                FROM RoomBookings rb WHERE rb.booking_id = b.booking_id
+              ) = (
+                SELECT COALESCE(ARRAY_AGG((irb.room_id, irb.extra_bed_count)::text ORDER BY irb.room_id), '{}')
+                FROM import_room_bookings irb WHERE irb.line_no = i.line_no
+              )
+          )
+          DELETE FROM import_bookings i
+          USING unchanged u
+          WHERE i.line_no = u.line_no;
+          """)
+          unchanged_count = cursor.rowcount
+
+          # Customers with a real phone number: one upsert per number, renamed to the last
+          # non-generic name given for it
+          cursor.execute("""
+          INSERT INTO Customers (name, phone_number)
+          SELECT DISTINCT ON (phone_number) customer_name, phone_number
+          FROM import_bookings
+          WHERE NOT is_phone_generic AND NOT is_name_generic
+          ORDER BY phone_number, line_no DESC
+          ON CONFLICT (phone_number) WHERE RIGHT(phone_number, 6) <> '000000' DO UPDATE
+          SET name = EXCLUDED.name
+          WHERE Customers.name IS DISTINCT FROM EXCLUDED.name;
+
+          INSERT INTO Customers (name, phone_number)
+          SELECT DISTINCT ON (phone_number) customer_name, phone_number
+          FROM import_bookings
+          WHERE NOT is_phone_generic AND is_name_generic
+          ORDER BY phone_number, line_no
+          ON CONFLICT (phone_number) WHERE RIGHT(phone_number, 6) <> '000000' DO NOTHING;
+
+          UPDATE import_bookings i
+          SET customer_id = c.customer_id
+          FROM Customers c
+          WHERE NOT i.is_phone_generic AND c.phone_number = i.phone_number AND RIGHT(c.phone_number, 6) <> '000000';
+          """)
+
+          # Generic phone numbers are shared, so match on the non-generic name instead
+          cursor.execute("""
+          INSERT INTO Customers (name, phone_number)
+          SELECT DISTINCT ON (customer_name) customer_name, phone_number
+          FROM import_bookings i
+          WHERE is_phone_generic AND NOT is_name_generic
+            AND NOT EXISTS (SELECT 1 FROM Customers c WHERE c.name = i.customer_name)
+          ORDER BY customer_name, line_no;
+
+          UPDATE import_bookings i
+          SET customer_id = c.customer_id
+          FROM (SELECT name, MIN(customer_id) AS customer_id FROM Customers GROUP BY name) c
+          WHERE i.is_phone_generic AND NOT i.is_name_generic AND c.name = i.customer_name;
+          """)
+
+          # Anonymous customers get a new row per booking; IDs are drawn first to pair them up
+          cursor.execute("""
+          UPDATE import_bookings
+          SET customer_id = NEXTVAL(PG_GET_SERIAL_SEQUENCE('customers', 'customer_id'))
+          WHERE is_phone_generic AND is_name_generic;
+
+          INSERT INTO Customers (customer_id, name, phone_number)
+          SELECT customer_id, customer_name, phone_number
+          FROM import_bookings
+          WHERE is_phone_generic AND is_name_generic;
+          """)
+
+          cursor.execute("""
+          UPDATE Bookings b
+          SET customer_id = i.customer_id, status = i.status, check_in_date = i.check_in_date, last_date = i.last_date,
+              total_price = i.total_price, prepayment = i.prepayment, prepayment_status = i.prepayment_status,
+              source = i.source, notes = i.notes
+          FROM import_bookings i
+          WHERE b.booking_id = i.target_booking_id;
+          """)
+          updated_count = cursor.rowcount
+
+          # New bookings get IDs from the sequence in input order
+          cursor.execute("""
+          WITH new_bookings AS (
+            SELECT line_no, NEXTVAL(PG_GET_SERIAL_SEQUENCE('bookings', 'booking_id')) AS booking_id
+            FROM (SELECT line_no FROM import_bookings WHERE target_booking_id IS NULL ORDER BY line_no) ordered
+          )
+          UPDATE import_bookings i
+          SET target_booking_id = n.booking_id, is_new = TRUE
+          FROM new_bookings n
+          WHERE i.line_no = n.line_no;
+
+          INSERT INTO Bookings (booking_id, customer_id, status, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes)
+          SELECT target_booking_id, customer_id, status, check_in_date, last_date, total_price, prepayment, prepayment_status, source, notes
+          FROM import_bookings
+          WHERE is_new;
+          """)
+          inserted_count = cursor.rowcount
+
+          cursor.execute("""
+          DELETE FROM RoomBookings rb
+          USING import_bookings i
+          WHERE rb.booking_id = i.target_booking_id
+            AND NOT EXISTS (
+              SELECT 1 FROM import_room_bookings irb WHERE irb.line_no = i.line_no AND irb.room_id = rb.room_id
+            );
+
+          INSERT INTO RoomBookings (booking_id, room_id, extra_bed_count)
+          SELECT i.target_booking_id, irb.room_id, irb.extra_bed_count
+          FROM import_room_bookings irb
+          JOIN import_bookings i ON i.line_no = irb.line_no
+          ON CONFLICT (booking_id, room_id) DO UPDATE
+          SET extra_bed_count = EXCLUDED.extra_bed_count
+          WHERE RoomBookings.extra_bed_count IS DISTINCT FROM EXCLUDED.extra_bed_count;
+          """)
+
+    except Exception as e:
+      self.logger.error(f"Error bulk importing bookings: {e}")
+      return None
+
+    self.invalidate_occupancy_index()
+    self.bump_data_version()
+    return {
+      'inserted': inserted_count,
+      'updated': updated_count,
+      'unchanged': unchanged_count,
+      'skipped': skipped_booking_ids,
+    }
+
   ##########################################
   ### Closure data access functions  ###
   ##########################################
@@ -726,6 +969,12 @@ class BookingDAO:
           """
           cursor.execute(insert_room_closures_query, (closure_id, room_id))
 
+      if closure_info.status == 'valid':
+        self._update_occupancy_index(lambda occupancy_index: occupancy_index.set_closure(
+          closure_id, closure_info.room_ids, closure_info.start_date, closure_info.last_date
+        ))
+      self.bump_data_version()
+
     except Exception as e:
       self.logger.error(f"Error inserting closure: {e}")
 
@@ -745,6 +994,9 @@ class BookingDAO:
         """
         cursor.execute(delete_closure_query, (closure_id,))
 
+      self._update_occupancy_index(lambda occupancy_index: occupancy_index.remove_closure(closure_id))
+      self.bump_data_version()
+
     except Exception as e:
       self.logger.error(f"Error deleting closure {closure_id}: {e}")
       return False
@@ -764,7 +1016,7 @@ class BookingDAO:
         FROM Closures c
         JOIN RoomClosures rc ON c.closure_id = rc.closure_id
         JOIN Rooms r ON rc.room_id = r.room_id
-        WHERE %s BETWEEN c.start_date AND c.last_date
+        WHERE DATERANGE(c.start_date, c.last_date, '[]') @> %s::date
           AND c.status = 'valid'::closure_statuses
         GROUP BY c.closure_id;
         """
@@ -832,44 +1084,98 @@ class BookingDAO:
 
     return matches
 
+  def get_closures_by_ids(self, closure_ids) -> Optional[list[ClosureInfo]]:
+    """Returns the closures with the given IDs whatever their status, e.g. deleted ones to unsync."""
+    if not closure_ids:
+      return []
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+
+        query = """
+        SELECT c.closure_id, c.status, c.start_date, c.last_date, c.reason,
+          STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids, c.created, c.modified
+        FROM Closures c
+        JOIN RoomClosures rc ON c.closure_id = rc.closure_id
+        JOIN Rooms r ON rc.room_id = r.room_id
+        WHERE c.closure_id = ANY(%s)
+        GROUP BY c.closure_id
+        ORDER BY c.created;
+        """
+        cursor.execute(query, (list(closure_ids),))
+        rows = cursor.fetchall()
+
+      return [
+        ClosureInfo(
+          closure_id=row[0],
+          status=row[1],
+          start_date=row[2],
+          last_date=row[3],
+          reason=row[4] or '',
+          room_ids=row[5],
+          created=row[6],
+          modified=row[7]
+        )
+        for row in rows
+      ]
+    except Exception as e:
+      self.logger.error(f"Error fetching closures by IDs: {e}")
+      return None
+
   ##########################################
   ###   Customer data access functions   ###
   ##########################################
 
+  def _upsert_customer(self, cursor, customer: Customer) -> int:
+    is_name_generic = is_generic_name(customer.name)
+    if not is_generic_phone_number(customer.phone_number):
+      # Match on phone number through the partial unique index from 0004_add_customer_phone_unique_index.sql
+      # and only rename the customer when a non-generic name is given
+      cursor.execute("""
+      WITH upserted AS (
+        INSERT INTO Customers (name, phone_number)
+        VALUES (%s, %s)
+        ON CONFLICT (phone_number) WHERE RIGHT(phone_number, 6) <> '000000' DO UPDATE
+        SET name = EXCLUDED.name
+        WHERE NOT %s AND Customers.name IS DISTINCT FROM EXCLUDED.name
+        RETURNING customer_id
+      )
+      SELECT customer_id FROM upserted
+      UNION ALL
+      SELECT customer_id FROM Customers WHERE phone_number = %s AND RIGHT(phone_number, 6) <> '000000'
+      LIMIT 1;
+      """, (customer.name, customer.phone_number, is_name_generic, customer.phone_number))
+    elif not is_name_generic:
+      # Generic phone numbers are shared, so match on the non-generic name instead
+      cursor.execute("""
+      WITH existing AS (
+        SELECT customer_id FROM Customers WHERE name = %s LIMIT 1
+      ), inserted AS (
+        INSERT INTO Customers (name, phone_number)
+        SELECT %s, %s
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        RETURNING customer_id
+      )
+      SELECT customer_id FROM existing
+      UNION ALL
+      SELECT customer_id FROM inserted;
+      """, (customer.name, customer.name, customer.phone_number))
+    else:
+      cursor.execute("""
+      INSERT INTO Customers (name, phone_number)
+      VALUES (%s, %s)
+      RETURNING customer_id;
+      """, (customer.name, customer.phone_number))
+    return cursor.fetchone()[0]
+
   def upsert_customer(self, customer: Customer)-> Optional[int]:
     customer_id = None
     try:
       with self.cursor() as cursor:
         if not cursor:
           return None
-
-        existing_customer = None
-        if not is_generic_phone_number(customer.phone_number):
-          # Check if the customer exists based on phone number
-          cursor.execute("SELECT customer_id, name, phone_number FROM Customers WHERE phone_number=%s", (customer.phone_number,))
-          existing_customer = cursor.fetchone()
-        elif not is_generic_name(customer.name):
-          # Check if the customer exists based on non-generic name
-          cursor.execute("SELECT customer_id, name, phone_number FROM Customers WHERE name=%s", (customer.name,))
-          existing_customer = cursor.fetchone()
-
-        if existing_customer:
-          customer_id, existing_name, existing_phone_number = existing_customer
-          # Compare names and phone numbers and update if necessary
-          if not is_generic_name(customer.name) and customer.name != existing_name:
-            self.logger.info(f"Updating customer name from {existing_name} to {customer.name}")
-            cursor.execute("UPDATE Customers SET name=%s WHERE customer_id=%s", (customer.name, customer_id))
-          if not is_generic_phone_number(customer.phone_number) and customer.phone_number != existing_phone_number:
-            self.logger.info(f"Updating customer phone number from {existing_phone_number} to {customer.phone_number}")
-            cursor.execute("UPDATE Customers SET phone_number=%s WHERE customer_id=%s", (customer.phone_number, customer_id))
-        else:
-          # Insert a new customer record
-          cursor.execute("""
-          INSERT INTO Customers (name, phone_number)
-          VALUES (%s, %s)
-          RETURNING customer_id;
-          """, (customer.name, customer.phone_number))
-          customer_id = cursor.fetchone()[0]
+        customer_id = self._upsert_customer(cursor, customer)
     except Exception as e:
       self.logger.error(f"Error query customer: {e}")
     return customer_id
@@ -943,6 +1249,15 @@ class BookingDAO:
   ##########################################
 
   def get_rooms_by_ids(self, room_ids=None) -> list[dict]:
+    room_catalogue = self.get_room_catalogue()
+    if room_catalogue:
+      return room_catalogue.get_rooms(room_ids)
+    return self._query_rooms(room_ids)
+
+  def get_rooms_by_id(self) -> dict[str, dict]:
+    return { room['room_id']: room for room in self.get_rooms_by_ids() }
+
+  def _query_rooms(self, room_ids=None) -> list[dict]:
     rooms = []
     try:
       with self.cursor() as cursor:
@@ -981,7 +1296,28 @@ class BookingDAO:
       self.logger.error(f"Error retrieving rooms: {e}")
     return rooms
 
-  def get_available_room_ids(self, check_in_date, last_date, exclude_booking_id=None):
+  def get_available_room_ids(self, check_in_date, last_date, exclude_booking_id=None, use_occupancy_index=True):
+    """
+    Returns the rooms free of bookings and closures on every night of the range. Checks made
+    right before a write pass use_occupancy_index=False, so they query the database itself.
+    """
+    occupancy_index = self.get_occupancy_index() if use_occupancy_index else None
+    if not occupancy_index:
+      return self._query_available_room_ids(check_in_date, last_date, exclude_booking_id)
+
+    available_room_ids = occupancy_index.get_available_room_ids(check_in_date, last_date, exclude_booking_id)
+    if self.db_config.OCCUPANCY_INDEX_CONSISTENCY_CHECK:
+      db_available_room_ids = self._query_available_room_ids(check_in_date, last_date, exclude_booking_id)
+      if db_available_room_ids is not None and db_available_room_ids != available_room_ids:
+        self.logger.warning(
+          f"Occupancy index out of sync for {check_in_date}~{last_date}: "
+          f"index={available_room_ids} db={db_available_room_ids}. Dropping index."
+        )
+        self.invalidate_occupancy_index()
+        return db_available_room_ids
+    return available_room_ids
+
+  def _query_available_room_ids(self, check_in_date, last_date, exclude_booking_id=None):
     available_room_ids = None
     try:
       with self.cursor() as cursor:
@@ -997,7 +1333,7 @@ class BookingDAO:
             FROM RoomBookings rb
             JOIN Bookings b ON rb.booking_id = b.booking_id
             WHERE b.status != 'canceled'::booking_statuses -- Ignore canceled bookings
-              AND (b.check_in_date <= %s AND b.last_date >= %s)
+              AND DATERANGE(b.check_in_date, b.last_date, '[]') && DATERANGE(%s, %s, '[]')
               AND (%s IS NULL OR b.booking_id != %s)
           )
           AND r.room_id NOT IN (
@@ -1005,72 +1341,347 @@ class BookingDAO:
             FROM RoomClosures rc
             JOIN Closures c ON rc.closure_id = c.closure_id
             WHERE c.status = 'valid'::closure_statuses
-              AND (c.start_date <= %s AND c.last_date >= %s)
+              AND DATERANGE(c.start_date, c.last_date, '[]') && DATERANGE(%s, %s, '[]')
           )
         ORDER BY r.ctid;
         """
 
         # Execute query with date range parameters
         cursor.execute(query, (
-          last_date,
           check_in_date,
+          last_date,
           exclude_booking_id,
           exclude_booking_id,
-          last_date,
-          check_in_date
+          check_in_date,
+          last_date
         ))
         available_room_ids = [row[0] for row in cursor.fetchall()]
     except Exception as e:
       self.logger.error(f"Error fetching available room ids: {e}")
     return available_room_ids
 
-  def get_total_price_estimation(self, room_ids, check_in_date, last_date, extra_bed_count=0):
-    total_price = None
+  def get_occupied_room_nights(self, start_date, last_date) -> Optional[tuple[set, Optional[datetime]]]:
+    """
+    Retrieves every occupied (room_id, night) within a date range in one query.
+
+    Returns:
+        tuple: The set of occupied (room_id, date) pairs and the latest modification time of
+        bookings, closures and rooms, usable as a Last-Modified value.
+    """
+    occupied_room_nights = set()
+    last_modified = None
     try:
       with self.cursor() as cursor:
         if not cursor:
           return None
 
-        # Fetch pricing details for the specified rooms
         query = """
-        SELECT room_id, holiday_price_per_night, weekday_price_per_night
-        FROM Rooms
-        WHERE room_id IN %s
+        SELECT rb.room_id, GREATEST(b.check_in_date, %s), LEAST(b.last_date, %s)
+        FROM RoomBookings rb
+        JOIN Bookings b ON rb.booking_id = b.booking_id
+        WHERE b.status != 'canceled'::booking_statuses
+          AND DATERANGE(b.check_in_date, b.last_date, '[]') && DATERANGE(%s, %s, '[]')
+        UNION ALL
+        SELECT rc.room_id, GREATEST(c.start_date, %s), LEAST(c.last_date, %s)
+        FROM RoomClosures rc
+        JOIN Closures c ON rc.closure_id = c.closure_id
+        WHERE c.status = 'valid'::closure_statuses
+          AND DATERANGE(c.start_date, c.last_date, '[]') && DATERANGE(%s, %s, '[]');
         """
-        cursor.execute(query, (tuple(room_ids),))
-        rooms = cursor.fetchall()
+        cursor.execute(query, (
+          start_date, last_date, start_date, last_date,
+          start_date, last_date, start_date, last_date
+        ))
+        rows = cursor.fetchall()
+
+        cursor.execute("""
+        SELECT GREATEST(
+          (SELECT MAX(modified) FROM Bookings),
+          (SELECT MAX(modified) FROM Closures),
+          (SELECT MAX(modified) FROM Rooms)
+        );
+        """)
+        last_modified = cursor.fetchone()[0]
+
+      for room_id, first_night, last_night in rows:
+        for offset in range((last_night - first_night).days + 1):
+          occupied_room_nights.add((room_id, first_night + timedelta(days=offset)))
+    except Exception as e:
+      self.logger.error(f"Error fetching occupied room nights: {e}")
+      return None
+    return occupied_room_nights, last_modified
+
+  def get_price_quote(self, room_ids, check_in_date, last_date, extra_bed_counts=None) -> Optional[PriceQuote]:
+    try:
+      rooms_by_id = { room['room_id']: room for room in self.get_rooms_by_ids(room_ids) }
+      return quote_stay(rooms_by_id, list(room_ids), check_in_date, last_date, extra_bed_counts)
+    except Exception as e:
+      self.logger.error(f"Error calculating price quote: {e}")
+      return None
+
+  ##########################################
+  ###   Room catalogue access functions  ###
+  ##########################################
+
+  def get_room_catalogue(self) -> Optional[RoomCatalogue]:
+    if not self.room_catalogue:
+      return None
+    if not self.room_catalogue.is_fresh():
+      with self._room_catalogue_lock:
+        # Another thread may have reloaded it while this one waited for the lock
+        if not self.room_catalogue.is_fresh():
+          self.load_room_catalogue()
+    return self.room_catalogue if self.room_catalogue.is_fresh() else None
+
+  def load_room_catalogue(self):
+    rooms = self._query_rooms()
+    if rooms:
+      self.room_catalogue.load(rooms)
+      self.logger.info(f"Room catalogue loaded with {len(rooms)} rooms")
+
+  def start_room_change_listener(self):
+    listener_thread = threading.Thread(
+      target=self._listen_for_notifications, args=(ROOMS_CHANGED_CHANNEL, self._on_rooms_changed),
+      name='room-change-listener', daemon=True
+    )
+    listener_thread.start()
+    return listener_thread
+
+  def _on_rooms_changed(self):
+    self.logger.info("Rooms changed, invalidating room catalogue")
+    self._invalidate_room_caches()
+
+  def bump_data_version(self):
+    with self._data_version_lock:
+      self.data_version += 1
+
+  def start_change_listener(self, on_change):
+    """Calls on_change from a background thread whenever a transaction changes bookings or closures."""
+    listener_thread = threading.Thread(
+      target=self._listen_for_notifications, args=(BOOKING_CHANGES_CHANNEL, on_change),
+      name='change-listener', daemon=True
+    )
+    listener_thread.start()
+    return listener_thread
+
+  def _listen_for_notifications(self, channel, on_notify):
+    # Uses a dedicated connection outside the pool, since LISTEN is bound to the session
+    while True:
+      connection = None
+      try:
+        connection = psycopg2.connect(**self.get_connection_options())
+        connection.autocommit = True
+        with connection.cursor() as cursor:
+          cursor.execute(f"LISTEN {channel};")
+        # Notifications sent while not listening are lost, so act as if one had arrived
+        on_notify()
+        while True:
+          if select.select([connection], [], [], ROOM_CHANGE_LISTENER_POLL_SECONDS) == ([], [], []):
+            continue
+          connection.poll()
+          if connection.notifies:
+            connection.notifies.clear()
+            on_notify()
+      except Exception as e:
+        self.logger.warning(f"Listener on {channel} disconnected: {e}")
+      finally:
+        if connection:
+          connection.close()
+      time.sleep(ROOM_CHANGE_LISTENER_RETRY_SECONDS)
+
+  def _invalidate_room_caches(self):
+    self.bump_data_version()
+    self.room_catalogue.invalidate()
+    # The occupancy index keeps the list of open rooms, so rebuild it on next use as well
+    self.invalidate_occupancy_index()
+
+  ##########################################
+  ###   Occupancy index access functions ###
+  ##########################################
+
+  def load_occupancy_index(self) -> Optional[RoomOccupancyIndex]:
+    with self._occupancy_index_lock:
+      changes_before_load = self._occupancy_index_changes
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+
+        cursor.execute("SELECT room_id FROM Rooms WHERE room_status = 'available'::room_statuses ORDER BY ctid;")
+        room_ids = [row[0] for row in cursor.fetchall()]
+
+        cursor.execute("""
+        SELECT b.booking_id, STRING_AGG(rb.room_id, ''), b.check_in_date, b.last_date
+        FROM Bookings b
+        JOIN RoomBookings rb ON b.booking_id = rb.booking_id
+        WHERE b.status != 'canceled'::booking_statuses
+        GROUP BY b.booking_id;
+        """)
+        bookings = cursor.fetchall()
+
+        cursor.execute("""
+        SELECT c.closure_id, STRING_AGG(rc.room_id, ''), c.start_date, c.last_date
+        FROM Closures c
+        JOIN RoomClosures rc ON c.closure_id = rc.closure_id
+        WHERE c.status = 'valid'::closure_statuses
+        GROUP BY c.closure_id;
+        """)
+        closures = cursor.fetchall()
+
+      occupancy_index = RoomOccupancyIndex()
+      occupancy_index.load(room_ids, bookings, closures)
+      with self._occupancy_index_lock:
+        if self._occupancy_index_changes != changes_before_load:
+          # Callers fall back to SQL; the next use rebuilds it
+          self.logger.info("Discarded occupancy index rebuild overtaken by a concurrent change")
+          return None
+        self.occupancy_index = occupancy_index
+      self.logger.info(f"Occupancy index loaded with {len(bookings)} bookings and {len(closures)} closures")
+      return occupancy_index
+    except Exception as e:
+      self.logger.error(f"Error loading occupancy index: {e}")
+    return self.occupancy_index
 
-      # Map room pricing for quick lookup
-      room_pricing = {
-          room_id: {
-              "holiday_price": holiday_price,
-              "weekday_price": weekday_price
-          }
-          for room_id, holiday_price, weekday_price in rooms
-      }
+  def get_occupancy_index(self) -> Optional[RoomOccupancyIndex]:
+    if not self.db_config.OCCUPANCY_INDEX_ENABLED:
+      return None
+    # Other processes (e.g. the scheduler syncing from Notion) also write bookings, so reload periodically
+    # Read once: _invalidate_room_caches may clear the attribute from another thread at any time
+    occupancy_index = self.occupancy_index
+    if not occupancy_index or occupancy_index.get_age_seconds() > self.db_config.OCCUPANCY_INDEX_REFRESH_SECONDS:
+      with self._occupancy_index_load_lock:
+        # Another thread may have rebuilt it while this one waited for the lock
+        occupancy_index = self.occupancy_index
+        if not occupancy_index or occupancy_index.get_age_seconds() > self.db_config.OCCUPANCY_INDEX_REFRESH_SECONDS:
+          occupancy_index = self.load_occupancy_index()
+    return occupancy_index
+
+  def invalidate_occupancy_index(self):
+    """Drops the index, so the next use rebuilds it from the database."""
+    with self._occupancy_index_lock:
+      self._occupancy_index_changes += 1
+      self.occupancy_index = None
+
+  def invalidate_caches(self):
+    """
+    Drops the occupancy index and the room catalogue, then bumps the data version, so caches keyed
+    on the version are rebuilt from fresh data rather than from the stale index.
+    """
+    self.invalidate_occupancy_index()
+    if self.room_catalogue:
+      self.room_catalogue.invalidate()
+    self.bump_data_version()
+
+  def is_listening_for_changes(self) -> bool:
+    """True when the DAO already calls invalidate_caches on every booking_changes notification."""
+    return bool(self.db_config.OCCUPANCY_INDEX_ENABLED and self.db_config.OCCUPANCY_INDEX_LISTEN_ENABLED)
+
+  def _update_occupancy_index(self, update):
+    """Applies update to the index in place, after its change is committed."""
+    with self._occupancy_index_lock:
+      self._occupancy_index_changes += 1
+      occupancy_index = self.occupancy_index
+      if occupancy_index:
+        update(occupancy_index)
+
+  def _update_occupancy_index_booking(self, booking_id, booking_info: Optional[BookingInfo]):
+    if not booking_id or not booking_info:
+      return
+    if booking_info.status == 'canceled':
+      self._update_occupancy_index(lambda occupancy_index: occupancy_index.remove_booking(booking_id))
+    else:
+      self._update_occupancy_index(lambda occupancy_index: occupancy_index.set_booking(
+        booking_id, booking_info.room_ids, booking_info.check_in_date, booking_info.last_date
+      ))
 
-      # Calculate total price
-      total_price = 0
-      current_date = check_in_date
+  ##########################################
+  ### BookingStats data access functions ###
+  ##########################################
 
-      while current_date <= last_date:
-        is_holiday = is_booking_holiday_night(current_date)
+  def get_monthly_booking_stats(self, year_month: str) -> Optional[MonthlyBookingStats]:
+    """
+    Returns the report totals and per room type figures of a month from the pre-aggregated
+    tables, recomputing the month first if a booking change marked it stale.
 
-        # Add price for each room for the current date
-        for room_id in room_ids:
-          if is_holiday:
-            total_price += int(room_pricing[room_id]["holiday_price"])
-          else:
-            total_price += int(room_pricing[room_id]["weekday_price"])
+    Args:
+        year_month (str): The target month in 'YYYY-MM' format.
+    """
+    try:
+      first_day = datetime.strptime(year_month, "%Y-%m").date()
+      days_in_month = calendar.monthrange(first_day.year, first_day.month)[1]
+      next_month_first_day = first_day + timedelta(days=days_in_month)
 
-        # Move to the next day
-        current_date += timedelta(days=1)
+      with self.transaction() as cursor:
+        if not cursor:
+          return None
 
-      total_price += int(extra_bed_count) * EXTRA_BED_PRICE_PER_NIGHT * ((last_date - check_in_date).days + 1)
+        cursor.execute("SELECT refresh_booking_stats(month) FROM BookingStatsStaleMonths WHERE month = %s;", (first_day,))
+        cursor.execute("""
+        SELECT booking_count, total_revenue, booking_com_commission, staff_share, balance, refreshed
+        FROM MonthlyBookingStats
+        WHERE month = %s;
+        """, (first_day,))
+        month_row = cursor.fetchone()
+
+        cursor.execute("""
+        SELECT r.room_type, r.room_total, COALESCE(s.rooms_sold, 0), COALESCE(s.room_revenue, 0)
+        FROM (
+          SELECT room_type, COUNT(*) AS room_total
+          FROM Rooms
+          WHERE room_status = 'available'::room_statuses AND room_type IS NOT NULL
+          GROUP BY room_type
+        ) r
+        LEFT JOIN (
+          SELECT room_type, SUM(rooms_sold) AS rooms_sold, SUM(room_revenue) AS room_revenue
+          FROM RoomTypeNightStats
+          WHERE stay_date >= %s AND stay_date < %s
+          GROUP BY room_type
+        ) s ON s.room_type = r.room_type
+        ORDER BY r.room_type;
+        """, (first_day, next_month_first_day))
+        room_type_rows = cursor.fetchall()
+
+      booking_count, total_revenue, booking_com_commission, staff_share, balance, refreshed = month_row or (0, 0, 0, 0, 0, None)
+      return MonthlyBookingStats(
+        year_month=year_month,
+        booking_count=booking_count,
+        total_revenue=int(total_revenue),
+        booking_com_commission=int(booking_com_commission),
+        staff_share=int(staff_share),
+        balance=int(balance),
+        room_types=[
+          RoomTypeStats(
+            room_type=room_type,
+            available_room_nights=room_total * days_in_month,
+            rooms_sold=int(rooms_sold),
+            room_revenue=int(room_revenue)
+          )
+          for room_type, room_total, rooms_sold, room_revenue in room_type_rows
+        ],
+        refreshed=refreshed
+      )
+    except Exception as e:
+      self.logger.error(f"Error getting monthly booking stats: {e}")
+      return None
 
+  def refresh_stale_booking_stats(self) -> Optional[int]:
+    """Recomputes every month marked stale, one transaction per month, and returns how many were refreshed."""
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+        cursor.execute("SELECT month FROM BookingStatsStaleMonths ORDER BY month;")
+        months = [row[0] for row in cursor.fetchall()]
+
+      for month in months:
+        with self.transaction() as cursor:
+          if not cursor:
+            return None
+          cursor.execute("SELECT refresh_booking_stats(%s);", (month,))
+      return len(months)
     except Exception as e:
-      self.logger.error(f"Error calculating total price: {e}")
-    return total_price
+      self.logger.error(f"Error refreshing booking stats: {e}")
+      return None
 
   ##########################################
   ###  SyncRecord data access functions  ###
@@ -1119,3 +1730,307 @@ class BookingDAO:
     except Exception as e:
       self.logger.error(f"Error logging sync record: {e}")
     return sync_id
+
+  ##########################################
+  ###  ChangeFeed data access functions  ###
+  ##########################################
+
+  def read_changes(self, consumer) -> Optional[ChangeBatch]:
+    """
+    Returns the bookings and closures changed by the transactions committed since the consumer's
+    cursor. The cursor only moves when save_change_cursor is called with the batch snapshot, so a
+    batch that fails to sync is read again.
+    """
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+
+        cursor.execute("SELECT txid_current_snapshot()::text;")
+        snapshot = cursor.fetchone()[0]
+        cursor.execute("SELECT snapshot::text FROM ChangeFeedCursors WHERE consumer = %s;", (consumer,))
+        row = cursor.fetchone()
+        if not row:
+          return ChangeBatch(consumer, snapshot, is_initial=True)
+
+        # Transactions visible now but not in the cursor snapshot, i.e. committed since then
+        cursor.execute("""
+        SELECT entity_type, ARRAY_AGG(DISTINCT entity_id ORDER BY entity_id), COUNT(*)
+        FROM ChangeLog
+        WHERE txid >= txid_snapshot_xmin(%(cursor)s::txid_snapshot)
+          AND NOT txid_visible_in_snapshot(txid, %(cursor)s::txid_snapshot)
+          AND txid_visible_in_snapshot(txid, %(snapshot)s::txid_snapshot)
+        GROUP BY entity_type;
+        """, { 'cursor': row[0], 'snapshot': snapshot })
+        changes = { entity_type: (entity_ids, count) for entity_type, entity_ids, count in cursor.fetchall() }
+
+      booking_ids, booking_change_count = changes.get(CHANGE_ENTITY_BOOKING, ([], 0))
+      closure_ids, closure_change_count = changes.get(CHANGE_ENTITY_CLOSURE, ([], 0))
+      return ChangeBatch(consumer, snapshot, booking_ids, closure_ids, booking_change_count + closure_change_count)
+    except Exception as e:
+      self.logger.error(f"Error reading changes for {consumer}: {e}")
+      return None
+
+  def save_change_cursor(self, consumer, snapshot) -> bool:
+    """Moves the consumer's cursor and drops the changes every consumer has read."""
+    try:
+      with self.transaction() as cursor:
+        if not cursor:
+          return False
+        cursor.execute("""
+        INSERT INTO ChangeFeedCursors (consumer, snapshot)
+        VALUES (%s, %s::txid_snapshot)
+        ON CONFLICT (consumer) DO UPDATE
+        SET snapshot = EXCLUDED.snapshot, modified = CURRENT_TIMESTAMP;
+        """, (consumer, snapshot))
+        cursor.execute("""
+        DELETE FROM ChangeLog
+        WHERE txid < (SELECT MIN(txid_snapshot_xmin(snapshot)) FROM ChangeFeedCursors);
+        """)
+      return True
+    except Exception as e:
+      self.logger.error(f"Error saving change cursor for {consumer}: {e}")
+      return False
+
+  ##########################################
+  ###    JobRun data access functions    ###
+  ##########################################
+
+  def log_job_run(self, job_name, executor, status, duration_ms, item_count=None, error_count=0, error=None) -> Optional[int]:
+    """Records a finished scheduler job run, which started duration_ms before now."""
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+        cursor.execute("""
+        INSERT INTO SchedulerJobRuns (job_name, executor, status, started, duration_ms, item_count, error_count, error)
+        VALUES (%s, %s, %s, CURRENT_TIMESTAMP - %s * INTERVAL '1 millisecond', %s, %s, %s, %s)
+        RETURNING run_id;
+        """, (job_name, executor, status, duration_ms, duration_ms, item_count, error_count, error))
+        return cursor.fetchone()[0]
+    except Exception as e:
+      self.logger.error(f"Error logging run of job {job_name}: {e}")
+      return None
+
+  def get_latest_job_runs(self) -> Optional[list[JobRun]]:
+    """Returns the latest run of every job, ordered by job name."""
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+        cursor.execute("""
+        SELECT DISTINCT ON (job_name)
+          run_id, job_name, executor, status, started, finished, duration_ms, item_count, error_count, error
+        FROM SchedulerJobRuns
+        ORDER BY job_name, started DESC;
+        """)
+        return [JobRun(*row) for row in cursor.fetchall()]
+    except Exception as e:
+      self.logger.error(f"Error retrieving job runs: {e}")
+      return None
+
+  ##########################################
+  ### GoogleCalendarEvent data functions ###
+  ##########################################
+
+  def get_google_calendar_event_ids(self, calendar_id, entity_type, entity_ids=None) -> Optional[dict[int, str]]:
+    """
+    Returns the Google Calendar event IDs of synced bookings or closures, keyed by their ID.
+
+    Args:
+        entity_type (str): 'booking' or 'closure'.
+        entity_ids (list[int]): Only these IDs; all mapped entities when omitted.
+    """
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+
+        query = """
+        SELECT entity_id, event_id
+        FROM GoogleCalendarEvents
+        WHERE calendar_id = %s AND entity_type = %s AND (%s::int[] IS NULL OR entity_id = ANY(%s::int[]));
+        """
+        cursor.execute(query, (calendar_id, entity_type, entity_ids, entity_ids))
+        return { entity_id: event_id for entity_id, event_id in cursor.fetchall() }
+    except Exception as e:
+      self.logger.error(f"Error querying Google Calendar event IDs: {e}")
+      return None
+
+  def save_google_calendar_events(self, calendar_id, entity_type, events: dict[int, tuple[str, str]]) -> bool:
+    """
+    Stores the event ID and etag of synced bookings or closures.
+
+    Args:
+        events (dict[int, tuple[str, str]]): (event_id, etag) keyed by booking or closure ID.
+    """
+    if not events:
+      return True
+    entity_ids = list(events.keys())
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return False
+
+        query = """
+        INSERT INTO GoogleCalendarEvents (calendar_id, entity_type, entity_id, event_id, etag, synced_time)
+        SELECT %s, %s, t.entity_id, t.event_id, t.etag, NOW()
+        FROM UNNEST(%s::int[], %s::varchar[], %s::varchar[]) AS t(entity_id, event_id, etag)
+        ON CONFLICT (calendar_id, entity_type, entity_id) DO UPDATE
+        SET event_id = EXCLUDED.event_id, etag = EXCLUDED.etag, synced_time = EXCLUDED.synced_time;
+        """
+        cursor.execute(query, (
+          calendar_id,
+          entity_type,
+          entity_ids,
+          [events[entity_id][0] for entity_id in entity_ids],
+          [events[entity_id][1] for entity_id in entity_ids]
+        ))
+      return True
+    except Exception as e:
+      self.logger.error(f"Error saving Google Calendar events: {e}")
+      return False
+
+  def delete_google_calendar_events(self, calendar_id, entity_type, entity_ids) -> bool:
+    if not entity_ids:
+      return True
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return False
+
+        query = """
+        DELETE FROM GoogleCalendarEvents
+        WHERE calendar_id = %s AND entity_type = %s AND entity_id = ANY(%s::int[]);
+        """
+        cursor.execute(query, (calendar_id, entity_type, list(entity_ids)))
+      return True
+    except Exception as e:
+      self.logger.error(f"Error deleting Google Calendar events: {e}")
+      return False
+
+  def has_google_calendar_events(self, calendar_id) -> Optional[bool]:
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM GoogleCalendarEvents WHERE calendar_id = %s);", (calendar_id,))
+        return cursor.fetchone()[0]
+    except Exception as e:
+      self.logger.error(f"Error checking Google Calendar events: {e}")
+      return None
+
+  ##########################################
+  ###  NotionPage data access functions  ###
+  ##########################################
+
+  def get_notion_page_ids(self, database_id, entity_type, entity_ids=None) -> Optional[dict[int, str]]:
+    """
+    Returns the Notion page IDs of synced bookings or closures, keyed by their ID.
+
+    Args:
+        entity_type (str): 'booking' or 'closure'.
+        entity_ids (list[int]): Only these IDs; all mapped entities when omitted.
+    """
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+
+        query = """
+        SELECT entity_id, page_id
+        FROM NotionPages
+        WHERE database_id = %s AND entity_type = %s AND (%s::int[] IS NULL OR entity_id = ANY(%s::int[]));
+        """
+        cursor.execute(query, (database_id, entity_type, entity_ids, entity_ids))
+        return { entity_id: page_id for entity_id, page_id in cursor.fetchall() }
+    except Exception as e:
+      self.logger.error(f"Error querying Notion page IDs: {e}")
+      return None
+
+  def save_notion_page_ids(self, database_id, entity_type, page_ids: dict[int, str]) -> bool:
+    if not page_ids:
+      return True
+    entity_ids = list(page_ids.keys())
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return False
+
+        query = """
+        INSERT INTO NotionPages (database_id, entity_type, entity_id, page_id, synced_time)
+        SELECT %s, %s, t.entity_id, t.page_id, NOW()
+        FROM UNNEST(%s::int[], %s::varchar[]) AS t(entity_id, page_id)
+        ON CONFLICT (database_id, entity_type, entity_id) DO UPDATE
+        SET page_id = EXCLUDED.page_id, synced_time = EXCLUDED.synced_time;
+        """
+        cursor.execute(query, (database_id, entity_type, entity_ids, [page_ids[entity_id] for entity_id in entity_ids]))
+      return True
+    except Exception as e:
+      self.logger.error(f"Error saving Notion page IDs: {e}")
+      return False
+
+  def delete_notion_page_ids(self, database_id, entity_type, entity_ids) -> bool:
+    if not entity_ids:
+      return True
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return False
+
+        query = """
+        DELETE FROM NotionPages
+        WHERE database_id = %s AND entity_type = %s AND entity_id = ANY(%s::int[]);
+        """
+        cursor.execute(query, (database_id, entity_type, list(entity_ids)))
+      return True
+    except Exception as e:
+      self.logger.error(f"Error deleting Notion page IDs: {e}")
+      return False
+
+  def has_notion_pages(self, database_id) -> Optional[bool]:
+    try:
+      with self.cursor() as cursor:
+        if not cursor:
+          return None
+        cursor.execute("SELECT EXISTS (SELECT 1 FROM NotionPages WHERE database_id = %s);", (database_id,))
+        return cursor.fetchone()[0]
+    except Exception as e:
+      self.logger.error(f"Error checking Notion pages: {e}")
+      return None
+
+  ##########################################
+  ### LINE notification outbox functions ###
+  ##########################################
+
+  def _enqueue_line_notifications(self, cursor, notifications: list[LineNotification]):
+    # The transaction ID keeps notifications of later changes to the same booking apart,
+    # while a notification queued twice by one change is stored once
+    for notification in notifications:
+      cursor.execute("""
+      INSERT INTO LineNotificationOutbox (recipient_id, messages, dedupe_key)
+      VALUES (%s, %s::jsonb, %s || ':' || txid_current())
+      ON CONFLICT (dedupe_key) DO NOTHING;
+      """, (notification.recipient_id, json.dumps(notification.messages, ensure_ascii=False), notification.dedupe_key))
+
+  def enqueue_line_notifications(self, notifications: list[LineNotification]) -> bool:
+    if not notifications:
+      return True
+    try:
+      with self.transaction() as cursor:
+        if not cursor:
+          return False
+        self._enqueue_line_notifications(cursor, notifications)
+    except Exception as e:
+      self.logger.error(f"Error queuing LINE notifications: {e}")
+      return False
+    self._wake_notification_dispatcher()
+    return True
+
+  def set_notification_dispatcher(self, notification_dispatcher):
+    """Registers the dispatcher of this process, which is woken up after each queued notification."""
+    self.notification_dispatcher = notification_dispatcher
+
+  def _wake_notification_dispatcher(self):
+    if self.notification_dispatcher:
+      self.notification_dispatcher.wake()
@@ -0,0 +1,141 @@
+import re
+from dataclasses import dataclass
+from .data_class.booking_info import BookingInfo
+
+# Every booking read returns the same columns; room IDs are one character each, so the extra bed
+# counts come back as an array in the same ctid order as the aggregated room_ids string
+BOOKING_PROJECTION_QUERY = """
+SELECT b.booking_id, b.status, c.name, c.phone_number, b.check_in_date, b.last_date,
+  b.total_price, b.notes, b.source, b.prepayment, b.prepayment_note, b.prepayment_status,
+  STRING_AGG(r.room_id, '' ORDER BY r.ctid) AS room_ids,
+  ARRAY_AGG(rb.extra_bed_count ORDER BY r.ctid) AS extra_bed_counts,
+  b.created, b.modified
+FROM Bookings b
+JOIN Customers c ON b.customer_id = c.customer_id
+JOIN RoomBookings rb ON b.booking_id = rb.booking_id
+JOIN Rooms r ON rb.room_id = r.room_id"""
+
+CANCELED_LAST_ORDER = "CASE WHEN b.status = 'canceled'::booking_statuses THEN 1 ELSE 0 END"
+
+PARAMETER_PATTERN = re.compile(r'\$(\d+)')
+
+
+@dataclass(frozen=True)
+class BookingQuery:
+  """
+  A booking projection query with numbered $n parameters, so the same text can be sent to
+  PREPARE or, with the parameters rewritten to psycopg2 placeholders, executed directly.
+  """
+  name: str
+  sql: str
+  parameter_count: int
+  # False for queries whose plan depends on the bound values, which a generic plan cannot see
+  prepared: bool = True
+
+  @property
+  def prepare_sql(self) -> str:
+    return f"PREPARE {self.name} AS {self.sql}"
+
+  @property
+  def execute_sql(self) -> str:
+    if not self.parameter_count:
+      return f"EXECUTE {self.name}"
+    return f"EXECUTE {self.name} ({', '.join(['%s'] * self.parameter_count)})"
+
+  @property
+  def direct_sql(self) -> str:
+    return PARAMETER_PATTERN.sub(r'%(p\1)s', self.sql)
+
+  def direct_params(self, params) -> dict:
+    return { f'p{index}': value for index, value in enumerate(params, start=1) }
+
+
+def build_booking_query(name, where=None, order_by=None, limit=None, with_query=None, join=None, prepared=True) -> BookingQuery:
+  """
+  Builds a booking projection query.
+
+  Args:
+      name (str): Prepared statement name, unique per query.
+      where (str, optional): WHERE clause using $1, $2, ... parameters.
+      order_by (str, optional): ORDER BY clause; columns of joined tables must be aggregated.
+      limit (str, optional): LIMIT clause, usually a parameter.
+      with_query (str, optional): Common table expressions put in front of the projection.
+      join (str, optional): Extra JOIN clause, e.g. on a common table expression.
+      prepared (bool): False to always send the query with its parameters bound client-side.
+  """
+  sql = BOOKING_PROJECTION_QUERY
+  if with_query:
+    sql = f"WITH {with_query}{sql}"
+  if join:
+    sql += f"\n{join}"
+  if where:
+    sql += f"\nWHERE {where}"
+  sql += "\nGROUP BY b.booking_id, c.customer_id"
+  if order_by:
+    sql += f"\nORDER BY {order_by}"
+  if limit:
+    sql += f"\nLIMIT {limit}"
+  parameter_count = max((int(number) for number in PARAMETER_PATTERN.findall(sql)), default=0)
+  return BookingQuery(name, sql, parameter_count, prepared)
+
+
+def booking_info_from_row(row) -> BookingInfo:
+  """Decodes a BOOKING_PROJECTION_QUERY row by unpacking it positionally."""
+  (
+    booking_id, status, customer_name, phone_number, check_in_date, last_date, total_price, notes, source,
+    prepayment, prepayment_note, prepayment_status, room_ids, extra_bed_counts, created, modified
+  ) = row
+  return BookingInfo(
+    booking_id, status, customer_name, phone_number, check_in_date, last_date, int(total_price or 0),
+    notes or '', source, int(prepayment or 0), prepayment_note or '', prepayment_status, room_ids,
+    dict(zip(room_ids, extra_bed_counts)) if extra_bed_counts else {}, created, modified
+  )
+
+
+BOOKING_BY_ID = build_booking_query('booking_by_id', "b.booking_id = $1")
+
+BOOKINGS_BY_IDS = build_booking_query('bookings_by_ids', "b.booking_id = ANY($1::int[])")
+
+BOOKINGS_BY_DATE = {
+  None: build_booking_query(
+    'bookings_by_stay_date',
+    "DATERANGE(b.check_in_date, b.last_date, '[]') @> $1::date",
+    order_by=f"{CANCELED_LAST_ORDER}, b.booking_id"
+  ),
+  'check_in_date': build_booking_query(
+    'bookings_by_check_in_date', "b.check_in_date = $1::date", order_by=f"{CANCELED_LAST_ORDER}, b.booking_id"
+  ),
+  'last_date': build_booking_query(
+    'bookings_by_last_date', "b.last_date = $1::date", order_by=f"{CANCELED_LAST_ORDER}, b.booking_id"
+  ),
+}
+
+OVERLAPPING_BOOKINGS_BY_PHONE = build_booking_query(
+  'overlapping_bookings_by_phone',
+  """c.phone_number = $1
+  AND b.status != 'canceled'::booking_statuses
+  AND DATERANGE(b.check_in_date, b.last_date, '[]') && DATERANGE($2::date, $3::date, '[]')""",
+  order_by="b.check_in_date, b.booking_id"
+)
+
+BOOKINGS_NOT_PREPAID = build_booking_query(
+  'bookings_not_prepaid',
+  """b.check_in_date >= $1::date
+  AND b.status != 'canceled'::booking_statuses
+  AND b.prepayment > 0 AND b.prepayment_status = 'unpaid'::prepayment_statuses""",
+  order_by="b.check_in_date, b.booking_id"
+)
+
+BOOKINGS_BY_CHECK_IN_RANGE = build_booking_query(
+  'bookings_by_check_in_range',
+  """b.check_in_date >= $1::date AND b.check_in_date < $2::date
+  AND b.status != 'canceled'::booking_statuses""",
+  order_by="b.check_in_date, b.booking_id"
+)
+
+LATEST_BOOKINGS = build_booking_query(
+  'latest_bookings', "b.created >= $1 OR b.modified >= $1", order_by="b.created"
+)
+
+# Read through a named server-side cursor, which cannot run a prepared statement
+ALL_BOOKINGS = build_booking_query('all_bookings', order_by="b.created, b.booking_id", prepared=False)
@@ -0,0 +1,70 @@
+from typing import Optional
+from .booking_projection import CANCELED_LAST_ORDER, build_booking_query
+
+# Relevance of each kind of keyword match; name matches rank by trigram similarity in between
+KEYWORD_RANK_BOOKING_ID = 4
+KEYWORD_RANK_PHONE_SUFFIX = 3
+KEYWORD_RANK_NAME = 1
+
+# Each branch is planned on its own index (primary key, customers_phone_number_reversed_idx,
+# customers_name_trgm_idx) and the matches are unioned, instead of OR-ing the filters, which
+# forces a scan of every booking. A booking matched by several branches (keyword "5" for booking
+# 5 whose phone ends in 5) is collapsed to its best rank, so the projection joins its rooms once.
+KEYWORD_MATCHES_QUERY = f"""keyword_match_rows AS (
+  SELECT b.booking_id, {KEYWORD_RANK_BOOKING_ID}::real AS rank
+  FROM Bookings b
+  WHERE b.booking_id = $1::int
+  UNION ALL
+  SELECT b.booking_id, {KEYWORD_RANK_PHONE_SUFFIX}::real
+  FROM Customers c
+  JOIN Bookings b ON b.customer_id = c.customer_id
+  WHERE REVERSE(c.phone_number) LIKE $2
+  UNION ALL
+  SELECT b.booking_id, {KEYWORD_RANK_NAME} + SIMILARITY(c.name, $3)
+  FROM Customers c
+  JOIN Bookings b ON b.customer_id = c.customer_id
+  WHERE c.name LIKE $4
+),
+keyword_matches AS (
+  SELECT booking_id, MAX(rank) AS rank
+  FROM keyword_match_rows
+  GROUP BY booking_id
+)"""
+
+# The reversed phone pattern needs the planner to see the literal prefix, so the query is not prepared.
+BOOKINGS_BY_KEYWORD = build_booking_query(
+  'bookings_by_keyword',
+  with_query=KEYWORD_MATCHES_QUERY,
+  join="JOIN keyword_matches km ON km.booking_id = b.booking_id",
+  order_by=f"{CANCELED_LAST_ORDER}, MAX(km.rank) DESC, b.booking_id DESC",
+  limit="$5",
+  prepared=False
+)
+
+
+def escape_like(value: str) -> str:
+  return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def get_keyword_booking_id(keyword: str) -> Optional[int]:
+  """Returns the keyword as a booking ID when it is one, so it is looked up by primary key."""
+  keyword = keyword.strip()
+  if not keyword.isascii() or not keyword.isdigit():
+    return None
+  booking_id = int(keyword)
+  return booking_id if booking_id <= 2 ** 31 - 1 else None
+
+
+def get_keyword_search_params(keyword: str, limit: int) -> tuple:
+  """
+  Returns the parameters of BOOKINGS_BY_KEYWORD: the exact booking ID, the reversed phone
+  number prefix (the phone number ends with the keyword) and the customer name substring.
+  """
+  escaped_keyword = escape_like(keyword)
+  return (
+    get_keyword_booking_id(keyword),
+    f"{escape_like(keyword[::-1])}%",
+    keyword,
+    f"%{escaped_keyword}%",
+    limit,
+  )
@@ -0,0 +1,174 @@
+import threading
+import time
+
+
+class PoolTimeoutError(Exception):
+  pass
+
+
+class _PooledConnection:
+  def __init__(self, connection):
+    self.connection = connection
+    self.created_at = time.monotonic()
+    self.released_at = self.created_at
+
+
+class HealthCheckedConnectionPool:
+  """
+  Thread-safe connection pool that validates connections on checkout.
+
+  Idle connections older than max_idle_seconds are pinged before being handed out, connections
+  older than max_lifetime_seconds are recycled, and callers wait up to timeout seconds for a free
+  connection instead of failing immediately when the pool is exhausted.
+  """
+
+  def __init__(self, minconn, maxconn, connect, timeout=10, max_idle_seconds=30, max_lifetime_seconds=1800, logger=None):
+    self.minconn = minconn
+    self.maxconn = maxconn
+    self.timeout = timeout
+    self.max_idle_seconds = max_idle_seconds
+    self.max_lifetime_seconds = max_lifetime_seconds
+    self.logger = logger
+    self._connect = connect
+    self._condition = threading.Condition()
+    self._idle = []
+    self._in_use = {}
+    self._pending = 0
+    self._closed = False
+    self._total_wait_seconds = 0.0
+    self._max_wait_seconds = 0.0
+    self._checkout_count = 0
+    self._wait_count = 0
+    self._discarded_count = 0
+
+    for _ in range(minconn):
+      self._idle.append(_PooledConnection(self._connect()))
+
+  def getconn(self):
+    started_at = time.monotonic()
+    deadline = started_at + self.timeout
+    waited = False
+    with self._condition:
+      while True:
+        if self._closed:
+          raise PoolTimeoutError("Connection pool is closed")
+        if self._idle or self._size() < self.maxconn:
+          pooled = self._idle.pop() if self._idle else None
+          # Reserve the slot while validating outside the lock
+          self._pending += 1
+          break
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+          raise PoolTimeoutError(f"Timed out after {self.timeout}s waiting for a database connection")
+        waited = True
+        self._condition.wait(remaining)
+
+    try:
+      pooled = self._validate(pooled)
+    except Exception:
+      with self._condition:
+        self._pending -= 1
+        self._condition.notify()
+      raise
+
+    wait_seconds = time.monotonic() - started_at
+    with self._condition:
+      self._pending -= 1
+      self._in_use[id(pooled.connection)] = pooled
+      self._checkout_count += 1
+      self._total_wait_seconds += wait_seconds
+      self._max_wait_seconds = max(self._max_wait_seconds, wait_seconds)
+      if waited:
+        self._wait_count += 1
+    return pooled.connection
+
+  def putconn(self, connection, close=False):
+    with self._condition:
+      pooled = self._in_use.pop(id(connection), None)
+      if pooled is None:
+        return
+
+    if not close and not self._closed and not connection.closed:
+      try:
+        # Leave no open transaction behind for the next borrower
+        connection.rollback()
+      except Exception:
+        close = True
+    else:
+      close = True
+
+    with self._condition:
+      if close or self._closed:
+        self._close_quietly(connection)
+        self._discarded_count += 1
+      else:
+        pooled.released_at = time.monotonic()
+        self._idle.append(pooled)
+      self._condition.notify()
+
+  def closeall(self):
+    with self._condition:
+      self._closed = True
+      connections = [pooled.connection for pooled in self._idle] + [pooled.connection for pooled in self._in_use.values()]
+      self._idle = []
+      self._in_use = {}
+      self._condition.notify_all()
+    for connection in connections:
+      self._close_quietly(connection)
+
+  def get_stats(self) -> dict:
+    with self._condition:
+      return {
+        'size': self._size(),
+        'idle': len(self._idle),
+        'in_use': len(self._in_use),
+        'max_size': self.maxconn,
+        'checkouts': self._checkout_count,
+        'waits': self._wait_count,
+        'discarded': self._discarded_count,
+        'avg_wait_ms': round(self._total_wait_seconds / self._checkout_count * 1000, 3) if self._checkout_count else 0.0,
+        'max_wait_ms': round(self._max_wait_seconds * 1000, 3),
+      }
+
+  def _size(self):
+    return len(self._idle) + len(self._in_use) + self._pending
+
+  def _validate(self, pooled):
+    """Returns a healthy pooled connection, replacing the given one when it is stale or broken."""
+    if pooled is not None:
+      now = time.monotonic()
+      if now - pooled.created_at > self.max_lifetime_seconds:
+        self._discard(pooled, "exceeded max lifetime")
+        pooled = None
+      elif now - pooled.released_at > self.max_idle_seconds and not self._ping(pooled.connection):
+        self._discard(pooled, "failed health check")
+        pooled = None
+
+    if pooled is None:
+      pooled = _PooledConnection(self._connect())
+    return pooled
+
+  def _ping(self, connection):
+    if connection.closed:
+      return False
+    try:
+      with connection.cursor() as cursor:
+        cursor.execute("SELECT 1")
+      if not connection.autocommit:
+        connection.rollback()
+      return True
+    except Exception:
+      return False
+
+  def _discard(self, pooled, reason):
+    if self.logger:
+      self.logger.info(f"Discarding pooled database connection: {reason}")
+    self._close_quietly(pooled.connection)
+    with self._condition:
+      self._discarded_count += 1
+
+  def _close_quietly(self, connection):
+    try:
+      connection.close()
+    except Exception:
+      pass
@@ -0,0 +1,12 @@
+from dataclasses import dataclass, field
+
+@dataclass
+class ChangeBatch:
+  consumer: str
+  # txid snapshot the batch was read up to, saved as the consumer's cursor once the batch is handled
+  snapshot: str
+  booking_ids: list[int] = field(default_factory=list)
+  closure_ids: list[int] = field(default_factory=list)
+  change_count: int = 0
+  # The consumer had no cursor yet, so the batch is empty and the changes have to be read otherwise
+  is_initial: bool = False
@@ -0,0 +1,20 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+JOB_RUN_STATUS_SUCCEEDED = 'succeeded'
+JOB_RUN_STATUS_FAILED = 'failed'
+
+@dataclass
+class JobRun:
+  run_id: int
+  job_name: str
+  executor: str
+  status: str
+  started: datetime
+  finished: datetime
+  duration_ms: int
+  item_count: Optional[int] = None
+  # Errors logged during the run; most jobs log their failures instead of raising them
+  error_count: int = 0
+  error: Optional[str] = None
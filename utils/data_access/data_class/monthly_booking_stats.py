@@ -0,0 +1,35 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+
+@dataclass
+class RoomTypeStats:
+  room_type: str
+  available_room_nights: int
+  rooms_sold: int
+  room_revenue: int
+
+  @property
+  def occupancy_rate(self) -> float:
+    return self.rooms_sold / self.available_room_nights if self.available_room_nights else 0.0
+
+  @property
+  def adr(self) -> int:
+    """Average daily rate: room revenue per room night sold."""
+    return round(self.room_revenue / self.rooms_sold) if self.rooms_sold else 0
+
+  @property
+  def revpar(self) -> int:
+    """Room revenue per available room night."""
+    return round(self.room_revenue / self.available_room_nights) if self.available_room_nights else 0
+
+
+@dataclass
+class MonthlyBookingStats:
+  year_month: str
+  booking_count: int
+  total_revenue: int
+  booking_com_commission: int
+  staff_share: int
+  balance: int
+  room_types: list[RoomTypeStats] = field(default_factory=list)
+  refreshed: datetime = None
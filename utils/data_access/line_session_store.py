@@ -0,0 +1,136 @@
+import json
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date, datetime
+
+SESSION_PURGE_INTERVAL_SECONDS = 600
+
+
+def new_session() -> dict:
+  return { 'flow': None, 'step': None, 'data': {} }
+
+
+def _encode_value(value):
+  if isinstance(value, datetime):
+    return { '$dt': value.isoformat() }
+  if isinstance(value, date):
+    return { '$d': value.isoformat() }
+  raise TypeError(f"Cannot serialize {type(value).__name__} in a LINE session")
+
+
+def _decode_object(obj):
+  if len(obj) == 1:
+    if '$d' in obj:
+      return date.fromisoformat(obj['$d'])
+    if '$dt' in obj:
+      return datetime.fromisoformat(obj['$dt'])
+  return obj
+
+
+def encode_session(session: dict) -> str:
+  """Serializes a session to compact JSON, tagging dates and datetimes so they round-trip."""
+  return json.dumps(session, default=_encode_value, ensure_ascii=False, separators=(',', ':'))
+
+
+def decode_session(payload: str) -> dict:
+  return json.loads(payload, object_hook=_decode_object)
+
+
+class InMemorySessionStore:
+  """
+  Keeps LINE conversation sessions in process memory.
+
+  Only safe with a single gunicorn worker; sessions are lost on restart.
+  """
+
+  def __init__(self, ttl_seconds):
+    self.ttl_seconds = ttl_seconds
+    self._lock = threading.Lock()
+    self._sessions = {}
+    self._user_locks = {}
+    self._purged_at = time.monotonic()
+
+  @contextmanager
+  def session(self, user_id):
+    """Yields the session of user_id, holding a per-user lock until the block exits."""
+    with self._get_user_lock(user_id):
+      with self._lock:
+        expires_at, session = self._sessions.get(user_id, (0, None))
+        if session is None or expires_at < time.monotonic():
+          session = new_session()
+      yield session
+      with self._lock:
+        self._sessions[user_id] = (time.monotonic() + self.ttl_seconds, session)
+        self._purge_expired()
+
+  def _get_user_lock(self, user_id):
+    with self._lock:
+      return self._user_locks.setdefault(user_id, threading.Lock())
+
+  def _purge_expired(self):
+    now = time.monotonic()
+    if now - self._purged_at < SESSION_PURGE_INTERVAL_SECONDS:
+      return
+    self._purged_at = now
+    for user_id in [user_id for user_id, (expires_at, _) in self._sessions.items() if expires_at < now]:
+      del self._sessions[user_id]
+      user_lock = self._user_locks.get(user_id)
+      if user_lock and not user_lock.locked():
+        del self._user_locks[user_id]
+
+
+class PostgresSessionStore:
+  """
+  Keeps LINE conversation sessions in the LineSessions table, so every gunicorn worker sees
+  the same flow state and restarts do not interrupt staff in the middle of a flow.
+  """
+
+  def __init__(self, booking_dao, ttl_seconds):
+    self.booking_dao = booking_dao
+    self.ttl_seconds = ttl_seconds
+    self._purged_at = time.monotonic()
+
+  @contextmanager
+  def session(self, user_id):
+    """
+    Yields the session of user_id and saves it when the block exits.
+
+    A transaction-scoped advisory lock on the user serializes concurrent events of the same
+    user across workers; the session is saved in the same transaction.
+    """
+    with self.booking_dao.transaction() as cursor:
+      if not cursor:
+        self.booking_dao.logger.error(f"No database connection for LINE session of {user_id}, using an empty session")
+        yield new_session()
+        return
+
+      cursor.execute("SELECT pg_advisory_xact_lock(hashtext(%s));", (f'line_session:{user_id}',))
+      cursor.execute("SELECT data FROM LineSessions WHERE user_id = %s AND expires_at > NOW();", (user_id,))
+      row = cursor.fetchone()
+      session = decode_session(row[0]) if row else new_session()
+
+      yield session
+
+      cursor.execute("""
+      INSERT INTO LineSessions (user_id, data, expires_at)
+      VALUES (%s, %s, NOW() + %s * INTERVAL '1 second')
+      ON CONFLICT (user_id) DO UPDATE
+      SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at;
+      """, (user_id, encode_session(session), self.ttl_seconds))
+      self._purge_expired(cursor)
+
+  def _purge_expired(self, cursor):
+    now = time.monotonic()
+    if now - self._purged_at < SESSION_PURGE_INTERVAL_SECONDS:
+      return
+    self._purged_at = now
+    cursor.execute("DELETE FROM LineSessions WHERE expires_at < NOW();")
+
+
+def create_session_store(backend, ttl_seconds, booking_dao=None):
+  if backend == 'postgres':
+    return PostgresSessionStore(booking_dao, ttl_seconds)
+  if backend != 'memory':
+    raise ValueError(f"Unknown LINE session store backend: {backend}")
+  return InMemorySessionStore(ttl_seconds)
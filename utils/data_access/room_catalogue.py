@@ -0,0 +1,45 @@
+import threading
+import time
+
+
+class RoomCatalogue:
+  """
+  Process-wide copy of the Rooms table.
+
+  Rooms change a few times a year, so they are loaded once and served from memory until
+  the TTL expires or the catalogue is invalidated by a rooms_changed notification.
+  """
+
+  def __init__(self, ttl_seconds):
+    self.ttl_seconds = ttl_seconds
+    self._lock = threading.Lock()
+    self._rooms = []
+    self.loaded_at = None
+
+  def load(self, rooms):
+    """
+    Replace the cached rooms.
+
+    Args:
+        rooms (list[dict]): Rooms in display order, as returned by BookingDAO.get_rooms_by_ids.
+    """
+    with self._lock:
+      self._rooms = [dict(room) for room in rooms]
+      self.loaded_at = time.monotonic()
+
+  def invalidate(self):
+    with self._lock:
+      self.loaded_at = None
+
+  def is_fresh(self):
+    loaded_at = self.loaded_at
+    return loaded_at is not None and time.monotonic() - loaded_at <= self.ttl_seconds
+
+  def get_rooms(self, room_ids=None) -> list[dict]:
+    with self._lock:
+      rooms = self._rooms
+    if room_ids:
+      room_ids = set(room_ids)
+      rooms = [room for room in rooms if room['room_id'] in room_ids]
+    # Hand out copies so callers cannot modify the shared catalogue
+    return [dict(room) for room in rooms]
@@ -0,0 +1,111 @@
+import threading
+import time
+from datetime import timedelta
+
+HOLDER_TYPE_BOOKING = 'booking'
+HOLDER_TYPE_CLOSURE = 'closure'
+
+
+def _iter_nights(start_date, last_date):
+  current_date = start_date
+  while current_date <= last_date:
+    yield current_date
+    current_date += timedelta(days=1)
+
+
+class RoomOccupancyIndex:
+  """
+  In-memory index of occupied room nights.
+
+  Every (room_id, night) key maps to the set of holders (bookings or closures) occupying it,
+  so availability of a date range can be answered without querying the database.
+  """
+
+  def __init__(self):
+    self._lock = threading.RLock()
+    self._room_ids = []
+    self._holders_by_room_night = {}
+    self._room_nights_by_holder = {}
+    self.loaded_at = None
+
+  def load(self, room_ids, bookings, closures):
+    """
+    Rebuild the index from scratch.
+
+    Args:
+        room_ids (list[str]): Bookable room IDs in display order.
+        bookings (iterable): (booking_id, room_ids, check_in_date, last_date) of non-canceled bookings.
+        closures (iterable): (closure_id, room_ids, start_date, last_date) of valid closures.
+    """
+    with self._lock:
+      self._room_ids = list(room_ids)
+      self._holders_by_room_night = {}
+      self._room_nights_by_holder = {}
+      for booking_id, booking_room_ids, check_in_date, last_date in bookings:
+        self._add_holder((HOLDER_TYPE_BOOKING, booking_id), booking_room_ids, check_in_date, last_date)
+      for closure_id, closure_room_ids, start_date, last_date in closures:
+        self._add_holder((HOLDER_TYPE_CLOSURE, closure_id), closure_room_ids, start_date, last_date)
+      self.loaded_at = time.monotonic()
+
+  def is_loaded(self):
+    return self.loaded_at is not None
+
+  def get_age_seconds(self):
+    if not self.is_loaded():
+      return None
+    return time.monotonic() - self.loaded_at
+
+  def set_booking(self, booking_id, room_ids, check_in_date, last_date):
+    with self._lock:
+      holder = (HOLDER_TYPE_BOOKING, booking_id)
+      self._remove_holder(holder)
+      self._add_holder(holder, room_ids, check_in_date, last_date)
+
+  def remove_booking(self, booking_id):
+    with self._lock:
+      self._remove_holder((HOLDER_TYPE_BOOKING, booking_id))
+
+  def set_closure(self, closure_id, room_ids, start_date, last_date):
+    with self._lock:
+      holder = (HOLDER_TYPE_CLOSURE, closure_id)
+      self._remove_holder(holder)
+      self._add_holder(holder, room_ids, start_date, last_date)
+
+  def remove_closure(self, closure_id):
+    with self._lock:
+      self._remove_holder((HOLDER_TYPE_CLOSURE, closure_id))
+
+  def get_available_room_ids(self, check_in_date, last_date, exclude_booking_id=None) -> list[str]:
+    excluded_holder = (HOLDER_TYPE_BOOKING, exclude_booking_id) if exclude_booking_id is not None else None
+    nights = list(_iter_nights(check_in_date, last_date))
+    with self._lock:
+      return [
+        room_id
+        for room_id in self._room_ids
+        if not any(self._is_occupied(room_id, night, excluded_holder) for night in nights)
+      ]
+
+  def _is_occupied(self, room_id, night, excluded_holder):
+    holders = self._holders_by_room_night.get((room_id, night))
+    if not holders:
+      return False
+    return len(holders) > 1 or excluded_holder not in holders
+
+  def _add_holder(self, holder, room_ids, start_date, last_date):
+    room_nights = [
+      (room_id, night)
+      for room_id in room_ids
+      for night in _iter_nights(start_date, last_date)
+    ]
+    for room_night in room_nights:
+      self._holders_by_room_night.setdefault(room_night, set()).add(holder)
+    self._room_nights_by_holder[holder] = room_nights
+
+  def _remove_holder(self, holder):
+    for room_night in self._room_nights_by_holder.pop(holder, []):
+      holders = self._holders_by_room_night.get(room_night)
+      if not holders:
+        continue
+      holders.discard(holder)
+      if not holders:
+        del self._holders_by_room_night[room_night]
@@ -0,0 +1,197 @@
+import logging
+import re
+from datetime import timedelta
+from typing import Optional
+from utils.booking_utils import format_booking_info
+from utils.closure_utils import format_closure_info
+from utils.data_access.data_class.booking_info import BookingInfo
+from utils.data_access.data_class.closure_info import ClosureInfo
+
+# Google accepts at most 50 calls per batch request
+GOOGLE_CALENDAR_BATCH_SIZE = 50
+GOOGLE_CALENDAR_LIST_PAGE_SIZE = 2500
+GOOGLE_CALENDAR_TIMEZONE = 'Asia/Taipei'
+
+ENTITY_TYPE_BOOKING = 'booking'
+ENTITY_TYPE_CLOSURE = 'closure'
+
+# Events created before the GoogleCalendarEvents table existed are only identified by the ID in
+# their description; ＣＬＩＤ must not be read as a booking ID
+EVENT_DESCRIPTION_ID_PATTERNS = {
+  ENTITY_TYPE_BOOKING: re.compile(r'(?<!ＣＬ)ＩＤ：(\d+)'),
+  ENTITY_TYPE_CLOSURE: re.compile(r'ＣＬＩＤ：(\d+)'),
+}
+
+# The event was deleted from the calendar by hand
+MISSING_EVENT_STATUSES = (404, 410)
+
+
+def build_all_day_event_body(summary, description, start_date, last_date) -> dict:
+  return {
+    'summary': summary,
+    'description': description,
+    'start': {
+      'date': start_date.strftime('%Y-%m-%d'),
+      'timeZone': GOOGLE_CALENDAR_TIMEZONE,
+    },
+    'end': {
+      'date': (last_date + timedelta(days=1)).strftime('%Y-%m-%d'),
+      'timeZone': GOOGLE_CALENDAR_TIMEZONE,
+    },
+    'reminders': {
+      'useDefault': False,
+      'overrides': [
+        {'method': 'popup', 'minutes': 1440},  # Reminder 1 day before
+      ],
+    },
+  }
+
+
+def get_booking_event_changes(bookings: list[BookingInfo]) -> dict[int, Optional[dict]]:
+  """Returns the event body of each booking keyed by booking ID, or None when its event should be deleted."""
+  return {
+    booking_info.booking_id: None if booking_info.status == 'canceled' else build_all_day_event_body(
+      f'{booking_info.customer_name}，{booking_info.room_ids}，{int(booking_info.total_price)}',
+      format_booking_info(booking_info, 'calendar'),
+      booking_info.check_in_date,
+      booking_info.last_date
+    )
+    for booking_info in bookings
+  }
+
+
+def get_closure_event_changes(closures: list[ClosureInfo]) -> dict[int, Optional[dict]]:
+  """Returns the event body of each closure keyed by closure ID, or None when its event should be deleted."""
+  return {
+    closure_info.closure_id: None if closure_info.status == 'deleted' else build_all_day_event_body(
+      f'關{closure_info.room_ids}',
+      format_closure_info(closure_info, 'calendar'),
+      closure_info.start_date,
+      closure_info.last_date
+    )
+    for closure_info in closures
+  }
+
+
+def get_http_status(exception) -> Optional[int]:
+  # googleapiclient's HttpError keeps the response in resp
+  return getattr(getattr(exception, 'resp', None), 'status', None)
+
+
+def execute_in_batches(calendar_service, requests):
+  """
+  Sends API requests through the batch endpoint, GOOGLE_CALENDAR_BATCH_SIZE per HTTP request.
+
+  Args:
+      requests (list[tuple[str, HttpRequest]]): (request_id, request) pairs.
+
+  Yields:
+      dict[str, tuple]: (response, exception) keyed by request ID, one dict per batch.
+  """
+  for start in range(0, len(requests), GOOGLE_CALENDAR_BATCH_SIZE):
+    results = {}
+    def collect_result(request_id, response, exception):
+      results[request_id] = (response, exception)
+
+    batch = calendar_service.new_batch_http_request(callback=collect_result)
+    for request_id, request in requests[start:start + GOOGLE_CALENDAR_BATCH_SIZE]:
+      batch.add(request, request_id=request_id)
+    batch.execute()
+    yield results
+
+
+def sync_calendar_events(calendar_service, booking_dao, calendar_id, entity_type, changes: dict[int, Optional[dict]]) -> list[int]:
+  """
+  Creates, patches or deletes the Google Calendar events of changed bookings or closures.
+
+  Events are looked up in the GoogleCalendarEvents table instead of searching the calendar, so
+  each change is one call, and the calls are sent in batches.
+
+  Args:
+      entity_type (str): 'booking' or 'closure'.
+      changes (dict[int, Optional[dict]]): Event bodies keyed by booking or closure ID; None deletes the event.
+
+  Returns:
+      list[int]: IDs whose event could not be synced.
+  """
+  if not changes:
+    return []
+  event_ids = booking_dao.get_google_calendar_event_ids(calendar_id, entity_type, list(changes.keys()))
+  if event_ids is None:
+    raise RuntimeError(f"Could not load the Google Calendar event IDs of {entity_type} changes")
+
+  events = calendar_service.events()
+  requests = []
+  for entity_id, event_body in changes.items():
+    event_id = event_ids.get(entity_id)
+    if event_body is None:
+      if event_id:
+        requests.append((f'delete:{entity_id}', events.delete(calendarId=calendar_id, eventId=event_id)))
+    elif event_id:
+      requests.append((f'patch:{entity_id}', events.patch(calendarId=calendar_id, eventId=event_id, body=event_body)))
+    else:
+      requests.append((f'insert:{entity_id}', events.insert(calendarId=calendar_id, body=event_body)))
+
+  failed_entity_ids = []
+  while requests:
+    retry_requests = []
+    for batch_results in execute_in_batches(calendar_service, requests):
+      saved_events = {}
+      deleted_entity_ids = []
+      for request_id, (response, exception) in batch_results.items():
+        action, entity_id = request_id.split(':')
+        entity_id = int(entity_id)
+        status = get_http_status(exception) if exception else None
+        if exception is None and action == 'delete':
+          deleted_entity_ids.append(entity_id)
+        elif exception is None:
+          saved_events[entity_id] = (response['id'], response.get('etag'))
+          logging.info(f"{'Created' if action == 'insert' else 'Updated'} Google Calendar event for {entity_type} ID {entity_id}")
+        elif status in MISSING_EVENT_STATUSES and action == 'delete':
+          deleted_entity_ids.append(entity_id)
+        elif status in MISSING_EVENT_STATUSES and action == 'patch':
+          retry_requests.append((f'insert:{entity_id}', events.insert(calendarId=calendar_id, body=changes[entity_id])))
+        else:
+          failed_entity_ids.append(entity_id)
+          logging.error(f"Error syncing {entity_type} {entity_id} to Google Calendar: {exception}")
+
+      # Saved after every batch, so a later batch failing does not leave created events unmapped,
+      # to be created again on the next run
+      if deleted_entity_ids:
+        logging.info(f"Deleted Google Calendar events for {entity_type} IDs {sorted(deleted_entity_ids)}")
+      booking_dao.save_google_calendar_events(calendar_id, entity_type, saved_events)
+      booking_dao.delete_google_calendar_events(calendar_id, entity_type, deleted_entity_ids)
+    requests = retry_requests
+  return failed_entity_ids
+
+
+def backfill_calendar_event_ids(calendar_service, booking_dao, calendar_id) -> dict[str, int]:
+  """
+  Maps the events created before the GoogleCalendarEvents table existed, by reading the booking
+  or closure ID from their description. Lists the whole calendar once, a page at a time.
+
+  Returns:
+      dict[str, int]: Number of mapped events per entity type.
+  """
+  events_by_type = { entity_type: {} for entity_type in EVENT_DESCRIPTION_ID_PATTERNS }
+  page_token = None
+  while True:
+    result = calendar_service.events().list(
+      calendarId=calendar_id,
+      maxResults=GOOGLE_CALENDAR_LIST_PAGE_SIZE,
+      pageToken=page_token,
+      fields='items(id,etag,description),nextPageToken'
+    ).execute()
+    for event in result.get('items', []):
+      for entity_type, pattern in EVENT_DESCRIPTION_ID_PATTERNS.items():
+        match = pattern.search(event.get('description') or '')
+        if match:
+          # Like the old search-based sync, the last of duplicated events is kept
+          events_by_type[entity_type][int(match.group(1))] = (event['id'], event.get('etag'))
+    page_token = result.get('nextPageToken')
+    if not page_token:
+      break
+
+  for entity_type, events in events_by_type.items():
+    booking_dao.save_google_calendar_events(calendar_id, entity_type, events)
+  return { entity_type: len(events) for entity_type, events in events_by_type.items() }
@@ -0,0 +1,180 @@
+import gzip
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from psycopg2 import sql
+
+# Only columns stamped by every insert and update can select the rows written since the last
+# backup: `modified`, kept current by the update_timestamp trigger (or by every write of its table),
+# and the columns below that their table's writes always set. Other tables, such as
+# LineNotificationOutbox whose sent_at and attempts change without any timestamp, are copied whole.
+CHANGE_COLUMN = 'modified'
+CHANGE_COLUMNS_BY_TABLE = {
+  'syncrecords': 'synced_time',
+  'googlecalendarevents': 'synced_time',
+  'notionpages': 'synced_time',
+  'changelog': 'created',
+  'schedulerjobruns': 'finished',
+}
+
+TABLE_MODE_CHANGES = 'changes'
+TABLE_MODE_FULL = 'full'
+
+
+def open_gzip_text(path, mode):
+  """gzip with a fixed header timestamp, so identical content always hashes the same."""
+  if mode == 'w':
+    return io.TextIOWrapper(gzip.GzipFile(path, 'wb', mtime=0), encoding='utf-8', newline='')
+  return io.TextIOWrapper(gzip.GzipFile(path, 'rb'), encoding='utf-8', newline='')
+
+
+def get_table_specs(cursor) -> dict[str, dict]:
+  """Returns the columns, primary key and change column of every table in the public schema."""
+  cursor.execute("""
+  SELECT c.relname,
+    ARRAY(
+      SELECT a.attname FROM pg_attribute a
+      WHERE a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped AND a.attgenerated = ''
+      ORDER BY a.attnum
+    ),
+    ARRAY(
+      SELECT a.attname FROM pg_index i
+      JOIN pg_attribute a ON a.attrelid = i.indrelid AND a.attnum = ANY(i.indkey)
+      WHERE i.indrelid = c.oid AND i.indisprimary
+      ORDER BY a.attnum
+    )
+  FROM pg_class c
+  JOIN pg_namespace n ON n.oid = c.relnamespace
+  WHERE n.nspname = 'public' AND c.relkind = 'r'
+  ORDER BY c.relname;
+  """)
+  specs = {}
+  for table, columns, key_columns in cursor.fetchall():
+    change_column = CHANGE_COLUMNS_BY_TABLE.get(table) or (CHANGE_COLUMN if CHANGE_COLUMN in columns else None)
+    specs[table] = {
+      'columns': list(columns),
+      'key_columns': list(key_columns),
+      'change_column': change_column,
+      'mode': TABLE_MODE_CHANGES if change_column and key_columns else TABLE_MODE_FULL,
+    }
+  return specs
+
+
+def capture_changes(connection, since: datetime, directory) -> tuple[datetime, dict[str, dict]]:
+  """
+  Writes the rows of every table written since `since` to <table>.changes.csv.gz with the
+  primary keys of all its rows in <table>.keys.csv.gz, so deletions can be replayed. Tables
+  without a primary key or a reliable change column are written whole to <table>.rows.csv.gz.
+  Everything is read from one repeatable-read snapshot.
+
+  Returns:
+      tuple[datetime, dict]: The snapshot time and the table specs, as stored in the manifest.
+  """
+  connection.set_session(isolation_level='REPEATABLE READ', readonly=True)
+  try:
+    with connection.cursor() as cursor:
+      cursor.execute("SELECT LOCALTIMESTAMP;")
+      snapshot_time = cursor.fetchone()[0]
+      specs = get_table_specs(cursor)
+
+      for table, spec in specs.items():
+        columns = sql.SQL(', ').join(map(sql.Identifier, spec['columns']))
+        if spec['mode'] == TABLE_MODE_CHANGES:
+          changed_rows_query = sql.SQL("COPY (SELECT {} FROM {} WHERE {} >= {}) TO STDOUT WITH (FORMAT csv)").format(
+            columns, sql.Identifier(table), sql.Identifier(spec['change_column']), sql.Literal(since)
+          )
+          key_columns = sql.SQL(', ').join(map(sql.Identifier, spec['key_columns']))
+          keys_query = sql.SQL("COPY (SELECT {} FROM {} ORDER BY {}) TO STDOUT WITH (FORMAT csv)").format(
+            key_columns, sql.Identifier(table), key_columns
+          )
+          with open_gzip_text(os.path.join(directory, f'{table}.changes.csv.gz'), 'w') as f:
+            cursor.copy_expert(changed_rows_query.as_string(connection), f)
+          with open_gzip_text(os.path.join(directory, f'{table}.keys.csv.gz'), 'w') as f:
+            cursor.copy_expert(keys_query.as_string(connection), f)
+        else:
+          rows_query = sql.SQL("COPY (SELECT {} FROM {}) TO STDOUT WITH (FORMAT csv)").format(columns, sql.Identifier(table))
+          with open_gzip_text(os.path.join(directory, f'{table}.rows.csv.gz'), 'w') as f:
+            cursor.copy_expert(rows_query.as_string(connection), f)
+    connection.rollback()
+  finally:
+    connection.set_session(isolation_level='DEFAULT', readonly=False)
+  return snapshot_time, specs
+
+
+def apply_table_changes(connection, table, spec, directory):
+  """
+  Replays one table of a change set. Runs as session_replication_role = replica, which needs a
+  superuser, so foreign keys and triggers (e.g. update_timestamp) do not fire while tables are
+  applied in any order.
+  """
+  columns = sql.SQL(', ').join(map(sql.Identifier, spec['columns']))
+  with connection.cursor() as cursor:
+    cursor.execute("SET LOCAL session_replication_role = replica;")
+    if spec['mode'] == TABLE_MODE_FULL:
+      cursor.execute(sql.SQL("DELETE FROM {};").format(sql.Identifier(table)))
+      with open_gzip_text(os.path.join(directory, f'{table}.rows.csv.gz'), 'r') as f:
+        cursor.copy_expert(sql.SQL("COPY {} ({}) FROM STDIN WITH (FORMAT csv)").format(sql.Identifier(table), columns).as_string(connection), f)
+      return
+
+    key_columns = sql.SQL(', ').join(map(sql.Identifier, spec['key_columns']))
+    cursor.execute(sql.SQL("CREATE TEMP TABLE changed_rows ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA;").format(columns, sql.Identifier(table)))
+    cursor.execute(sql.SQL("CREATE TEMP TABLE kept_keys ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA;").format(key_columns, sql.Identifier(table)))
+    with open_gzip_text(os.path.join(directory, f'{table}.changes.csv.gz'), 'r') as f:
+      cursor.copy_expert("COPY changed_rows FROM STDIN WITH (FORMAT csv)", f)
+    with open_gzip_text(os.path.join(directory, f'{table}.keys.csv.gz'), 'r') as f:
+      cursor.copy_expert("COPY kept_keys FROM STDIN WITH (FORMAT csv)", f)
+
+    value_columns = [column for column in spec['columns'] if column not in spec['key_columns']]
+    on_conflict = sql.SQL("DO NOTHING") if not value_columns else sql.SQL("DO UPDATE SET {}").format(
+      sql.SQL(', ').join(
+        sql.SQL("{} = EXCLUDED.{}").format(sql.Identifier(column), sql.Identifier(column))
+        for column in value_columns
+      )
+    )
+    cursor.execute(sql.SQL("INSERT INTO {} ({}) SELECT {} FROM changed_rows ON CONFLICT ({}) {};").format(
+      sql.Identifier(table), columns, columns, key_columns, on_conflict
+    ))
+    key_match = sql.SQL(' AND ').join(
+      sql.SQL("k.{} = t.{}").format(sql.Identifier(column), sql.Identifier(column))
+      for column in spec['key_columns']
+    )
+    cursor.execute(sql.SQL("DELETE FROM {} t WHERE NOT EXISTS (SELECT 1 FROM kept_keys k WHERE {});").format(
+      sql.Identifier(table), key_match
+    ))
+
+
+def apply_changes(connect, tables: dict[str, dict], directory, jobs=4):
+  """
+  Replays a change set written by capture_changes, one table per worker with up to `jobs`
+  workers, each table in its own transaction on its own connection from connect().
+  """
+  def apply_table(table):
+    connection = connect()
+    try:
+      with connection:
+        apply_table_changes(connection, table, tables[table], directory)
+    finally:
+      connection.close()
+
+  with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+    # list() re-raises the first error of any table
+    list(executor.map(apply_table, tables))
+
+
+def reset_sequences(connection):
+  """Moves every serial sequence past the largest restored ID."""
+  with connection.cursor() as cursor:
+    cursor.execute("""
+    SELECT c.relname, a.attname, PG_GET_SERIAL_SEQUENCE(QUOTE_IDENT(c.relname), a.attname)
+    FROM pg_class c
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    JOIN pg_attribute a ON a.attrelid = c.oid AND a.attnum > 0 AND NOT a.attisdropped
+    WHERE n.nspname = 'public' AND c.relkind = 'r'
+      AND PG_GET_SERIAL_SEQUENCE(QUOTE_IDENT(c.relname), a.attname) IS NOT NULL;
+    """)
+    for table, column, sequence in cursor.fetchall():
+      cursor.execute(sql.SQL("SELECT SETVAL(%s, COALESCE(MAX({}), 1), MAX({}) IS NOT NULL) FROM {};").format(
+        sql.Identifier(column), sql.Identifier(column), sql.Identifier(table)
+      ), (sequence,))
+  connection.commit()
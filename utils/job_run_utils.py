@@ -0,0 +1,36 @@
+from utils.data_access.data_class.job_run import JOB_RUN_STATUS_SUCCEEDED, JobRun
+
+JOB_RUN_STATUS_MARK = {
+  JOB_RUN_STATUS_SUCCEEDED: '✅',
+}
+JOB_RUN_ERROR_MAX_LENGTH = 80
+
+
+def format_duration(duration_ms: int) -> str:
+  if duration_ms < 1000:
+    return f"{duration_ms}ms"
+  seconds = duration_ms / 1000
+  if seconds < 60:
+    return f"{seconds:.1f}秒"
+  return f"{int(seconds // 60)}分{int(seconds % 60)}秒"
+
+
+def format_job_runs(job_runs: list[JobRun]) -> str:
+  """The latest run of each scheduler job, as shown by the LINE bot."""
+  if not job_runs:
+    return "尚無排程紀錄"
+
+  message = "[排程狀態]\n"
+  for job_run in job_runs:
+    status_mark = JOB_RUN_STATUS_MARK.get(job_run.status, '❌')
+    message += f"{status_mark} {job_run.job_name}\n"
+    message += f"{job_run.finished.strftime('%m/%d %H:%M')}，{format_duration(job_run.duration_ms)}"
+    if job_run.item_count is not None:
+      message += f"，{job_run.item_count}筆"
+    message += "\n"
+    if job_run.error_count:
+      error = job_run.error or ''
+      if len(error) > JOB_RUN_ERROR_MAX_LENGTH:
+        error = error[:JOB_RUN_ERROR_MAX_LENGTH] + '…'
+      message += f"錯誤{job_run.error_count}次：{error}\n"
+  return message.rstrip('\n')
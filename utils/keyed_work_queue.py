@@ -0,0 +1,125 @@
+import queue
+import threading
+import time
+import zlib
+
+_STOP = object()
+
+
+class KeyedWorkQueue:
+  """
+  Bounded in-process work queue served by a fixed pool of worker threads.
+
+  Tasks with the same key always go to the same worker, so they run one at a time and in
+  submission order, while tasks with different keys run in parallel.
+  """
+
+  def __init__(self, num_workers, max_size_per_worker, logger=None, name='work-queue'):
+    self.logger = logger
+    self._queues = [queue.Queue(maxsize=max_size_per_worker) for _ in range(num_workers)]
+    self._stats_lock = threading.Lock()
+    # Held while queueing, so submit_all sees capacity that no other submitter can take
+    self._submit_lock = threading.Lock()
+    self._submitted_count = 0
+    self._rejected_count = 0
+    self._processed_count = 0
+    self._failed_count = 0
+    self._total_latency_seconds = 0.0
+    self._max_latency_seconds = 0.0
+    self._total_processing_seconds = 0.0
+    self._workers = [
+      threading.Thread(target=self._work, args=(work_queue,), name=f'{name}-{index}', daemon=True)
+      for index, work_queue in enumerate(self._queues)
+    ]
+    for worker in self._workers:
+      worker.start()
+
+  def submit(self, key, fn, *args) -> bool:
+    """Queues fn(*args) behind earlier tasks of the same key; returns False when that queue is full."""
+    return self.submit_all([(key, fn, args)])
+
+  def submit_all(self, tasks) -> bool:
+    """
+    Queues every (key, fn, args) task, or none of them when one would not fit.
+
+    Returns:
+        bool: False when a queue is full and nothing was queued.
+    """
+    tasks_by_queue = {}
+    for key, fn, args in tasks:
+      work_queue = self._queues[zlib.crc32(str(key).encode()) % len(self._queues)]
+      tasks_by_queue.setdefault(id(work_queue), (work_queue, []))[1].append((fn, args))
+
+    with self._submit_lock:
+      # Workers only take tasks off the queues, so room seen here is still there below
+      if any(
+        work_queue.maxsize > 0 and work_queue.qsize() + len(queue_tasks) > work_queue.maxsize
+        for work_queue, queue_tasks in tasks_by_queue.values()
+      ):
+        with self._stats_lock:
+          self._rejected_count += len(tasks)
+        return False
+      submitted_at = time.monotonic()
+      for work_queue, queue_tasks in tasks_by_queue.values():
+        for fn, args in queue_tasks:
+          work_queue.put_nowait((submitted_at, fn, args))
+    with self._stats_lock:
+      self._submitted_count += len(tasks)
+    return True
+
+  def join(self):
+    """Blocks until every queued task has been processed."""
+    for work_queue in self._queues:
+      work_queue.join()
+
+  def shutdown(self, timeout=None):
+    """Lets the workers finish the tasks already queued, then stops them."""
+    for work_queue in self._queues:
+      work_queue.put((None, _STOP, ()))
+    for worker in self._workers:
+      worker.join(timeout)
+
+  def get_stats(self) -> dict:
+    with self._stats_lock:
+      finished_count = self._processed_count + self._failed_count
+      return {
+        'workers': len(self._workers),
+        'depth': sum(work_queue.qsize() for work_queue in self._queues),
+        'max_depth': sum(work_queue.maxsize for work_queue in self._queues),
+        'submitted': self._submitted_count,
+        'rejected': self._rejected_count,
+        'processed': self._processed_count,
+        'failed': self._failed_count,
+        'avg_latency_ms': round(self._total_latency_seconds / finished_count * 1000, 3) if finished_count else 0.0,
+        'max_latency_ms': round(self._max_latency_seconds * 1000, 3),
+        'avg_processing_ms': round(self._total_processing_seconds / finished_count * 1000, 3) if finished_count else 0.0,
+      }
+
+  def _work(self, work_queue):
+    while True:
+      submitted_at, fn, args = work_queue.get()
+      if fn is _STOP:
+        work_queue.task_done()
+        return
+
+      started_at = time.monotonic()
+      failed = False
+      try:
+        fn(*args)
+      except Exception as e:
+        failed = True
+        if self.logger:
+          self.logger.exception(f"Error processing queued task: {e}")
+      finished_at = time.monotonic()
+
+      with self._stats_lock:
+        if failed:
+          self._failed_count += 1
+        else:
+          self._processed_count += 1
+        # Latency covers the time spent waiting in the queue plus processing
+        latency_seconds = finished_at - submitted_at
+        self._total_latency_seconds += latency_seconds
+        self._max_latency_seconds = max(self._max_latency_seconds, latency_seconds)
+        self._total_processing_seconds += finished_at - started_at
+      work_queue.task_done()
@@ -84,6 +84,9 @@ def generate_go_to_previous_step_button():
   )
 
 def append_total_price_quick_reply_buttons(quick_reply_buttons, total_price):
+  # No estimate to suggest
+  if total_price is None:
+    return
   original_price = int(total_price)
   discounted_price = original_price * 9 // 10
   quick_reply_buttons.append(
@@ -0,0 +1,148 @@
+import json
+import threading
+import uuid
+import requests
+from utils.line_notification_service import merge_line_notifications
+
+LINE_PUSH_URL = 'https://api.line.me/v2/bot/message/push'
+LINE_PUSH_TIMEOUT_SECONDS = 10
+
+
+class LineNotificationDispatcher:
+  """
+  Drains the LineNotificationOutbox table in batches and pushes the notifications to LINE.
+
+  Rows are claimed for lease_seconds with FOR UPDATE SKIP LOCKED in a short transaction, so several
+  line-bot-server workers can run a dispatcher without sending a notification twice, and the pushes
+  run without holding a row lock or a pooled connection. Failed pushes are retried with exponential
+  backoff; each push carries an X-Line-Retry-Key derived from its outbox IDs, so LINE drops a
+  retry of a push it already accepted.
+  """
+
+  def __init__(self, booking_dao, channel_access_token, logger, batch_size=50, poll_seconds=5, max_attempts=8, base_backoff_seconds=5, max_backoff_seconds=3600, lease_seconds=None):
+    self.booking_dao = booking_dao
+    self.logger = logger
+    self.batch_size = batch_size
+    self.poll_seconds = poll_seconds
+    self.max_attempts = max_attempts
+    self.base_backoff_seconds = base_backoff_seconds
+    self.max_backoff_seconds = max_backoff_seconds
+    # Long enough for every push of a full batch to time out
+    self.lease_seconds = lease_seconds or batch_size * LINE_PUSH_TIMEOUT_SECONDS
+    # One keep-alive session for every push instead of a new LineBotApi per notification
+    self.session = requests.Session()
+    self.session.headers.update({
+      'Authorization': f'Bearer {channel_access_token}',
+      'Content-Type': 'application/json',
+    })
+    self._wake_event = threading.Event()
+
+  def start(self):
+    dispatcher_thread = threading.Thread(target=self._run, name='line-notification-dispatcher', daemon=True)
+    dispatcher_thread.start()
+    return dispatcher_thread
+
+  def wake(self):
+    """Dispatches right away instead of waiting for the next poll."""
+    self._wake_event.set()
+
+  def _run(self):
+    while True:
+      try:
+        claimed_count = self.dispatch_pending()
+      except Exception as e:
+        self.logger.error(f"Error dispatching LINE notifications: {e}")
+        claimed_count = 0
+      # A full batch means more rows may be waiting
+      if claimed_count < self.batch_size:
+        self._wake_event.wait(self.poll_seconds)
+        self._wake_event.clear()
+
+  def dispatch_pending(self) -> int:
+    """Pushes one batch of due notifications and returns the number of outbox rows claimed."""
+    rows = self._claim_due_notifications()
+    if not rows:
+      return 0
+
+    sent_outbox_ids = []
+    failures = []
+    for recipient_id, outbox_ids, messages in merge_line_notifications(rows):
+      error, retryable = self._push(recipient_id, outbox_ids, messages)
+      if error is None:
+        sent_outbox_ids.extend(outbox_ids)
+        self.logger.info(f"LINE notifications {outbox_ids} sent to {recipient_id} in one push of {len(messages)} messages")
+      else:
+        failures.append((outbox_ids, error, retryable))
+        self.logger.warning(f"Failed to push LINE notifications {outbox_ids} to {recipient_id}: {error}")
+
+    # If this fails the rows stay claimed until the lease expires; the retry keys stop LINE from
+    # delivering the pushes that did go through a second time
+    self._record_push_results(sent_outbox_ids, failures)
+    return len(rows)
+
+  def _claim_due_notifications(self) -> list[tuple]:
+    with self.booking_dao.transaction() as cursor:
+      if not cursor:
+        return []
+
+      cursor.execute("""
+      WITH due AS (
+        SELECT outbox_id
+        FROM LineNotificationOutbox
+        WHERE sent_at IS NULL AND attempts < %s AND next_attempt_at <= NOW()
+          AND (claimed_until IS NULL OR claimed_until <= NOW())
+        ORDER BY outbox_id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+      )
+      UPDATE LineNotificationOutbox o
+      SET claimed_until = NOW() + %s * INTERVAL '1 second'
+      FROM due
+      WHERE o.outbox_id = due.outbox_id
+      RETURNING o.outbox_id, o.recipient_id, o.messages;
+      """, (self.max_attempts, self.batch_size, self.lease_seconds))
+      # RETURNING does not keep the ORDER BY, and notifications must go out in the order they were queued
+      return sorted((
+        (outbox_id, recipient_id, messages if isinstance(messages, list) else json.loads(messages))
+        for outbox_id, recipient_id, messages in cursor.fetchall()
+      ), key=lambda row: row[0])
+
+  def _record_push_results(self, sent_outbox_ids, failures):
+    with self.booking_dao.transaction() as cursor:
+      if not cursor:
+        return
+
+      if sent_outbox_ids:
+        cursor.execute("""
+        UPDATE LineNotificationOutbox
+        SET sent_at = NOW(), claimed_until = NULL
+        WHERE outbox_id = ANY(%s);
+        """, (sent_outbox_ids,))
+      for outbox_ids, error, retryable in failures:
+        cursor.execute("""
+        UPDATE LineNotificationOutbox
+        SET attempts = CASE WHEN %s THEN attempts + 1 ELSE %s END,
+            last_error = %s,
+            next_attempt_at = NOW() + LEAST(%s * POWER(2, attempts), %s) * INTERVAL '1 second',
+            claimed_until = NULL
+        WHERE outbox_id = ANY(%s);
+        """, (retryable, self.max_attempts, error, self.base_backoff_seconds, self.max_backoff_seconds, outbox_ids))
+
+  def _push(self, recipient_id, outbox_ids, messages):
+    """Returns (None, False) on success, otherwise the error and whether it is worth retrying."""
+    retry_key = uuid.uuid5(uuid.NAMESPACE_OID, 'line-notification-outbox:' + ','.join(map(str, outbox_ids)))
+    try:
+      response = self.session.post(
+        LINE_PUSH_URL,
+        json={ 'to': recipient_id, 'messages': messages },
+        headers={ 'X-Line-Retry-Key': str(retry_key) },
+        timeout=LINE_PUSH_TIMEOUT_SECONDS
+      )
+    except requests.RequestException as e:
+      return str(e), True
+
+    # 409 means LINE already accepted a push with this retry key
+    if response.status_code in (200, 409):
+      return None, False
+    retryable = response.status_code == 429 or response.status_code >= 500
+    return f"HTTP {response.status_code}: {response.text[:500]}", retryable
@@ -1,103 +1,145 @@
 import os
+from dataclasses import dataclass
+from typing import Optional
 from urllib.parse import quote
-from linebot import LineBotApi
-from linebot.models import TextSendMessage
 from const import line_config, property_config
 from const.notification_templates import ASK_FOR_PREPAYMENT
 from utils.data_access.data_class.booking_info import BookingInfo
 from utils.booking_utils import format_booking_info, get_booking_room_brief
 from utils.input_utils import format_phone_number_for_display
 
+
+@dataclass
+class LineNotification:
+  recipient_id: str
+  messages: list[dict]
+  # Notifications with the same key are only queued once, see BookingDAO.enqueue_line_notifications
+  dedupe_key: str
+
+
+# LINE accepts at most five messages per push request
+LINE_PUSH_MAX_MESSAGES = 5
+
+
+def text_message(text) -> dict:
+  return { 'type': 'text', 'text': text }
+
+
+def merge_line_notifications(rows) -> list[tuple[str, list[int], list[dict]]]:
+  """
+  Packs queued notifications into as few push requests as possible.
+
+  Notifications of the same recipient are merged in queue order while they fit in one push;
+  a notification whose messages repeat one already in the push is only marked as sent.
+
+  Args:
+      rows (list[tuple]): (outbox_id, recipient_id, messages) in queue order.
+
+  Returns:
+      list[tuple]: (recipient_id, outbox_ids, messages) per push request.
+  """
+  pushes = []
+  open_pushes = {}
+  for outbox_id, recipient_id, messages in rows:
+    push = open_pushes.get(recipient_id)
+    if push and all(message in push[2] for message in messages):
+      push[1].append(outbox_id)
+      continue
+    if not push or len(push[2]) + len(messages) > LINE_PUSH_MAX_MESSAGES:
+      push = (recipient_id, [], [])
+      pushes.append(push)
+      open_pushes[recipient_id] = push
+    push[1].append(outbox_id)
+    push[2].extend(messages)
+  return pushes
+
+
 class LineNotificationService:
+  """
+  Builds the LINE notifications of booking changes.
+
+  The notifications are written to the LineNotificationOutbox table by BookingDAO in the same
+  transaction as the change, and pushed by LineNotificationDispatcher.
+  """
+
   def __init__(self, logger):
-    self.line_bot_api = LineBotApi(os.getenv('LINE_CHANNEL_ACCESS_TOKEN'))
     self.recipient_id = os.getenv('LINE_BROADCAST_GROUP_ID')
     self.logger = logger
 
-  def notify_booking_created(self, booking_info: BookingInfo):
-    try:
-      message = format_booking_info(booking_info)
-      self.line_bot_api.push_message(
-        self.recipient_id,
-        TextSendMessage(text=message)
-      )
-      self.logger.info(f"Booking created notification sent to group {self.recipient_id}. booking_id: {booking_info.booking_id}")
-    except Exception as e:
-      self.logger.info(f"Failed to send booking created notification to group {self.recipient_id}. booking_id: {booking_info.booking_id}. error: {e}")
+  def _group_notification(self, event, booking_info: BookingInfo, text) -> list[LineNotification]:
+    if not self.recipient_id:
+      self.logger.info(f"No LINE broadcast group configured, skipping booking {event} notification. booking_id: {booking_info.booking_id}")
+      return []
+    return [LineNotification(
+      recipient_id=self.recipient_id,
+      messages=[text_message(text)],
+      dedupe_key=f"booking_{event}:{booking_info.booking_id}:{self.recipient_id}"
+    )]
+
+  def booking_created(self, booking_info: BookingInfo) -> list[LineNotification]:
+    return self._group_notification('created', booking_info, format_booking_info(booking_info))
+
+  def booking_updated(self, booking_info: BookingInfo) -> list[LineNotification]:
+    return self._group_notification('updated', booking_info, format_booking_info(booking_info, custom_status_mark='[更改]'))
+
+  def booking_restored(self, booking_info: BookingInfo) -> list[LineNotification]:
+    return self._group_notification('restored', booking_info, format_booking_info(booking_info, custom_status_mark='[復原]'))
+
+  def booking_canceled(self, booking_info: BookingInfo) -> list[LineNotification]:
+    message = f"{booking_info.check_in_date.strftime('%m/%d')} ID{booking_info.booking_id} {booking_info.customer_name} 取消"
+    return self._group_notification('canceled', booking_info, message)
 
-  def notify_public_booking_created_admins(self, booking_info: BookingInfo, room_type_summary: dict):
+  def booking_prepaid(self, booking_info: BookingInfo) -> list[LineNotification]:
+    message = f"{booking_info.check_in_date.strftime('%m/%d')} ID{booking_info.booking_id} {booking_info.customer_name} 已付訂金{int(booking_info.prepayment)}元 摘要\"{booking_info.prepayment_note}\""
+    return self._group_notification('prepaid', booking_info, message)
+
+  def booking_changed(self, existing_booking_info: Optional[BookingInfo], booking_info: BookingInfo) -> list[LineNotification]:
+    """Returns the notifications of an upsert, comparing the stored booking with the new one."""
+    if not existing_booking_info:
+      return self.booking_created(booking_info)
+    if existing_booking_info.status != booking_info.status:
+      if booking_info.status == 'canceled':
+        return self.booking_canceled(booking_info)
+      if existing_booking_info.status == 'canceled':
+        return self.booking_restored(booking_info)
+      if booking_info.status == 'prepaid':
+        return self.booking_prepaid(booking_info)
+      return []
+    if existing_booking_info != booking_info:
+      return self.booking_updated(booking_info)
+    return []
+
+  def public_booking_created_admins(self, booking_info: BookingInfo, room_type_summary: dict) -> list[LineNotification]:
     if not line_config.LINE_ADMIN_USER_IDS:
       self.logger.info(f"No LINE admin recipients configured. booking_id: {booking_info.booking_id}")
-      return
+      return []
     if not booking_info.prepayment or booking_info.prepayment_status != 'unpaid':
       self.logger.info(f"Skipping admin SMS notification because booking does not need unpaid prepayment. booking_id: {booking_info.booking_id}")
-      return
-
-    try:
-      nights = (booking_info.last_date - booking_info.check_in_date).days + 1
-      room_brief = get_booking_room_brief(room_type_summary, booking_info.extra_bed_count)
-      sms_body = ASK_FOR_PREPAYMENT.format(
-        property_name=property_config.PROPERTY_NAME,
-        booking_id_text=f"(訂單編號：{booking_info.booking_id})",
-        check_in_date=booking_info.check_in_date.strftime('%m/%d'),
-        nights=nights,
-        room_brief=room_brief,
-        total_price=int(booking_info.total_price),
-        prepayment=int(booking_info.prepayment),
-        bank_account_info=property_config.BANK_ACCOUNT_INFO
-      ).strip()
-      sms_url = f"sms:{format_phone_number_for_display(booking_info.phone_number)}?body={quote(sms_body)}"
-      messages = [
-        TextSendMessage(text=f"官網訂單已建立，請發送訂金簡訊：\n\n{format_booking_info(booking_info)}"),
-        TextSendMessage(text=f"匯款訊息：\n\n{sms_body}"),
-        TextSendMessage(text=f"發送簡訊：\n\n{sms_url}"),
-      ]
-      for admin_user_id in line_config.LINE_ADMIN_USER_IDS:
-        self.line_bot_api.push_message(admin_user_id, messages)
-      self.logger.info(f"Public booking admin SMS notification sent. booking_id: {booking_info.booking_id}. recipients: {len(line_config.LINE_ADMIN_USER_IDS)}")
-    except Exception as e:
-      self.logger.info(f"Failed to send public booking admin SMS notification. booking_id: {booking_info.booking_id}. error: {e}")
-
-  def notify_booking_updated(self, booking_info: BookingInfo):
-    try:
-      message = format_booking_info(booking_info, custom_status_mark='[更改]')
-      self.line_bot_api.push_message(
-        self.recipient_id,
-        TextSendMessage(text=message)
-      )
-      self.logger.info(f"Booking updated notification sent to group {self.recipient_id}. booking_id: {booking_info.booking_id}")
-    except Exception as e:
-      self.logger.info(f"Failed to send booking updated notification to group {self.recipient_id}. booking_id: {booking_info.booking_id}. error: {e}")
-
-  def notify_booking_restored(self, booking_info: BookingInfo):
-    try:
-      message = format_booking_info(booking_info, custom_status_mark='[復原]')
-      self.line_bot_api.push_message(
-        self.recipient_id,
-        TextSendMessage(text=message)
-      )
-      self.logger.info(f"Booking restored notification sent to group {self.recipient_id}. booking_id: {booking_info.booking_id}")
-    except Exception as e:
-      self.logger.info(f"Failed to send booking restored notification to group {self.recipient_id}. booking_id: {booking_info.booking_id}. error: {e}")
-
-  def notify_booking_canceled(self, booking_info: BookingInfo):
-    try:
-      message = f"{booking_info.check_in_date.strftime('%m/%d')} ID{booking_info.booking_id} {booking_info.customer_name} 取消"
-      self.line_bot_api.push_message(
-        self.recipient_id,
-        TextSendMessage(text=message)
-      )
-      self.logger.info(f"Booking canceled notification sent to group {self.recipient_id}. booking_id: {booking_info.booking_id}")
-    except Exception as e:
-      self.logger.info(f"Failed to send booking canceled notification to group {self.recipient_id}. booking_id: {booking_info.booking_id}. error: {e}")
-
-  def notify_booking_prepaid(self, booking_info: BookingInfo):
-    try:
-      message = f"{booking_info.check_in_date.strftime('%m/%d')} ID{booking_info.booking_id} {booking_info.customer_name} 已付訂金{int(booking_info.prepayment)}元 摘要\"{booking_info.prepayment_note}\""
-      self.line_bot_api.push_message(
-        self.recipient_id,
-        TextSendMessage(text=message)
+      return []
+
+    nights = (booking_info.last_date - booking_info.check_in_date).days + 1
+    room_brief = get_booking_room_brief(room_type_summary, booking_info.extra_bed_count)
+    sms_body = ASK_FOR_PREPAYMENT.format(
+      property_name=property_config.PROPERTY_NAME,
+      booking_id_text=f"(訂單編號：{booking_info.booking_id})",
+      check_in_date=booking_info.check_in_date.strftime('%m/%d'),
+      nights=nights,
+      room_brief=room_brief,
+      total_price=int(booking_info.total_price),
+      prepayment=int(booking_info.prepayment),
+      bank_account_info=property_config.BANK_ACCOUNT_INFO
+    ).strip()
+    sms_url = f"sms:{format_phone_number_for_display(booking_info.phone_number)}?body={quote(sms_body)}"
+    messages = [
+      text_message(f"官網訂單已建立，請發送訂金簡訊：\n\n{format_booking_info(booking_info)}"),
+      text_message(f"匯款訊息：\n\n{sms_body}"),
+      text_message(f"發送簡訊：\n\n{sms_url}"),
+    ]
+    return [
+      LineNotification(
+        recipient_id=admin_user_id,
+        messages=messages,
+        dedupe_key=f"public_booking_created:{booking_info.booking_id}:{admin_user_id}"
       )
-      self.logger.info(f"Booking prepaid notification sent to group {self.recipient_id}. booking_id: {booking_info.booking_id}")
-    except Exception as e:
-      self.logger.info(f"Failed to send booking prepaid notification to group {self.recipient_id}. booking_id: {booking_info.booking_id}. error: {e}")
+      for admin_user_id in line_config.LINE_ADMIN_USER_IDS
+    ]
@@ -0,0 +1,100 @@
+from typing import Callable, Iterator
+from utils.data_access.data_class.booking_info import BookingInfo
+
+# Notion returns at most 100 results per query
+NOTION_PAGE_SIZE = 100
+# Notion allows an average of three requests per second per integration
+NOTION_REQUESTS_PER_SECOND = 3
+NOTION_RATE_LIMITED_CODE = 'rate_limited'
+NOTION_RATE_LIMITED_MAX_RETRIES = 5
+NOTION_OBJECT_NOT_FOUND_CODE = 'object_not_found'
+
+
+def get_notion_error_code(exception):
+  # notion_client's APIResponseError carries the Notion error code
+  return getattr(exception, 'code', None)
+
+
+class RateLimitedNotion:
+  """
+  Runs Notion client calls through a token bucket, and retries calls that Notion still
+  rejects as rate limited with growing pauses.
+  """
+
+  def __init__(self, client, token_bucket, sleep):
+    self.client = client
+    self.token_bucket = token_bucket
+    self._sleep = sleep
+
+  def call(self, fn: Callable, **kwargs):
+    for attempt in range(NOTION_RATE_LIMITED_MAX_RETRIES + 1):
+      self.token_bucket.acquire()
+      try:
+        return fn(**kwargs)
+      except Exception as e:
+        if get_notion_error_code(e) != NOTION_RATE_LIMITED_CODE or attempt == NOTION_RATE_LIMITED_MAX_RETRIES:
+          raise
+        self._sleep(2 ** attempt)
+
+  def query_database(self, database_id, filter=None) -> Iterator[dict]:
+    """Yields every page matching filter, following next_cursor until has_more is false."""
+    query = { 'database_id': database_id, 'page_size': NOTION_PAGE_SIZE }
+    if filter:
+      query['filter'] = filter
+    while True:
+      response = self.call(self.client.databases.query, **query)
+      yield from response['results']
+      if not response.get('has_more'):
+        return
+      query['start_cursor'] = response['next_cursor']
+
+
+def as_local_time(value, local_tz):
+  """Returns value in local_tz; naive values, such as DB timestamps, are taken as local time."""
+  if value.tzinfo is not None:
+    return value.astimezone(local_tz)
+  # pytz zones need localize() to pick the right offset
+  if hasattr(local_tz, 'localize'):
+    return local_tz.localize(value)
+  return value.replace(tzinfo=local_tz)
+
+
+def resolve_booking_conflicts(bookings_in_db: list[BookingInfo], bookings_from_notion: list[BookingInfo], stored_bookings: dict[int, BookingInfo], local_tz):
+  """
+  Decides which side wins for every booking changed since the last sync.
+
+  Bookings equal on both sides are dropped, as are Notion bookings equal to the stored booking
+  (the Notion query looks one minute back). When both sides changed the same booking, the more
+  recently modified one is kept.
+
+  Args:
+      stored_bookings (dict[int, BookingInfo]): Stored bookings of the Notion booking IDs.
+      local_tz: Timezone of the naive DB timestamps (Asia/Taipei), whatever the process timezone is.
+
+  Returns:
+      tuple[list[BookingInfo], list[BookingInfo]]: Bookings to write to Notion and to the DB.
+  """
+  notion_booking_set = set(bookings_from_notion)
+  db_booking_set = set(bookings_in_db)
+  bookings_in_db = [booking_info for booking_info in bookings_in_db if booking_info not in notion_booking_set]
+  bookings_from_notion = [
+    booking_info for booking_info in bookings_from_notion
+    if booking_info not in db_booking_set and stored_bookings.get(booking_info.booking_id) != booking_info
+  ]
+
+  bookings_in_db_by_id = { booking_info.booking_id: booking_info for booking_info in bookings_in_db }
+  booking_ids_in_db_to_skip = set()
+  booking_ids_from_notion_to_skip = set()
+  for booking_info_from_notion in bookings_from_notion:
+    booking_info_in_db = bookings_in_db_by_id.get(booking_info_from_notion.booking_id)
+    if not booking_info_in_db:
+      continue
+    if as_local_time(booking_info_in_db.modified, local_tz) > as_local_time(booking_info_from_notion.modified, local_tz):
+      booking_ids_from_notion_to_skip.add(booking_info_from_notion.booking_id)
+    else:
+      booking_ids_in_db_to_skip.add(booking_info_in_db.booking_id)
+
+  return (
+    [booking_info for booking_info in bookings_in_db if booking_info.booking_id not in booking_ids_in_db_to_skip],
+    [booking_info for booking_info in bookings_from_notion if booking_info.booking_id not in booking_ids_from_notion_to_skip],
+  )
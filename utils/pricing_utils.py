@@ -0,0 +1,86 @@
+from dataclasses import dataclass, field
+from datetime import date, timedelta
+from const.booking_const import EXTRA_BED_PRICE_PER_NIGHT
+from utils.taiwan_holiday_utils import get_booking_holiday_nights
+
+RATE_TYPE_HOLIDAY = 'holiday'
+RATE_TYPE_WEEKDAY = 'weekday'
+
+
+@dataclass
+class RoomPriceBreakdown:
+  room_id: str
+  nightly_prices: list[int]
+  extra_bed_count: int = 0
+  extra_bed_price: int = 0
+  total_price: int = 0
+
+
+@dataclass
+class PriceQuote:
+  check_in_date: date
+  last_date: date
+  rate_types: list[str] = field(default_factory=list)
+  rooms: dict[str, RoomPriceBreakdown] = field(default_factory=dict)
+  total_price: int = 0
+
+  @property
+  def nights(self) -> int:
+    return len(self.rate_types)
+
+
+def get_stay_rate_types(check_in_date, last_date) -> list[str]:
+  return [
+    RATE_TYPE_HOLIDAY if is_holiday else RATE_TYPE_WEEKDAY
+    for is_holiday in get_booking_holiday_nights(check_in_date, last_date)
+  ]
+
+
+def get_nightly_rates(room, rate_types) -> list[int]:
+  holiday_price = int(room['holiday_price_per_night'])
+  weekday_price = int(room['weekday_price_per_night'])
+  return [holiday_price if rate_type == RATE_TYPE_HOLIDAY else weekday_price for rate_type in rate_types]
+
+
+def quote_stay(rooms_by_id, room_ids, check_in_date, last_date, extra_bed_counts=None) -> PriceQuote:
+  """
+  Prices a stay from room rates and the holiday calendar.
+
+  Args:
+      rooms_by_id (dict): Rooms keyed by room ID, as returned by BookingDAO.get_rooms_by_ids.
+      room_ids (list[str]): Booked room IDs.
+      check_in_date (date): First night of the stay.
+      last_date (date): Last night of the stay.
+      extra_bed_counts (dict[str, int]): Extra beds per booked room.
+
+  Returns:
+      PriceQuote: The total and the per-room, per-night breakdown.
+  """
+  extra_bed_counts = extra_bed_counts or {}
+  rate_types = get_stay_rate_types(check_in_date, last_date)
+  quote = PriceQuote(check_in_date=check_in_date, last_date=last_date, rate_types=rate_types)
+  for room_id in room_ids:
+    extra_bed_count = int(extra_bed_counts.get(room_id, 0))
+    nightly_prices = get_nightly_rates(rooms_by_id[room_id], rate_types)
+    extra_bed_price = extra_bed_count * EXTRA_BED_PRICE_PER_NIGHT * len(rate_types)
+    quote.rooms[room_id] = RoomPriceBreakdown(
+      room_id=room_id,
+      nightly_prices=nightly_prices,
+      extra_bed_count=extra_bed_count,
+      extra_bed_price=extra_bed_price,
+      total_price=sum(nightly_prices) + extra_bed_price,
+    )
+  quote.total_price = sum(breakdown.total_price for breakdown in quote.rooms.values())
+  return quote
+
+
+def get_nightly_room_prices(rooms_by_id, check_in_date, last_date) -> dict[str, list[dict]]:
+  rate_types = get_stay_rate_types(check_in_date, last_date)
+  dates = [(check_in_date + timedelta(days=offset)).isoformat() for offset in range(len(rate_types))]
+  return {
+    room_id: [
+      { 'date': night, 'price': price, 'rateType': rate_type }
+      for night, price, rate_type in zip(dates, get_nightly_rates(room, rate_types), rate_types)
+    ]
+    for room_id, room in rooms_by_id.items()
+  }
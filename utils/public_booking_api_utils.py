@@ -7,13 +7,23 @@ from flask import jsonify, request
 from const.booking_const import EXTRA_BED_PRICE_PER_NIGHT, PUBLIC_BOOKING_SOURCE, ROOM_TYPES
 from utils.datetime_utils import get_local_today
 from utils.input_utils import format_phone_number, format_phone_number_for_display, is_valid_date, is_valid_phone_number
-from utils.taiwan_holiday_utils import is_taiwan_holiday
+from utils.taiwan_holiday_utils import get_booking_holiday_nights, get_public_bookable_nights
 
 ROOM_TYPE_LABELS = { room_type: room_type_name for room_type, room_type_name, _ in ROOM_TYPES }
 MIN_CANCEL_DAYS_BEFORE_CHECK_IN = 7
 PUBLIC_BOOKING_MAX_ADVANCE_DAYS = 180
-PUBLIC_BOOKING_CLOSED_WEEKDAYS = {0, 1, 2}
+AVAILABILITY_CALENDAR_MAX_AGE_SECONDS = 60
+# How long browsers may reuse public read responses without asking again
+ROOMS_MAX_AGE_SECONDS = 300
+HOLIDAY_RATE_DATES_MAX_AGE_SECONDS = 86400
+AVAILABILITY_MAX_AGE_SECONDS = 30
+# Server-side cache of rendered public read responses; a TTL of 0 disables it
+PUBLIC_API_CACHE_MAX_ENTRIES = int(os.getenv('PUBLIC_API_CACHE_MAX_ENTRIES', '512'))
+PUBLIC_API_CACHE_TTL_SECONDS = int(os.getenv('PUBLIC_API_CACHE_TTL_SECONDS', '60'))
+# Also drop cached responses on writes by other processes (the scheduler, other gunicorn workers)
+PUBLIC_API_CACHE_LISTEN_ENABLED = os.getenv('PUBLIC_API_CACHE_LISTEN_ENABLED', '').lower() in ('1', 'true', 'yes', 'on')
 GENERIC_PUBLIC_API_ERROR_MESSAGE = "系統暫時無法處理，請稍後再試。"
+ROOMS_UNAVAILABLE_ERROR_MESSAGE = "選擇的房間已被預訂，請重新查詢空房。"
 
 
 def get_public_booking_discount_per_room_night():
@@ -63,6 +73,21 @@ def parse_date_range(source):
   return check_in, check_out, check_out - timedelta(days=1), nights
 
 
+def parse_calendar_date_range(source):
+  start_date = parse_date_value(source.get('start'), 'start')
+  end_date = parse_date_value(source.get('end'), 'end')
+  if end_date < start_date:
+    raise ValueError("結束日期需晚於開始日期。")
+
+  # Month views may start before today or end after the booking window, so clamp instead of rejecting
+  today = get_local_today()
+  start_date = max(start_date, today)
+  end_date = min(end_date, today + timedelta(days=PUBLIC_BOOKING_MAX_ADVANCE_DAYS))
+  if end_date < start_date:
+    raise ValueError("目前僅開放 180 天內的訂房。")
+  return start_date, end_date
+
+
 def iter_stay_nights(check_in_date, last_date):
   current_date = check_in_date
   while current_date <= last_date:
@@ -70,12 +95,8 @@ def iter_stay_nights(check_in_date, last_date):
     current_date += timedelta(days=1)
 
 
-def is_public_bookable_night(target_date):
-  return target_date.weekday() not in PUBLIC_BOOKING_CLOSED_WEEKDAYS or is_taiwan_holiday(target_date)
-
-
 def is_public_bookable_date_range(check_in_date, last_date):
-  return all(is_public_bookable_night(target_date) for target_date in iter_stay_nights(check_in_date, last_date))
+  return all(get_public_bookable_nights(check_in_date, last_date))
 
 
 def ensure_public_bookable_date_range(check_in_date, last_date):
@@ -108,7 +129,12 @@ def serialize_room(room, is_available=None):
   return serialized
 
 
-def serialize_booking(booking_info, website_discount_amount=0, booking_dao=None):
+def serialize_booking(booking_info, website_discount_amount=0, booking_dao=None, rooms_by_id=None):
+  """
+  Args:
+      rooms_by_id (dict): Rooms keyed by room ID; pass it when serializing several bookings so
+          the rooms are loaded once. Loaded from booking_dao when omitted.
+  """
   check_out = booking_info.last_date + timedelta(days=1)
   nights = (check_out - booking_info.check_in_date).days
   if not website_discount_amount and booking_info.source == PUBLIC_BOOKING_SOURCE:
@@ -134,11 +160,9 @@ def serialize_booking(booking_info, website_discount_amount=0, booking_dao=None)
     'source': booking_info.source,
     'notes': booking_info.notes,
   }
-  if booking_dao:
-    rooms_by_id = {
-      room['room_id']: room
-      for room in booking_dao.get_rooms_by_ids(list(booking_info.room_ids))
-    }
+  if rooms_by_id is None and booking_dao:
+    rooms_by_id = booking_dao.get_rooms_by_id()
+  if rooms_by_id is not None:
     serialized['rooms'] = [
       serialize_room(rooms_by_id[room_id])
       for room_id in booking_info.room_ids
@@ -147,9 +171,50 @@ def serialize_booking(booking_info, website_discount_amount=0, booking_dao=None)
   return serialized
 
 
+def serialize_price_quote(price_quote):
+  return {
+    'rateTypes': price_quote.rate_types,
+    'rooms': {
+      room_id: {
+        'nightlyPrices': breakdown.nightly_prices,
+        'extraBedCount': breakdown.extra_bed_count,
+        'extraBedPrice': breakdown.extra_bed_price,
+        'totalPrice': breakdown.total_price,
+      }
+      for room_id, breakdown in price_quote.rooms.items()
+    },
+  }
+
+
+def build_availability_calendar(rooms_by_id, start_date, end_date, occupied_room_nights):
+  nights = list(iter_stay_nights(start_date, end_date))
+  holiday_nights = get_booking_holiday_nights(start_date, end_date)
+  bookable_nights = get_public_bookable_nights(start_date, end_date)
+  rooms = {}
+  for room_id, room in rooms_by_id.items():
+    is_open = room['room_status'] == 'available'
+    rooms[room_id] = {
+      'available': [
+        is_open and is_bookable and (room_id, night) not in occupied_room_nights
+        for night, is_bookable in zip(nights, bookable_nights)
+      ],
+      'prices': [
+        int(room['holiday_price_per_night'] if is_holiday else room['weekday_price_per_night'])
+        for is_holiday in holiday_nights
+      ],
+    }
+  return {
+    'start': start_date.isoformat(),
+    'end': end_date.isoformat(),
+    'dates': [night.isoformat() for night in nights],
+    'rateTypes': ['holiday' if is_holiday else 'weekday' for is_holiday in holiday_nights],
+    'bookable': bookable_nights,
+    'rooms': rooms,
+  }
+
+
 def get_rooms_by_id(booking_dao):
-  rooms = booking_dao.get_rooms_by_ids()
-  return { room['room_id']: room for room in rooms }
+  return booking_dao.get_rooms_by_id()
 
 
 def validate_public_room_ids(room_ids, booking_dao):
@@ -202,10 +267,13 @@ def parse_extra_bed_counts(value, room_ids, booking_dao):
 
 def ensure_rooms_available(room_ids, check_in_date, last_date, booking_dao, exclude_booking_id=None):
   ensure_public_bookable_date_range(check_in_date, last_date)
-  available_room_ids = booking_dao.get_available_room_ids(check_in_date, last_date, exclude_booking_id) or []
+  # Decides a write, so ask the database rather than this process's occupancy index
+  available_room_ids = booking_dao.get_available_room_ids(
+    check_in_date, last_date, exclude_booking_id, use_occupancy_index=False
+  ) or []
   unavailable_room_ids = [room_id for room_id in room_ids if room_id not in available_room_ids]
   if unavailable_room_ids:
-    raise ValueError("選擇的房間已被預訂，請重新查詢空房。")
+    raise ValueError(ROOMS_UNAVAILABLE_ERROR_MESSAGE)
 
 
 def get_owned_booking_or_error(booking_id, phone_number, booking_dao):
@@ -0,0 +1,33 @@
+import threading
+import time
+
+
+class TokenBucket:
+  """
+  Client-side rate limiter: holds up to capacity tokens, refilled at rate tokens per second.
+
+  acquire() blocks until a token is available, so callers never exceed the rate on average
+  and never burst above capacity.
+  """
+
+  def __init__(self, rate, capacity=None, clock=time.monotonic, sleep=time.sleep):
+    self.rate = float(rate)
+    self.capacity = float(capacity if capacity is not None else rate)
+    self._clock = clock
+    self._sleep = sleep
+    self._lock = threading.Lock()
+    self._tokens = self.capacity
+    self._updated_at = clock()
+
+  def acquire(self, tokens=1):
+    while True:
+      with self._lock:
+        now = self._clock()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        # Tolerate float rounding, otherwise a refill of exactly one token could wait forever
+        if self._tokens >= tokens - 1e-9:
+          self._tokens = max(0.0, self._tokens - tokens)
+          return
+        wait_seconds = (tokens - self._tokens) / self.rate
+      self._sleep(wait_seconds)
@@ -0,0 +1,63 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Callable, Hashable, Optional
+
+
+@dataclass(frozen=True)
+class CachedResponse:
+  body: bytes
+  etag: str
+
+  @classmethod
+  def from_body(cls, body: bytes) -> 'CachedResponse':
+    return cls(body, hashlib.sha256(body).hexdigest()[:32])
+
+
+class ResponseCache:
+  """
+  Bounded LRU of rendered response bodies with a TTL.
+
+  Callers put the data version in the key, so entries rendered before a write are never served
+  after it and simply age out of the LRU.
+  """
+
+  def __init__(self, max_entries, ttl_seconds, clock: Callable[[], float]=time.monotonic):
+    self.max_entries = max_entries
+    self.ttl_seconds = ttl_seconds
+    self.clock = clock
+    self._lock = threading.Lock()
+    self._entries: OrderedDict[Hashable, tuple[float, CachedResponse]] = OrderedDict()
+    self.hits = 0
+    self.misses = 0
+
+  @property
+  def enabled(self) -> bool:
+    return self.max_entries > 0 and self.ttl_seconds > 0
+
+  def get(self, key: Hashable) -> Optional[CachedResponse]:
+    with self._lock:
+      entry = self._entries.get(key)
+      if entry is None or entry[0] <= self.clock():
+        if entry is not None:
+          del self._entries[key]
+        self.misses += 1
+        return None
+      self._entries.move_to_end(key)
+      self.hits += 1
+      return entry[1]
+
+  def put(self, key: Hashable, response: CachedResponse):
+    if not self.enabled:
+      return
+    with self._lock:
+      self._entries[key] = (self.clock() + self.ttl_seconds, response)
+      self._entries.move_to_end(key)
+      while len(self._entries) > self.max_entries:
+        self._entries.popitem(last=False)
+
+  def get_stats(self) -> dict:
+    with self._lock:
+      return { 'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses }
@@ -1,4 +1,6 @@
+import threading
 from datetime import date, timedelta
+from const.booking_const import PUBLIC_BOOKING_CLOSED_WEEKDAYS
 
 
 def _date_range(start_date, last_date):
@@ -51,16 +53,110 @@ TAIWAN_MAKEUP_WORKDAYS = {
 }
 
 
+# Per-day flags stored in the yearly bitmaps
+DAY_FLAG_HOLIDAY = 1
+DAY_FLAG_WORKDAY = 2
+DAY_FLAG_BOOKING_HOLIDAY_NIGHT = 4
+DAY_FLAG_PUBLIC_BOOKABLE_NIGHT = 8
+
+
 def is_taiwan_holiday(target_date):
   return target_date in TAIWAN_HOLIDAYS
 
 
 def is_taiwan_workday(target_date):
+  return bool(_get_day_flags(target_date) & DAY_FLAG_WORKDAY)
+
+
+def is_booking_holiday_night(target_date):
+  return bool(_get_day_flags(target_date) & DAY_FLAG_BOOKING_HOLIDAY_NIGHT)
+
+
+def is_public_bookable_night(target_date):
+  return bool(_get_day_flags(target_date) & DAY_FLAG_PUBLIC_BOOKABLE_NIGHT)
+
+
+def get_day_flags(start_date, last_date) -> bytes:
+  """
+  Returns one byte of DAY_FLAG_* bits per day from start_date to last_date inclusive,
+  sliced from the yearly bitmaps instead of evaluating the calendar day by day.
+  """
+  if last_date < start_date:
+    return b''
+  if start_date.year == last_date.year:
+    return bytes(_get_year_flags(start_date.year)[_day_of_year(start_date):_day_of_year(last_date) + 1])
+  day_flags = bytearray(_get_year_flags(start_date.year)[_day_of_year(start_date):])
+  for year in range(start_date.year + 1, last_date.year):
+    day_flags += _get_year_flags(year)
+  day_flags += _get_year_flags(last_date.year)[:_day_of_year(last_date) + 1]
+  return bytes(day_flags)
+
+
+def get_booking_holiday_nights(start_date, last_date) -> list[bool]:
+  return [bool(flags & DAY_FLAG_BOOKING_HOLIDAY_NIGHT) for flags in get_day_flags(start_date, last_date)]
+
+
+def get_booking_holiday_night_dates(start_date, last_date) -> list[date]:
+  return [
+    start_date + timedelta(days=offset)
+    for offset, flags in enumerate(get_day_flags(start_date, last_date))
+    if flags & DAY_FLAG_BOOKING_HOLIDAY_NIGHT
+  ]
+
+
+def get_public_bookable_nights(start_date, last_date) -> list[bool]:
+  return [bool(flags & DAY_FLAG_PUBLIC_BOOKABLE_NIGHT) for flags in get_day_flags(start_date, last_date)]
+
+
+def count_booking_holiday_nights(start_date, last_date) -> int:
+  return sum(1 for flags in get_day_flags(start_date, last_date) if flags & DAY_FLAG_BOOKING_HOLIDAY_NIGHT)
+
+
+def _is_taiwan_workday(target_date):
   if target_date in TAIWAN_MAKEUP_WORKDAYS:
     return True
   return target_date.weekday() < 5 and not is_taiwan_holiday(target_date)
 
 
-def is_booking_holiday_night(target_date):
-  is_holiday = target_date.weekday() == 5 or is_taiwan_holiday(target_date)
-  return is_holiday and not is_taiwan_workday(target_date + timedelta(days=1))
+def _compute_day_flags(target_date):
+  flags = 0
+  is_holiday = is_taiwan_holiday(target_date)
+  if is_holiday:
+    flags |= DAY_FLAG_HOLIDAY
+  if _is_taiwan_workday(target_date):
+    flags |= DAY_FLAG_WORKDAY
+  if (target_date.weekday() == 5 or is_holiday) and not _is_taiwan_workday(target_date + timedelta(days=1)):
+    flags |= DAY_FLAG_BOOKING_HOLIDAY_NIGHT
+  if target_date.weekday() not in PUBLIC_BOOKING_CLOSED_WEEKDAYS or is_holiday:
+    flags |= DAY_FLAG_PUBLIC_BOOKABLE_NIGHT
+  return flags
+
+
+def _build_year_flags(year):
+  return bytes(_compute_day_flags(day) for day in _date_range(date(year, 1, 1), date(year, 12, 31)))
+
+
+def _day_of_year(target_date):
+  return target_date.timetuple().tm_yday - 1
+
+
+def _get_year_flags(year):
+  year_flags = _YEAR_FLAGS.get(year)
+  if year_flags is None:
+    with _YEAR_FLAGS_LOCK:
+      year_flags = _YEAR_FLAGS.get(year)
+      if year_flags is None:
+        year_flags = _YEAR_FLAGS[year] = _build_year_flags(year)
+  return year_flags
+
+
+def _get_day_flags(target_date):
+  return _get_year_flags(target_date.year)[_day_of_year(target_date)]
+
+
+# Years covered by the holiday table are built up front, any other year on first use
+_YEAR_FLAGS_LOCK = threading.Lock()
+_YEAR_FLAGS = {
+  year: _build_year_flags(year)
+  for year in range(min(TAIWAN_HOLIDAY_PERIODS), max(TAIWAN_HOLIDAY_PERIODS) + 2)
+}